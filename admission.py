@@ -0,0 +1,144 @@
+# Maritime Color Vision Test - Admission control
+# Copyright © Toni Mandusic 2025
+#
+# Caps the number of sessions taking tests in one process so reruns stay
+# fast enough for the timed lantern test. A session needs a slot to enter
+# a test page; without one it waits in a queue and sees its position and
+# an estimated wait. Slots are leases renewed by every script run and freed
+# when the candidate reaches the results or stops interacting for
+# LEASE_SECONDS. Sessions in the middle of the lantern test queue ahead of
+# everyone else, so a timed section that lost its slot resumes first.
+
+import os
+import threading
+import time
+from collections import namedtuple
+
+import metrics
+
+MAX_ACTIVE = int(os.environ.get("MVT_MAX_ACTIVE_SESSIONS", 0))  # 0 = no cap
+LEASE_SECONDS = float(os.environ.get("MVT_ADMISSION_LEASE", 120))
+# Until sessions have finished, assume a full assessment takes this long
+DEFAULT_SESSION_SECONDS = 600
+EWMA_ALPHA = 0.2
+
+TIMED, NORMAL = 0, 1  # queue priorities, lower goes first
+
+WAIT_SECONDS = metrics.REGISTRY.histogram(
+    "mvt_admission_wait_seconds", "Time spent in the waiting room before admission", (),
+    (5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600))
+
+Ticket = namedtuple('Ticket', ['admitted', 'position', 'estimated_wait'])
+
+
+class _Waiting:
+    __slots__ = ('priority', 'sequence', 'enqueued_at', 'last_seen')
+
+    def __init__(self, priority, sequence, now):
+        self.priority = priority
+        self.sequence = sequence
+        self.enqueued_at = now
+        self.last_seen = now
+
+
+class AdmissionController:
+    """Slot leases plus a priority waiting queue, shared by all sessions of the process"""
+
+    def __init__(self, max_active=MAX_ACTIVE, lease_seconds=LEASE_SECONDS):
+        self.max_active = max_active
+        self.lease_seconds = lease_seconds
+        self.session_seconds = DEFAULT_SESSION_SECONDS  # EWMA of slot hold time
+        self.admitted_total = 0
+        self._active = {}  # session uid -> [admitted_at, last_seen]
+        self._waiting = {}  # session uid -> _Waiting
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def admit(self, session_uid, priority=NORMAL, now=None):
+        """Renew or request a slot; returns a Ticket"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            lease = self._active.get(session_uid)
+            if lease is not None:
+                lease[1] = now
+                return Ticket(True, 0, 0.0)
+            if not self.max_active:
+                self._grant(session_uid, now)
+                return Ticket(True, 0, 0.0)
+            entry = self._waiting.get(session_uid)
+            if entry is None:
+                self._sequence += 1
+                entry = self._waiting[session_uid] = _Waiting(priority, self._sequence, now)
+            entry.last_seen = now
+            entry.priority = min(entry.priority, priority)
+            queue = sorted(self._waiting, key=lambda uid: (self._waiting[uid].priority, self._waiting[uid].sequence))
+            free = self.max_active - len(self._active)
+            for uid in queue[:max(0, free)]:
+                WAIT_SECONDS.observe(now - self._waiting.pop(uid).enqueued_at)
+                self._grant(uid, now)
+            if session_uid in self._active:
+                return Ticket(True, 0, 0.0)
+            position = queue.index(session_uid) - max(0, free) + 1
+            # Slots free up at max_active / session_seconds per second
+            estimated_wait = position * self.session_seconds / self.max_active
+            return Ticket(False, position, estimated_wait)
+
+    def touch(self, session_uid, now=None):
+        """Renew the lease of an admitted session without requesting one"""
+        with self._lock:
+            lease = self._active.get(session_uid)
+            if lease is not None:
+                lease[1] = time.time() if now is None else now
+
+    def release(self, session_uid, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._waiting.pop(session_uid, None)
+            lease = self._active.pop(session_uid, None)
+            if lease is not None:
+                self._record_hold(now - lease[0])
+
+    def active_count(self):
+        return len(self._active)
+
+    def waiting_count(self):
+        return len(self._waiting)
+
+    def _grant(self, session_uid, now):
+        self._active[session_uid] = [now, now]
+        self.admitted_total += 1
+
+    def _record_hold(self, seconds):
+        self.session_seconds += EWMA_ALPHA * (seconds - self.session_seconds)
+
+    def _expire(self, now):
+        deadline = now - self.lease_seconds
+        # Renewals don't reorder _active, so check every lease; the cap
+        # keeps this a few dozen entries
+        for uid in [uid for uid, (_, last_seen) in self._active.items() if last_seen < deadline]:
+            admitted_at, last_seen = self._active.pop(uid)
+            self._record_hold(last_seen - admitted_at)
+        for uid in [uid for uid, entry in self._waiting.items() if entry.last_seen < deadline]:
+            del self._waiting[uid]
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    """Process-wide admission controller shared by every Streamlit session"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                controller = AdmissionController()
+                metrics.REGISTRY.gauge("mvt_admission_active", "Sessions holding a test slot",
+                                       controller.active_count)
+                metrics.REGISTRY.gauge("mvt_admission_waiting", "Sessions waiting for a test slot",
+                                       controller.waiting_count)
+                metrics.REGISTRY.gauge("mvt_admission_admitted", "Slots granted since start",
+                                       lambda: controller.admitted_total)
+                _controller = controller
+    return _controller
@@ -0,0 +1,247 @@
+# Maritime Color Vision Test - Cohort analytics
+# Copyright © Toni Mandusic 2025
+#
+# Running aggregates over every stored result, kept in the cohort_stats
+# table of the results database. Each completed test contributes a few
+# observations (per-plate errors, lantern shown->answered pairs, per-group
+# ECDIS accuracy, pass / accuracy per test) under its cohort: fleet, month
+# and position. The results writer folds each batch in within the same
+# transaction as the insert, as (count, mean, M2) triples merged with
+# Chan's parallel form of Welford's update, so means and variances never
+# need a rescan. Dashboards read the small aggregate table, whose size
+# depends on the number of cohorts and items, not on stored assessments.
+#
+# The fleet is a deployment setting (MVT_FLEET); results themselves don't
+# carry one.
+#
+# Usage: python analytics.py --rebuild [--db PATH]   (recompute from results)
+
+import argparse
+import json
+import logging
+import os
+from collections import defaultdict
+
+import protocol
+
+FLEET = os.environ.get("MVT_FLEET", "default")
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cohort_stats (
+    fleet TEXT NOT NULL,
+    month TEXT NOT NULL,
+    position TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    key TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    m2 REAL NOT NULL,
+    PRIMARY KEY (fleet, month, position, metric, key)
+) WITHOUT ROWID;
+"""
+
+# Merge a batch's (n, mean, m2) into the stored triple; every expression
+# on the right sees the row's old values
+UPSERT = """
+INSERT INTO cohort_stats (fleet, month, position, metric, key, n, mean, m2)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (fleet, month, position, metric, key) DO UPDATE SET
+    n = n + excluded.n,
+    mean = mean + (excluded.mean - mean) * excluded.n / (n + excluded.n),
+    m2 = m2 + excluded.m2 + (excluded.mean - mean) * (excluded.mean - mean) * n * excluded.n / (n + excluded.n)
+"""
+
+# Metrics: value is 0/1 for rates, so mean is the rate
+PLATE_ERROR = 'ishihara_plate_error'      # key: plate number
+LANTERN_ANSWER = 'lantern_answer'         # key: "shown>answered", count only
+LANTERN_COLOR_ERROR = 'lantern_color_error'  # key: shown color
+ECDIS_GROUP_ACCURACY = 'ecdis_group_accuracy'  # key: group index
+RADAR_SUBTEST_SCORE = 'radar_subtest_score'  # key: subtest index
+PASS = 'pass'                             # key: test
+ACCURACY = 'accuracy'                     # key: test
+
+
+def observations(record):
+    """(metric, key, value) contributed by one stored result, against the answer key it was given on"""
+    test = record["test"]
+    answers = record["answers"]
+    if isinstance(answers, str):
+        answers = json.loads(answers)
+    rules = protocol.recorded(answers)
+    yield PASS, test, 1.0 if record["status"] == 'PASS' else 0.0
+    yield ACCURACY, test, float(record["accuracy"])
+    if test == 'ishihara':
+        for plate, answer in answers.get('answers', {}).items():
+            normal = rules.ishihara_data[int(plate)]["normal"]
+            yield PLATE_ERROR, str(plate), 0.0 if (answer or "").strip() == normal else 1.0
+    elif test == 'lantern':
+        for pair in answers.get('answers', {}).values():
+            for light in ('1', '2'):
+                shown, answered = pair['correct' + light], pair['light' + light]
+                yield LANTERN_ANSWER, f"{shown}>{answered}", 1.0
+                yield LANTERN_COLOR_ERROR, shown, 0.0 if shown == answered else 1.0
+    elif test == 'ecdis':
+        for group, score in enumerate(answers.get('group_scores', [])):
+            yield ECDIS_GROUP_ACCURACY, str(group), score / len(rules.ecdis_fm_colors[group])
+    elif test == 'radar':
+        for subtest, score in enumerate(answers.get('subtest_scores', [])):
+            yield RADAR_SUBTEST_SCORE, str(subtest), float(score)
+
+
+def accumulate(records, fleet=FLEET):
+    """Welford aggregates {(fleet, month, position, metric, key): [n, mean, m2]} of a batch
+
+    A record that can't be read (malformed answers, items its answer key
+    doesn't have) is logged and left out; the rest of the batch still counts.
+    """
+    stats = defaultdict(lambda: [0, 0.0, 0.0])
+    for record in records:
+        try:
+            cohort = (fleet, record["completed_at"][:7], record["position"])
+            values = list(observations(record))
+        except Exception:
+            logger.exception("Result left out of the analytics: %s test of session %s",
+                             record.get("test"), record.get("session_id"))
+            continue
+        for metric, key, value in values:
+            entry = stats[cohort + (metric, key)]
+            entry[0] += 1
+            delta = value - entry[1]
+            entry[1] += delta / entry[0]
+            entry[2] += delta * (value - entry[1])
+    return stats
+
+
+def upsert_rows(records, fleet=FLEET):
+    """UPSERT parameters folding records (dicts with the results columns) into cohort_stats"""
+    return [key + tuple(entry) for key, entry in accumulate(records, fleet).items()]
+
+
+def update(conn, records, fleet=FLEET):
+    """Fold records into cohort_stats on conn's open transaction"""
+    conn.executemany(UPSERT, upsert_rows(records, fleet))
+
+
+def merge(a, b):
+    """Combine two (n, mean, m2) triples"""
+    n = a[0] + b[0]
+    if not n:
+        return (0, 0.0, 0.0)
+    delta = b[1] - a[1]
+    return (n, a[1] + delta * b[0] / n, a[2] + b[2] + delta * delta * a[0] * b[0] / n)
+
+
+class Stat(tuple):
+    """(n, mean, m2) with the derived sample variance"""
+    __slots__ = ()
+
+    n = property(lambda self: self[0])
+    mean = property(lambda self: self[1])
+
+    @property
+    def variance(self):
+        return self[2] / (self[0] - 1) if self[0] > 1 else 0.0
+
+
+def summary(conn, metrics, fleet=None, months=None, position=None, by_position=False):
+    """{metric: {key: Stat}} merged over the selected cohorts
+
+    months is an inclusive (first, last) pair of "YYYY-MM" strings. With
+    by_position the keys become (position, key).
+    """
+    sql = f"SELECT position, metric, key, n, mean, m2 FROM cohort_stats WHERE metric IN ({', '.join('?' * len(metrics))})"
+    params = list(metrics)
+    if fleet is not None:
+        sql += " AND fleet = ?"
+        params.append(fleet)
+    if months is not None:
+        sql += " AND month BETWEEN ? AND ?"
+        params.extend(months)
+    if position is not None:
+        sql += " AND position = ?"
+        params.append(position)
+    merged = defaultdict(dict)
+    for row_position, metric, key, n, mean, m2 in conn.execute(sql, params):
+        if by_position:
+            key = (row_position, key)
+        merged[metric][key] = Stat(merge(merged[metric].get(key, (0, 0.0, 0.0)), (n, mean, m2)))
+    return merged
+
+
+def group_name(group, rules):
+    """Display name of an ECDIS group key; 'Group N' for a group the protocol doesn't have"""
+    group = int(group)
+    names = rules.ecdis_group_names
+    return names[group] if group < len(names) else f"Group {group + 1}"
+
+
+def color_name(code, rules):
+    """Display name of a lantern color code; the code itself for a color the protocol doesn't have"""
+    color = rules.lantern_colors.get(code)
+    return color['name'] if color else code
+
+
+def lantern_codes(answers, rules):
+    """Color codes in LANTERN_ANSWER keys: in the protocol's palette order, then any others"""
+    seen = set()
+    for key in answers:
+        seen.update(key.split(">", 1))
+    return [code for code in rules.lantern_palette if code in seen] + sorted(seen - set(rules.lantern_palette))
+
+
+def cohorts(conn):
+    """Distinct fleets, months and positions with data, for filter choices"""
+    return {
+        column: [row[0] for row in conn.execute(f"SELECT DISTINCT {column} FROM cohort_stats ORDER BY {column}")]
+        for column in ('fleet', 'month', 'position')
+    }
+
+
+def rebuild(path, chunk_size=10000, fleet=FLEET):
+    """Recompute cohort_stats from every stored result (one-off backfill)"""
+    # Imported here: results_store imports this module for the writer
+    from results_store import connect, decode_row
+
+    conn = connect(path)
+    try:
+        conn.executescript(SCHEMA)
+        # One write transaction: the results writer waits, so no batch is
+        # counted twice or missed while the table is rebuilt
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM cohort_stats")
+        after_id = 0
+        total = 0
+        while True:
+            rows = conn.execute("SELECT * FROM results WHERE id > ? ORDER BY id LIMIT ?",
+                                (after_id, chunk_size)).fetchall()
+            if not rows:
+                break
+            after_id = rows[-1]["id"]
+            update(conn, [decode_row(row) for row in rows], fleet)
+            total += len(rows)
+        conn.commit()
+        return total
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def main():
+    from results_store import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Maintain cohort analytics aggregates")
+    parser.add_argument("--rebuild", action="store_true", help="recompute aggregates from all stored results")
+    parser.add_argument("--db", default=DB_PATH, help="results database (default: %(default)s)")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.error("nothing to do (use --rebuild)")
+    count = rebuild(args.db)
+    print(f"Rebuilt cohort aggregates from {count} result(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,34 @@
 # Copyright © Toni Mandusic 2025
 
 import streamlit as st
-import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import os
 import random
 import time
 from datetime import datetime
-from fpdf import FPDF
-import base64
-from io import BytesIO
+import json
+import uuid
+import hmac
+import tempfile
+from results_store import get_store, format_timestamp
+import protocol
+import assets
+import battery
+import calibration
+import certificates
+import lights
+import roster
+from state import NO_SELECTION
+import engine
+import checkpoint
+from session_lifecycle import get_lifecycle, restore_test_state
+from admission import get_controller, TIMED, NORMAL
+import metrics
+import analytics
+import irt
+import recording
+from proctoring import get_detector
+from progress_bus import get_bus
 
 # Page configuration
 st.set_page_config(
@@ -84,29 +104,32 @@ st.markdown("""
     .nav-button {
         margin: 0.5rem;
     }
-    .lantern-display-container {
+    .st-key-lantern_display {
         background-color: #000000;
-        padding: 80px 20px;
+        padding: 60px 20px;
         border-radius: 8px;
-        text-align: center;
         margin: 20px 0;
         border: 2px solid #333;
         min-height: 300px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
     }
-    .lantern-lights-wrapper {
+    .st-key-lantern_display [data-testid="stImage"] {
         display: flex;
         justify-content: center;
-        align-items: center;
-        gap: 100px;
-        width: 100%;
     }
-    .lantern-light {
-        display: flex;
-        flex-direction: column;
-        align-items: center;
+    .lantern-light-label {
+        color: white;
+        text-align: center;
+        font-size: 16px;
+    }
+    @keyframes scintillate {
+        0% { filter: brightness(1); }
+        13% { filter: brightness(0.84); }
+        29% { filter: brightness(1.1); }
+        41% { filter: brightness(0.92); }
+        58% { filter: brightness(1.04); }
+        72% { filter: brightness(0.8); }
+        86% { filter: brightness(1.08); }
+        100% { filter: brightness(1); }
     }
     .test-title {
         color: #1a3d7c;
@@ -132,271 +155,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Test data - CORRECTED Ishihara interpretations according to PDF
-# Using all plates EXCEPT: 3, 18, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38
-ISHIHARA_DATA = {
-    # Plate 1: Everyone sees 12
-    1: {"normal": "12", "deutan": "12", "protan": "12"},
-    
-    # Plate 2: Normal vs Red-green deficiency
-    2: {"normal": "8", "deutan": "3", "protan": "3"},
-    
-    # Plate 4-9: Normal vs Red-green deficiency
-    4: {"normal": "29", "deutan": "70", "protan": "70"},
-    5: {"normal": "57", "deutan": "35", "protan": "35"},
-    6: {"normal": "5", "deutan": "2", "protan": "2"},
-    7: {"normal": "3", "deutan": "5", "protan": "5"},
-    8: {"normal": "15", "deutan": "17", "protan": "17"},
-    9: {"normal": "74", "deutan": "21", "protan": "21"},
-    
-    # Plates 10-17: Normal sees number, colorblind sees nothing/wrong
-    10: {"normal": "2", "deutan": "", "protan": ""},
-    11: {"normal": "6", "deutan": "", "protan": ""},
-    12: {"normal": "97", "deutan": "", "protan": ""},
-    13: {"normal": "45", "deutan": "", "protan": ""},
-    14: {"normal": "5", "deutan": "", "protan": ""},
-    15: {"normal": "7", "deutan": "", "protan": ""},
-    16: {"normal": "16", "deutan": "", "protan": ""},
-    17: {"normal": "73", "deutan": "", "protan": ""},
-    
-    # Plates 19-21: Normal sees nothing, colorblind sees number
-    19: {"normal": "", "deutan": "2", "protan": "2"},
-    20: {"normal": "", "deutan": "45", "protan": "45"},
-    21: {"normal": "", "deutan": "73", "protan": "73"},
-    
-    # Plates 22-25: Different numbers for different types
-    22: {"normal": "26", "deutan": "2", "protan": "6"},
-    23: {"normal": "42", "deutan": "4", "protan": "2"},
-    24: {"normal": "35", "deutan": "3", "protan": "5"},
-    25: {"normal": "96", "deutan": "9", "protan": "6"}
-}
-
-# List of plates we're actually using (all except excluded ones)
-USED_PLATES = [1, 2, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 19, 20, 21, 22, 23, 24, 25]
-TOTAL_PLATES = len(USED_PLATES)
-
-LANTERN_COLORS = {
-    'red': {'name': 'Red', 'hex': '#FF0000'},
-    'green': {'name': 'Green', 'hex': '#00FF00'}, 
-    'yellow': {'name': 'Yellow', 'hex': '#FFD200'},
-    'white': {'name': 'White', 'hex': '#FFFFFF'}
-}
-
-LANTERN_SEQUENCES = [
-    ('red', 'green'), ('red', 'white'), ('green', 'white'),
-    ('yellow', 'yellow'), ('red', 'red'), ('green', 'green'),
-    ('white', 'white'), ('red', 'yellow'), ('green', 'yellow')
-]
-
-ECDIS_FM_COLORS = [
-    # Sea blues
-    ['#AEE9FF', '#9BDDF5', '#88D1EB', '#75C5E1', '#62B9D7', '#4FADCD', '#3CA1C3', '#2995B9'],
-    # Land browns
-    ['#E5D8A6', '#D4C895', '#C3B884', '#B2A873', '#A19862', '#908851', '#7F7840', '#6E682F'],
-    # Depth blues
-    ['#0076BF', '#006BAC', '#005F99', '#005386', '#004773', '#003B60', '#002F4D', '#00233A'],
-    # Navigation yellows
-    ['#FFAA00', '#E69900', '#CC8800', '#B37700', '#996600', '#805500', '#664400', '#4D3300'],
-    # Navigation greens
-    ['#44FF44', '#3CE03C', '#33C633', '#2AAD2A', '#229322', '#197A19', '#106110', '#084808'],
-    # Olive greens (new)
-    ['#808000', '#767A00', '#6D7400', '#636E00', '#596800', '#4F6200', '#455C00', '#3B5600'],
-    # Dark purples (new)
-    ['#4B0082', '#45007A', '#3F0072', '#39006A', '#330062', '#2D005A', '#270052', '#21004A']
-]
-
-# RADAR COLOR TEST DATA - DODANO
-RADAR_COLORS = {
-    'critical_pairs': [
-        ['#80FF80', '#80FF80'],  # identične
-        ['#FF8080', '#FF6060'],  # vrlo slične crvene
-        ['#80FF80', '#60FF60'],  # vrlo slične zelene  
-        ['#FFD200', '#FFB000'],  # slične žute
-        ['#FF8080', '#80FF80'],  # različite (crvena vs zelena)
-        ['#FFD200', '#80FF80'],  # različite (žuta vs zelena)
-    ],
-    'intensity_scale': [
-        '#004400', '#006600', '#008800', '#00AA00', '#00CC00', '#00EE00', '#80FF80', '#FFFFFF'
-    ],
-    'contrast_targets': [
-        {'bg': '#000818', 'target': '#80FF80', 'visible': True},    # ZELENI na tamnoplavoj - VIDLJIV
-        {'bg': '#000818', 'target': '#404040', 'visible': False},   # TAMNOSIVI na tamnoplavoj - NEVIDLJIV
-        {'bg': '#1A3D7C', 'target': '#80FF80', 'visible': True},    # ZELENI na svijetloplavoj - VIDLJIV  
-        {'bg': '#1A3D7C', 'target': '#606060', 'visible': False},   # SIVI na svijetloplavoj - NEVIDLJIV
-    ]
-}
-
-class CertificatePDF(FPDF):
-    def header(self):
-        # Logo
-        self.image('https://i.postimg.cc/L8cW5X4H/phant-logo.png', 10, 8, 33)
-        self.set_font('Arial', 'B', 18)
-        self.cell(0, 10, 'MARITIME COLOR VISION CERTIFICATE', 0, 1, 'C')
-        self.ln(10)
-    
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
-
-def generate_certificate(user_data, test_results):
-    pdf = CertificatePDF()
-    pdf.add_page()
-    
-    # Title
-    pdf.set_font('Arial', 'B', 24)
-    pdf.cell(0, 20, 'CERTIFICATE OF COLOR VISION ASSESSMENT', 0, 1, 'C')
-    pdf.ln(10)
-    
-    # Candidate Information
-    pdf.set_font('Arial', 'B', 14)
-    pdf.cell(0, 10, 'CANDIDATE INFORMATION', 0, 1, 'L')
-    pdf.set_font('Arial', '', 12)
-    
-    # FIX: Encode text to Latin-1 and replace unsupported characters
-    def safe_text(text):
-        if isinstance(text, str):
-            # Replace problematic characters
-            text = text.encode('latin-1', 'replace').decode('latin-1')
-        return str(text)
-    
-    pdf.cell(0, 8, f'Name: {safe_text(user_data["name"])}', 0, 1)
-    pdf.cell(0, 8, f'ID: {safe_text(user_data["id"])}', 0, 1)
-    pdf.cell(0, 8, f'Position: {safe_text(user_data["position"])}', 0, 1)
-    pdf.cell(0, 8, f'Date of Assessment: {safe_text(user_data["date"])}', 0, 1)
-    pdf.ln(10)
-    
-    # Test Results
-    pdf.set_font('Arial', 'B', 14)
-    pdf.cell(0, 10, 'TEST RESULTS SUMMARY', 0, 1, 'L')
-    
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(60, 10, 'Test', 1, 0, 'C')
-    pdf.cell(40, 10, 'Score', 1, 0, 'C')
-    pdf.cell(40, 10, 'Accuracy', 1, 0, 'C')
-    pdf.cell(50, 10, 'Status', 1, 1, 'C')
-    
-    pdf.set_font('Arial', '', 11)
-    for test in test_results:
-        pdf.cell(60, 10, safe_text(test['test']), 1, 0, 'L')
-        pdf.cell(40, 10, safe_text(test['score']), 1, 0, 'C')
-        pdf.cell(40, 10, safe_text(test['accuracy']), 1, 0, 'C')
-        status_color = (0, 128, 0) if test['status'] == 'PASS' else (255, 0, 0)
-        pdf.set_text_color(*status_color)
-        pdf.cell(50, 10, safe_text(test['status']), 1, 1, 'C')
-        pdf.set_text_color(0, 0, 0)
-    
-    pdf.ln(10)
-    
-    # Overall Assessment
-    pdf.set_font('Arial', 'B', 14)
-    pdf.cell(0, 10, 'OVERALL ASSESSMENT', 0, 1, 'L')
-    
-    passed_tests = sum(1 for test in test_results if test['status'] == 'PASS')
-    total_tests = len(test_results)
-    
-    if passed_tests == total_tests:
-        pdf.set_text_color(0, 128, 0)
-        pdf.set_font('Arial', 'B', 16)
-        pdf.cell(0, 12, 'OVERALL RESULT: PASS', 0, 1, 'L')
-        pdf.set_font('Arial', '', 12)
-        pdf.multi_cell(0, 8, safe_text('The candidate has demonstrated satisfactory color vision capabilities for maritime duties. Performance meets IMO standards for navigation and lookout responsibilities.'))
-    else:
-        pdf.set_text_color(255, 0, 0)
-        pdf.set_font('Arial', 'B', 16)
-        pdf.cell(0, 12, 'OVERALL RESULT: FAIL', 0, 1, 'L')
-        pdf.set_font('Arial', '', 12)
-        pdf.multi_cell(0, 8, safe_text('The candidate has not met the required standards for color vision in maritime operations. Further professional assessment is recommended.'))
-    
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(10)
-    
-    # Professional Endorsement
-    pdf.set_font('Arial', 'I', 10)
-    pdf.multi_cell(0, 8, safe_text('This certificate is issued based on computerized color vision assessment. For official medical certification, consult a qualified maritime medical examiner.'))
-    
-    # Signature area
-    pdf.ln(20)
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, 'Maritime Color Vision Test System', 0, 1, 'C')
-    pdf.set_font('Arial', 'I', 10)
-    pdf.cell(0, 10, 'Copyright © Toni Mandusic 2025', 0, 1, 'C')
-    
-    return pdf
-
-def generate_comprehensive_pdf(user_data, results_data):
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Header
-    pdf.set_font('Arial', 'B', 24)
-    pdf.cell(0, 20, 'COMPREHENSIVE COLOR VISION ASSESSMENT', 0, 1, 'C')
-    pdf.ln(10)
-    
-    # Candidate Information
-    pdf.set_font('Arial', 'B', 16)
-    pdf.cell(0, 10, 'CANDIDATE INFORMATION', 0, 1, 'L')
-    pdf.set_font('Arial', '', 12)
-    
-    def safe_text(text):
-        if isinstance(text, str):
-            return text.encode('latin-1', 'replace').decode('latin-1')
-        return str(text)
-    
-    pdf.cell(0, 8, f'Name: {safe_text(user_data["name"])}', 0, 1)
-    pdf.cell(0, 8, f'ID: {safe_text(user_data["id"])}', 0, 1)
-    pdf.cell(0, 8, f'Position: {safe_text(user_data["position"])}', 0, 1)
-    pdf.cell(0, 8, f'Date: {safe_text(user_data["date"])}', 0, 1)
-    pdf.ln(10)
-    
-    # Test Results Summary
-    pdf.set_font('Arial', 'B', 16)
-    pdf.cell(0, 10, 'TEST RESULTS SUMMARY', 0, 1, 'L')
-    
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(80, 10, 'Test', 1, 0, 'C')
-    pdf.cell(40, 10, 'Score', 1, 0, 'C')
-    pdf.cell(40, 10, 'Accuracy', 1, 0, 'C')
-    pdf.cell(30, 10, 'Status', 1, 1, 'C')
-    
-    pdf.set_font('Arial', '', 10)
-    for test in results_data['tests_completed']:
-        pdf.cell(80, 10, safe_text(test['test']), 1, 0, 'L')
-        pdf.cell(40, 10, safe_text(test['score']), 1, 0, 'C')
-        pdf.cell(40, 10, safe_text(test['accuracy']), 1, 0, 'C')
-        status_color = (0, 128, 0) if test['status'] == 'PASS' else (255, 0, 0)
-        pdf.set_text_color(*status_color)
-        pdf.cell(30, 10, safe_text(test['status']), 1, 1, 'C')
-        pdf.set_text_color(0, 0, 0)
-    
-    pdf.ln(10)
-    
-    # Overall Assessment
-    passed_tests = sum(1 for test in results_data['tests_completed'] if test['status'] == 'PASS')
-    total_tests = len(results_data['tests_completed'])
-    
-    pdf.set_font('Arial', 'B', 16)
-    pdf.cell(0, 10, 'OVERALL ASSESSMENT', 0, 1, 'L')
-    
-    if passed_tests == total_tests:
-        pdf.set_text_color(0, 128, 0)
-        pdf.set_font('Arial', 'B', 14)
-        pdf.cell(0, 10, 'FIT FOR MARITIME DUTIES', 0, 1, 'L')
-    elif passed_tests >= total_tests * 0.7:
-        pdf.set_text_color(255, 165, 0)
-        pdf.set_font('Arial', 'B', 14)
-        pdf.cell(0, 10, 'CONDITIONALLY FIT', 0, 1, 'L')
-    else:
-        pdf.set_text_color(255, 0, 0)
-        pdf.set_font('Arial', 'B', 14)
-        pdf.cell(0, 10, 'FURTHER ASSESSMENT REQUIRED', 0, 1, 'L')
-    
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font('Arial', 'I', 10)
-    pdf.multi_cell(0, 8, safe_text('This comprehensive report is generated by the Maritime Color Vision Test System. For official medical certification, consult a qualified maritime medical examiner.'))
-    
-    return pdf
-
 def render_header():
     col1, col2 = st.columns([3, 1])
     
@@ -419,6 +177,10 @@ def render_header():
 
 def user_information():
     st.markdown("### PERSONAL INFORMATION")
+    store = get_store()
+    if store.has_roster():
+        roster_lookup(store)
+        st.markdown("Not on the roster? Enter your details:")
     with st.container():
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -428,9 +190,36 @@ def user_information():
         with col3:
             st.session_state.user_position = st.selectbox(
                 "Position",
-                ["Select position", "Deck Officer", "Engine Officer", "Lookout", "Pilot", "Other"]
+                ["Select position"] + list(roster.POSITIONS)
             )
 
+def roster_lookup(store):
+    """Typeahead over the imported crew roster; picking an entry fills in the candidate's details"""
+    query = st.text_input("Find yourself on the crew roster",
+                          placeholder=f"Type at least {roster.MIN_SEARCH_CHARS} letters of your surname")
+    if not query.strip():
+        return
+    matches = store.search_roster(query)
+    if not matches:
+        st.info("No roster entry matches. Check the spelling or enter your details below.")
+        return
+    labels = [f"{entry['candidate_name']} — ID {roster.mask_id(entry['candidate_id'])} ({entry['position']})"
+              for entry in matches]
+    choice = st.radio("Select your entry", range(len(matches)), format_func=labels.__getitem__, index=None)
+    if choice is None:
+        return
+    # IDs are masked in the list: the candidate proves the entry is theirs
+    typed_id = st.text_input("Confirm your ID number", key="roster_confirm_id", placeholder="ID or passport number")
+    if st.button("Use This Entry", type="primary"):
+        entry = matches[choice]
+        if not roster.same_id(entry['candidate_id'], typed_id):
+            st.error("The ID number doesn't match this roster entry.")
+            return
+        st.session_state.user_name = entry['candidate_name']
+        st.session_state.user_id = entry['candidate_id']
+        st.session_state.user_position = entry['position']
+        st.rerun()
+
 def show_user_panel():
     if st.session_state.get('user_name'):
         st.markdown(f"""
@@ -440,6 +229,9 @@ def show_user_panel():
             <strong>Position:</strong> {st.session_state.user_position}
         </div>
         """, unsafe_allow_html=True)
+        if any(test in st.session_state for test in checkpoint.STATE_CLASSES):
+            st.caption(f"Resume code: **{checkpoint.display_code(st.session_state.resume_code)}** - "
+                       "note it down to continue this assessment after a disconnect")
 
 def home_page():
     render_header()
@@ -449,6 +241,7 @@ def home_page():
         st.markdown("---")
     
     show_user_panel()
+    offer_resume()
     
     st.markdown("### SELECT TEST")
     st.markdown("Choose a test to begin your color vision assessment")
@@ -505,52 +298,278 @@ def home_page():
                 st.session_state.current_page = "radar_simple"
                 st.rerun()
     
+    # Full battery: every test in one run, results at the end
+    st.markdown("---")
+    st.markdown("### FULL BATTERY")
+    st.markdown("All tests in one session, one after another: "
+                + " → ".join(PAGE_LABELS[TEST_PAGE_OF[test]] for test in battery.ORDER)
+                + ". Results are shown when the last test is done.")
+    if battery_test() is not None:
+        if st.button("Continue Full Battery", key="battery_home", use_container_width=True, type="primary"):
+            st.session_state.current_page = TEST_PAGE_OF[battery_test()]
+            st.rerun()
+    elif st.button("Start Full Battery", key="battery_home", use_container_width=True, type="primary"):
+        if validate_user_info():
+            start_battery()
+            st.rerun()
+    
+    # Display calibration: corrects every stimulus color for this screen
+    st.markdown("---")
+    profile = display_profile()
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.markdown("### DISPLAY CALIBRATION")
+        if profile is None:
+            st.caption("This display is not calibrated: stimulus colors are shown as specified.")
+        else:
+            st.caption(f"Stimulus colors are corrected for this display ({calibration.describe(profile)}).")
+    with col2:
+        label = "Calibrate Display" if profile is None else "Recalibrate Display"
+        if st.button(label, key="calibration_home", use_container_width=True):
+            st.session_state.current_page = "calibration"
+            st.rerun()
+    
     # Quick navigation between tests if already started
-    if any(key in st.session_state for key in ['lantern_answers', 'user_answers', 'ecdis_scores', 'radar_scores']):
+    if any(key in st.session_state for key in ['lantern', 'ishihara', 'ecdis', 'radar']):
         st.markdown("---")
         st.markdown("### CONTINUE TESTING")
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            if st.session_state.get('lantern_answers'):
+            if 'lantern' in st.session_state and st.session_state.lantern.answered_pairs():
                 if st.button("Continue Lantern Test", use_container_width=True):
                     st.session_state.current_page = "lantern"
                     st.rerun()
         
         with col2:
-            if st.session_state.get('user_answers'):
+            if 'ishihara' in st.session_state and st.session_state.ishihara.has_answers():
                 if st.button("Continue Ishihara Test", use_container_width=True):
                     st.session_state.current_page = "ishihara"
                     st.rerun()
         
         with col3:
-            if st.session_state.get('ecdis_scores'):
+            if 'ecdis' in st.session_state:
                 if st.button("Continue ECDIS Test", use_container_width=True):
                     st.session_state.current_page = "ecdiscfm"
                     st.rerun()
         
         # DODANO: Continue Radar Test
         with col4:
-            if st.session_state.get('radar_scores'):
+            if 'radar' in st.session_state:
                 if st.button("Continue Radar Test", use_container_width=True):
                     st.session_state.current_page = "radar_simple"
                     st.rerun()
     
     render_footer()
 
+def offer_resume():
+    """Offer to restore a checkpointed assessment for the entered candidate ID
+
+    Resuming takes the name the assessment was started under and its resume
+    code as well, so an ID alone doesn't open someone else's test.
+    """
+    candidate_id = st.session_state.get('user_id', '').strip()
+    if any(test in st.session_state for test in checkpoint.STATE_CLASSES) or not checkpoint.exists(candidate_id):
+        return
+    
+    st.info("💾 An unfinished assessment was found for this ID. Enter the resume code shown during it "
+            "to continue where you left off, or to discard it and start fresh.")
+    code = st.text_input("Resume code", key="resume_code_input", placeholder="ABCD-EFGH")
+    col1, col2 = st.columns(2)
+    with col1:
+        resume = st.button("Resume Assessment", use_container_width=True, type="primary")
+    with col2:
+        fresh = st.button("Start Fresh", use_container_width=True)
+    if not (resume or fresh):
+        return
+    flat = checkpoint.load(candidate_id)
+    if not flat or not checkpoint.may_resume(flat, candidate_id, st.session_state.get('user_name'), code):
+        st.error("The name or resume code doesn't match the unfinished assessment for this ID.")
+        return
+    if resume:
+        for key, value in checkpoint.restore(flat).items():
+            st.session_state[key] = value
+        st.session_state.resume_code = checkpoint.normalize_code(code)
+        # Next save starts a fresh, compacted log from the restored state
+        st.session_state.checkpoint_snapshot = None
+    else:
+        checkpoint.discard(candidate_id, flat['resume_digest'])
+    st.rerun()
+
+def owns_checkpoint():
+    """False if the entered ID has another session's unfinished assessment"""
+    candidate_id = st.session_state.get('user_id', '').strip()
+    digest = checkpoint.resume_digest(candidate_id, st.session_state.resume_code)
+    return not checkpoint.held_by_other(candidate_id, digest)
+
+def save_checkpoint():
+    """Append whatever test state changed during this run to the candidate's checkpoint"""
+    candidate_id = st.session_state.get('user_id', '').strip()
+    if not candidate_id or not any(test in st.session_state for test in checkpoint.STATE_CLASSES):
+        return
+    st.session_state.resume_digest = checkpoint.resume_digest(candidate_id, st.session_state.resume_code)
+    current = checkpoint.snapshot(st.session_state)
+    try:
+        checkpoint.save(candidate_id, st.session_state.get('checkpoint_snapshot'), current)
+    except checkpoint.CheckpointTaken:
+        # Another session's assessment under this ID: leave its log alone
+        return
+    st.session_state.checkpoint_snapshot = current
+
+def session_random():
+    """Random source for test setup; reproducible when the session has a seed"""
+    # A seed comes from MVT_RANDOM_SEED or is set by a driver (load tests,
+    # replays) as st.session_state.random_seed. Each draw gets its own
+    # generator derived from (seed, draw number), so only two ints are kept
+    # in the session.
+    seed = st.session_state.get('random_seed')
+    if seed is None:
+        return random
+    draw = st.session_state.get('random_draws', 0)
+    st.session_state.random_draws = draw + 1
+    return random.Random(f"{seed}:{draw}")
+
+def session_recorder():
+    """This session's input recorder, None when recording is off"""
+    if not recording.ENABLED:
+        return None
+    if 'recorder' not in st.session_state:
+        recording.prune_due()
+        st.session_state.recorder = recording.SessionRecorder(st.session_state.session_uid)
+    return st.session_state.recorder
+
+def session_protocol():
+    """The protocol this session is pinned to; the active one when the session first asks"""
+    version = st.session_state.get('protocol_version')
+    if version is None:
+        active = protocol.current()
+        st.session_state.protocol_version = active.version
+        return active
+    return protocol.get_version(version)
+
+def display_profile():
+    """This session's display calibration (calibration.Profile), None when uncalibrated"""
+    values = st.session_state.get('display_profile')
+    return calibration.Profile(*values) if values else None
+
+def stimulus_palette(rules):
+    """Colors to draw for a protocol's stimulus colors on this session's display"""
+    return calibration.palette(display_profile(), rules)
+
+def start_test(test, prepared=None):
+    """Fresh engine state for a test, randomized from the session's seed
+
+    prepared is a (seed, state) pair the full battery built ahead.
+    """
+    now = time.time()
+    if prepared is None:
+        # The setup seed is drawn explicitly so the recording can replay it
+        seed = event_seed()
+        state = engine.start(test, random.Random(seed), now, session_protocol())
+    else:
+        seed, state = prepared
+        state = engine.begin(test, state, now)
+    st.session_state[test] = state
+    recorder = session_recorder()
+    if recorder is not None:
+        recorder.start(test, seed, now, state.protocol.version)
+    mark_test_started(test)
+    get_detector().item_shown(st.session_state.session_uid, now)
+
+def dispatch(test, *event, response=True):
+    """Apply one engine transition to this session's test state
+
+    An ANSWER with response=False changes the state but isn't the
+    candidate's response (the proctoring detector doesn't see it).
+    """
+    now = time.time()
+    previous = st.session_state[test]
+    state = engine.apply(test, previous, event, now)
+    st.session_state[test] = state
+    recorder = session_recorder()
+    if recorder is not None:
+        recorder.event(test, event, now)
+    # Feed the proctoring detector: answers, and every newly shown item
+    item = engine.current_item(test, previous)
+    if event[0] == engine.ANSWER:
+        if item is not None and response:
+            get_detector().answer(st.session_state.session_uid, test, item, now)
+    elif event[0] == engine.RESUME or engine.current_item(test, state) != item:
+        get_detector().item_shown(st.session_state.session_uid, now)
+    return state
+
+def event_seed():
+    """Seed for a test setup or a randomizing event (shuffle, night scene)"""
+    return session_random().getrandbits(32)
+
+def battery_test():
+    """The test a running full battery is on, None outside a battery"""
+    order = st.session_state.get('battery_order')
+    index = st.session_state.get('battery_index', 0)
+    return order[index] if order and index < len(order) else None
+
+def start_battery():
+    order = list(battery.ORDER)
+    st.session_state.battery_order = order
+    st.session_state.battery_index = 0
+    st.session_state.battery_prepared = {}
+    start_test(order[0])
+    st.session_state.current_page = TEST_PAGE_OF[order[0]]
+
+def prefetch_next_test():
+    """Have the battery's next test prepared in the background while this one runs"""
+    upcoming = battery.next_test(st.session_state.battery_order, st.session_state.battery_index)
+    if upcoming is None:
+        return
+    if 'battery_prepared' not in st.session_state:
+        st.session_state.battery_prepared = {}
+    prepared = st.session_state.battery_prepared
+    if upcoming not in prepared:
+        seed = event_seed()
+        prepared[upcoming] = (seed, battery.get_prefetcher().submit(battery.prepare, upcoming, seed,
+                                                                    session_protocol(), display_profile()))
+
+def finish_test(test):
+    """Leave a finished test: on to the battery's next test, or to the results"""
+    if battery_test() == test:
+        st.session_state.battery_index += 1
+        upcoming = battery_test()
+        if upcoming is not None:
+            entry = st.session_state.get('battery_prepared', {}).pop(upcoming, None)
+            prepared = None
+            if entry is not None:
+                seed, future = entry
+                outcome = "ready" if future.done() else "waited"
+                try:
+                    prepared = (seed, future.result())
+                except Exception:
+                    outcome = "failed"
+                battery.PREPARED.inc(outcome)
+            else:
+                battery.PREPARED.inc("lost")
+            start_test(upcoming, prepared)
+            st.session_state.current_page = TEST_PAGE_OF[upcoming]
+            return
+    st.session_state.current_page = "results"
+
+def finish_label(test):
+    if battery_test() == test and battery.next_test(st.session_state.battery_order,
+                                                    st.session_state.battery_index) is not None:
+        return "Next Test →"
+    return "See Results"
+
 def validate_user_info():
     if not st.session_state.get('user_name') or not st.session_state.get('user_id'):
         st.error("❌ Please complete personal information before starting tests")
         return False
+    if not owns_checkpoint():
+        st.error("❌ This ID has an unfinished assessment. Resume it or start fresh with its resume code.")
+        return False
     return True
 
 def initialize_lantern_test():
-    if 'lantern_pair_start_time' not in st.session_state:
-        st.session_state.lantern_pair_start_time = time.time()
-    if 'lantern_current_pair' not in st.session_state:
-        st.session_state.lantern_current_pair = 0
-        st.session_state.lantern_answers = {}
-        st.session_state.lantern_sequence = random.sample(LANTERN_SEQUENCES, len(LANTERN_SEQUENCES))
+    if 'lantern' not in st.session_state:
+        start_test('lantern')
 
 def lantern_test():
     render_header()
@@ -559,80 +578,73 @@ def lantern_test():
     
     initialize_lantern_test()
     
-    current_pair = st.session_state.lantern_current_pair
-    sequence = st.session_state.lantern_sequence
+    lantern = st.session_state.lantern
+    current_pair = lantern.current_pair
+    sequence = lantern.sequence
     
     if current_pair >= len(sequence):
+        if battery_test() == 'lantern':
+            finish_test('lantern')
+            st.rerun()
         show_lantern_results()
         return
     
     # FIXED TIMER LOGIC - 10 seconds fixed, no warnings
-    if 'lantern_pair_start_time' not in st.session_state:
-        st.session_state.lantern_pair_start_time = time.time()
-    
-    elapsed_time = time.time() - st.session_state.lantern_pair_start_time
-    time_remaining = max(0, 10 - elapsed_time)  # 10 seconds fixed
+    time_remaining = engine.lantern_time_remaining(lantern, time.time())
     
     # Display simple countdown timer
     st.markdown(f"**Time remaining: {time_remaining:.1f}s**")
-    st.progress(time_remaining / 10)
+    st.progress(time_remaining / lantern.protocol.lantern_pair_seconds)
     
-    color1, color2 = sequence[current_pair]
-    color1_data = LANTERN_COLORS[color1]
-    color2_data = LANTERN_COLORS[color2]
+    color1, color2 = lantern.pair_colors(current_pair)
     
     st.markdown(f"**Light Pair {current_pair + 1} of {len(sequence)}**")
     
-    # Lantern display
-    lantern_html = f"""
-    <div class="lantern-display-container">
-        <div class="lantern-lights-wrapper">
-            <div class="lantern-light">
-                <div style="width: 96px; height: 96px; border-radius: 50%; background-color: {color1_data['hex']}; margin: 0 auto; box-shadow: 0 0 40px {color1_data['hex']}80; border: 3px solid #555;"></div>
-                <div style="color: white; margin-top: 15px; font-size: 16px;">LIGHT 1</div>
-            </div>
-            <div class="lantern-light">
-                <div style="width: 96px; height: 96px; border-radius: 50%; background-color: {color2_data['hex']}; margin: 0 auto; box-shadow: 0 0 40px {color2_data['hex']}80; border: 3px solid #555;"></div>
-                <div style="color: white; margin-top: 15px; font-size: 16px;">LIGHT 2</div>
-            </div>
-        </div>
-    </div>
-    """
-    st.markdown(lantern_html, unsafe_allow_html=True)
+    # Lantern display: cached light sprites (see lights.py), so a rerun
+    # sends the same image URLs again, not new pixels
+    if lights.SETTINGS.scintillation:
+        # Out of step, like two real lights
+        st.markdown("""<style>
+        .st-key-lantern_light_1 img { animation: scintillate 1.7s infinite; }
+        .st-key-lantern_light_2 img { animation: scintillate 2.3s infinite reverse; }
+        </style>""", unsafe_allow_html=True)
+    profile = display_profile()
+    with st.container(key="lantern_display"):
+        for i, (column, color) in enumerate(zip(st.columns(2), (color1, color2)), 1):
+            with column, st.container(key=f"lantern_light_{i}"):
+                sprite = assets.light_sprite(lantern.protocol.lantern_colors[color]['hex'], profile)
+                st.image(sprite, width=lights.SETTINGS.size, output_format="PNG")
+                st.markdown(f'<div class="lantern-light-label">LIGHT {i}</div>', unsafe_allow_html=True)
     
     # Auto-advance after 10 seconds
     if time_remaining <= 0:
-        st.session_state.lantern_current_pair += 1
-        st.session_state.lantern_pair_start_time = time.time()
+        dispatch('lantern', engine.TIMEOUT)
         st.rerun()
     
     # Answer section
+    color_options = ["Select color"] + [color['name'] for color in lantern.protocol.lantern_colors.values()]
     with st.container():
         col1, col2 = st.columns(2)
         with col1:
-            light1_answer = st.selectbox("Light 1 Color:", ["Select color", "Red", "Green", "Yellow", "White"], 
+            light1_answer = st.selectbox("Light 1 Color:", color_options, 
                                        key=f"lantern_1_{current_pair}")
         with col2:
-            light2_answer = st.selectbox("Light 2 Color:", ["Select color", "Red", "Green", "Yellow", "White"], 
+            light2_answer = st.selectbox("Light 2 Color:", color_options, 
                                        key=f"lantern_2_{current_pair}")
     
     if light1_answer != "Select color" and light2_answer != "Select color":
-        st.session_state.lantern_answers[current_pair] = {
-            'light1': light1_answer.lower(), 'light2': light2_answer.lower(),
-            'correct1': color1_data['name'].lower(), 'correct2': color2_data['name'].lower()
-        }
+        if lantern.answer(current_pair) != (light1_answer.lower(), light2_answer.lower()):
+            lantern = dispatch('lantern', engine.ANSWER, light1_answer, light2_answer)
     
     # Navigation
     col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
     with col1:
         if current_pair > 0 and st.button("← Previous", use_container_width=True):
-            st.session_state.lantern_current_pair -= 1
-            st.session_state.lantern_pair_start_time = time.time()
+            dispatch('lantern', engine.PREVIOUS)
             st.rerun()
     with col2:
         if st.button("Skip", use_container_width=True):
-            st.session_state.lantern_current_pair += 1
-            st.session_state.lantern_pair_start_time = time.time()
+            dispatch('lantern', engine.SKIP)
             st.rerun()
     with col3:
         if st.button("Home", use_container_width=True):
@@ -640,8 +652,7 @@ def lantern_test():
             st.rerun()
     with col4:
         if st.button("Next →", use_container_width=True, type="primary"):
-            st.session_state.lantern_current_pair += 1
-            st.session_state.lantern_pair_start_time = time.time()
+            dispatch('lantern', engine.NEXT)
             st.rerun()
 
 def ishihara_test():
@@ -649,35 +660,40 @@ def ishihara_test():
     show_user_panel()
     st.markdown("### ISHIHARA TEST")
     
-    if 'current_plate' not in st.session_state:
-        st.session_state.current_plate = 0  # Start with first used plate
-        st.session_state.user_answers = {}
-        st.session_state.ishihara_score = 0
+    if 'ishihara' not in st.session_state:
+        start_test('ishihara')  # Start with first used plate
     
-    current_index = st.session_state.current_plate
-    plate_number = USED_PLATES[current_index]
+    ishihara = st.session_state.ishihara
+    current_index = ishihara.current_plate
+    plate_number = ishihara.protocol.used_plates[current_index]
+    total_plates = ishihara.protocol.total_plates
     
-    st.markdown(f"**Plate {current_index + 1} of {TOTAL_PLATES}**")
-    st.progress((current_index + 1) / TOTAL_PLATES)
+    st.markdown(f"**Plate {current_index + 1} of {total_plates}**")
+    st.progress((current_index + 1) / total_plates)
     
     # Center the image with reduced size (300px)
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        image_path = f"assets/ishihara_plates/plate{plate_number}.png"
-        if os.path.exists(image_path):
-            st.image(image_path, width=300, use_column_width=False)
+        image_bytes = assets.plate_bytes(plate_number, display_profile())
+        if image_bytes is not None:
+            metrics.PAYLOAD_BYTES.observe(len(image_bytes), "plate_image")
+            st.image(image_bytes, width=300, use_column_width=False)
         else:
-            st.error(f"❌ Plate image not found: {image_path}")
+            st.error(f"❌ Plate image not found: {assets.plate_path(plate_number)}")
             return
     
     # User input centered - BEZ IKAKVIH SAVJETA ŠTO SE TREBA VIDJETI
     with col2:
         user_answer = st.text_input(
             "What number do you see? (Leave blank if none)",
-            value=st.session_state.user_answers.get(plate_number, ""),
+            value=ishihara.answer(plate_number),
             key=f"plate_{plate_number}"
         )
-        st.session_state.user_answers[plate_number] = user_answer.strip()
+        if user_answer.strip() != ishihara.answers[current_index]:
+            # The blank a plate starts with only marks it as visited; a
+            # response is an actual change of the answer
+            ishihara = dispatch('ishihara', engine.ANSWER, user_answer,
+                                response=user_answer.strip() != ishihara.answer(plate_number))
     
     # Navigation
     col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 1, 1])
@@ -687,56 +703,37 @@ def ishihara_test():
             st.rerun()
     with col2:
         if current_index > 0 and st.button("← Previous", use_container_width=True):
-            st.session_state.current_plate -= 1
+            dispatch('ishihara', engine.PREVIOUS)
             st.rerun()
     with col3:
         if st.button("Other Tests", use_container_width=True):
             st.session_state.current_page = "home"
             st.rerun()
     with col4:
-        if current_index < TOTAL_PLATES - 1 and st.button("Next →", use_container_width=True, type="primary"):
-            st.session_state.current_plate += 1
+        if current_index < total_plates - 1 and st.button("Next →", use_container_width=True, type="primary"):
+            dispatch('ishihara', engine.NEXT)
             st.rerun()
     with col5:
-        if current_index == TOTAL_PLATES - 1 and st.button("See Results", use_container_width=True, type="primary"):
-            score = calculate_ishihara_score()
-            st.session_state.ishihara_score = score
-            st.session_state.current_page = "results"
+        if current_index == total_plates - 1 and st.button(finish_label('ishihara'), use_container_width=True,
+                                                           type="primary"):
+            dispatch('ishihara', engine.FINISH)
+            finish_test('ishihara')
             st.rerun()
 
-def calculate_ishihara_score():
-    """Calculate Ishihara test score based on correct answers"""
-    score = 0
-    user_answers = st.session_state.user_answers
-    
-    for plate_num in USED_PLATES:
-        user_answer = user_answers.get(plate_num, "").strip()
-        plate_data = ISHIHARA_DATA[plate_num]
-        
-        # For plates where normal vision sees a number
-        if plate_data["normal"] != "":
-            if user_answer == plate_data["normal"]:
-                score += 1
-        # For plates where normal vision sees nothing (plates 19-21)
-        else:
-            if user_answer == "":
-                score += 1
-    
-    return score
-
+@metrics.timed_call("generate_ishihara_report")
 def generate_ishihara_report():
     """Generate detailed Ishihara test report with interpretation"""
-    if not st.session_state.get('user_answers'):
+    if 'ishihara' not in st.session_state or not st.session_state.ishihara.has_answers():
         return None
     
-    user_answers = st.session_state.user_answers
-    score = st.session_state.get('ishihara_score', 0)
+    ishihara = st.session_state.ishihara
+    score = ishihara.score
     
     # Calculate detailed results
     results = []
-    for plate_num in USED_PLATES:
-        user_answer = user_answers.get(plate_num, "").strip()
-        plate_data = ISHIHARA_DATA[plate_num]
+    for plate_num in ishihara.protocol.used_plates:
+        user_answer = ishihara.answer(plate_num).strip()
+        plate_data = ishihara.protocol.ishihara_data[plate_num]
         
         # Determine if answer is correct
         is_correct = False
@@ -755,7 +752,7 @@ def generate_ishihara_report():
         })
     
     # Calculate statistics
-    total_plates = len(USED_PLATES)
+    total_plates = ishihara.protocol.total_plates
     correct_answers = sum(1 for r in results if r['Status'] == 'PASS')
     accuracy = (correct_answers / total_plates) * 100
     
@@ -854,39 +851,29 @@ def ecdisfm_test():
     show_user_panel()
     st.markdown("### ECDIS HUE TEST")
     
-    if 'ecdis_current_group' not in st.session_state:
-        st.session_state.ecdis_current_group = 0
-        st.session_state.ecdis_scores = [0] * len(ECDIS_FM_COLORS)
-        st.session_state.ecdis_user_orders = []
-        for group in ECDIS_FM_COLORS:
-            shuffled = group.copy()
-            random.shuffle(shuffled)
-            st.session_state.ecdis_user_orders.append(shuffled)
-        st.session_state.ecdis_selected_color = None
-    
-    current_group = st.session_state.ecdis_current_group
-    user_order = st.session_state.ecdis_user_orders[current_group]
-    selected_color = st.session_state.ecdis_selected_color
-    
-    group_names = ["Sea Blues", "Land Browns", "Depth Blues", "Navigation Yellows", 
-                   "Navigation Greens", "Olive Greens", "Dark Purples"]
-    st.markdown(f"**{group_names[current_group]}** - Arrange from lightest to darkest")
-    st.markdown(f"*Group {current_group + 1} of {len(ECDIS_FM_COLORS)}*")
-    st.progress((current_group + 1) / len(ECDIS_FM_COLORS))
+    if 'ecdis' not in st.session_state:
+        start_test('ecdis')
+    
+    ecdis = st.session_state.ecdis
+    current_group = ecdis.current_group
+    selected_color = ecdis.selected
+    
+    group_count = len(ecdis.protocol.ecdis_fm_colors)
+    st.markdown(f"**{ecdis.protocol.ecdis_group_names[current_group]}** - Arrange from lightest to darkest")
+    st.markdown(f"*Group {current_group + 1} of {group_count}*")
+    st.progress((current_group + 1) / group_count)
     
     # Color grid
     cols = st.columns(8)
-    for i, color in enumerate(user_order):
+    palette = stimulus_palette(ecdis.protocol)
+    colors = [palette[color] for color in ecdis.colors(current_group)]
+    for i, (color_index, color) in enumerate(zip(ecdis.orders[current_group], colors)):
         with cols[i]:
-            border_color = "#FF0000" if color == selected_color else "#333333"
-            border_width = "3px" if color == selected_color else "1px"
+            border_color = "#FF0000" if color_index == selected_color else "#333333"
+            border_width = "3px" if color_index == selected_color else "1px"
             
             if st.button("", key=f"ecdis_color_{i}"):
-                if selected_color is None:
-                    st.session_state.ecdis_selected_color = color
-                else:
-                    move_ecdis_color(selected_color, i)
-                    st.session_state.ecdis_selected_color = None
+                dispatch('ecdis', engine.ANSWER, i)
                 st.rerun()
             
             st.markdown(
@@ -895,7 +882,7 @@ def ecdisfm_test():
             )
             st.markdown(f'<div style="text-align:center; font-size:12px; margin-top:5px;">{i+1}</div>', unsafe_allow_html=True)
     
-    if selected_color:
+    if selected_color != NO_SELECTION:
         st.info("**Selected** - Now click target position to move")
     else:
         st.info("**Click any color to select it**, then click target position")
@@ -908,62 +895,36 @@ def ecdisfm_test():
             st.rerun()
     with col2:
         if st.button("Shuffle", use_container_width=True):
-            random.shuffle(st.session_state.ecdis_user_orders[current_group])
-            st.session_state.ecdis_selected_color = None
+            dispatch('ecdis', engine.SHUFFLE, event_seed())
             st.rerun()
     with col3:
         if st.button("Other Tests", use_container_width=True):
             st.session_state.current_page = "home"
             st.rerun()
     with col4:
-        if current_group < len(ECDIS_FM_COLORS) - 1:
+        if current_group < group_count - 1:
             if st.button("Next Group →", use_container_width=True, type="primary"):
-                # Calculate score for current group before moving to next
-                calculate_ecdis_group_score(current_group)
-                st.session_state.ecdis_current_group += 1
-                st.session_state.ecdis_selected_color = None
+                # Scores the current group before moving to the next
+                dispatch('ecdis', engine.NEXT)
                 st.rerun()
         else:
-            if st.button("See Results", use_container_width=True, type="primary"):
-                # Calculate score for final group
-                calculate_ecdis_group_score(current_group)
-                st.session_state.current_page = "results"
+            if st.button(finish_label('ecdis'), use_container_width=True, type="primary"):
+                # Score the final group
+                dispatch('ecdis', engine.FINISH)
+                finish_test('ecdis')
                 st.rerun()
 
-def calculate_ecdis_group_score(group_index):
-    """Calculate score for ECDIS group based on correct ordering"""
-    user_order = st.session_state.ecdis_user_orders[group_index]
-    correct_order = ECDIS_FM_COLORS[group_index]
-    
-    score = 0
-    max_score = len(correct_order)
-    
-    # Simple scoring: count how many colors are in correct position
-    for i, color in enumerate(user_order):
-        if color == correct_order[i]:
-            score += 1
-    
-    st.session_state.ecdis_scores[group_index] = score
-
-def move_ecdis_color(selected_color, target_position):
-    current_group = st.session_state.ecdis_current_group
-    user_order = st.session_state.ecdis_user_orders[current_group]
-    current_position = user_order.index(selected_color)
-    user_order.pop(current_position)
-    user_order.insert(target_position, selected_color)
-
 # DODANO: RADAR SIMPLE TEST FUNCTIONS
 def radar_simple_test():
     render_header()
     show_user_panel()
     st.markdown("### RADAR COLOR DISCRIMINATION TEST")
     
-    if 'radar_current_test' not in st.session_state:
-        st.session_state.radar_current_test = 0
-        st.session_state.radar_scores = [0, 0, 0, 0]  # 4 podtesta
-        st.session_state.radar_start_time = time.time()
+    if 'radar' not in st.session_state:
+        start_test('radar')
     
-    current_test = st.session_state.radar_current_test
+    radar = st.session_state.radar
+    current_test = radar.current_test
     test_types = ["Critical Color Pairs", "Intensity Ordering", "Contrast Detection", "Night Mode"]
     
     st.markdown(f"**{test_types[current_test]}** - Test {current_test + 1} of 4")
@@ -986,35 +947,30 @@ def radar_simple_test():
             st.rerun()
     with col2:
         if current_test > 0 and st.button("← Previous", use_container_width=True):
-            st.session_state.radar_current_test -= 1
+            dispatch('radar', engine.PREVIOUS)
             st.rerun()
     with col3:
         if current_test < 3 and st.button("Next →", use_container_width=True, type="primary"):
-            st.session_state.radar_current_test += 1
+            dispatch('radar', engine.NEXT)
             st.rerun()
-        elif current_test == 3 and st.button("See Results", use_container_width=True, type="primary"):
-            st.session_state.current_page = "results"
+        elif current_test == 3 and st.button(finish_label('radar'), use_container_width=True, type="primary"):
+            dispatch('radar', engine.FINISH)
+            finish_test('radar')
             st.rerun()
 
 def critical_color_pairs_test():
     st.markdown("**Are these two colors THE SAME or DIFFERENT?**")
     
-    if 'radar_pair_index' not in st.session_state:
-        st.session_state.radar_pair_index = 0
-        st.session_state.radar_pair_answers = []
-    
-    pair_idx = st.session_state.radar_pair_index
-    pairs = RADAR_COLORS['critical_pairs']
+    radar = st.session_state.radar
+    pair_idx = radar.pair_index
+    pairs = radar.protocol.radar_colors['critical_pairs']
     
     if pair_idx >= len(pairs):
-        # Calculate score
-        correct = sum(st.session_state.radar_pair_answers)
-        st.session_state.radar_scores[0] = correct
-        st.success(f"Test completed! Score: {correct}/{len(pairs)}")
+        st.success(f"Test completed! Score: {radar.scores[engine.PAIRS_TEST]}/{len(pairs)}")
         return
     
-    color1, color2 = pairs[pair_idx]
-    is_same = color1 == color2
+    palette = stimulus_palette(radar.protocol)
+    color1, color2 = (palette[color] for color in pairs[pair_idx])
     
     col1, col2 = st.columns(2)
     with col1:
@@ -1029,13 +985,11 @@ def critical_color_pairs_test():
     col1, col2 = st.columns(2)
     with col1:
         if st.button("SAME COLORS", use_container_width=True, key=f"same_{pair_idx}"):
-            st.session_state.radar_pair_answers.append(is_same == True)
-            st.session_state.radar_pair_index += 1
+            dispatch('radar', engine.ANSWER, True)
             st.rerun()
     with col2:
         if st.button("DIFFERENT COLORS", use_container_width=True, key=f"diff_{pair_idx}"):
-            st.session_state.radar_pair_answers.append(is_same == False)
-            st.session_state.radar_pair_index += 1
+            dispatch('radar', engine.ANSWER, False)
             st.rerun()
     
     st.markdown(f"**Progress: {pair_idx + 1}/{len(pairs)} pairs**")
@@ -1043,31 +997,20 @@ def critical_color_pairs_test():
 def intensity_ordering_test():
     st.markdown("**Arrange radar colors from WEAKEST to STRONGEST signal**")
     
-    if 'radar_order_user' not in st.session_state:
-        colors = RADAR_COLORS['intensity_scale'].copy()
-        random.shuffle(colors)
-        st.session_state.radar_order_user = colors
-        st.session_state.radar_selected_color = None
-    
-    user_order = st.session_state.radar_order_user
-    selected_color = st.session_state.radar_selected_color
+    radar = st.session_state.radar
+    selected_color = radar.selected
     
     # Color grid
     cols = st.columns(8)
-    for i, color in enumerate(user_order):
+    palette = stimulus_palette(radar.protocol)
+    colors = [palette[color] for color in radar.order_colors()]
+    for i, (color_index, color) in enumerate(zip(radar.order, colors)):
         with cols[i]:
-            border_color = "#FF0000" if color == selected_color else "#333333"
-            border_width = "3px" if color == selected_color else "1px"
+            border_color = "#FF0000" if color_index == selected_color else "#333333"
+            border_width = "3px" if color_index == selected_color else "1px"
             
             if st.button("", key=f"radar_color_{i}"):
-                if selected_color is None:
-                    st.session_state.radar_selected_color = color
-                else:
-                    # Move color
-                    current_idx = user_order.index(selected_color)
-                    user_order.pop(current_idx)
-                    user_order.insert(i, selected_color)
-                    st.session_state.radar_selected_color = None
+                dispatch('radar', engine.ANSWER, i)
                 st.rerun()
             
             st.markdown(
@@ -1076,42 +1019,33 @@ def intensity_ordering_test():
             )
             st.markdown(f'<div style="text-align:center; font-size:12px; margin-top:5px;">{i+1}</div>', unsafe_allow_html=True)
     
-    if selected_color:
+    if selected_color != NO_SELECTION:
         st.info("**Selected** - Now click target position to move")
     else:
         st.info("**Click any color to select it**, then click target position")
     
     # Check order button
     if st.button("Check Order", type="primary", key="radar_check_order"):
-        correct_order = RADAR_COLORS['intensity_scale']
-        score = 0
-        for i, color in enumerate(user_order):
-            if color == correct_order[i]:
-                score += 1
-        st.session_state.radar_scores[1] = score
-        st.success(f"Ordering score: {score}/8 correct positions")
+        radar = dispatch('radar', engine.CHECK)
+        st.success(f"Ordering score: {radar.scores[engine.ORDER_TEST]}/{len(radar.order)} correct positions")
 
 def contrast_detection_test():
     st.markdown("**Can you detect the target in different background conditions?**")
     
-    if 'radar_contrast_index' not in st.session_state:
-        st.session_state.radar_contrast_index = 0
-        st.session_state.radar_contrast_answers = []
-    
-    contrast_idx = st.session_state.radar_contrast_index
-    contrasts = RADAR_COLORS['contrast_targets']
+    radar = st.session_state.radar
+    contrast_idx = radar.contrast_index
+    contrasts = radar.protocol.radar_colors['contrast_targets']
     
     if contrast_idx >= len(contrasts):
-        correct = sum(st.session_state.radar_contrast_answers)
-        st.session_state.radar_scores[2] = correct
-        st.success(f"Contrast test completed! Score: {correct}/{len(contrasts)}")
+        st.success(f"Contrast test completed! Score: {radar.scores[engine.CONTRAST_TEST]}/{len(contrasts)}")
         return
     
     contrast = contrasts[contrast_idx]
+    palette = stimulus_palette(radar.protocol)
     
     # Display radar background with potential target
-    st.markdown(f'<div style="height:200px; background:{contrast["bg"]}; border-radius:8px; border:2px solid #333; position:relative;">'
-                f'<div style="width:40px; height:40px; background:{contrast["target"]}; border-radius:50%; position:absolute; top:80px; left:170px;"></div>'
+    st.markdown(f'<div style="height:200px; background:{palette[contrast["bg"]]}; border-radius:8px; border:2px solid #333; position:relative;">'
+                f'<div style="width:40px; height:40px; background:{palette[contrast["target"]]}; border-radius:50%; position:absolute; top:80px; left:170px;"></div>'
                 f'</div>', unsafe_allow_html=True)
     
     st.markdown("**Is there a visible target in the radar display?**")
@@ -1119,13 +1053,11 @@ def contrast_detection_test():
     col1, col2 = st.columns(2)
     with col1:
         if st.button("YES, I see it", use_container_width=True, key=f"yes_{contrast_idx}"):
-            st.session_state.radar_contrast_answers.append(contrast["visible"] == True)
-            st.session_state.radar_contrast_index += 1
+            dispatch('radar', engine.ANSWER, True)
             st.rerun()
     with col2:
         if st.button("NO, not visible", use_container_width=True, key=f"no_{contrast_idx}"):
-            st.session_state.radar_contrast_answers.append(contrast["visible"] == False)
-            st.session_state.radar_contrast_index += 1
+            dispatch('radar', engine.ANSWER, False)
             st.rerun()
     
     st.markdown(f"**Progress: {contrast_idx + 1}/{len(contrasts)} scenarios**")
@@ -1135,26 +1067,21 @@ def night_mode_test():
     st.markdown("Count how many targets you can see in this night radar display:")
     
     # FIXED: Spremi originalni broj meta prije nego što se prikaže rezultat
-    if 'radar_night_original_targets' not in st.session_state:
-        st.session_state.radar_night_original_targets = random.randint(1, 5)
-        st.session_state.radar_night_start = time.time()
-        st.session_state.radar_night_positions = []
-        
-        # Generate and store positions
-        for i in range(st.session_state.radar_night_original_targets):
-            x = random.randint(50, 350)
-            y = random.randint(50, 250)
-            st.session_state.radar_night_positions.append((x, y))
+    radar = st.session_state.radar
+    if not radar.night_targets:
+        radar = dispatch('radar', engine.SCENE, event_seed())
     
-    num_targets = st.session_state.radar_night_original_targets
-    positions = st.session_state.radar_night_positions
+    num_targets = radar.night_targets
+    positions = radar.night_target_positions()
+    palette = stimulus_palette(radar.protocol)
+    background, target = palette["#000818"], palette["#80FF80"]
     
     # Create night radar display
-    radar_html = '<div style="height:300px; background:#000818; border-radius:8px; border:2px solid #333; position:relative; margin:20px 0;">'
+    radar_html = f'<div style="height:300px; background:{background}; border-radius:8px; border:2px solid #333; position:relative; margin:20px 0;">'
     
     # Add stored targets
     for x, y in positions:
-        radar_html += f'<div style="width:12px; height:12px; background:#80FF80; border-radius:50%; position:absolute; top:{y}px; left:{x}px; box-shadow: 0 0 10px #80FF80;"></div>'
+        radar_html += f'<div style="width:12px; height:12px; background:{target}; border-radius:50%; position:absolute; top:{y}px; left:{x}px; box-shadow: 0 0 10px {target};"></div>'
     
     radar_html += '</div>'
     st.markdown(radar_html, unsafe_allow_html=True)
@@ -1163,28 +1090,22 @@ def night_mode_test():
     user_guess = st.number_input("How many targets do you see?", min_value=0, max_value=10, value=0, key="radar_night_guess")
     
     if st.button("Submit Answer", type="primary", key="radar_night_submit"):
-        reaction_time = time.time() - st.session_state.radar_night_start
-        score = 5 - abs(user_guess - num_targets)  # 5 points minus difference
-        score = max(0, score)
-        st.session_state.radar_scores[3] = score
+        reaction_time = time.time() - radar.night_start
+        # Scores 5 points minus the difference and clears the scene for the next test
+        radar = dispatch('radar', engine.ANSWER, user_guess)
         
         # FIXED: Prikaži ispravne rezultate
         st.success(f"**Correct answer: {num_targets} targets** | **Your answer: {user_guess}**")
-        st.info(f"Reaction time: {reaction_time:.1f}s | Score: {score}/5")
-        
-        # Clear for next test
-        if 'radar_night_original_targets' in st.session_state:
-            del st.session_state.radar_night_original_targets
-        if 'radar_night_positions' in st.session_state:
-            del st.session_state.radar_night_positions
+        st.info(f"Reaction time: {reaction_time:.1f}s | Score: {radar.scores[engine.NIGHT_TEST]}/5")
 
 def show_lantern_results():
     render_header()
     show_user_panel()
     st.markdown("### LANTERN TEST RESULTS")
     
-    answers = st.session_state.lantern_answers
-    total_pairs = len(LANTERN_SEQUENCES)
+    lantern = st.session_state.lantern
+    answers = lantern.answers_by_pair()
+    total_pairs = len(lantern.sequence)
     
     if not answers:
         st.warning("No test data available.")
@@ -1222,17 +1143,18 @@ def show_lantern_results():
     with col3:
         st.metric("Errors", errors)
     with col4:
-        status = "PASS" if errors <= 1 else "FAIL"
-        st.metric("Result", status, delta="PASS" if errors <= 1 else "FAIL", 
-                 delta_color="normal" if errors <= 1 else "inverse")
+        passed = engine.lantern_passed(errors, lantern.protocol)
+        status = "PASS" if passed else "FAIL"
+        st.metric("Result", status, delta=status, 
+                 delta_color="normal" if passed else "inverse")
     
     # Detailed results
     st.markdown("#### Detailed Results")
-    st.dataframe(pd.DataFrame(detailed_results), use_container_width=True)
+    st.dataframe(detailed_results, use_container_width=True)
     
     # Assessment
     st.markdown("#### PROFESSIONAL ASSESSMENT")
-    if errors <= 1:
+    if engine.lantern_passed(errors, lantern.protocol):
         st.success("""**✅ EXCELLENT - Suitable for Maritime Duties**
         
 Your performance meets IMO standards for color vision requirements in navigation and lookout duties. 
@@ -1252,10 +1174,7 @@ Consult an eye care specialist for comprehensive assessment before undertaking m
     col1, col2, col3 = st.columns(3)
     with col1:
         if st.button("Retest Lantern", use_container_width=True):
-            st.session_state.lantern_current_pair = 0
-            st.session_state.lantern_answers = {}
-            st.session_state.lantern_sequence = random.sample(LANTERN_SEQUENCES, len(LANTERN_SEQUENCES))
-            st.session_state.lantern_pair_start_time = time.time()
+            start_test('lantern')
             st.rerun()
     with col2:
         if st.button("Back to Home", use_container_width=True):
@@ -1266,11 +1185,74 @@ Consult an eye care specialist for comprehensive assessment before undertaking m
             st.session_state.current_page = "results"
             st.rerun()
 
-def create_download_link(pdf_output, filename):
-    """Generate a download link for PDF"""
-    b64 = base64.b64encode(pdf_output).decode()
-    href = f'<a href="data:application/octet-stream;base64,{b64}" download="{filename}">Download Certificate</a>'
-    return href
+def mark_test_started(test_key):
+    """Remember when a test was started, for the stored timings"""
+    st.session_state.test_started_at[test_key] = time.time()
+
+def persist_test_result(test_key, score, max_score, accuracy, status, answers):
+    """Stage a completed test for the results store, once per distinct outcome (see commit_results)"""
+    fingerprint = json.dumps([score, status, answers], sort_keys=True, default=str)
+    if st.session_state.persisted_results.get(test_key) == fingerprint:
+        return
+
+    completed = time.time()
+    started = st.session_state.test_started_at.get(test_key)
+    # The stored answers only mean something against their answer key
+    answers = dict(answers, protocol=st.session_state[test_key].protocol.version)
+    if st.session_state.get('display_profile'):
+        answers['display'] = list(st.session_state.display_profile)
+    if 'staged_results' not in st.session_state:
+        st.session_state.staged_results = []
+    st.session_state.staged_results.append((test_key, fingerprint, {
+        'session_id': st.session_state.session_uid,
+        'candidate_id': st.session_state.get('user_id', ''),
+        'candidate_name': st.session_state.get('user_name', ''),
+        'position': st.session_state.get('user_position', ''),
+        'test': test_key,
+        'score': score,
+        'max_score': max_score,
+        'accuracy': accuracy,
+        'status': status,
+        'answers': answers,
+        'started_at': format_timestamp(started),
+        'completed_at': format_timestamp(completed),
+        'duration': completed - started if started else None
+    }))
+
+def commit_results():
+    """Queue the staged results together; the store commits them in one transaction"""
+    staged = st.session_state.get('staged_results')
+    if not staged:
+        return
+    get_store().submit_many([record for _, _, record in staged])
+    recorder = session_recorder()
+    for test_key, fingerprint, record in staged:
+        st.session_state.persisted_results[test_key] = fingerprint
+        if recorder is not None:
+            recorder.result(test_key, record['score'], record['status'], time.time())
+    st.session_state.staged_results = []
+
+def show_ability(test_key, answers):
+    """Show the calibrated IRT ability estimate, if any, and add it to the answers to store"""
+    # Scored against the answer key this session was given on
+    answers['protocol'] = st.session_state[test_key].protocol.version
+    ability = irt.ability(test_key, answers)
+    if ability is not None:
+        st.caption(f"IRT ability estimate: θ = {ability.theta:+.2f} ± {ability.se:.2f} "
+                   f"({ability.items} calibrated items, parameters {ability.version})")
+        answers['ability'] = {'theta': round(ability.theta, 4), 'se': round(ability.se, 4),
+                              'version': ability.version}
+    return answers
+
+def issue_certificate(results_data):
+    """Signed certificate record for the results shown, registered in the results store"""
+    certificate = certificates.issue(
+        results_data['user_id'], results_data['user_name'], results_data['position'],
+        st.session_state.session_uid,
+        [[test['test'], test['score'], test['accuracy'], test['status']]
+         for test in results_data['tests_completed']])
+    get_store().add_certificate(certificate)
+    return certificate
 
 def show_results():
     render_header()
@@ -1288,10 +1270,12 @@ def show_results():
     }
     
     # 1. Ishihara test results
-    if st.session_state.get('user_answers'):
+    if 'ishihara' in st.session_state and st.session_state.ishihara.has_answers():
         ishihara_report = generate_ishihara_report()
         if ishihara_report:
             stats = ishihara_report['statistics']
+            ishihara_passed = engine.ishihara_passed(stats['accuracy'], st.session_state.ishihara.protocol)
+            ishihara_status = 'PASS' if ishihara_passed else 'FAIL'
             
             # Display individual Ishihara report
             st.markdown("---")
@@ -1317,21 +1301,28 @@ def show_results():
                 'test': 'Ishihara Test',
                 'score': f"{stats['correct_answers']}/{stats['total_plates']}",
                 'accuracy': f"{stats['accuracy']:.1f}%",
-                'status': 'PASS' if stats['accuracy'] >= 80 else 'FAIL',
+                'status': ishihara_status,
                 'assessment': stats['vision_status']
             })
+            
+            ishihara_answers = show_ability('ishihara', {'answers': st.session_state.ishihara.answers_by_plate()})
+            if engine.finished('ishihara', st.session_state.ishihara):
+                persist_test_result('ishihara', stats['correct_answers'], stats['total_plates'], stats['accuracy'],
+                                    ishihara_status, ishihara_answers)
 
     # 2. Lantern test results (postojeći kod)
-    if st.session_state.get('lantern_answers'):
-        lantern_answers = st.session_state.lantern_answers
-        total_pairs = len(LANTERN_SEQUENCES)
+    if 'lantern' in st.session_state and st.session_state.lantern.answered_pairs():
+        lantern = st.session_state.lantern
+        lantern_answers = lantern.answers_by_pair()
+        total_pairs = len(lantern.sequence)
         correct_pairs = sum(1 for answer in lantern_answers.values() 
                           if answer['light1'] == answer['correct1'] and answer['light2'] == answer['correct2'])
         accuracy = (correct_pairs / total_pairs) * 100
         errors = total_pairs - correct_pairs
         
         # Determine lantern assessment
-        if errors <= 1:
+        lantern_passed = engine.lantern_passed(errors, lantern.protocol)
+        if lantern_passed:
             lantern_status = 'PASS'
             lantern_interpretation = 'Excellent navigation light recognition'
             lantern_color = 'green'
@@ -1380,18 +1371,25 @@ def show_results():
             'test': 'Lantern Test',
             'score': f"{correct_pairs}/{total_pairs}",
             'accuracy': f"{accuracy:.1f}%",
-            'status': 'PASS' if errors <= 1 else 'FAIL',
+            'status': 'PASS' if lantern_passed else 'FAIL',
             'assessment': lantern_interpretation
         })
+        
+        if engine.finished('lantern', lantern):
+            persist_test_result('lantern', correct_pairs, total_pairs, accuracy,
+                                'PASS' if lantern_passed else 'FAIL',
+                                {'sequence': lantern.sequence_colors(),
+                                 'answers': lantern_answers,
+                                 'lighting': lights.SETTINGS._asdict()})
 
     # 3. ECDIS test results (postojeći kod)
-    if st.session_state.get('ecdis_scores'):
-        ecdis_scores = st.session_state.ecdis_scores
+    if 'ecdis' in st.session_state:
+        ecdis_scores = st.session_state.ecdis.scores
         total_score = sum(ecdis_scores)
-        max_possible_score = len(ECDIS_FM_COLORS) * len(ECDIS_FM_COLORS[0])
+        max_possible_score = sum(len(group) for group in st.session_state.ecdis.protocol.ecdis_fm_colors)
         accuracy = (total_score / max_possible_score) * 100
         
-        if accuracy >= 80:
+        if st.session_state.ecdis.protocol.ecdis_passed(accuracy):
             ecdis_status = 'PASS'
             ecdis_interpretation = 'Good ECDIS color discrimination'
             ecdis_color = 'green'
@@ -1435,14 +1433,20 @@ def show_results():
             'status': ecdis_status,
             'assessment': ecdis_interpretation
         })
+        
+        if engine.finished('ecdis', st.session_state.ecdis):
+            persist_test_result('ecdis', total_score, max_possible_score, accuracy, ecdis_status,
+                                {'orders': st.session_state.ecdis.hex_orders(),
+                                 'group_scores': list(ecdis_scores)})
 
     # 4. Radar test results (postojeći kod)
-    if st.session_state.get('radar_scores'):
-        radar_total = sum(st.session_state.radar_scores)
-        radar_max = 6 + 8 + 4 + 5
+    if 'radar' in st.session_state:
+        radar = st.session_state.radar
+        radar_total = sum(radar.scores)
+        radar_max = radar.protocol.radar_max_score
         accuracy = (radar_total / radar_max) * 100
         
-        if accuracy >= 80:
+        if radar.protocol.radar_passed(accuracy):
             radar_status = 'PASS'
             radar_interpretation = 'Good radar color discrimination'
             radar_color = 'green'
@@ -1486,6 +1490,17 @@ def show_results():
             'status': radar_status,
             'assessment': radar_interpretation
         })
+        
+        radar_answers = show_ability('radar', {
+            'subtest_scores': list(radar.scores),
+            'pair_answers': [bool(answer) for answer in radar.pair_answers],
+            'intensity_order': radar.order_colors(),
+            'contrast_answers': [bool(answer) for answer in radar.contrast_answers]})
+        if engine.finished('radar', radar):
+            persist_test_result('radar', radar_total, radar_max, accuracy, radar_status, radar_answers)
+    
+    # A full battery's results go to the store all or nothing
+    commit_results()
 
     # COMPREHENSIVE REPORT SECTION
     if results_data['tests_completed']:
@@ -1586,6 +1601,9 @@ def show_results():
     with col2:
         if st.button("Download PDF Report", use_container_width=True, type="primary"):
             try:
+                # fpdf is only loaded once someone actually asks for a PDF
+                from pdf_reports import generate_comprehensive_pdf, create_download_link
+                
                 # Prepare data for comprehensive PDF report
                 user_data = {
                     'name': results_data['user_name'],
@@ -1594,22 +1612,30 @@ def show_results():
                     'date': results_data['date']
                 }
                 
+                # Sign and register the certificate before its PDF goes out
+                certificate = issue_certificate(results_data)
+                
                 # Generate comprehensive PDF
-                pdf = generate_comprehensive_pdf(user_data, results_data)
+                pdf = generate_comprehensive_pdf(user_data, results_data, certificate)
                 
                 # Save to bytes buffer
-                pdf_bytes = pdf.output(dest='S').encode('latin1')
+                with metrics.timed(metrics.CALL_SECONDS, "pdf_output"):
+                    pdf_bytes = pdf.output(dest='S').encode('latin1')
+                metrics.PAYLOAD_BYTES.observe(len(pdf_bytes), "pdf_report")
                 
                 # Create download link
                 st.markdown(create_download_link(pdf_bytes, 
                     f"Comprehensive_Report_{results_data['user_name'].replace(' ', '_')}.pdf"), 
                     unsafe_allow_html=True)
                 st.success("✅ Comprehensive PDF report generated! Click the download link above.")
+                st.caption(f"Certificate ID: {certificates.display_id(certificate['cert_id'])}")
             except Exception as e:
                 st.error(f"❌ Error generating PDF report: {str(e)}")
     
     with col3:
         if st.button("Start New Session", use_container_width=True):
+            checkpoint.discard(st.session_state.get('user_id', ''), st.session_state.get('resume_digest'))
+            get_bus().remove(st.session_state.session_uid)
             for key in list(st.session_state.keys()):
                 if key not in ['user_name', 'user_id', 'user_position']:
                     del st.session_state[key]
@@ -1625,7 +1651,550 @@ def render_footer():
     </div>
     """, unsafe_allow_html=True)
 
+# Pages that need an admission slot, and the test each one runs
+TEST_PAGES = {"lantern": 'lantern', "ishihara": 'ishihara', "ecdiscfm": 'ecdis', "radar_simple": 'radar'}
+TEST_PAGE_OF = {test: page for page, test in TEST_PAGES.items()}
+WAIT_POLL_SECONDS = 5
+PROCTOR_REFRESH_SECONDS = 3
+PAGE_LABELS = {"home": "Home", "lantern": "Lantern", "ishihara": "Ishihara", "ecdiscfm": "ECDIS",
+               "radar_simple": "Radar", "results": "Results", "waiting_room": "Waiting Room",
+               "calibration": "Display Calibration"}
+FOCUS_MONITOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "focus_monitor")
+
+_focus_monitor = None
+
+def publish_progress(session_uid, page):
+    """Tell proctor pages where this candidate is, when that changed during the run"""
+    status = {
+        'candidate': f"{st.session_state.user_name} ({st.session_state.user_id})",
+        'position': st.session_state.user_position,
+        'page': page,
+    }
+    if 'protocol_version' in st.session_state:
+        status['protocol'] = st.session_state.protocol_version
+    for test, field, key in (('ishihara', 'current_plate', 'plate'), ('lantern', 'current_pair', 'pair'),
+                             ('ecdis', 'current_group', 'group'), ('radar', 'current_test', 'radar')):
+        if test in st.session_state:
+            status[key] = getattr(st.session_state[test], field)
+    if st.session_state.get('published_progress') != status:
+        get_bus().publish(session_uid, status)
+        st.session_state.published_progress = status
+
+def track_focus(session_uid):
+    """Feed tab switches reported by the browser to the proctoring detector"""
+    global _focus_monitor
+    if _focus_monitor is None:
+        # Components API only loaded once a candidate reaches a test (cold start)
+        import streamlit.components.v1 as components
+        _focus_monitor = components.declare_component("focus_monitor", path=FOCUS_MONITOR_PATH)
+    detector = get_detector()
+    detector.identify(session_uid, f"{st.session_state.user_name} ({st.session_state.user_id})")
+    switches = _focus_monitor(key="focus_monitor", default=0)
+    if switches:
+        detector.tab_switches(session_uid, int(switches))
+
+def admission_gate(session_uid, page):
+    """Check the session's slot before rendering; returns the page to render"""
+    controller = get_controller()
+    if page == "results":
+        controller.release(session_uid)
+        return page
+    if page not in TEST_PAGES:
+        controller.touch(session_uid)
+        return page
+    # A candidate halfway through the lantern pairs goes to the front of the queue
+    lantern = st.session_state.get('lantern')
+    timed = page == "lantern" and lantern is not None and not engine.at_end('lantern', lantern)
+    ticket = controller.admit(session_uid, TIMED if timed else NORMAL)
+    if not ticket.admitted:
+        st.session_state.admission_ticket = ticket
+        return "waiting_room"
+    if st.session_state.pop('admission_ticket', None) is not None:
+        # Timed sections get their clock back after the wait
+        test = TEST_PAGES[page]
+        if test in st.session_state:
+            dispatch(test, engine.RESUME)
+    return page
+
+@st.fragment(run_every=WAIT_POLL_SECONDS)
+def poll_admission():
+    ticket = get_controller().admit(st.session_state.session_uid)
+    if ticket.admitted:
+        st.rerun(scope="app")
+    st.session_state.admission_ticket = ticket
+    minutes = max(1, round(ticket.estimated_wait / 60))
+    st.info(f"You are number **{ticket.position}** in the queue. Estimated wait: about **{minutes} min**.")
+
+def waiting_room_page():
+    render_header()
+    show_user_panel()
+    st.markdown("### WAITING ROOM")
+    st.markdown("All test stations are busy right now. Your test starts automatically as soon as a place is free - please keep this page open.")
+    poll_admission()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Leave Queue", use_container_width=True):
+            get_controller().release(st.session_state.session_uid)
+            st.session_state.pop('admission_ticket', None)
+            st.session_state.current_page = "home"
+            st.rerun()
+    with col2:
+        if st.button("Check Now", use_container_width=True, type="primary"):
+            st.rerun()
+
+def calibration_page():
+    render_header()
+    st.markdown("### DISPLAY CALIBRATION")
+    st.markdown("View this page at 100 % zoom, from your normal viewing distance, in the room lighting used for the test.")
+    current = display_profile()
+
+    st.markdown("**1. Brightness.** Move the slider until the middle square blends into the striped frame around it - squint if it helps.")
+    level = st.slider("Gray level", 100, 240, calibration.REFERENCE_MATCH, key="calibration_match")
+    st.markdown(f"""
+    <div style="width:240px; height:240px; margin:10px auto; padding:60px; box-sizing:border-box;
+                background:repeating-linear-gradient(0deg, #000 0px, #000 1px, #fff 1px, #fff 2px);">
+        <div style="width:120px; height:120px; background:rgb({level},{level},{level});"></div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.markdown("**2. White point.** Adjust until the gray patches look neutral, with no color cast.")
+    col1, col2 = st.columns(2)
+    with col1:
+        warmth = st.slider("Cool ↔ warm", -20, 20, 0, key="calibration_warmth")
+    with col2:
+        tint = st.slider("Magenta ↔ green", -20, 20, 0, key="calibration_tint")
+    profile = calibration.make_profile(level, warmth, tint)
+    grays = calibration.correct_colors(profile, ["#404040", "#808080", "#C0C0C0"])
+    st.markdown('<div style="display:flex; justify-content:center; gap:10px; margin:10px 0;">'
+                + "".join(f'<div style="width:120px; height:80px; background:{gray};"></div>' for gray in grays)
+                + '</div>', unsafe_allow_html=True)
+    st.caption(f"Measured: {calibration.describe(profile)}")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("Use This Calibration", use_container_width=True, type="primary"):
+            st.session_state.display_profile = list(profile)
+            st.session_state.current_page = "home"
+            st.rerun()
+    with col2:
+        if st.button("Reset", use_container_width=True, disabled=current is None):
+            st.session_state.display_profile = None
+            st.rerun()
+    with col3:
+        if st.button("Back to Home", use_container_width=True):
+            st.session_state.current_page = "home"
+            st.rerun()
+
+    if current is not None:
+        st.caption(f"In use: {calibration.describe(current)}")
+    st.caption("To use this calibration for every session on this station, save it and set MVT_DISPLAY_PROFILE: "
+               f"`python calibration.py save NAME --gamma {profile.gamma} "
+               f"--white {profile.red},{profile.green},{profile.blue}`")
+    render_footer()
+
+OPERATOR_TOKEN = os.environ.get("MVT_OPERATOR_TOKEN", "")
+
+def operator_authorized():
+    """Gate for operator pages: asks once per session for MVT_OPERATOR_TOKEN"""
+    if not OPERATOR_TOKEN:
+        st.error("Operator pages are disabled. Set MVT_OPERATOR_TOKEN to enable them.")
+        return False
+    if st.session_state.get('operator_authorized'):
+        return True
+    token = st.text_input("Operator token", type="password")
+    if token and hmac.compare_digest(token.encode("utf-8"), OPERATOR_TOKEN.encode("utf-8")):
+        st.session_state.operator_authorized = True
+        st.rerun()
+    elif token:
+        st.error("❌ Invalid operator token")
+    return False
+
+def format_ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.1f}"
+
+def histogram_table(histogram, label, scale=format_ms):
+    rows = []
+    for (name,), (_, count, total) in sorted(histogram.series().items()):
+        rows.append({
+            label: name,
+            'Count': count,
+            'Mean': scale(total / count) if count else "-",
+            'p50': scale(histogram.quantile(0.5, name)),
+            'p95': scale(histogram.quantile(0.95, name)),
+            'p99': scale(histogram.quantile(0.99, name)),
+        })
+    return rows
+
+def operator_metrics_page():
+    render_header()
+    st.markdown("### OPERATOR METRICS")
+    if not operator_authorized():
+        return
+    if not metrics.ENABLED:
+        st.warning("Metrics recording is off (MVT_METRICS=0)")
+    
+    col1, col2, col3 = st.columns(3)
+    lifecycle = get_lifecycle()
+    col1.metric("Resident Sessions", lifecycle.resident_count())
+    col2.metric("Running Now", lifecycle.running_count())
+    col3.metric("Evicted to Disk", lifecycle.evicted_total)
+    
+    col1, col2, col3 = st.columns(3)
+    controller = get_controller()
+    cap = controller.max_active or "no cap"
+    col1.metric("Test Slots in Use", f"{controller.active_count()} / {cap}")
+    col2.metric("Waiting Room", controller.waiting_count())
+    col3.metric("Typical Session", f"{controller.session_seconds / 60:.0f} min")
+    
+    st.markdown("#### Page Renders (ms)")
+    pages = histogram_table(metrics.PAGE_SECONDS, 'Page')
+    for row in pages:
+        row['Errors'] = metrics.PAGE_ERRORS.value(row['Page'])
+    st.dataframe(pages, use_container_width=True)
+    
+    st.markdown("#### Expensive Calls (ms)")
+    st.dataframe(histogram_table(metrics.CALL_SECONDS, 'Call'), use_container_width=True)
+    
+    st.markdown("#### Payload Sizes (KB)")
+    st.dataframe(histogram_table(metrics.PAYLOAD_BYTES, 'Payload', lambda size: "-" if size is None else f"{size / 1024:.1f}"),
+                 use_container_width=True)
+    
+    with st.expander("Prometheus text format"):
+        if metrics.METRICS_PORT:
+            st.caption(f"Scrape http://127.0.0.1:{metrics.METRICS_PORT}/metrics")
+        st.code(metrics.REGISTRY.render(), language="text")
+    
+    if st.button("Refresh", type="primary"):
+        st.rerun()
+
+def format_rate(stat):
+    return f"{stat.mean * 100:.1f}% (n={stat.n})"
+
+def proctor_page():
+    render_header()
+    st.markdown("### PROCTOR VIEW")
+    if not operator_authorized():
+        return
+    st.markdown("#### Live Candidates")
+    proctor_live()
+    st.markdown("#### Timing Anomalies")
+    show_all = st.toggle("Show all active sessions", value=False)
+    proctor_sessions(show_all)
+
+def item_progress(index, total):
+    return "-" if index is None else f"{min(index + 1, total)}/{total}"
+
+@st.fragment(run_every=PROCTOR_REFRESH_SECONDS)
+def proctor_live():
+    # Only sessions that changed since the last refresh come off the bus
+    subscription = st.session_state.get('progress_subscription')
+    if subscription is None or subscription.closed:
+        subscription = st.session_state.progress_subscription = get_bus().subscribe()
+        st.session_state.progress_view = {}
+    view = st.session_state.progress_view
+    for session_uid, status in subscription.poll().items():
+        if status is None:
+            view.pop(session_uid, None)
+        else:
+            view[session_uid] = status
+    
+    if not view:
+        st.info("No candidates in progress")
+        return
+    now = time.time()
+    rows = []
+    for status in sorted(view.values(), key=lambda status: status['candidate']):
+        rules = protocol.get_version(status['protocol']) if 'protocol' in status else protocol.current()
+        rows.append({
+            'Candidate': status['candidate'],
+            'Position': status['position'],
+            'Page': PAGE_LABELS.get(status['page'], status['page']),
+            'Ishihara Plate': item_progress(status.get('plate'), rules.total_plates),
+            'Lantern Pair': item_progress(status.get('pair'), len(rules.lantern_sequences)),
+            'ECDIS Group': item_progress(status.get('group'), len(rules.ecdis_fm_colors)),
+            'Radar Part': item_progress(status.get('radar'), engine.RADAR_SUBTESTS),
+            'Last Change (s ago)': f"{now - status['updated_at']:.0f}",
+        })
+    st.dataframe(rows, use_container_width=True)
+
+@st.fragment(run_every=PROCTOR_REFRESH_SECONDS)
+def proctor_sessions(show_all):
+    detector = get_detector()
+    col1, col2 = st.columns(2)
+    col1.metric("Sessions Tracked", detector.tracked_count())
+    col2.metric("Flagged Since Start", detector.flagged_total)
+    
+    now = time.time()
+    rows = []
+    for stats in detector.sessions(flagged_only=not show_all).values():
+        rows.append({
+            'Candidate': stats['label'],
+            'Flags': ", ".join(flag.replace('_', ' ') for flag in stats['flags']) or "-",
+            'Flagged At': datetime.fromtimestamp(stats['flagged_at']).strftime("%H:%M:%S") if stats['flagged_at'] else "-",
+            'Answers': stats['answers'],
+            'Mean Latency (s)': f"{stats['mean_latency']:.1f}",
+            'Fast': stats['fast'],
+            'Long Pauses': stats['pauses'],
+            'Changes': stats['changes'],
+            'Tab Switches': stats['tab_switches'],
+            'Answers After Switch': stats['answers_after_switch'],
+            'Last Seen (s ago)': f"{now - stats['last_seen']:.0f}",
+        })
+    if rows:
+        st.dataframe(rows, use_container_width=True)
+    else:
+        st.info("No flagged sessions" if not show_all else "No active sessions")
+
+HISTORY_SORT_LABELS = {"Completed": 'completed_at', "Name": 'name', "Accuracy": 'accuracy'}
+
+def history_page():
+    render_header()
+    st.markdown("### ASSESSMENT HISTORY")
+    if not operator_authorized():
+        return
+    
+    store = get_store()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        name = st.text_input("Name starts with")
+    with col2:
+        candidate_id = st.text_input("Candidate ID")
+    with col3:
+        position = st.selectbox("Position", ["All positions"] + store.cohorts()['position'])
+    with col4:
+        test = st.selectbox("Test", ["All tests"] + list(engine.STATE_CLASSES))
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        status = st.selectbox("Result", ["Any", "PASS", "BORDERLINE", "FAIL"])
+    with col2:
+        dates = st.date_input("Completed between", value=())
+    with col3:
+        sort_label = st.selectbox("Sort by", list(HISTORY_SORT_LABELS))
+    with col4:
+        descending = st.selectbox("Order", ["Descending", "Ascending"]) == "Descending"
+    filters = {
+        'name': name,
+        'candidate_id': candidate_id,
+        'position': None if position == "All positions" else position,
+        'test': None if test == "All tests" else test,
+        'status': None if status == "Any" else status,
+        'date_from': dates[0] if len(dates) > 0 else None,
+        'date_to': dates[1] if len(dates) > 1 else (dates[0] if dates else None),
+    }
+    sort = HISTORY_SORT_LABELS[sort_label]
+    
+    # Cursors of the pages seen so far; a new query starts over
+    query = json.dumps([filters, sort, descending], sort_keys=True, default=str)
+    if st.session_state.get('history_query') != query:
+        st.session_state.history_query = query
+        st.session_state.history_cursors = [None]
+    cursors = st.session_state.history_cursors
+    
+    rows, next_cursor = store.history(filters, sort, descending, after=cursors[-1])
+    if rows:
+        st.dataframe([{
+            'Completed': row['completed_at'].replace('T', ' '),
+            'Name': row['candidate_name'],
+            'Candidate ID': row['candidate_id'],
+            'Position': row['position'],
+            'Test': row['test'].title(),
+            'Score': f"{row['score']:g}/{row['max_score']:g}",
+            'Accuracy': f"{row['accuracy']:.1f}%",
+            'Result': row['status'],
+            'Duration': "-" if row['duration'] is None else f"{row['duration'] / 60:.1f} min",
+        } for row in rows], use_container_width=True, hide_index=True)
+    else:
+        st.info("No assessments match these filters.")
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if len(cursors) > 1 and st.button("← Previous Page", use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {len(cursors)}")
+    with col3:
+        if next_cursor is not None and st.button("Next Page →", use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
+    
+    def export():
+        # Runs when the button is clicked; rows go to a spooled temp file in
+        # chunks, so memory stays flat for large exports
+        out = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        store.export_csv(filters, out)
+        out.seek(0)
+        return out
+    
+    st.download_button("Export Filtered Results (CSV)", data=export, file_name="assessment_history.csv",
+                       mime="text/csv")
+
+def cohort_dashboard_page():
+    render_header()
+    st.markdown("### COHORT ANALYTICS")
+    if not operator_authorized():
+        return
+    
+    store = get_store()
+    choices = store.cohorts()
+    if not choices['month']:
+        st.info("No completed assessments yet.")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        fleet = st.selectbox("Fleet", ["All fleets"] + choices['fleet'])
+    with col2:
+        first_month = st.selectbox("From", choices['month'])
+    with col3:
+        last_month = st.selectbox("To", choices['month'], index=len(choices['month']) - 1)
+    with col4:
+        position = st.selectbox("Position", ["All positions"] + choices['position'])
+    filters = {
+        'fleet': None if fleet == "All fleets" else fleet,
+        'months': (first_month, last_month),
+        'position': None if position == "All positions" else position,
+    }
+    
+    # Reads only the aggregate rows of the selected cohorts
+    by_position = store.cohort_summary([analytics.PASS], by_position=True, **filters)[analytics.PASS]
+    data = store.cohort_summary([analytics.PASS, analytics.PLATE_ERROR, analytics.LANTERN_ANSWER,
+                                 analytics.ECDIS_GROUP_ACCURACY], **filters)
+    
+    st.markdown("#### Pass Rate by Position")
+    tests = sorted({test for _, test in by_position})
+    rows = []
+    for row_position in sorted({row_position for row_position, _ in by_position}):
+        row = {'Position': row_position}
+        for test in tests:
+            stat = by_position.get((row_position, test))
+            row[test.title()] = format_rate(stat) if stat else "-"
+        rows.append(row)
+    st.dataframe(rows, use_container_width=True)
+    
+    st.markdown("#### Ishihara Error Rate per Plate")
+    plates = data[analytics.PLATE_ERROR]
+    st.dataframe([{
+        'Plate': int(plate),
+        'Answers': stat.n,
+        'Error Rate': f"{stat.mean * 100:.1f}%",
+        'Std Dev': f"{stat.variance ** 0.5:.2f}",
+    } for plate, stat in sorted(plates.items(), key=lambda item: int(item[0]))], use_container_width=True)
+    
+    # Aggregates span protocol versions and key colors and groups by code
+    # and index: named after the active protocol where it has them
+    rules = protocol.current()
+    st.markdown("#### Lantern Confusion Matrix (% of times shown)")
+    answers = data[analytics.LANTERN_ANSWER]
+    codes = analytics.lantern_codes(answers, rules)
+    rows = []
+    for shown in codes:
+        counts = {answered: answers[f"{shown}>{answered}"].n
+                  for answered in codes if f"{shown}>{answered}" in answers}
+        total = sum(counts.values())
+        if not total:
+            continue
+        row = {'Shown': analytics.color_name(shown, rules)}
+        for answered in codes:
+            row[analytics.color_name(answered, rules)] = f"{counts.get(answered, 0) / total * 100:.1f}%"
+        rows.append(row)
+    st.dataframe(rows, use_container_width=True)
+    
+    st.markdown("#### ECDIS Accuracy per Group")
+    groups = data[analytics.ECDIS_GROUP_ACCURACY]
+    st.dataframe([{
+        'Group': analytics.group_name(group, rules),
+        'Attempts': stat.n,
+        'Mean Accuracy': f"{stat.mean * 100:.1f}%",
+        'Std Dev': f"{stat.variance ** 0.5 * 100:.1f}%",
+    } for group, stat in sorted(groups.items(), key=lambda item: int(item[0]))], use_container_width=True)
+
+def roster_page():
+    render_header()
+    st.markdown("### CREW ROSTER")
+    if not operator_authorized():
+        return
+    
+    store = get_store()
+    st.caption(f"{store.roster_size()} candidate(s) on the roster. Candidates find their entry on the home page.")
+    st.markdown("Upload a CSV or XLSX roster with name and ID columns, and optionally position or rank. "
+                "Entries with an ID already on the roster are replaced.")
+    upload = st.file_uploader("Roster", type=["csv", "xlsx"])
+    if upload is None or not st.button("Import Roster", type="primary"):
+        return
+    started = time.perf_counter()
+    try:
+        report = store.import_roster(upload, upload.name)
+    except roster.RosterError as exc:
+        st.error(f"❌ {exc}")
+        return
+    st.success(f"✅ Imported {report['imported']} candidate(s) in {time.perf_counter() - started:.1f}s")
+    if report['skipped'] or report['positions_mapped']:
+        st.warning(f"⚠️ {report['skipped']} row(s) skipped, "
+                   f"{report['positions_mapped']} position(s) not recognized and set to Other")
+        st.dataframe([{'Line': line, 'Problem': problem} for line, problem in report['problems']],
+                     use_container_width=True, hide_index=True)
+
+def verify_page():
+    """Public certificate check for inspectors: IDs, scanned QR codes or a whole crew list"""
+    render_header()
+    st.markdown("### CERTIFICATE VERIFICATION")
+    st.markdown("Enter certificate IDs or scanned QR codes, one per line, or upload a crew list "
+                "(CSV with a `certificate` column and optionally `candidate_id`).")
+    claims_text = st.text_area("Certificates", value=st.query_params.get("c", ""), height=120)
+    crew_file = st.file_uploader("Crew list", type=["csv"])
+    
+    claims = [line for line in claims_text.splitlines() if line.strip()]
+    if crew_file is not None:
+        try:
+            claims.extend(certificates.read_crew(crew_file.getvalue().decode("utf-8-sig").splitlines()))
+        except (UnicodeDecodeError, ValueError) as exc:
+            st.error(f"❌ {exc}")
+            return
+    if not claims:
+        return
+    try:
+        keyring = certificates.load_keyring()
+    except certificates.KeyringError:
+        keyring = None  # IDs can still be looked up; signed fields all report an unknown key
+    results = certificates.verify_many(claims, get_store().certificates, keyring)
+    
+    valid = sum(1 for result in results if result['status'] == certificates.VALID)
+    if valid == len(results):
+        st.success(f"✅ {valid} of {len(results)} certificate(s) valid")
+    else:
+        st.error(f"❌ {len(results) - valid} of {len(results)} certificate(s) could not be verified")
+    st.dataframe([{
+        'Certificate': result['certificate'],
+        'Result': certificates.STATUS_LABELS[result['status']],
+        'Candidate ID': result['candidate_id'] or "",
+        'Name': result['candidate_name'] or "",
+        'Position': result['position'] or "",
+        'Issued': result['issued'] or "",
+        'Tests': certificates.summary_line(result),
+        'Detail': result['detail'],
+    } for result in results], use_container_width=True, hide_index=True)
+
+OPERATOR_PAGES = {
+    "metrics": operator_metrics_page,
+    "cohorts": cohort_dashboard_page,
+    "proctor": proctor_page,
+    "history": history_page,
+    "roster": roster_page,
+    "verify": verify_page,  # public: inspectors have no operator token
+}
+
 def main():
+    metrics.start_http_server()
+    
+    # Operator pages (and the public certificate check) are reached with
+    # ?view=<name> and never touch candidate state
+    operator_page = OPERATOR_PAGES.get(st.query_params.get("view"))
+    if operator_page is not None:
+        operator_page()
+        return
+    
     if 'current_page' not in st.session_state:
         st.session_state.current_page = "home"
     
@@ -1637,19 +2206,72 @@ def main():
     if 'user_position' not in st.session_state:
         st.session_state.user_position = "Select position"
     
-    # Page routing
-    if st.session_state.current_page == "home":
+    # Per-session bookkeeping for the results store
+    if 'session_uid' not in st.session_state:
+        st.session_state.session_uid = uuid.uuid4().hex
+    if 'resume_code' not in st.session_state:
+        st.session_state.resume_code = checkpoint.new_resume_code()
+    if 'test_started_at' not in st.session_state:
+        st.session_state.test_started_at = {}
+    if 'persisted_results' not in st.session_state:
+        st.session_state.persisted_results = {}
+    if 'random_seed' not in st.session_state and os.environ.get("MVT_RANDOM_SEED"):
+        st.session_state.random_seed = os.environ["MVT_RANDOM_SEED"]
+    if 'display_profile' not in st.session_state:
+        # A station's saved profile: ?display=NAME, else MVT_DISPLAY_PROFILE
+        name = st.query_params.get("display") or calibration.DEFAULT_PROFILE
+        profile = calibration.saved_profile(name) if name else None
+        st.session_state.display_profile = list(profile) if profile else None
+    
+    # Register activity so idle sessions can be evicted, and bring back
+    # test state that was evicted while this candidate was away
+    session_uid = st.session_state.session_uid
+    ctx = get_script_run_ctx()
+    lifecycle = get_lifecycle()
+    if ctx is not None:
+        lifecycle.begin(session_uid, ctx.session_state)
+    restore_test_state(st.session_state)
+    
+    # Page routing - the checkpoint also runs when a page stops early via st.rerun()
+    recorder = session_recorder()
+    page = admission_gate(session_uid, st.session_state.current_page)
+    if page in TEST_PAGES:
+        track_focus(session_uid)
+        if battery_test() == TEST_PAGES[page]:
+            prefetch_next_test()
+    started = time.perf_counter()
+    try:
+        with metrics.timed(metrics.PAGE_SECONDS, page):
+            route_page(page)
+    except Exception:
+        metrics.PAGE_ERRORS.inc(page)
+        raise
+    finally:
+        save_checkpoint()
+        if 'session_uid' in st.session_state:
+            publish_progress(session_uid, page)
+        if recorder is not None:
+            recorder.run(page, time.perf_counter() - started, time.time())
+            recorder.flush()
+        lifecycle.end(session_uid)
+
+def route_page(page):
+    if page == "home":
         home_page()
-    elif st.session_state.current_page == "lantern":
+    elif page == "lantern":
         lantern_test()
-    elif st.session_state.current_page == "ishihara":
+    elif page == "ishihara":
         ishihara_test()
-    elif st.session_state.current_page == "ecdiscfm":
+    elif page == "ecdiscfm":
         ecdisfm_test()
-    elif st.session_state.current_page == "radar_simple":  # DODANO
+    elif page == "radar_simple":  # DODANO
         radar_simple_test()
-    elif st.session_state.current_page == "results":
+    elif page == "results":
         show_results()
+    elif page == "waiting_room":
+        waiting_room_page()
+    elif page == "calibration":
+        calibration_page()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
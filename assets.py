@@ -0,0 +1,120 @@
+# Maritime Color Vision Test - Stimulus assets
+# Copyright © Toni Mandusic 2025
+#
+# Ishihara plate images, read from disk once per process and shared by
+# every session. The Ishihara page used to reopen the plate file on every
+# rerun; the full battery (battery.py) also loads the plates of the next
+# test in the background, so its first plate appears without a pause.
+#
+# Plates for a calibrated display (calibration.py) are corrected once per
+# profile and plate and kept in a bounded LRU cache, so calibration costs
+# one decode / encode per plate and station, not one per rerun.
+#
+# Lantern light sprites (lights.py) are rendered and encoded once per
+# color, lighting settings and display profile. Streamlit serves an image
+# under a hash of its bytes, so the page sends the same URL on every rerun
+# and the browser keeps the pixels.
+
+import functools
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import calibration
+import lights
+import metrics
+
+PLATE_DIR = os.path.join("assets", "ishihara_plates")
+# Corrected plates kept in memory: a few display profiles' worth
+CALIBRATED_PLATES = int(os.environ.get("MVT_CALIBRATED_PLATES", 256))
+LIGHT_SPRITES = 128
+
+_plates = {}  # plate number -> PNG bytes
+_plates_lock = threading.Lock()
+_calibrated = OrderedDict()  # (profile, plate number) -> PNG bytes, least recently used first
+_calibrated_lock = threading.Lock()
+
+
+def plate_path(plate_number):
+    return os.path.join(PLATE_DIR, f"plate{plate_number}.png")
+
+
+def plate_bytes(plate_number, profile=None):
+    """PNG bytes of a plate, corrected for a display profile if given; None if its file is missing"""
+    if profile is not None:
+        return _calibrated_plate(plate_number, profile)
+    image = _plates.get(plate_number)
+    if image is None:
+        path = plate_path(plate_number)
+        if not os.path.exists(path):
+            return None
+        with metrics.timed(metrics.CALL_SECONDS, "plate_image_load"):
+            with open(path, "rb") as f:
+                image = f.read()
+        with _plates_lock:
+            image = _plates.setdefault(plate_number, image)
+    return image
+
+
+def _calibrated_plate(plate_number, profile):
+    key = (profile, plate_number)
+    with _calibrated_lock:
+        image = _calibrated.get(key)
+        if image is not None:
+            _calibrated.move_to_end(key)
+            return image
+    original = plate_bytes(plate_number)
+    if original is None:
+        return None
+    # Imported here: only calibrated stations need numpy and Pillow for plates
+    import numpy as np
+    from PIL import Image
+
+    with metrics.timed(metrics.CALL_SECONDS, "plate_calibrate"):
+        with Image.open(io.BytesIO(original)) as plate:
+            mode = "RGBA" if "A" in plate.getbands() or plate.mode == "P" else "RGB"
+            pixels = np.asarray(plate.convert(mode))
+        out = io.BytesIO()
+        Image.fromarray(calibration.apply(profile, pixels), mode).save(out, "PNG", compress_level=1)
+        image = out.getvalue()
+    with _calibrated_lock:
+        image = _calibrated.setdefault(key, image)
+        while len(_calibrated) > CALIBRATED_PLATES:
+            _calibrated.popitem(last=False)
+    return image
+
+
+def prefetch_plates(plate_numbers, profile=None):
+    """Load plates into the cache ahead of use; returns how many are available"""
+    return sum(1 for plate_number in plate_numbers if plate_bytes(plate_number, profile) is not None)
+
+
+def cached_plate_count():
+    return len(_plates) + len(_calibrated)
+
+
+@functools.lru_cache(maxsize=LIGHT_SPRITES)
+def light_sprite(color, profile=None, lighting=lights.SETTINGS):
+    """PNG bytes of a lantern light of a '#RRGGBB' color, corrected for a display profile if given"""
+    from PIL import Image
+
+    with metrics.timed(metrics.CALL_SECONDS, "light_sprite_render"):
+        pixels = lights.sprite_pixels(color, lighting)
+        if profile is not None:
+            pixels = calibration.apply(profile, pixels)
+        out = io.BytesIO()
+        Image.fromarray(pixels, "RGB").save(out, "PNG", compress_level=1)
+        return out.getvalue()
+
+
+def prefetch_lights(colors, profile=None):
+    """Render lantern light sprites ahead of use"""
+    for color in colors:
+        light_sprite(color, profile)
+
+
+metrics.REGISTRY.gauge("mvt_plates_cached", "Ishihara plate images held in memory, original and calibrated",
+                       cached_plate_count)
+metrics.REGISTRY.gauge("mvt_light_sprites_cached", "Lantern light sprites held in memory",
+                       lambda: light_sprite.cache_info().currsize)
@@ -0,0 +1,78 @@
+# Maritime Color Vision Test - Full battery
+# Copyright © Toni Mandusic 2025
+#
+# The full battery runs every test in one go, in a configured order
+# (MVT_BATTERY, default lantern, Ishihara, ECDIS, radar), with no trips
+# back to the home page. While the candidate works on one test, the next
+# one is prepared on a small shared thread pool: its setup seed is drawn
+# up front (so recordings still replay), its state - lantern sequence,
+# shuffled ECDIS trays, radar layout - is built with engine.prepare, and
+# its assets (plate images, lantern light sprites) are loaded into the
+# shared cache. Entering the next test then only starts its clock. Results
+# are shown and committed together, in one results store transaction, when
+# the battery ends.
+#
+# The battery's order and position are plain session fields, so a
+# checkpoint restore continues it; a prepared test that got lost on the
+# way (restart, eviction) is simply prepared again.
+
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import assets
+import engine
+import metrics
+
+PREFETCH_WORKERS = 2
+
+# Prepared tests by how their entry went: ready, waited for, or prepared
+# again because the earlier one was lost
+PREPARED = metrics.REGISTRY.counter(
+    "mvt_battery_prepared_total", "Battery tests entered, by whether their prepared state was ready",
+    ("outcome",))
+
+
+def parse_order(text):
+    """Battery order from a comma separated list of tests"""
+    order = tuple(test.strip() for test in text.split(",") if test.strip())
+    unknown = [test for test in order if test not in engine.STATE_CLASSES]
+    if unknown or not order or len(set(order)) != len(order):
+        raise ValueError(f"not a battery order: {text!r}")
+    return order
+
+
+ORDER = parse_order(os.environ.get("MVT_BATTERY", "lantern,ishihara,ecdis,radar"))
+
+
+def prepare(test, seed, protocol, profile=None):
+    """Next test's state from its setup seed, with its assets loaded; runs on the prefetch pool
+
+    profile is the session's display profile (calibration.py), if any.
+    """
+    state = engine.prepare(test, random.Random(seed), protocol)
+    if test == 'ishihara':
+        assets.prefetch_plates(protocol.used_plates, profile)
+    elif test == 'lantern':
+        assets.prefetch_lights([color['hex'] for color in protocol.lantern_colors.values()], profile)
+    return state
+
+
+def next_test(order, index):
+    """Test after position index, None at the end"""
+    return order[index + 1] if index + 1 < len(order) else None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_prefetcher():
+    """Process-wide pool that prepares upcoming battery tests"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="battery-prefetch")
+    return _pool
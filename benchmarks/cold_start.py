@@ -0,0 +1,73 @@
+# Maritime Color Vision Test - Cold start benchmark
+# Copyright © Toni Mandusic 2025
+#
+# Containers scale to zero between exam sessions, so the first candidate
+# pays for interpreter start, imports and the first script run. Each
+# sample is a fresh Python process that imports Streamlit, then renders
+# the home page once with AppTest. Reported times are medians; the module
+# list shows which heavy optional dependencies were loaded by then.
+#
+# Usage: python benchmarks/cold_start.py [RUNS]
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "fpdf", "http.server")
+
+# Runs in the child process; prints one JSON line
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+at.run()
+rendered = time.perf_counter()
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+print(json.dumps({
+    "streamlit_import": imported - started,
+    "first_render": rendered - imported,
+    "loaded": [name for name in sys.argv[2:] if name in sys.modules],
+}))
+"""
+
+
+def sample(workdir):
+    # Keep the measured runs out of the real stores: the home page render
+    # writes a recording when recording is on, and the app opens the
+    # results database
+    env = dict(os.environ,
+               MVT_RESULTS_DB=os.path.join(workdir, "results.db"),
+               MVT_CHECKPOINT_DIR=os.path.join(workdir, "checkpoints"),
+               MVT_RECORDINGS_DIR=os.path.join(workdir, "recordings"))
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", CHILD, os.path.join(ROOT, "app.py"), *HEAVY_MODULES],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    total = time.perf_counter() - started
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_total"] = total
+    return result
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory(prefix="mvt-cold-") as workdir:
+        samples = [sample(workdir) for _ in range(runs)]
+    print(f"Cold starts measured:           {runs}")
+    for key, label in (("streamlit_import", "Streamlit import"),
+                       ("first_render", "Time to first render (home)"),
+                       ("process_total", "Process start to exit")):
+        print(f"{label + ':':<32}{statistics.median(s[key] for s in samples) * 1000:8.0f} ms")
+    print(f"{'Heavy modules loaded:':<32}{', '.join(samples[-1]['loaded']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Maritime Color Vision Test - Test engine throughput
+# Copyright © Toni Mandusic 2025
+#
+# Drives complete seeded sessions of all four tests through engine.py, no
+# UI involved, and reports transitions per second on one core.
+#
+# Usage: python benchmarks/engine_throughput.py [SESSIONS]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+from protocol import ISHIHARA_DATA, USED_PLATES, LANTERN_COLORS, LANTERN_SEQUENCES, ECDIS_FM_COLORS, RADAR_COLORS
+
+
+def session_events(rng):
+    """(test, now, event) for one candidate taking all four tests"""
+    now = 0.0
+    names = [color['name'] for color in LANTERN_COLORS.values()]
+    for _ in LANTERN_SEQUENCES:
+        now += rng.uniform(2, 9)
+        yield 'lantern', now, (engine.ANSWER, rng.choice(names), rng.choice(names))
+        yield 'lantern', now, (engine.NEXT,)
+    for plate in USED_PLATES:
+        now += rng.uniform(2, 6)
+        yield 'ishihara', now, (engine.ANSWER, rng.choice([ISHIHARA_DATA[plate]['normal'], ""]))
+        yield 'ishihara', now, (engine.NEXT,)
+    yield 'ishihara', now, (engine.FINISH,)
+    for group in ECDIS_FM_COLORS:
+        for _ in range(rng.randint(2, 8)):
+            yield 'ecdis', now, (engine.ANSWER, rng.randrange(len(group)))
+        yield 'ecdis', now, (engine.NEXT,)
+    for _ in RADAR_COLORS['critical_pairs']:
+        yield 'radar', now, (engine.ANSWER, rng.random() < 0.5)
+    yield 'radar', now, (engine.NEXT,)
+    for _ in range(rng.randint(2, 8)):
+        yield 'radar', now, (engine.ANSWER, rng.randrange(len(RADAR_COLORS['intensity_scale'])))
+    yield 'radar', now, (engine.CHECK,)
+    yield 'radar', now, (engine.NEXT,)
+    for _ in RADAR_COLORS['contrast_targets']:
+        yield 'radar', now, (engine.ANSWER, rng.random() < 0.5)
+    yield 'radar', now, (engine.NEXT,)
+    yield 'radar', now, (engine.SCENE, rng.getrandbits(32))
+    yield 'radar', now + 3, (engine.ANSWER, rng.randint(1, 5))
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    # Pre-generate the events so only the transitions are timed
+    scripts = [list(session_events(random.Random(i))) for i in range(sessions)]
+    transitions = sum(len(script) for script in scripts)
+
+    started = time.perf_counter()
+    for i, script in enumerate(scripts):
+        rng = random.Random(i)
+        states = {test: engine.start(test, rng) for test in engine.STATE_CLASSES}
+        for test, now, event in script:
+            states[test] = engine.apply(test, states[test], event, now)
+    elapsed = time.perf_counter() - started
+
+    print(f"Sessions:         {sessions}")
+    print(f"Transitions:      {transitions}")
+    print(f"Transitions/sec:  {transitions / elapsed:10.0f}")
+    print(f"Per transition:   {elapsed / transitions * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# Maritime Color Vision Test - Headless load test
+# Copyright © Toni Mandusic 2025
+#
+# Drives N scripted virtual candidates through the whole app with
+# Streamlit's AppTest: home -> Ishihara -> lantern -> ECDIS -> radar ->
+# results -> PDF download. Every rerun is timed and attributed to the page
+# it rendered. AppTest keeps process-global state, so concurrent candidates
+# run in separate worker processes; each worker reports CPU time and peak
+# RSS growth per session. Each candidate's answers and the app's own random
+# draws are seeded from --seed, so runs are reproducible and comparable
+# between versions.
+#
+# Usage: python benchmarks/load_test.py [--candidates N] [--concurrency C]
+#                                       [--seed S] [--json report.json]
+
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+# Keep benchmark data out of the real stores; must be set before the app
+# modules are first imported
+_workdir = tempfile.mkdtemp(prefix="mvt-load-")
+os.environ.setdefault("MVT_RESULTS_DB", os.path.join(_workdir, "results.db"))
+os.environ.setdefault("MVT_CHECKPOINT_DIR", os.path.join(_workdir, "checkpoints"))
+# Session recordings (replayable with benchmarks/replay.py); set
+# MVT_RECORDINGS_DIR to keep them as a corpus
+os.environ.setdefault("MVT_RECORD", "1")
+os.environ.setdefault("MVT_RECORDINGS_DIR", os.path.join(_workdir, "recordings"))
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from protocol import ISHIHARA_DATA, USED_PLATES, LANTERN_COLORS, LANTERN_SEQUENCES, ECDIS_FM_COLORS, RADAR_COLORS  # noqa: E402
+
+POSITIONS = ["Deck Officer", "Engine Officer", "Lookout", "Pilot", "Other"]
+
+
+class Candidate:
+    """One scripted candidate; records (page, seconds) for every rerun"""
+
+    def __init__(self, index, seed, timeout):
+        self.index = index
+        self.rng = random.Random(f"candidate:{seed}:{index}")
+        self.app_seed = f"{seed}:{index}"
+        self.timeout = timeout
+        self.timings = []
+        self.at = None
+
+    def run(self, at=None):
+        at = self.at if at is None else at
+        main_module = sys.modules["__main__"]
+        started = time.perf_counter()
+        try:
+            at.run(timeout=self.timeout)
+        finally:
+            # AppTest leaves the app script installed as __main__, which
+            # breaks unpickling of the next task sent to this worker
+            sys.modules["__main__"] = main_module
+        elapsed = time.perf_counter() - started
+        if at.exception:
+            raise RuntimeError(f"candidate {self.index}: {at.exception[0].message}")
+        self.timings.append((at.session_state.current_page, elapsed))
+
+    def click(self, label=None, key=None):
+        for button in self.at.button:
+            if (label is not None and button.label == label) or (key is not None and button.key == key):
+                button.click()
+                self.run()
+                return
+        raise RuntimeError(f"candidate {self.index}: no button {label or key} on {self.at.session_state.current_page}")
+
+    def go_home(self):
+        self.click("Back to Home" if self.at.session_state.current_page == "results" else "Home")
+
+    def answer_ishihara(self):
+        self.click("Start Ishihara Test")
+        for i, plate in enumerate(USED_PLATES):
+            key = ISHIHARA_DATA[plate]
+            self.at.text_input[0].input(self.rng.choice([key["normal"], key["normal"], key["deutan"], ""]))
+            self.run()
+            self.click("Next →" if i < len(USED_PLATES) - 1 else "See Results")
+
+    def answer_lantern(self):
+        self.click("Start Lantern Test")
+        names = [color['name'] for color in LANTERN_COLORS.values()]
+        for _ in LANTERN_SEQUENCES:
+            self.at.selectbox[0].select(self.rng.choice(names))
+            self.run()
+            self.at.selectbox[1].select(self.rng.choice(names))
+            self.run()
+            self.click("Next →")
+        self.click("All Results")
+
+    def answer_ecdis(self):
+        self.click("Start ECDIS Test")
+        for group in range(len(ECDIS_FM_COLORS)):
+            for _ in range(self.rng.randint(1, 4)):
+                source, target = self.rng.sample(range(len(ECDIS_FM_COLORS[group])), 2)
+                self.click(key=f"ecdis_color_{source}")
+                self.click(key=f"ecdis_color_{target}")
+            self.click("Next Group →" if group < len(ECDIS_FM_COLORS) - 1 else "See Results")
+
+    def answer_radar(self):
+        self.click("Start Radar Test")
+        for _ in RADAR_COLORS['critical_pairs']:
+            self.click(self.rng.choice(["SAME COLORS", "DIFFERENT COLORS"]))
+        self.click("Next →")
+        for _ in range(self.rng.randint(1, 4)):
+            source, target = self.rng.sample(range(len(RADAR_COLORS['intensity_scale'])), 2)
+            self.click(key=f"radar_color_{source}")
+            self.click(key=f"radar_color_{target}")
+        self.click("Check Order")
+        self.click("Next →")
+        for _ in RADAR_COLORS['contrast_targets']:
+            self.click(self.rng.choice(["YES, I see it", "NO, not visible"]))
+        self.click("Next →")
+        self.at.number_input(key="radar_night_guess").set_value(self.rng.randint(1, 5))
+        self.run()
+        self.click("Submit Answer")
+        self.click("See Results")
+
+    def session(self):
+        self.at = AppTest.from_file(APP_PATH, default_timeout=self.timeout)
+        self.at.session_state.random_seed = self.app_seed
+        self.at.session_state.user_name = f"Candidate {self.index}"
+        self.at.session_state.user_id = f"LOAD-{self.index:06d}"
+        self.at.session_state.user_position = self.rng.choice(POSITIONS)
+        self.run()
+        self.answer_ishihara()
+        self.go_home()
+        self.answer_lantern()
+        self.go_home()
+        self.answer_ecdis()
+        self.go_home()
+        self.answer_radar()
+        self.click("Download PDF Report")
+        return self.timings
+
+
+def warm_up(seed, timeout):
+    # Imports and the first script compile are not per-session costs
+    Candidate(-1, seed, timeout).run(AppTest.from_file(APP_PATH, default_timeout=timeout))
+
+
+def run_candidate(index, seed, timeout):
+    """Worker entry point: (timings, cpu seconds, peak RSS growth in bytes)"""
+    rss_before = rss_bytes()
+    cpu_before = time.process_time()
+    timings = Candidate(index, seed, timeout).session()
+    return timings, time.process_time() - cpu_before, max(0, rss_bytes() - rss_before)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def rss_bytes():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run scripted candidates through the app and report rerun latency")
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--seed", default="0")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json", help="also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    with ProcessPoolExecutor(max_workers=args.concurrency, initializer=warm_up,
+                             initargs=(args.seed, args.timeout)) as pool:
+        wall_before = time.perf_counter()
+        results = list(pool.map(run_candidate, range(args.candidates),
+                                [args.seed] * args.candidates, [args.timeout] * args.candidates))
+        wall = time.perf_counter() - wall_before
+
+    by_page = defaultdict(list)
+    for timings, _, _ in results:
+        for page, seconds in timings:
+            by_page[page].append(seconds * 1000)
+
+    report = {
+        "candidates": args.candidates,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "wall_seconds": wall,
+        "cpu_seconds_per_session": statistics.mean(cpu for _, cpu, _ in results),
+        "rss_bytes_per_session": statistics.mean(rss for _, _, rss in results),
+        "pages": {
+            page: {
+                "reruns": len(values),
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "max_ms": max(values),
+            }
+            for page, values in sorted(by_page.items())
+        },
+    }
+
+    print(f"{args.candidates} candidates, concurrency {args.concurrency}, seed {args.seed}: {wall:.1f}s wall")
+    print(f"CPU per session: {report['cpu_seconds_per_session']:.2f}s   "
+          f"peak RSS growth per session: {report['rss_bytes_per_session'] / 1024:.0f} KB")
+    print(f"{'page':<14}{'reruns':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for page, stats in report["pages"].items():
+        print(f"{page:<14}{stats['reruns']:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+              f"{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# Maritime Color Vision Test - Session replay
+# Copyright © Toni Mandusic 2025
+#
+# Re-drives recorded sessions (recording.py) against the current code.
+#
+# Scoring replay (always): every recorded test start and engine event is
+# applied again, at full speed, and each stored score and pass / fail status
+# is recomputed and compared with what the recorded version stored. Tests
+# run on the protocol version they were recorded with (from the protocol
+# archive), or on the one given with --protocol to try a new protocol file
+# against real sessions. Any difference means a change in the engine, the
+# protocol data or the pass rules alters outcomes for real candidates.
+#
+# App replay (--app): every recorded script run is rendered again with
+# AppTest, with the page and the test state the candidate had at that
+# point, and the render times are compared with the recorded ones (or with
+# an earlier replay's --json report given as --baseline). Both sides are
+# the app's own script-run time from its recording, so AppTest's overhead
+# doesn't count. Widget input is not replayed; the state it produced is.
+#
+# Usage: python benchmarks/replay.py RECORDING_OR_DIR... [--app] [--baseline report.json]
+#                                    [--json report.json] [--limit N] [--protocol FILE]
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+# Rendered results pages store results and checkpoints; keep them out of
+# the real stores. The replayed runs' own recordings (render times) always
+# go to the scratch directory. Must be set before the app modules are
+# first imported
+_workdir = tempfile.mkdtemp(prefix="mvt-replay-")
+os.environ.setdefault("MVT_RESULTS_DB", os.path.join(_workdir, "results.db"))
+os.environ.setdefault("MVT_CHECKPOINT_DIR", os.path.join(_workdir, "checkpoints"))
+os.environ["MVT_RECORDINGS_DIR"] = os.path.join(_workdir, "recordings")
+
+import engine  # noqa: E402
+import protocol  # noqa: E402
+import recording  # noqa: E402
+
+# Pass rules the protocol owns; other tests' statuses are decided in app.py
+STATUS_RULES = {
+    'ishihara': lambda score, rules: rules.ishihara_passed(score * 100 / rules.total_plates),
+    'lantern': lambda score, rules: rules.lantern_passed(len(rules.lantern_sequences) - score),
+}
+
+
+def recording_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".jsonl"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def replay_session(entries, on_run=None, override=None):
+    """Re-apply a session's entries; returns (mismatches, transitions, complete)
+
+    on_run(page, recorded seconds, states) is called for every recorded
+    script run with the test states as they were when that run started.
+    Tests start on override, if given, instead of their recorded protocol.
+    """
+    states = {}
+    run_states = {}
+    mismatches = []
+    transitions = 0
+    complete = True
+    for kind, now, *args in entries:
+        if kind == recording.START:
+            test, seed, *version = args
+            rules = override or protocol.get_version(version[0] if version else protocol.BUILTIN_VERSION)
+            states[test] = engine.start(test, random.Random(seed), now, rules)
+        elif kind == recording.EVENT:
+            test, *event = args
+            if test not in states:
+                complete = False  # state came from a checkpoint, not from recorded events
+                continue
+            states[test] = engine.apply(test, states[test], tuple(event), now)
+            transitions += 1
+        elif kind == recording.RESULT:
+            test, score, status = args
+            if test not in states:
+                complete = False
+                continue
+            replayed = engine.score(test, states[test])
+            if replayed != score:
+                mismatches.append((test, 'score', score, replayed))
+            rule = STATUS_RULES.get(test)
+            if rule is not None and status in ('PASS', 'FAIL'):
+                replayed_status = 'PASS' if rule(replayed, states[test].protocol) else 'FAIL'
+                if replayed_status != status:
+                    mismatches.append((test, 'status', status, replayed_status))
+        elif kind == recording.RUN:
+            page, seconds = args
+            if on_run is not None:
+                on_run(page, seconds, run_states)
+            # States are never modified in place, so a shallow copy is a snapshot
+            run_states = dict(states)
+    return mismatches, transitions, complete
+
+
+class AppReplayer:
+    """Renders recorded runs with AppTest and collects (page, recorded, replayed) seconds"""
+
+    def __init__(self, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        # The app's recorder measures the replayed runs
+        recording.ENABLED = True
+        self.app_test = AppTest
+        self.timeout = timeout
+        self.timings = []
+        self.at = None
+        self.path = None
+
+    def begin(self, session_uid):
+        self.path = recording.recording_path(session_uid)
+        self.at = self.app_test.from_file(APP_PATH, default_timeout=self.timeout)
+        self.at.session_state.session_uid = session_uid
+        self.at.session_state.user_name = "Replay"
+        self.at.session_state.user_id = f"REPLAY-{session_uid[:12]}"
+        self.at.session_state.user_position = "Other"
+
+    def __call__(self, page, recorded, states):
+        for test in engine.STATE_CLASSES:
+            if test in states:
+                self.at.session_state[test] = states[test]
+        self.at.session_state.current_page = page
+        main_module = sys.modules["__main__"]
+        try:
+            self.at.run(timeout=self.timeout)
+        finally:
+            # AppTest leaves the app script installed as __main__
+            sys.modules["__main__"] = main_module
+        _, entries = recording.load(self.path)
+        replayed = next(args for kind, _, *args in reversed(entries) if kind == recording.RUN)
+        self.timings.append((page, recorded, replayed[1]))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def latency_report(timings, baseline=None):
+    """{page: stats} comparing replayed render times with recorded (or baseline) ones"""
+    recorded = defaultdict(list)
+    replayed = defaultdict(list)
+    for page, before, after in timings:
+        recorded[page].append(before * 1000)
+        replayed[page].append(after * 1000)
+    pages = {}
+    for page in sorted(replayed):
+        stats = {
+            'runs': len(replayed[page]),
+            'recorded_p50_ms': percentile(recorded[page], 50),
+            'recorded_p95_ms': percentile(recorded[page], 95),
+            'p50_ms': percentile(replayed[page], 50),
+            'p95_ms': percentile(replayed[page], 95),
+        }
+        base = (baseline or {}).get(page)
+        reference = base['p50_ms'] if base else stats['recorded_p50_ms']
+        stats['p50_change'] = (stats['p50_ms'] - reference) / reference if reference else None
+        pages[page] = stats
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sessions: verify scores and compare render latency")
+    parser.add_argument("paths", nargs="+", help="recording files or directories of them")
+    parser.add_argument("--app", action="store_true", help="also re-render every recorded run through the app")
+    parser.add_argument("--baseline", help="earlier --json report to compare render latency against")
+    parser.add_argument("--json", help="write the report as JSON to this path")
+    parser.add_argument("--limit", type=int, default=0, help="replay at most N sessions")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--protocol", help="protocol file to score every session with instead of its recorded one")
+    args = parser.parse_args()
+
+    override = protocol.load(args.protocol) if args.protocol else None
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f).get('pages')
+    replayer = AppReplayer(args.timeout) if args.app else None
+
+    sessions = transitions = incomplete = 0
+    mismatches = []
+    engine_seconds = 0.0
+    for path in recording_files(args.paths):
+        if args.limit and sessions >= args.limit:
+            break
+        headers, entries = recording.load(path)
+        if not headers:
+            continue
+        started = time.perf_counter()
+        try:
+            session_mismatches, count, complete = replay_session(entries, override=override)
+        except KeyError as exc:
+            print(f"{path}: protocol version {exc} is not in {protocol.PROTOCOL_DIR}; skipped")
+            continue
+        sessions += 1
+        engine_seconds += time.perf_counter() - started
+        transitions += count
+        incomplete += not complete
+        mismatches.extend((headers[0]['session'],) + mismatch for mismatch in session_mismatches)
+        if replayer is not None:
+            replayer.begin(headers[0]['session'])
+            replay_session(entries, replayer, override)
+
+    report = {
+        'sessions': sessions,
+        'incomplete_sessions': incomplete,
+        'transitions': transitions,
+        'transitions_per_second': transitions / engine_seconds if engine_seconds else None,
+        'mismatches': [dict(zip(('session', 'test', 'field', 'recorded', 'replayed'), mismatch))
+                       for mismatch in mismatches],
+    }
+    if replayer is not None:
+        report['pages'] = latency_report(replayer.timings, baseline)
+
+    print(f"Replayed {sessions} session(s), {transitions} transitions"
+          + (f" at {report['transitions_per_second']:.0f}/s" if engine_seconds else ""))
+    if incomplete:
+        print(f"{incomplete} session(s) continued from a checkpoint; their earlier tests were skipped")
+    if mismatches:
+        print(f"{len(mismatches)} result(s) differ from the recording:")
+        for session, test, field, before, after in mismatches:
+            print(f"  {session} {test} {field}: recorded {before}, now {after}")
+    else:
+        print("All recorded results reproduce exactly")
+    if 'pages' in report:
+        against = "baseline" if baseline else "recorded"
+        print(f"\n{'page':<14}{'runs':>6}{against + ' p50':>15}{'p50 ms':>10}{'p95 ms':>10}{'change':>9}")
+        for page, stats in report['pages'].items():
+            reference = baseline[page]['p50_ms'] if baseline and page in baseline else stats['recorded_p50_ms']
+            change = "-" if stats['p50_change'] is None else f"{stats['p50_change'] * 100:+.0f}%"
+            print(f"{page:<14}{stats['runs']:>6}{reference:>15.1f}{stats['p50_ms']:>10.1f}"
+                  f"{stats['p95_ms']:>10.1f}{change:>9}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
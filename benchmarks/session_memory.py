@@ -0,0 +1,117 @@
+# Maritime Color Vision Test - Per-session memory benchmark
+# Copyright © Toni Mandusic 2025
+#
+# Measures the heap cost of one fully completed session's test state, for
+# the original loose session_state keys (nested dicts / lists of hex
+# strings) and for the per-test state objects in state.py.
+#
+# Usage: python benchmarks/session_memory.py [SESSIONS]
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protocol import ISHIHARA_DATA, USED_PLATES, LANTERN_COLORS, LANTERN_SEQUENCES, ECDIS_FM_COLORS, RADAR_COLORS
+from state import IshiharaState, LanternState, EcdisState, RadarState
+
+
+def typed(text):
+    # Widget values arrive as fresh string objects, never the interned constants
+    return "".join(list(text))
+
+
+def legacy_session():
+    """Test state as the app stored it before state.py (one key per value)"""
+    state = {}
+    state['lantern_pair_start_time'] = time.time()
+    state['lantern_current_pair'] = len(LANTERN_SEQUENCES)
+    state['lantern_sequence'] = random.sample(LANTERN_SEQUENCES, len(LANTERN_SEQUENCES))
+    state['lantern_answers'] = {}
+    for pair, (color1, color2) in enumerate(state['lantern_sequence']):
+        state['lantern_answers'][pair] = {
+            'light1': typed(LANTERN_COLORS[color1]['name']).lower(), 'light2': typed(LANTERN_COLORS[color2]['name']).lower(),
+            'correct1': LANTERN_COLORS[color1]['name'].lower(), 'correct2': LANTERN_COLORS[color2]['name'].lower()
+        }
+
+    state['current_plate'] = len(USED_PLATES) - 1
+    state['user_answers'] = {plate: typed(ISHIHARA_DATA[plate]['normal']) for plate in USED_PLATES}
+    state['ishihara_score'] = len(USED_PLATES)
+
+    state['ecdis_current_group'] = len(ECDIS_FM_COLORS) - 1
+    state['ecdis_scores'] = [0] * len(ECDIS_FM_COLORS)
+    state['ecdis_user_orders'] = []
+    for group in ECDIS_FM_COLORS:
+        shuffled = group.copy()
+        random.shuffle(shuffled)
+        state['ecdis_user_orders'].append(shuffled)
+    state['ecdis_selected_color'] = None
+
+    state['radar_current_test'] = 3
+    state['radar_scores'] = [0, 0, 0, 0]
+    state['radar_start_time'] = time.time()
+    state['radar_pair_index'] = len(RADAR_COLORS['critical_pairs'])
+    state['radar_pair_answers'] = [True] * len(RADAR_COLORS['critical_pairs'])
+    colors = RADAR_COLORS['intensity_scale'].copy()
+    random.shuffle(colors)
+    state['radar_order_user'] = colors
+    state['radar_selected_color'] = None
+    state['radar_contrast_index'] = len(RADAR_COLORS['contrast_targets'])
+    state['radar_contrast_answers'] = [True] * len(RADAR_COLORS['contrast_targets'])
+    state['radar_night_original_targets'] = 5
+    state['radar_night_start'] = time.time()
+    state['radar_night_positions'] = [(random.randint(50, 350), random.randint(50, 250)) for _ in range(5)]
+    return state
+
+
+def slotted_session():
+    """Test state as one object per test (state.py)"""
+    lantern = LanternState()
+    for pair in range(len(LANTERN_SEQUENCES)):
+        color1, color2 = lantern.pair_colors(pair)
+        lantern.set_answer(pair, typed(color1), typed(color2))
+    lantern.current_pair = len(LANTERN_SEQUENCES)
+
+    ishihara = IshiharaState()
+    for plate in USED_PLATES:
+        ishihara.set_answer(plate, typed(ISHIHARA_DATA[plate]['normal']))
+    ishihara.current_plate = len(USED_PLATES) - 1
+
+    ecdis = EcdisState()
+    ecdis.current_group = len(ECDIS_FM_COLORS) - 1
+
+    radar = RadarState()
+    radar.current_test = 3
+    radar.pair_answers.extend([1] * len(RADAR_COLORS['critical_pairs']))
+    radar.contrast_answers.extend([1] * len(RADAR_COLORS['contrast_targets']))
+    radar.new_night_scene()
+    return {'lantern': lantern, 'ishihara': ishihara, 'ecdis': ecdis, 'radar': radar}
+
+
+def measure(build, sessions):
+    """Average traced heap bytes per session"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build() for _ in range(sessions)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / sessions
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    random.seed(0)
+    legacy = measure(legacy_session, sessions)
+    slotted = measure(slotted_session, sessions)
+    print(f"Sessions measured:        {sessions}")
+    print(f"Loose session_state keys: {legacy:8.0f} bytes/session")
+    print(f"Per-test state objects:   {slotted:8.0f} bytes/session")
+    print(f"Reduction:                {100 * (1 - slotted / legacy):8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
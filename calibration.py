@@ -0,0 +1,220 @@
+# Maritime Color Vision Test - Display calibration
+# Copyright © Toni Mandusic 2025
+#
+# Stimulus colors are specified for an ideal sRGB display; real bridge
+# simulator screens and laptops differ in gamma and white point. A display
+# profile holds the display's gamma, measured with a half-tone matching
+# task, and white point gains, from nudging a gray patch until it looks
+# neutral. Colors are corrected by decoding the sRGB value to linear
+# light, applying the gains and encoding with the display's own gamma.
+#
+# The correction is per channel, so a 3 x 256 lookup table is exact for
+# 8-bit colors. It is compiled once per profile and applied in one
+# vectorized pass: to a protocol's stimulus colors (cached per profile and
+# protocol version, see palette) and to plate images (assets.py caches the
+# corrected plates per profile and plate). Sessions without a profile draw
+# the specified colors unchanged, and never load numpy (cold start).
+#
+# Profiles can be saved by name (MVT_DISPLAY_PROFILES) and applied to every
+# session of a station with MVT_DISPLAY_PROFILE or a ?display=NAME link.
+#
+# Usage: python calibration.py save NAME --gamma G [--white R,G,B]
+#        python calibration.py list
+
+import argparse
+import functools
+import json
+import math
+import os
+import threading
+from collections import namedtuple
+
+PROFILES_PATH = os.environ.get("MVT_DISPLAY_PROFILES", os.path.join("data", "display_profiles.json"))
+DEFAULT_PROFILE = os.environ.get("MVT_DISPLAY_PROFILE", "")
+
+MIN_GAMMA = 1.4
+MAX_GAMMA = 3.0
+# Gray level that matches a 50 % black / white line pattern on an ideal display
+REFERENCE_MATCH = 188
+
+Profile = namedtuple('Profile', ['gamma', 'red', 'green', 'blue'])
+
+
+def gamma_from_match(level):
+    """Display gamma from the gray level (0-255) that matched the 50 % half-tone pattern"""
+    level = min(max(level, 1), 254)
+    return min(max(math.log(0.5) / math.log(level / 255), MIN_GAMMA), MAX_GAMMA)
+
+
+def white_gains(warmth, tint):
+    """Channel gains from the neutral gray adjustment, in percent
+
+    warmth > 0 takes blue out (the display looks too cold), tint > 0 takes
+    green out (it looks too green). Gains are scaled so the largest is 1:
+    the display's white is never driven past full output.
+    """
+    red = 1 + warmth / 200
+    green = 1 - tint / 100
+    blue = 1 - warmth / 100
+    top = max(red, green, blue)
+    return red / top, green / top, blue / top
+
+
+def make_profile(match_level, warmth=0, tint=0):
+    return Profile(round(gamma_from_match(match_level), 3), *(round(g, 4) for g in white_gains(warmth, tint)))
+
+
+def _srgb_to_linear(values):
+    import numpy as np
+
+    values = values / 255.0
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+@functools.lru_cache(maxsize=64)
+def lookup_table(profile):
+    """3 x 256 uint8 table: output level per channel and input level"""
+    import numpy as np
+
+    linear = _srgb_to_linear(np.arange(256, dtype=np.float64))
+    gains = np.array(profile[1:], dtype=np.float64)[:, None]
+    table = np.rint(255 * (linear[None, :] * gains) ** (1 / profile.gamma))
+    table = np.clip(table, 0, 255).astype(np.uint8)
+    table.flags.writeable = False
+    return table
+
+
+def apply(profile, rgb):
+    """Corrected copy of a uint8 array whose last axis is RGB (or RGBA; alpha is kept)"""
+    import numpy as np
+
+    table = lookup_table(profile)
+    out = rgb.copy()
+    out[..., :3] = table[np.arange(3), rgb[..., :3]]
+    return out
+
+
+def _parse_hex(color):
+    color = color.lstrip("#")
+    return [int(color[i:i + 2], 16) for i in (0, 2, 4)]
+
+
+def correct_colors(profile, colors):
+    """Corrected '#RRGGBB' strings for a list of them, in one pass"""
+    if not colors:
+        return []
+    import numpy as np
+
+    corrected = apply(profile, np.array([_parse_hex(color) for color in colors], dtype=np.uint8))
+    return ["#%02X%02X%02X" % tuple(int(v) for v in row) for row in corrected]
+
+
+class Palette(dict):
+    """{specified color: color to draw}; colors not compiled in are corrected on first use"""
+
+    def __init__(self, profile, colors=()):
+        super().__init__()
+        self.profile = profile
+        if profile is not None:
+            self.update(zip(colors, correct_colors(profile, colors)))
+
+    def __missing__(self, color):
+        if self.profile is None:
+            return color
+        corrected = self[color] = correct_colors(self.profile, [color])[0]
+        return corrected
+
+
+def stimulus_colors(protocol):
+    """Every color a protocol shows as a stimulus"""
+    colors = [color['hex'] for color in protocol.lantern_colors.values()]
+    for group in protocol.ecdis_fm_colors:
+        colors.extend(group)
+    radar = protocol.radar_colors
+    for pair in radar['critical_pairs']:
+        colors.extend(pair)
+    colors.extend(radar['intensity_scale'])
+    for target in radar['contrast_targets']:
+        colors.extend((target['bg'], target['target']))
+    return sorted({color for color in colors if color.startswith("#")})
+
+
+UNCALIBRATED = Palette(None)
+
+_palettes = {}
+_palettes_lock = threading.Lock()
+
+
+def palette(profile, protocol):
+    """Palette of a protocol's stimulus colors on a profiled display, compiled once per pair"""
+    if profile is None:
+        return UNCALIBRATED
+    key = (profile, protocol.version)
+    compiled = _palettes.get(key)
+    if compiled is None:
+        compiled = Palette(profile, stimulus_colors(protocol))
+        with _palettes_lock:
+            compiled = _palettes.setdefault(key, compiled)
+    return compiled
+
+
+def load_profiles(path=PROFILES_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {name: Profile(*values) for name, values in data.items()}
+
+
+def saved_profile(name, path=PROFILES_PATH):
+    """A named profile, None if there is no such profile"""
+    return load_profiles(path).get(name)
+
+
+def save_profile(name, profile, path=PROFILES_PATH):
+    profiles = load_profiles(path)
+    profiles[name] = profile
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({key: list(value) for key, value in sorted(profiles.items())}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def describe(profile):
+    return f"gamma {profile.gamma:.2f}, white {profile.red:.3f} / {profile.green:.3f} / {profile.blue:.3f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage saved display calibration profiles")
+    parser.add_argument("--profiles", default=PROFILES_PATH, help="profiles file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    save_parser = commands.add_parser("save", help="save a profile measured on the calibration page")
+    save_parser.add_argument("name")
+    save_parser.add_argument("--gamma", type=float, required=True)
+    save_parser.add_argument("--white", default="1,1,1", help="red,green,blue gains (default: %(default)s)")
+    commands.add_parser("list", help="list saved profiles")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name, profile in sorted(load_profiles(args.profiles).items()):
+            print(f"{name:<24} {describe(profile)}")
+        return
+    try:
+        gains = tuple(float(value) for value in args.white.split(","))
+    except ValueError:
+        gains = ()
+    if len(gains) != 3 or not all(0 < gain <= 1 for gain in gains):
+        parser.error("--white needs three gains in (0, 1]")
+    if not MIN_GAMMA <= args.gamma <= MAX_GAMMA:
+        parser.error(f"--gamma must be between {MIN_GAMMA} and {MAX_GAMMA}")
+    profile = Profile(args.gamma, *gains)
+    save_profile(args.name, profile, args.profiles)
+    print(f"Saved display profile {args.name}: {describe(profile)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+# Maritime Color Vision Test - Certificate signing and verification
+# Copyright © Toni Mandusic 2025
+#
+# Every issued certificate gets a compact signed ID so an inspector can
+# confirm it is genuine without calling anyone. The ID is an HMAC-SHA256,
+# truncated to 80 bits and written as 16 base32 characters, over the key
+# id, the candidate ID, the issue date and a digest of the results (name,
+# position, session and every test's score and status). The PDF carries
+# the ID and a QR code with the signed fields, so the signature can be
+# checked from the QR alone; the register (the certificates table in the
+# results store) adds the recorded results and catches IDs that were never
+# issued.
+#
+# Keys are local: a JSON keyring (MVT_CERT_KEYS) of base64 secrets by key
+# id, one of them active for new certificates. Rotating adds a key and
+# makes it active; old keys stay so their certificates still verify. Copy
+# the keyring (and the results database) to an inspection station to
+# verify offline.
+#
+# Usage: python certificates.py new-key [--keys PATH]
+#        python certificates.py verify [ID_OR_QR...] [--crew crew.csv] [--db PATH | --no-db]
+#                                      [--keys PATH] [--json]
+
+import argparse
+import base64
+import csv
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import sys
+from datetime import date
+from urllib.parse import parse_qs, quote, unquote, urlencode, urlsplit
+
+KEYS_PATH = os.environ.get("MVT_CERT_KEYS", os.path.join("data", "certificate_keys.json"))
+# Public address of the app; when set, QR codes open its verify page
+VERIFY_URL = os.environ.get("MVT_VERIFY_URL", "")
+
+PREFIX = "MVT1"
+ID_LENGTH = 16  # base32 characters, 80 bits of MAC
+DIGEST_LENGTH = 16  # hex characters of the result digest
+
+# Verification statuses
+VALID = 'valid'
+SIGNATURE_VALID = 'signature_valid'  # signed by a local key, no register to check against
+NOT_ISSUED = 'not_issued'
+FORGED = 'invalid_signature'
+UNKNOWN_KEY = 'unknown_key'
+MISMATCH = 'mismatch'
+MALFORMED = 'malformed'
+
+STATUS_LABELS = {
+    VALID: "Valid",
+    SIGNATURE_VALID: "Signature valid (not checked against the register)",
+    NOT_ISSUED: "Not issued",
+    FORGED: "Invalid signature",
+    UNKNOWN_KEY: "Signed with an unknown key",
+    MISMATCH: "Does not match the issued certificate",
+    MALFORMED: "Not a certificate ID",
+}
+
+_ID_PATTERN = re.compile(r"[A-Z2-7]{%d}" % ID_LENGTH)
+
+
+class KeyringError(ValueError):
+    pass
+
+
+class Keyring:
+    """Signing keys by id, and the id of the one that signs new certificates"""
+    __slots__ = ('keys', 'active')
+
+    def __init__(self, keys, active):
+        if active not in keys:
+            raise KeyringError(f"active key {active!r} is not in the keyring")
+        self.keys = keys
+        self.active = active
+
+
+def load_keyring(path=KEYS_PATH, create=False):
+    """Keyring from path; create=True starts one with a fresh key if there is none"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        if not create:
+            raise KeyringError(f"no certificate keyring at {path}") from None
+        return new_key(path)
+    except ValueError as exc:
+        raise KeyringError(f"{path}: {exc}") from None
+    try:
+        keys = {key_id: base64.b64decode(secret, validate=True) for key_id, secret in data['keys'].items()}
+        return Keyring(keys, data['active'])
+    except (KeyError, TypeError, AttributeError, ValueError) as exc:
+        raise KeyringError(f"{path}: not a certificate keyring ({exc})") from None
+
+
+def new_key(path=KEYS_PATH):
+    """Add a fresh key to the keyring at path (creating it) and make it the active one"""
+    try:
+        keyring = load_keyring(path)
+        keys = dict(keyring.keys)
+    except KeyringError:
+        if os.path.exists(path):
+            raise
+        keys = {}
+    key_id = f"k{len(keys) + 1}"
+    while key_id in keys:
+        key_id += "x"
+    keys[key_id] = secrets.token_bytes(32)
+    data = {'active': key_id, 'keys': {k: base64.b64encode(v).decode("ascii") for k, v in keys.items()}}
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    if not keys.keys() - {key_id}:
+        # First key: don't replace a keyring another process created meanwhile
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            os.remove(tmp)
+            return load_keyring(path)
+        os.remove(tmp)
+    else:
+        os.replace(tmp, path)
+    return Keyring(keys, key_id)
+
+
+def result_digest(candidate_name, position, session_id, results):
+    """Short digest of what a certificate states; results are [test, score, accuracy, status] lists"""
+    body = json.dumps([candidate_name, position, session_id, results], separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()[:DIGEST_LENGTH]
+
+
+def sign(key, key_id, candidate_id, issued, digest):
+    message = "\n".join((PREFIX, key_id, candidate_id, issued, digest)).encode("utf-8")
+    mac = hmac.new(key, message, hashlib.sha256).digest()[:ID_LENGTH * 5 // 8]
+    return base64.b32encode(mac).decode("ascii")
+
+
+def display_id(cert_id):
+    """ABCD-EFGH-JKLM-NPQR"""
+    return "-".join(cert_id[i:i + 4] for i in range(0, len(cert_id), 4))
+
+
+def normalize_id(text):
+    return re.sub(r"[\s-]", "", text).upper()
+
+
+def issue(candidate_id, candidate_name, position, session_id, results, issued=None, keyring=None):
+    """A signed certificate record (CERTIFICATE_COLUMNS) for a session's results"""
+    keyring = keyring or load_keyring(create=True)
+    issued = issued or date.today().isoformat()
+    results = [[str(value) for value in result] for result in results]
+    digest = result_digest(candidate_name, position, session_id, results)
+    return {
+        'cert_id': sign(keyring.keys[keyring.active], keyring.active, candidate_id, issued, digest),
+        'key_id': keyring.active,
+        'candidate_id': candidate_id,
+        'candidate_name': candidate_name,
+        'position': position,
+        'issued': issued,
+        'digest': digest,
+        'session_id': session_id,
+        'results': results,
+    }
+
+
+def qr_payload(record):
+    """The signed fields in one line: enough to check the signature with no register"""
+    return ":".join((PREFIX, record['cert_id'], record['key_id'], record['issued'], record['digest'],
+                     quote(record['candidate_id'], safe="")))
+
+
+def qr_text(record):
+    """What the certificate's QR code holds: a verify page link if VERIFY_URL is set, else the payload"""
+    payload = qr_payload(record)
+    if VERIFY_URL:
+        return f"{VERIFY_URL}?{urlencode({'view': 'verify', 'c': payload})}"
+    return payload
+
+
+def parse_claim(text):
+    """{cert_id, key_id, issued, digest, candidate_id} from a scanned QR, a verify link or a
+    bare ID (signed fields None); None if it is none of those"""
+    text = text.strip()
+    if "?" in text and "c=" in text:
+        text = (parse_qs(urlsplit(text).query).get('c') or [""])[0].strip()
+    if text.startswith(PREFIX + ":"):
+        parts = text.split(":")
+        if len(parts) != 6:
+            return None
+        _, cert_id, key_id, issued, digest, candidate_id = parts
+        claim = {'cert_id': normalize_id(cert_id), 'key_id': key_id, 'issued': issued, 'digest': digest,
+                 'candidate_id': unquote(candidate_id)}
+    else:
+        claim = {'cert_id': normalize_id(text), 'key_id': None, 'issued': None, 'digest': None,
+                 'candidate_id': None}
+    return claim if _ID_PATTERN.fullmatch(claim['cert_id']) else None
+
+
+def read_crew(lines):
+    """(claim, expected candidate ID or None) pairs from a crew list CSV
+
+    The list needs a 'certificate' column (ID, QR text or verify link); a
+    'candidate_id' column, if present, must match each certificate.
+    """
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames or 'certificate' not in [name.strip() for name in reader.fieldnames]:
+        raise ValueError("crew list needs a 'certificate' column")
+    claims = []
+    for row in reader:
+        row = {(key or "").strip(): (value or "").strip() for key, value in row.items()}
+        if row['certificate']:
+            claims.append((row['certificate'], row.get('candidate_id') or None))
+    return claims
+
+
+def _verify(claim, expected_candidate, record, keyring, registered):
+    if claim is None:
+        return MALFORMED, "not a certificate ID or QR code"
+    if record is None and registered:
+        return NOT_ISSUED, "no certificate with this ID in the register"
+    signed = record or claim
+    if signed['key_id'] is None:
+        return NOT_ISSUED, "a bare ID can only be checked against the register"
+    key = keyring.keys.get(signed['key_id']) if keyring is not None else None
+    if key is None:
+        return UNKNOWN_KEY, f"key {signed['key_id']} is not in the local keyring"
+    expected = sign(key, signed['key_id'], signed['candidate_id'], signed['issued'], signed['digest'])
+    if not hmac.compare_digest(expected, claim['cert_id']):
+        return FORGED, "the ID does not match the signed fields"
+    if record is not None:
+        if claim['key_id'] is not None and any(
+                claim[field] != record[field] for field in ('key_id', 'issued', 'digest', 'candidate_id')):
+            return MISMATCH, "the QR code's fields differ from the issued certificate"
+        if result_digest(record['candidate_name'], record['position'], record['session_id'],
+                         record['results']) != record['digest']:
+            return FORGED, "the register entry was altered after issue"
+    if expected_candidate is not None and expected_candidate != signed['candidate_id']:
+        return MISMATCH, f"issued to {signed['candidate_id']}, not {expected_candidate}"
+    return (VALID, "") if record is not None else (SIGNATURE_VALID, "")
+
+
+def verify_many(claims, lookup=None, keyring=None):
+    """Verify a batch of certificates in one pass; returns one result dict per claim, in order
+
+    claims are texts (ID, QR payload or verify link) or (text, expected
+    candidate ID) pairs. lookup(cert_ids) returns {cert_id: record} from
+    the register - one batched query for the whole crew list; without it
+    only signatures are checked.
+    """
+    parsed = []
+    for claim in claims:
+        text, expected = (claim, None) if isinstance(claim, str) else claim
+        parsed.append((text, parse_claim(text), expected))
+    records = {}
+    if lookup is not None:
+        records = lookup({claim['cert_id'] for _, claim, _ in parsed if claim is not None})
+    results = []
+    for text, claim, expected in parsed:
+        record = records.get(claim['cert_id']) if claim is not None else None
+        status, detail = _verify(claim, expected, record, keyring, lookup is not None)
+        shown = record or claim or {}
+        results.append({
+            'certificate': display_id(claim['cert_id']) if claim is not None else text,
+            'status': status,
+            'candidate_id': shown.get('candidate_id'),
+            'candidate_name': shown.get('candidate_name'),
+            'position': shown.get('position'),
+            'issued': shown.get('issued'),
+            'results': shown.get('results'),
+            'detail': detail,
+        })
+    return results
+
+
+def summary_line(result):
+    """'3/4 passed' for a verified certificate's results"""
+    tests = result['results'] or []
+    passed = sum(1 for test in tests if test[3] == 'PASS')
+    return f"{passed}/{len(tests)} passed" if tests else ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Certificate keys and offline verification")
+    commands = parser.add_subparsers(dest="command", required=True)
+    key_parser = commands.add_parser("new-key", help="add a signing key and make it active (key rotation)")
+    key_parser.add_argument("--keys", default=KEYS_PATH, help="keyring file (default: %(default)s)")
+    verify_parser = commands.add_parser("verify", help="verify certificate IDs, QR texts or a crew list")
+    verify_parser.add_argument("claims", nargs="*", help="certificate IDs, scanned QR texts or verify links")
+    verify_parser.add_argument("--crew", help="crew list CSV with a 'certificate' (and optional 'candidate_id') column")
+    verify_parser.add_argument("--keys", default=KEYS_PATH, help="keyring file (default: %(default)s)")
+    verify_parser.add_argument("--db", default=None, help="results database with the register")
+    verify_parser.add_argument("--no-db", action="store_true", help="check signatures only")
+    verify_parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.command == "new-key":
+        try:
+            keyring = new_key(args.keys)
+        except KeyringError as exc:
+            parser.exit(1, f"{exc}\n")
+        print(f"Key {keyring.active} is now active in {args.keys} ({len(keyring.keys)} key(s))")
+        return
+
+    claims = list(args.claims)
+    if args.crew:
+        try:
+            with open(args.crew, newline="", encoding="utf-8-sig") as f:
+                claims.extend(read_crew(f))
+        except (OSError, ValueError) as exc:
+            parser.exit(1, f"{args.crew}: {exc}\n")
+    if not claims:
+        parser.error("nothing to verify")
+    try:
+        keyring = load_keyring(args.keys)
+    except KeyringError as exc:
+        parser.exit(1, f"{exc}\n")
+
+    store = None
+    if not args.no_db:
+        from results_store import DB_PATH, ResultsStore
+        path = args.db or DB_PATH
+        if not os.path.exists(path):
+            parser.error(f"no results database at {path} (use --no-db to check signatures only)")
+        store = ResultsStore(path)
+    try:
+        results = verify_many(claims, store.certificates if store else None, keyring)
+    finally:
+        if store is not None:
+            store.close()
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for result in results:
+            who = " ".join(filter(None, (result['candidate_id'], result['candidate_name'])))
+            line = f"{result['certificate']:<22} {STATUS_LABELS[result['status']]}"
+            if who:
+                line += f"  {who}, issued {result['issued']} {summary_line(result)}".rstrip()
+            if result['detail']:
+                line += f"  ({result['detail']})"
+            print(line)
+    if any(result['status'] not in (VALID, SIGNATURE_VALID) for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# Maritime Color Vision Test - Session checkpointing
+# Copyright © Toni Mandusic 2025
+#
+# In-progress test state is checkpointed to an append-only log per
+# candidate so a server restart or a browser reconnect does not lose a
+# half-finished assessment. The session state is flattened into small
+# scalar fields (one per plate answer, per ECDIS tray, ...); each save
+# appends a single JSON line with only the fields that changed since the
+# previous save. Replaying the lines in order yields the latest state; a
+# torn last line from a crash is ignored. Logs are rewritten as one full
+# snapshot line once they grow past COMPACT_BYTES.
+#
+# A candidate ID alone doesn't resume a checkpoint: the candidate also needs
+# the name the assessment was started under and the resume code shown during
+# it. The log keeps only a digest of the code (resume_digest). The same
+# holds for replacing or discarding a log: a session whose digest doesn't
+# match can't start over on top of another session's recent assessment
+# (CheckpointTaken). A log left untouched for MVT_CHECKPOINT_ABANDONED_HOURS
+# is abandoned and can be replaced by anyone entering the ID.
+
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import sys
+import time
+
+from state import STATE_CLASSES
+
+CHECKPOINT_DIR = os.environ.get("MVT_CHECKPOINT_DIR", os.path.join("data", "checkpoints"))
+COMPACT_BYTES = 64 * 1024
+# Set MVT_CHECKPOINT_FSYNC=1 to also survive OS crashes / power loss, at
+# the cost of a disk flush per answer
+FSYNC = os.environ.get("MVT_CHECKPOINT_FSYNC") == "1"
+ABANDONED_AFTER = float(os.environ.get("MVT_CHECKPOINT_ABANDONED_HOURS", 24)) * 3600
+
+# Plain session_state values carried along with the test state objects
+SESSION_FIELDS = ('session_uid', 'current_page', 'user_name', 'user_position', 'protocol_version',
+                  'battery_order', 'battery_index', 'display_profile', 'resume_digest')
+
+# Resume codes: no 0/O or 1/I to misread when copying one down
+RESUME_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+RESUME_CODE_LENGTH = 8  # 40 bits
+
+# Reserved key listing fields removed since the previous save
+DELETED = "-"
+
+
+class CheckpointTaken(Exception):
+    """The candidate ID's log holds another session's unfinished assessment"""
+
+
+def checkpoint_path(candidate_id):
+    # Hash the ID so arbitrary input can't escape the checkpoint directory
+    digest = hashlib.sha1(candidate_id.strip().encode("utf-8")).hexdigest()[:20]
+    return os.path.join(CHECKPOINT_DIR, f"{digest}.log")
+
+
+def new_resume_code():
+    return "".join(secrets.choice(RESUME_ALPHABET) for _ in range(RESUME_CODE_LENGTH))
+
+
+def normalize_code(text):
+    return re.sub(r"[\s-]", "", text or "").upper()
+
+
+def display_code(code):
+    """ABCD-EFGH"""
+    return "-".join(code[i:i + 4] for i in range(0, len(code), 4))
+
+
+def resume_digest(candidate_id, code):
+    return hashlib.sha256(f"{candidate_id.strip()}\n{normalize_code(code)}".encode("utf-8")).hexdigest()
+
+
+def _same_name(a, b):
+    return " ".join((a or "").split()).casefold() == " ".join((b or "").split()).casefold()
+
+
+def may_resume(flat, candidate_id, candidate_name, code):
+    """True if a checkpoint was started under this name and with this resume code"""
+    digest = flat.get('resume_digest')
+    if not digest or not _same_name(flat.get('user_name'), candidate_name):
+        return False
+    return hmac.compare_digest(digest, resume_digest(candidate_id, code))
+
+
+def _field(name):
+    # Snapshots are kept in every active session for diffing; interned
+    # field names are shared instead of allocated per session
+    return sys.intern(name)
+
+
+def snapshot(session):
+    """Flatten the checkpointed part of a session into {field: scalar-or-small-list}"""
+    flat = {}
+    for name in SESSION_FIELDS:
+        if name in session:
+            flat[name] = session[name]
+    # Works on st.session_state and on another session's SafeSessionState
+    # (which has no .get), see session_lifecycle.py
+    started_at = session['test_started_at'] if 'test_started_at' in session else {}
+    for test, started in started_at.items():
+        flat[_field(f"started.{test}")] = started
+    for test in STATE_CLASSES:
+        if test not in session:
+            continue
+        for slot, value in session[test].to_dict().items():
+            # Per-item fields for Python-list slots (plate answers, ECDIS
+            # trays) so one answer only rewrites one field
+            if isinstance(value, list) and slot in ('answers', 'orders') and test in ('ishihara', 'ecdis'):
+                flat[_field(f"{test}.{slot}#")] = len(value)
+                for i, item in enumerate(value):
+                    flat[_field(f"{test}.{slot}.{i}")] = item
+            else:
+                flat[_field(f"{test}.{slot}")] = value
+    return flat
+
+
+def diff(previous, current):
+    """Fields added or changed in current, plus the names of removed fields under DELETED"""
+    delta = {key: value for key, value in current.items() if key not in previous or previous[key] != value}
+    removed = [key for key in previous if key not in current]
+    if removed:
+        delta[DELETED] = removed
+    return delta
+
+
+def _append(path, record):
+    line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+    # O_APPEND writes of one small buffer land as a whole line at the end
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        os.write(fd, line)
+        if FSYNC:
+            os.fsync(fd)
+        return os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+
+
+def _rewrite(path, flat):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps(flat, separators=(",", ":")) + "\n")
+        if FSYNC:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def save(candidate_id, previous, current):
+    """Append the changes between two snapshots; returns True if anything was written
+
+    previous=None starts a new log holding the full current snapshot, so a
+    session never appends onto state left behind by an earlier one; it
+    raises CheckpointTaken instead of replacing another session's log.
+    """
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    path = checkpoint_path(candidate_id)
+    if previous is None:
+        if held_by_other(candidate_id, current.get('resume_digest')):
+            raise CheckpointTaken(candidate_id)
+        _rewrite(path, current)
+        return True
+    delta = diff(previous, current)
+    if not delta:
+        return False
+    if _append(path, delta) > COMPACT_BYTES:
+        _rewrite(path, current)
+    return True
+
+
+def load(candidate_id):
+    """Replay a candidate's checkpoint log into the latest flat snapshot, or None"""
+    path = checkpoint_path(candidate_id)
+    if not os.path.exists(path):
+        return None
+    flat = {}
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                delta = json.loads(line)
+            except ValueError:
+                # Torn write from a crash - everything before it is intact
+                break
+            for key in delta.pop(DELETED, ()):
+                flat.pop(key, None)
+            flat.update(delta)
+    return flat or None
+
+
+def exists(candidate_id):
+    return bool(candidate_id) and os.path.exists(checkpoint_path(candidate_id))
+
+
+def held_by_other(candidate_id, digest):
+    """True if the ID's log is a recent assessment started with another resume code (or none)"""
+    try:
+        age = time.time() - os.path.getmtime(checkpoint_path(candidate_id))
+    except FileNotFoundError:
+        return False
+    if age > ABANDONED_AFTER:
+        return False
+    flat = load(candidate_id)
+    return bool(flat) and not (digest and hmac.compare_digest(flat.get('resume_digest') or "", digest))
+
+
+def discard(candidate_id, digest):
+    """Remove the ID's log if it is this resume digest's (or abandoned); returns False if it isn't"""
+    if held_by_other(candidate_id, digest):
+        return False
+    try:
+        os.remove(checkpoint_path(candidate_id))
+    except FileNotFoundError:
+        pass
+    return True
+
+
+def restore(flat):
+    """Rebuild session_state values from a flat snapshot"""
+    values = {name: flat[name] for name in SESSION_FIELDS if name in flat}
+    values['test_started_at'] = {key.split(".", 1)[1]: value for key, value in flat.items() if key.startswith("started.")}
+    for test, cls in STATE_CLASSES.items():
+        prefix = f"{test}."
+        fields = {key[len(prefix):]: value for key, value in flat.items() if key.startswith(prefix)}
+        if not fields:
+            continue
+        data = {}
+        for key, value in fields.items():
+            if key.endswith("#"):
+                slot = key[:-1]
+                data[slot] = [fields.get(f"{slot}.{i}") for i in range(value)]
+            elif "." not in key:
+                data[key] = value
+        state = cls.from_dict(data)
+        # Timed sections restart their clock instead of expiring on resume
+        if test == 'lantern':
+            state.pair_start_time = time.time()
+        elif test == 'radar' and state.night_targets:
+            state.night_start = time.time()
+        values[test] = state
+    return values
@@ -0,0 +1,77 @@
+# Maritime Color Vision Test - Test setup
+# Copyright © Toni Mandusic 2025
+#
+# Tests (test_*.py next to the modules they cover) run with python -m pytest
+# from the repository root. Everything the app and the modules write -
+# results, checkpoints, recordings, certificate keys, protocol versions - goes to a scratch
+# directory, never to the real stores in data/. Must be set before the app
+# modules are first imported.
+#
+# Fixtures shared by the test modules (stored-result records, an archived
+# protocol variant, app sessions) are defined here too.
+
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="mvt-tests-")
+os.environ["MVT_RESULTS_DB"] = os.path.join(_workdir, "results.db")
+os.environ["MVT_CHECKPOINT_DIR"] = os.path.join(_workdir, "checkpoints")
+os.environ["MVT_RECORDINGS_DIR"] = os.path.join(_workdir, "recordings")
+os.environ["MVT_CERT_KEYS"] = os.path.join(_workdir, "certificate_keys.json")
+os.environ["MVT_PROTOCOL"] = os.path.join(_workdir, "protocol.json")
+os.environ["MVT_PROTOCOL_DIR"] = os.path.join(_workdir, "protocols")
+os.environ["MVT_DISPLAY_PROFILES"] = os.path.join(_workdir, "display_profiles.json")
+
+import pytest  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import protocol  # noqa: E402
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+@pytest.fixture
+def result():
+    """Builds a stored-result record as the app submits it"""
+    def make(session_id, answers, status='PASS', accuracy=100.0, test='ishihara'):
+        return {
+            'session_id': session_id, 'candidate_id': session_id, 'candidate_name': "Test Candidate",
+            'position': "Deck Officer", 'test': test, 'score': 1, 'max_score': 1,
+            'accuracy': accuracy, 'status': status, 'answers': answers,
+            'completed_at': "2025-06-01T10:00:00",
+        }
+    return make
+
+
+@pytest.fixture
+def corrected_protocol():
+    """An archived version whose key for plate 1 reads 7 instead of the built-in 12"""
+    definition = protocol.BUILTIN.definition()
+    definition['version'] = "corrected-key"
+    definition['ishihara']['plates']['1']['normal'] = "7"
+    rules = protocol.Protocol(definition)
+    protocol.archive(rules)
+    return rules
+
+
+@pytest.fixture
+def candidate_app():
+    """Opens a new app session, signed in as candidate_id when one is given"""
+    def open_app(candidate_id=None, name="Test Candidate", position="Deck Officer"):
+        at = AppTest.from_file(APP_PATH, default_timeout=60)
+        at.run()
+        if candidate_id is not None:
+            at.session_state.user_name = name
+            at.session_state.user_id = candidate_id
+            at.session_state.user_position = position
+            at.run()
+        return at
+    return open_app
+
+
+@pytest.fixture
+def click():
+    """Clicks the app's button with this label and reruns"""
+    def click_button(at, label):
+        return next(button for button in at.button if button.label == label).click().run()
+    return click_button
@@ -0,0 +1,346 @@
+# Maritime Color Vision Test - Test engine
+# Copyright © Toni Mandusic 2025
+#
+# The test flow as explicit state machines, independent of any UI. A
+# transition takes a test's state object (state.py) and an event, and
+# returns a new state; the input is never modified, and the clock and
+# random seeds come in as arguments, so the same events always produce the
+# same states. Streamlit (app.py) is one frontend; the load-test harness,
+# replays or an asyncio kiosk API can drive the same functions directly -
+# transitions do no I/O and take microseconds.
+#
+# Events are tuples (name, *args) of JSON-friendly values, e.g.
+# ('answer', 'red', 'green') or ('shuffle', 1234), so they can be sent over
+# the wire or recorded as they are.
+#
+# Answer keys, palettes and pass rules come from the protocol each state
+# was started with (state.protocol), so a protocol published mid-session
+# never changes how a started test is scored.
+
+import random
+
+import protocol as protocols
+from state import STATE_CLASSES, IshiharaState, NO_SELECTION
+
+ANSWER = 'answer'
+NEXT = 'next'
+PREVIOUS = 'previous'
+SKIP = 'skip'
+TIMEOUT = 'timeout'
+FINISH = 'finish'
+SHUFFLE = 'shuffle'
+CHECK = 'check'
+SCENE = 'scene'
+RESUME = 'resume'
+
+RADAR_SUBTESTS = 4
+PAIRS_TEST, ORDER_TEST, CONTRAST_TEST, NIGHT_TEST = range(RADAR_SUBTESTS)
+
+
+class TransitionError(ValueError):
+    """Event not valid for this test"""
+
+
+# Ishihara
+
+def ishihara_score(state):
+    """Plates answered like normal color vision (blank where normal sees nothing)"""
+    score = 0
+    for answer, normal in zip(state.answers, state.protocol.normal_answers):
+        if (answer or "").strip() == normal:
+            score += 1
+    return score
+
+
+def ishihara_passed(accuracy, protocol=protocols.BUILTIN):
+    return protocol.ishihara_passed(accuracy)
+
+
+def _ishihara_answer(state, now, text):
+    state.answers[state.current_plate] = text.strip()
+
+
+def _ishihara_next(state, now):
+    if state.current_plate < state.protocol.total_plates - 1:
+        state.current_plate += 1
+
+
+def _ishihara_previous(state, now):
+    if state.current_plate > 0:
+        state.current_plate -= 1
+
+
+def _ishihara_finish(state, now):
+    state.score = ishihara_score(state)
+    state.finished = True
+
+
+# Lantern
+
+def lantern_time_remaining(state, now):
+    return max(0, state.protocol.lantern_pair_seconds - (now - state.pair_start_time))
+
+
+def lantern_passed(errors, protocol=protocols.BUILTIN):
+    return protocol.lantern_passed(errors)
+
+
+def _lantern_answer(state, now, color1, color2):
+    if state.current_pair < len(state.sequence):
+        state.set_answer(state.current_pair, color1.lower(), color2.lower())
+
+
+def _lantern_next(state, now):
+    if state.current_pair < len(state.sequence):
+        state.current_pair += 1
+        state.pair_start_time = now
+
+
+def _lantern_previous(state, now):
+    if state.current_pair > 0:
+        state.current_pair -= 1
+        state.pair_start_time = now
+
+
+def _lantern_timeout(state, now):
+    # Frontends may tick as often as they like; only an expired pair advances
+    if state.current_pair < len(state.sequence) and lantern_time_remaining(state, now) <= 0:
+        _lantern_next(state, now)
+
+
+def _lantern_resume(state, now):
+    # After a pause the candidate didn't control (waiting room, restore),
+    # the current pair gets its full time again
+    state.pair_start_time = now
+
+
+# ECDIS
+
+def _pick_and_move(state, order, position, move):
+    """First click selects the color at position, second click moves it there"""
+    if state.selected == NO_SELECTION:
+        state.selected = order[position]
+    else:
+        move(state.selected, position)
+        state.selected = NO_SELECTION
+
+
+def _ecdis_answer(state, now, position):
+    group = state.current_group
+    _pick_and_move(state, state.orders[group], position,
+                   lambda color, target: state.move(group, color, target))
+
+
+def _ecdis_shuffle(state, now, seed):
+    state.shuffle(state.current_group, random.Random(seed))
+    state.selected = NO_SELECTION
+
+
+def _ecdis_next(state, now):
+    state.score_group(state.current_group)
+    if state.current_group < len(state.protocol.ecdis_fm_colors) - 1:
+        state.current_group += 1
+    state.selected = NO_SELECTION
+
+
+def _ecdis_previous(state, now):
+    if state.current_group > 0:
+        state.current_group -= 1
+    state.selected = NO_SELECTION
+
+
+def _ecdis_finish(state, now):
+    state.score_group(state.current_group)
+    state.finished = True
+
+
+# Radar
+
+def _radar_answer(state, now, value):
+    subtest = state.current_test
+    if subtest == PAIRS_TEST:
+        same = state.protocol.radar_same_pairs
+        if state.pair_index < len(same):
+            state.pair_answers.append(same[state.pair_index] == bool(value))
+            state.pair_index += 1
+            if state.pair_index == len(same):
+                state.scores[PAIRS_TEST] = sum(state.pair_answers)
+    elif subtest == ORDER_TEST:
+        _pick_and_move(state, state.order, value, state.move)
+    elif subtest == CONTRAST_TEST:
+        visible = state.protocol.radar_visible
+        if state.contrast_index < len(visible):
+            state.contrast_answers.append(visible[state.contrast_index] == bool(value))
+            state.contrast_index += 1
+            if state.contrast_index == len(visible):
+                state.scores[CONTRAST_TEST] = sum(state.contrast_answers)
+    elif state.night_targets:
+        # 5 points minus the miscount; the scene is used up by the answer
+        state.scores[NIGHT_TEST] = max(0, 5 - abs(int(value) - state.night_targets))
+        state.clear_night_scene()
+
+
+def _radar_check(state, now):
+    state.scores[ORDER_TEST] = sum(1 for position, color in enumerate(state.order) if position == color)
+
+
+def _radar_scene(state, now, seed):
+    state.new_night_scene(random.Random(seed))
+    state.night_start = now
+
+
+def _radar_resume(state, now):
+    if state.night_targets:
+        state.night_start = now
+
+
+def _radar_next(state, now):
+    if state.current_test < RADAR_SUBTESTS - 1:
+        state.current_test += 1
+
+
+def _radar_previous(state, now):
+    if state.current_test > 0:
+        state.current_test -= 1
+
+
+def _radar_finish(state, now):
+    state.finished = True
+
+
+def _no_op(state, now, *args):
+    pass
+
+
+TRANSITIONS = {
+    'ishihara': {
+        ANSWER: _ishihara_answer,
+        NEXT: _ishihara_next,
+        SKIP: _ishihara_next,
+        PREVIOUS: _ishihara_previous,
+        FINISH: _ishihara_finish,
+        TIMEOUT: _no_op,
+        RESUME: _no_op,
+    },
+    'lantern': {
+        ANSWER: _lantern_answer,
+        NEXT: _lantern_next,
+        SKIP: _lantern_next,
+        PREVIOUS: _lantern_previous,
+        TIMEOUT: _lantern_timeout,
+        RESUME: _lantern_resume,
+        FINISH: _no_op,
+    },
+    'ecdis': {
+        ANSWER: _ecdis_answer,
+        SHUFFLE: _ecdis_shuffle,
+        NEXT: _ecdis_next,
+        SKIP: _ecdis_next,
+        PREVIOUS: _ecdis_previous,
+        FINISH: _ecdis_finish,
+        TIMEOUT: _no_op,
+        RESUME: _no_op,
+    },
+    'radar': {
+        ANSWER: _radar_answer,
+        CHECK: _radar_check,
+        SCENE: _radar_scene,
+        NEXT: _radar_next,
+        SKIP: _radar_next,
+        PREVIOUS: _radar_previous,
+        FINISH: _radar_finish,
+        TIMEOUT: _no_op,
+        RESUME: _radar_resume,
+    },
+}
+
+
+def prepare(test, rng=random, protocol=None):
+    """Initial state for a test before its clock starts; rng drives the randomized setup
+
+    The state is pinned to protocol (default: the active one). Preparing
+    ahead (the full battery does, for the next test) and calling begin()
+    later gives the same state as start() at that moment.
+    """
+    cls = STATE_CLASSES[test]
+    protocol = protocol or protocols.current()
+    return cls(protocol) if cls is IshiharaState else cls(rng, protocol)
+
+
+def _start_clock(test, state, now):
+    if test == 'lantern':
+        state.pair_start_time = now
+    elif test == 'radar':
+        state.start_time = now
+    return state
+
+
+def begin(test, state, now):
+    """A prepared state with its clock started at now; state itself is left unchanged"""
+    return _start_clock(test, state.copy(), now)
+
+
+def start(test, rng=random, now=0.0, protocol=None):
+    """Initial state for a test, started at now"""
+    return _start_clock(test, prepare(test, rng, protocol), now)
+
+
+def apply(test, state, event, now):
+    """New state after event; state itself is left unchanged"""
+    name, *args = event
+    try:
+        transition = TRANSITIONS[test][name]
+    except KeyError:
+        raise TransitionError(f"{test} has no transition {name!r}") from None
+    state = state.copy()
+    transition(state, now, *args)
+    return state
+
+
+def run(test, state, events):
+    """Apply a sequence of (now, event) pairs; returns the final state"""
+    for now, event in events:
+        state = apply(test, state, event, now)
+    return state
+
+
+def score(test, state):
+    """Raw score of a test as stored with its result"""
+    if test == 'ishihara':
+        return ishihara_score(state)
+    if test == 'lantern':
+        return sum(1 for answer in state.answers_by_pair().values()
+                   if answer['light1'] == answer['correct1'] and answer['light2'] == answer['correct2'])
+    return sum(state.scores)
+
+
+def current_item(test, state):
+    """Index of the single-answer item an ANSWER would go to, None for ordering tasks"""
+    if test == 'ishihara':
+        return state.current_plate
+    if test == 'lantern':
+        return state.current_pair if state.current_pair < len(state.sequence) else None
+    if test == 'radar':
+        if state.current_test == PAIRS_TEST:
+            return state.pair_index
+        if state.current_test == CONTRAST_TEST:
+            return len(state.protocol.radar_same_pairs) + state.contrast_index
+    return None
+
+
+def finished(test, state):
+    """True once the candidate has completed a test (FINISH, or past the last lantern pair)"""
+    if test == 'lantern':
+        return at_end(test, state)
+    return state.finished
+
+
+def at_end(test, state):
+    """True on the last item of a test (for the lantern: past the last pair)"""
+    if test == 'ishihara':
+        return state.current_plate == state.protocol.total_plates - 1
+    if test == 'lantern':
+        return state.current_pair >= len(state.sequence)
+    if test == 'ecdis':
+        return state.current_group == len(state.protocol.ecdis_fm_colors) - 1
+    return state.current_test == NIGHT_TEST
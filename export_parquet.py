@@ -0,0 +1,256 @@
+# Maritime Color Vision Test - Parquet export for analytics
+# Copyright © Toni Mandusic 2025
+#
+# Streams stored results into Parquet files partitioned by test type and
+# month (hive layout: <out>/test=<test>/month=<YYYY-MM>/part-*.parquet).
+# Each test type gets one column per plate / pair / group so analysts can
+# query responses directly; a plate's _correct column is scored against the
+# answer key of the protocol version the session was given on (None if that
+# version isn't archived here or has no key for the plate). The columns
+# follow the built-in protocol so every part shares one schema; items a
+# newer version added (extra plates, pairs, groups) go into the "answers"
+# column as JSON keyed by the column name they would have had. Rows are read
+# and written one chunk at a time and a watermark file records the last
+# exported result id, so nightly runs only process new sessions.
+#
+# With --packed the same rows are also written bit-packed (response_codec.py)
+# under <out>/packed/test=<test>/protocol=<version>/, one part per chunk and
+# protocol version, for analytics that load the whole archive into memory.
+#
+# Usage: python export_parquet.py OUTPUT_DIR [--db PATH] [--chunk-size N] [--packed]
+
+import argparse
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import protocol
+import response_codec
+from protocol import USED_PLATES, LANTERN_SEQUENCES, ECDIS_FM_COLORS, RADAR_COLORS
+from results_store import DB_PATH, ResultsStore
+
+WATERMARK_FILE = "_watermark.json"
+CHUNK_SIZE = 50000
+
+BASE_FIELDS = [
+    ("id", pa.int64()),
+    ("session_id", pa.string()),
+    ("candidate_id", pa.string()),
+    ("candidate_name", pa.string()),
+    ("position", pa.string()),
+    ("score", pa.float64()),
+    ("max_score", pa.float64()),
+    ("accuracy", pa.float64()),
+    ("status", pa.string()),
+    ("started_at", pa.timestamp("s")),
+    ("completed_at", pa.timestamp("s")),
+    ("duration", pa.float64()),
+]
+
+
+def _timestamp(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def ishihara_columns(answers):
+    plate_answers = answers.get("answers", {})
+    try:
+        answer_key = protocol.recorded(answers).ishihara_data
+    except KeyError:
+        answer_key = {}
+    extra_plates = sorted({int(plate) for plate in plate_answers if plate.isdigit()} - set(USED_PLATES))
+    columns = {}
+    for plate in list(USED_PLATES) + extra_plates:
+        answer = plate_answers.get(str(plate))
+        columns[f"plate_{plate}"] = answer
+        if answer is not None and plate in answer_key:
+            columns[f"plate_{plate}_correct"] = answer.strip() == answer_key[plate]["normal"]
+        else:
+            columns[f"plate_{plate}_correct"] = None
+    return columns
+
+
+def lantern_columns(answers):
+    sequence = answers.get("sequence", [])
+    pair_answers = answers.get("answers", {})
+    columns = {}
+    for i in range(max(len(LANTERN_SEQUENCES), len(sequence), len(pair_answers))):
+        shown = sequence[i] if i < len(sequence) else (None, None)
+        answer = pair_answers.get(str(i), {})
+        columns[f"pair_{i + 1}_shown1"] = shown[0]
+        columns[f"pair_{i + 1}_shown2"] = shown[1]
+        columns[f"pair_{i + 1}_light1"] = answer.get("light1")
+        columns[f"pair_{i + 1}_light2"] = answer.get("light2")
+    return columns
+
+
+def ecdis_columns(answers):
+    orders = answers.get("orders", [])
+    scores = answers.get("group_scores", [])
+    columns = {}
+    for g in range(max(len(ECDIS_FM_COLORS), len(orders), len(scores))):
+        columns[f"group_{g + 1}_score"] = scores[g] if g < len(scores) else None
+        columns[f"group_{g + 1}_order"] = ",".join(orders[g]) if g < len(orders) else None
+    return columns
+
+
+def radar_columns(answers):
+    subtest_scores = answers.get("subtest_scores", [])
+    pair_answers = answers.get("pair_answers", [])
+    contrast_answers = answers.get("contrast_answers", [])
+    columns = {}
+    for k in range(max(4, len(subtest_scores))):
+        columns[f"subtest_{k + 1}_score"] = subtest_scores[k] if k < len(subtest_scores) else None
+    for i in range(max(len(RADAR_COLORS['critical_pairs']), len(pair_answers))):
+        columns[f"pair_{i + 1}_correct"] = pair_answers[i] if i < len(pair_answers) else None
+    for i in range(max(len(RADAR_COLORS['contrast_targets']), len(contrast_answers))):
+        columns[f"contrast_{i + 1}_correct"] = contrast_answers[i] if i < len(contrast_answers) else None
+    intensity_order = answers.get("intensity_order")
+    columns["intensity_order"] = ",".join(intensity_order) if intensity_order else None
+    return columns
+
+
+def _response_fields(test):
+    """Arrow fields for a test's response columns, in export order"""
+    if test == "ishihara":
+        fields = []
+        for plate in USED_PLATES:
+            fields += [(f"plate_{plate}", pa.string()), (f"plate_{plate}_correct", pa.bool_())]
+        return fields
+    if test == "lantern":
+        fields = []
+        for i in range(len(LANTERN_SEQUENCES)):
+            fields += [(f"pair_{i + 1}_{name}", pa.string()) for name in ("shown1", "shown2", "light1", "light2")]
+        return fields
+    if test == "ecdis":
+        fields = []
+        for g in range(len(ECDIS_FM_COLORS)):
+            fields += [(f"group_{g + 1}_score", pa.int16()), (f"group_{g + 1}_order", pa.string())]
+        return fields
+    if test == "radar":
+        fields = [(f"subtest_{k + 1}_score", pa.int16()) for k in range(4)]
+        fields += [(f"pair_{i + 1}_correct", pa.bool_()) for i in range(len(RADAR_COLORS['critical_pairs']))]
+        fields += [(f"contrast_{i + 1}_correct", pa.bool_()) for i in range(len(RADAR_COLORS['contrast_targets']))]
+        fields.append(("intensity_order", pa.string()))
+        return fields
+    return []
+
+
+RESPONSE_COLUMNS = {
+    "ishihara": ishihara_columns,
+    "lantern": lantern_columns,
+    "ecdis": ecdis_columns,
+    "radar": radar_columns,
+}
+
+# Responses that have no column of their own, as JSON (all of them for test
+# types without a column layout)
+ANSWERS_FIELD = ("answers", pa.string())
+
+SCHEMAS = {test: pa.schema(BASE_FIELDS + _response_fields(test) + [ANSWERS_FIELD]) for test in RESPONSE_COLUMNS}
+
+
+def rows_to_table(test, rows):
+    """Build one Arrow table for rows of a single test type"""
+    schema = SCHEMAS.get(test) or pa.schema(BASE_FIELDS + [ANSWERS_FIELD])
+    to_columns = RESPONSE_COLUMNS.get(test)
+    data = defaultdict(list)
+    for row in rows:
+        for name, _ in BASE_FIELDS:
+            value = row[name]
+            if name in ("started_at", "completed_at"):
+                value = _timestamp(value)
+            data[name].append(value)
+        if to_columns is None:
+            data["answers"].append(json.dumps(row["answers"]))
+            continue
+        extra = {}
+        for name, value in to_columns(row["answers"]).items():
+            if name in schema.names:
+                data[name].append(value)
+            else:
+                extra[name] = value
+        data["answers"].append(json.dumps(extra) if extra else None)
+    return pa.Table.from_pydict({name: data[name] for name in schema.names}, schema=schema)
+
+
+def read_watermark(out_dir):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return json.load(f)["last_id"]
+
+
+def write_watermark(out_dir, last_id):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"last_id": last_id, "exported_at": datetime.now().isoformat(timespec="seconds")}, f)
+    os.replace(tmp, path)
+
+
+def export_packed(out_dir, rows):
+    """Write the bit-packed parts of one chunk's rows; versions not archived here are left out"""
+    groups = defaultdict(list)
+    for row in rows:
+        if row["test"] in response_codec.TESTS:
+            groups[(row["test"], row["answers"].get('protocol', protocol.BUILTIN_VERSION))].append(row)
+    for (test, version), group in groups.items():
+        try:
+            codec = response_codec.get_codec(version)
+        except KeyError:
+            continue
+        ids = np.array([row["id"] for row in group], dtype=np.int64)
+        response_codec.save_part(out_dir, test, version, ids, codec.encode(test, [row["answers"] for row in group]))
+
+
+def export(out_dir, store=None, chunk_size=CHUNK_SIZE, packed=False):
+    """Export results newer than the watermark; returns the number of rows written"""
+    store = store or ResultsStore(DB_PATH)
+    os.makedirs(out_dir, exist_ok=True)
+    after_id = read_watermark(out_dir)
+    exported = 0
+
+    for chunk in store.iter_results(after_id=after_id, chunk_size=chunk_size):
+        partitions = defaultdict(list)
+        for row in chunk:
+            partitions[(row["test"], row["completed_at"][:7])].append(row)
+
+        for (test, month), rows in partitions.items():
+            directory = os.path.join(out_dir, f"test={test}", f"month={month}")
+            os.makedirs(directory, exist_ok=True)
+            # File names carry the id range, so re-running after a crash
+            # between the write and the watermark update overwrites instead
+            # of duplicating
+            path = os.path.join(directory, f"part-{rows[0]['id']:012d}-{rows[-1]['id']:012d}.parquet")
+            pq.write_table(rows_to_table(test, rows), path + ".tmp", compression="zstd")
+            os.replace(path + ".tmp", path)
+        if packed:
+            export_packed(out_dir, chunk)
+
+        write_watermark(out_dir, chunk[-1]["id"])
+        exported += len(chunk)
+
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export stored assessment results to partitioned Parquet")
+    parser.add_argument("output_dir")
+    parser.add_argument("--db", default=DB_PATH, help="results database (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--packed", action="store_true", help="also write bit-packed responses per protocol version")
+    args = parser.parse_args()
+
+    count = export(args.output_dir, ResultsStore(args.db), args.chunk_size, args.packed)
+    print(f"Exported {count} result(s) to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# Maritime Color Vision Test - Item response theory scoring
+# Copyright © Toni Mandusic 2025
+#
+# Ability estimates from calibrated two-parameter logistic (2PL) item
+# parameters. Each Ishihara plate and each radar pair / contrast item has a
+# discrimination a and a difficulty b, fitted offline by irt_calibrate.py
+# from stored responses; P(correct | theta) = 1 / (1 + exp(-a (theta - b))).
+# A candidate's ability is the expected a posteriori (EAP) estimate of
+# theta under a standard normal prior, so items that separate normal from
+# deficient color vision weigh more than items everybody passes.
+#
+# The parameter file (MVT_IRT_PARAMS) is loaded once per process. Without
+# one - or with one that can't be read, which is logged - scoring falls
+# back to the raw counts only. Pure Python on purpose:
+# scoring a test is a few thousand float operations and must not pull
+# NumPy into the app's cold start.
+
+import json
+import logging
+import math
+import os
+import threading
+from collections import namedtuple
+
+import protocol
+
+PARAMS_PATH = os.environ.get("MVT_IRT_PARAMS", os.path.join("data", "irt_params.json"))
+FORMAT = 1
+
+# Quadrature for the EAP integral, shared with the calibration
+QUADRATURE_POINTS = 61
+THETA_RANGE = 4.0
+
+# Items with a lower discrimination carry almost no information (Baker's
+# "very low" band) and are candidates for removal from the protocol
+MIN_DISCRIMINATION = 0.35
+
+CALIBRATED_TESTS = ('ishihara', 'radar')
+
+Ability = namedtuple('Ability', ['theta', 'se', 'items', 'version'])
+
+logger = logging.getLogger(__name__)
+
+
+def quadrature():
+    """(nodes, weights) of a standard normal prior on an even theta grid"""
+    step = 2 * THETA_RANGE / (QUADRATURE_POINTS - 1)
+    nodes = [-THETA_RANGE + i * step for i in range(QUADRATURE_POINTS)]
+    densities = [math.exp(-0.5 * theta * theta) for theta in nodes]
+    total = sum(densities)
+    return nodes, [density / total for density in densities]
+
+
+def responses(test, answers):
+    """{item: 1 or 0} scored from a stored result's answers; unanswered items are absent
+
+    Plates are scored against the answer key of the protocol version the
+    answers were given on (answers['protocol']).
+    """
+    scored = {}
+    if test == 'ishihara':
+        ishihara_data = protocol.recorded(answers).ishihara_data
+        for plate, answer in answers.get('answers', {}).items():
+            normal = ishihara_data[int(plate)]["normal"]
+            scored[f"plate:{plate}"] = 1 if (answer or "").strip() == normal else 0
+    elif test == 'radar':
+        for index, correct in enumerate(answers.get('pair_answers', [])):
+            scored[f"pair:{index}"] = 1 if correct else 0
+        for index, correct in enumerate(answers.get('contrast_answers', [])):
+            scored[f"contrast:{index}"] = 1 if correct else 0
+    return scored
+
+
+def load_params(path=PARAMS_PATH):
+    """Parsed parameter file, or None when there is none yet"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            params = json.load(f)
+    except FileNotFoundError:
+        return None
+    if not isinstance(params, dict) or params.get("format") != FORMAT:
+        found = params.get("format") if isinstance(params, dict) else params
+        raise ValueError(f"{path}: unsupported IRT parameter format {found!r}")
+    return params
+
+
+def estimate(params, test, scored):
+    """EAP ability for one test's scored responses, or None without calibrated items"""
+    model = (params or {}).get("tests", {}).get(test)
+    if not model:
+        return None
+    items = [(model["items"][item], correct) for item, correct in scored.items() if item in model["items"]]
+    if not items:
+        return None
+    nodes, weights = quadrature()
+    log_posterior = []
+    for theta, weight in zip(nodes, weights):
+        total = math.log(weight)
+        for item, correct in items:
+            z = item["a"] * (theta - item["b"])
+            # log sigmoid(+-z) without overflow
+            z = z if correct else -z
+            total -= math.log1p(math.exp(-z)) if z > 0 else math.log1p(math.exp(z)) - z
+        log_posterior.append(total)
+    peak = max(log_posterior)
+    posterior = [math.exp(value - peak) for value in log_posterior]
+    norm = sum(posterior)
+    mean = sum(theta * p for theta, p in zip(nodes, posterior)) / norm
+    variance = sum((theta - mean) ** 2 * p for theta, p in zip(nodes, posterior)) / norm
+    return Ability(mean, math.sqrt(variance), len(items), params.get("version"))
+
+
+def uninformative_items(params, test, min_discrimination=MIN_DISCRIMINATION):
+    """Calibrated items of a test whose discrimination is below the threshold"""
+    model = (params or {}).get("tests", {}).get(test, {})
+    return [item for item, values in model.get("items", {}).items() if values["a"] < min_discrimination]
+
+
+_params = None
+_params_loaded = False
+_params_lock = threading.Lock()
+
+
+def get_params():
+    """Parameters from PARAMS_PATH, read once per process (None if not calibrated or unreadable)"""
+    global _params, _params_loaded
+    if not _params_loaded:
+        with _params_lock:
+            if not _params_loaded:
+                try:
+                    _params = load_params()
+                except (OSError, ValueError):
+                    # Results must still be shown and stored: score without IRT
+                    logger.exception("IRT parameters not loaded; ability estimates are off")
+                    _params = None
+                _params_loaded = True
+    return _params
+
+
+def ability(test, answers):
+    """Ability estimate for a stored-format answers dict with the process parameters"""
+    return estimate(get_params(), test, responses(test, answers))
@@ -0,0 +1,229 @@
+# Maritime Color Vision Test - IRT calibration job
+# Copyright © Toni Mandusic 2025
+#
+# Fits a 2PL model per Ishihara plate and per radar pair / contrast item
+# over every stored result and writes the parameter file irt.py scores
+# with. Estimation is marginal maximum likelihood by EM over a fixed
+# quadrature grid (Bock & Aitkin): the E-step is two matrix products per
+# chunk of sessions, the M-step a vectorized 2x2 Newton step for all items
+# at once, so the cost is linear in sessions. EM passes over every session
+# each iteration, so the responses are held in memory, one byte per session
+# and item (int8: -1 not shown, 0 wrong, 1 right); the float work arrays
+# only ever cover one chunk of sessions. Weak normal priors on the slope and intercept keep items that
+# (almost) everybody passes finite.
+#
+# Each result is scored against the protocol version it was given on
+# (irt.responses), so the items are the union over the stored versions: a
+# plate added by a later version gets its own column, answered only by the
+# sessions that saw it.
+#
+# Every run writes a new versioned file next to the active one and then
+# atomically replaces the active file; running apps pick it up on restart.
+#
+# Usage: python irt_calibrate.py [--db PATH] [--out PATH] [--min-sessions N]
+
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+import irt
+import protocol
+from results_store import DB_PATH, ResultsStore
+
+CHUNK_SIZE = 50000
+MAX_ITERATIONS = 500
+TOLERANCE = 1e-6  # relative change of the marginal log-likelihood
+NEWTON_STEPS = 3
+
+# Priors: slope a ~ N(1, 1), intercept c ~ N(0, 2^2)
+SLOPE_PRIOR = (1.0, 1.0)
+INTERCEPT_PRIOR = (0.0, 4.0)
+
+
+def items(test, rules):
+    """Item names of a test under one protocol version, in test order"""
+    if test == 'ishihara':
+        return [f"plate:{plate}" for plate in rules.used_plates]
+    return ([f"pair:{index}" for index in range(len(rules.radar_colors['critical_pairs']))]
+            + [f"contrast:{index}" for index in range(len(rules.radar_colors['contrast_targets']))])
+
+
+def response_matrix(store, test, chunk_size=CHUNK_SIZE):
+    """(responses, items): sessions x items int8 (-1 not shown, 0 wrong, 1 right) for one test, and the item names
+
+    The active protocol's items come first; items only older or newer
+    versions have are added as they turn up. Results on a protocol version
+    not archived here can't be scored and are left out.
+    """
+    columns = {item: index for index, item in enumerate(items(test, protocol.current()))}
+    blocks = []
+    for chunk in store.iter_results(chunk_size=chunk_size):
+        scored = []
+        for record in chunk:
+            if record["test"] != test:
+                continue
+            try:
+                scored.append(irt.responses(test, record["answers"]))
+            except KeyError:
+                continue
+        for responses in scored:
+            for item in responses:
+                columns.setdefault(item, len(columns))
+        block = np.full((len(scored), len(columns)), -1, dtype=np.int8)
+        for row, responses in enumerate(scored):
+            for item, correct in responses.items():
+                block[row, columns[item]] = correct
+        blocks.append(block)
+    # Earlier chunks predate the columns added since; they stay -1 there
+    matrix = np.full((sum(len(block) for block in blocks), len(columns)), -1, dtype=np.int8)
+    row = 0
+    while blocks:
+        block = blocks.pop(0)
+        matrix[row:row + len(block), :block.shape[1]] = block
+        row += len(block)
+    return matrix, list(columns)
+
+
+def _log_sigmoid(z):
+    return -np.logaddexp(0.0, -z)
+
+
+def _chunks(matrix, chunk_size):
+    """(correct, wrong) float 0/1 arrays for each chunk of sessions"""
+    for start in range(0, matrix.shape[0], chunk_size):
+        block = matrix[start:start + chunk_size]
+        yield (block == 1).astype(np.float64), (block == 0).astype(np.float64)
+
+
+def fit_2pl(responses, max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE, chunk_size=CHUNK_SIZE):
+    """Marginal ML 2PL fit of an int8 response matrix (response_matrix)
+
+    Returns dict of arrays a, b, se_a, se_b, n, p_correct plus log_likelihood.
+    """
+    nodes, weights = (np.array(values) for values in irt.quadrature())
+    log_weights = np.log(weights)
+    items = responses.shape[1]
+    a = np.ones(items)
+    c = np.zeros(items)
+    previous = None
+    for iteration in range(max_iterations):
+        # E-step: expected number of sessions (n) and of correct answers (r)
+        # per item at each quadrature node
+        z = a[:, None] * nodes[None, :] + c[:, None]
+        log_p, log_q = _log_sigmoid(z), _log_sigmoid(-z)
+        expected_n = np.zeros((items, nodes.size))
+        expected_r = np.zeros((items, nodes.size))
+        log_likelihood = 0.0
+        for correct, wrong in _chunks(responses, chunk_size):
+            joint = correct @ log_p + wrong @ log_q + log_weights
+            peak = joint.max(axis=1, keepdims=True)
+            posterior = np.exp(joint - peak)
+            total = posterior.sum(axis=1, keepdims=True)
+            posterior /= total
+            log_likelihood += float((np.log(total) + peak).sum())
+            expected_r += correct.T @ posterior
+            expected_n += (correct + wrong).T @ posterior
+        # M-step: Newton on each item's expected complete-data log-posterior
+        for _ in range(NEWTON_STEPS):
+            p = 1.0 / (1.0 + np.exp(-(a[:, None] * nodes + c[:, None])))
+            residual = expected_r - expected_n * p
+            weight = expected_n * p * (1.0 - p)
+            grad_a = (residual * nodes).sum(axis=1) - (a - SLOPE_PRIOR[0]) / SLOPE_PRIOR[1]
+            grad_c = residual.sum(axis=1) - (c - INTERCEPT_PRIOR[0]) / INTERCEPT_PRIOR[1]
+            h_aa = (weight * nodes * nodes).sum(axis=1) + 1.0 / SLOPE_PRIOR[1]
+            h_ac = (weight * nodes).sum(axis=1)
+            h_cc = weight.sum(axis=1) + 1.0 / INTERCEPT_PRIOR[1]
+            det = h_aa * h_cc - h_ac * h_ac
+            a = a + (h_cc * grad_a - h_ac * grad_c) / det
+            c = c + (h_aa * grad_c - h_ac * grad_a) / det
+        if previous is not None and abs(log_likelihood - previous) <= tolerance * abs(previous):
+            break
+        previous = log_likelihood
+    # Standard errors from the inverse information; b = -c / a by the delta method
+    var_a = h_cc / det
+    var_c = h_aa / det
+    cov_ac = -h_ac / det
+    b = -c / a
+    var_b = (c * c / a ** 4) * var_a + var_c / (a * a) - 2 * (c / a ** 3) * cov_ac
+    n = (responses >= 0).sum(axis=0)
+    return {
+        'a': a, 'b': b,
+        'se_a': np.sqrt(var_a), 'se_b': np.sqrt(np.maximum(var_b, 0.0)),
+        'n': n, 'p_correct': (responses == 1).sum(axis=0) / np.maximum(n, 1),
+        'log_likelihood': log_likelihood, 'iterations': iteration + 1,
+    }
+
+
+def calibrate(store, tests=irt.CALIBRATED_TESTS, min_sessions=100):
+    """Parameter file contents for the given tests (tests with too few sessions are left out)"""
+    now = datetime.now(timezone.utc)
+    params = {
+        'format': irt.FORMAT,
+        'version': now.strftime("%Y%m%dT%H%M%SZ"),
+        'fitted_at': now.isoformat(timespec="seconds"),
+        'model': '2pl',
+        'tests': {},
+    }
+    for test in tests:
+        responses, names = response_matrix(store, test)
+        if responses.shape[0] < min_sessions:
+            continue
+        fit = fit_2pl(responses)
+        params['tests'][test] = {
+            'sessions': int(responses.shape[0]),
+            'log_likelihood': fit['log_likelihood'],
+            'iterations': fit['iterations'],
+            'items': {
+                item: {key: round(float(fit[key][index]), 6) for key in ('a', 'b', 'se_a', 'se_b', 'p_correct')}
+                | {'n': int(fit['n'][index])}
+                for index, item in enumerate(names) if fit['n'][index]
+            },
+        }
+    return params
+
+
+def write_params(params, path=irt.PARAMS_PATH):
+    """Write the versioned file, then atomically make it the active one; returns the versioned path"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    stem, extension = os.path.splitext(os.path.basename(path))
+    versioned = os.path.join(directory, f"{stem}-{params['version']}{extension}")
+    body = json.dumps(params, indent=2, sort_keys=True)
+    with open(versioned, "w", encoding="utf-8") as f:
+        f.write(body)
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(body)
+    os.replace(temporary, path)
+    return versioned
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit 2PL item parameters from stored results")
+    parser.add_argument("--db", default=DB_PATH, help="results database (default: %(default)s)")
+    parser.add_argument("--out", default=irt.PARAMS_PATH, help="active parameter file (default: %(default)s)")
+    parser.add_argument("--min-sessions", type=int, default=100,
+                        help="skip tests with fewer stored results (default: %(default)s)")
+    args = parser.parse_args()
+
+    params = calibrate(ResultsStore(args.db), min_sessions=args.min_sessions)
+    if not params['tests']:
+        parser.exit(1, "Not enough stored results to calibrate any test\n")
+    versioned = write_params(params, args.out)
+    print(f"Wrote {versioned} (active: {args.out})")
+    for test, model in params['tests'].items():
+        print(f"\n{test}: {model['sessions']} sessions, {model['iterations']} EM iterations")
+        print(f"  {'item':<12} {'a':>7} {'b':>7} {'p':>6}")
+        for item, values in model['items'].items():
+            flag = "  low information" if values['a'] < irt.MIN_DISCRIMINATION else ""
+            print(f"  {item:<12} {values['a']:7.2f} {values['b']:7.2f} {values['p_correct']:6.2f}{flag}")
+        dropped = irt.uninformative_items(params, test)
+        if dropped:
+            print(f"  Candidates for removal (a < {irt.MIN_DISCRIMINATION}): {', '.join(dropped)}")
+
+
+if __name__ == "__main__":
+    main()
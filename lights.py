@@ -0,0 +1,101 @@
+# Maritime Color Vision Test - Lantern light rendering
+# Copyright © Toni Mandusic 2025
+#
+# A navigation light seen at night a couple of miles off is a point source:
+# a small, over-bright core that clips towards the channel limits, wrapped
+# in a glare halo from scatter in the eye, with haze adding more scatter
+# and taking light away. The lantern page used to draw flat 96 px circles;
+# it now shows sprites rendered here in linear light:
+#
+#   core    narrow Gaussian, peak = intensity setting x transmittance
+#   glare   wide Gaussian, stronger as haze scatters more of the light
+#   haze    Koschmieder transmittance exp(-3.912 d / V) over the viewing
+#           distance d for a meteorological visibility V (unset = clear)
+#
+# then encoded to sRGB on a black background. Scintillation (atmospheric
+# twinkle) is not baked into the pixels: the page animates the sprite's
+# brightness with CSS, so a light is one image however long it is shown.
+#
+# Sprites depend only on (color, size, intensity, visibility) - and the
+# display profile, see calibration.py - so assets.py renders each one once
+# per process; reruns only send Streamlit's URL for the cached image.
+#
+# Settings (MVT_LANTERN_*) apply to every session; they are stored with the
+# lantern results, since the viewing conditions are part of the outcome.
+
+import math
+import os
+from collections import namedtuple
+
+# Relative luminous intensity of the lantern's brightness settings
+INTENSITIES = {'high': 1.0, 'low': 0.25}
+# Peak core value (linear, 1 = channel limit) of a 'high' light in clear air
+CORE_PEAK = 6.0
+# Glare halo strength in clear air, and how much full haze adds
+GLARE = 0.025
+HAZE_GLARE = 0.2
+# Koschmieder's constant: 2 % contrast threshold
+KOSCHMIEDER = 3.912
+
+Lighting = namedtuple('Lighting', ['size', 'intensity', 'distance', 'visibility', 'scintillation'])
+
+
+def _settings():
+    intensity = os.environ.get("MVT_LANTERN_INTENSITY", "high")
+    if intensity not in INTENSITIES:
+        raise ValueError(f"MVT_LANTERN_INTENSITY must be one of {', '.join(INTENSITIES)}, not {intensity!r}")
+    visibility = os.environ.get("MVT_LANTERN_VISIBILITY", "")
+    return Lighting(
+        size=int(os.environ.get("MVT_LANTERN_SPRITE", 160)),
+        intensity=intensity,
+        distance=float(os.environ.get("MVT_LANTERN_DISTANCE", 2.0)),  # nautical miles
+        visibility=float(visibility) if visibility else None,  # nautical miles, None = clear
+        scintillation=os.environ.get("MVT_LANTERN_SCINTILLATION", "1") == "1")
+
+
+SETTINGS = _settings()
+
+
+def transmittance(distance, visibility):
+    """Fraction of the light that gets through the haze; 1 in clear air"""
+    if visibility is None:
+        return 1.0
+    return math.exp(-KOSCHMIEDER * distance / visibility)
+
+
+def _linear(color):
+    color = color.lstrip("#")
+    channels = [int(color[i:i + 2], 16) / 255 for i in (0, 2, 4)]
+    return [c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4 for c in channels]
+
+
+def render(color, size, intensity, transmitted=1.0):
+    """size x size x 3 uint8 sRGB sprite of a '#RRGGBB' light on black
+
+    intensity is relative (see INTENSITIES), transmitted the haze
+    transmittance over the viewing distance.
+    """
+    # Imported here: the app's cold start doesn't need numpy
+    import numpy as np
+
+    center = (size - 1) / 2
+    axis = np.arange(size, dtype=np.float64) - center
+    r2 = axis[None, :] ** 2 + axis[:, None] ** 2
+    core_sigma = max(0.8, size * 0.015)
+    glare_sigma = size * 0.1
+    glare = GLARE + HAZE_GLARE * (1 - transmitted)
+    profile = CORE_PEAK * intensity * transmitted * (
+        np.exp(-r2 / (2 * core_sigma ** 2)) + glare * np.exp(-r2 / (2 * glare_sigma ** 2)))
+    light = np.clip(profile[:, :, None] * np.array(_linear(color)), 0, 1)
+    encoded = np.where(light <= 0.0031308, light * 12.92, 1.055 * light ** (1 / 2.4) - 0.055)
+    return np.rint(encoded * 255).astype(np.uint8)
+
+
+def sprite_pixels(color, lighting=SETTINGS):
+    return render(color, lighting.size, INTENSITIES[lighting.intensity],
+                  transmittance(lighting.distance, lighting.visibility))
+
+
+def describe(lighting=SETTINGS):
+    air = "clear air" if lighting.visibility is None else f"visibility {lighting.visibility:g} NM"
+    return f"{lighting.intensity} intensity at {lighting.distance:g} NM, {air}"
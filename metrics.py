@@ -0,0 +1,305 @@
+# Maritime Color Vision Test - Runtime metrics
+# Copyright © Toni Mandusic 2025
+#
+# Process-wide counters, gauges and latency / size histograms shared by all
+# Streamlit sessions. The app times every page render and the expensive
+# helpers (reports, PDF generation, plate image loads); operators read the
+# numbers on the protected metrics page or scrape them in Prometheus text
+# format from a local HTTP endpoint (MVT_METRICS_PORT).
+#
+# Counters and histograms are sharded per thread: an update touches only
+# the calling thread's own dict (a bisect plus a couple of integer adds, no
+# lock), and a scrape sums the shards, folding those of finished script-run
+# threads into one so they don't pile up. Set MVT_METRICS=0 to turn
+# recording off entirely.
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+ENABLED = os.environ.get("MVT_METRICS", "1") != "0"
+METRICS_PORT = int(os.environ.get("MVT_METRICS_PORT", 0))  # 0 = no HTTP endpoint
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Shards:
+    """Per-thread {label values: value} dicts, each written only by its own thread"""
+
+    def __init__(self, merge):
+        self._merge = merge
+        self._local = threading.local()
+        self._shards = []  # (thread, values)
+        self._retired = {}  # merged values of threads that have finished
+        self._lock = threading.Lock()
+
+    def mine(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            # First update from this thread: the only one that takes the lock
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+            return values
+
+    def collect(self):
+        """All shards merged into a new dict"""
+        with self._lock:
+            live = []
+            for thread, values in self._shards:
+                if thread.is_alive():
+                    live.append((thread, values))
+                else:
+                    self._merge(self._retired, values)
+            self._shards = live
+            total = {}
+            self._merge(total, self._retired)
+            for _, values in live:
+                # dict() copies in one step, so the owner can keep updating
+                self._merge(total, dict(values))
+        return total
+
+
+def _merge_counts(into, values):
+    for label_values, value in values.items():
+        into[label_values] = into.get(label_values, 0) + value
+
+
+def _merge_buckets(into, values):
+    for label_values, counts in values.items():
+        counts = list(counts)
+        merged = into.get(label_values)
+        if merged is None:
+            into[label_values] = counts
+        else:
+            for index, count in enumerate(counts):
+                merged[index] += count
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._shards = _Shards(_merge_counts)
+
+    def inc(self, *label_values, amount=1):
+        if not ENABLED:
+            return
+        values = self._shards.mine()
+        values[label_values] = values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._shards.collect().get(label_values, 0)
+
+    def samples(self):
+        for label_values, value in self._shards.collect().items():
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+class Gauge:
+    """Value read from a callback at collection time, so it costs nothing to keep current"""
+    kind = "gauge"
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.labels = ()
+        self.read = read
+
+    def value(self):
+        return self.read()
+
+    def samples(self):
+        yield self.name, "", self.read()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket..., +Inf bucket, sum], per thread
+        self._shards = _Shards(_merge_buckets)
+
+    def observe(self, value, *label_values):
+        if not ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        values = self._shards.mine()
+        counts = values.get(label_values)
+        if counts is None:
+            counts = values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[index] += 1
+        counts[-1] += value
+
+    def series(self):
+        """{label values: (bucket counts, total count, sum)}, bucket counts not cumulative"""
+        return {label_values: (counts[:-1], sum(counts[:-1]), counts[-1])
+                for label_values, counts in self._shards.collect().items()}
+
+    def quantile(self, q, *label_values):
+        """Estimate a quantile by linear interpolation inside its bucket, like PromQL histogram_quantile"""
+        series = self.series().get(label_values)
+        if not series or not series[1]:
+            return None
+        counts, total, _ = series
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower  # +Inf bucket: best we can say is "above the last bound"
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def samples(self):
+        for label_values, (counts, total, total_sum) in self.series().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       _format_labels(self.labels, label_values, [("le", _format_value(bound))]), cumulative)
+            yield f"{self.name}_sum", _format_labels(self.labels, label_values), total_sum
+            yield f"{self.name}_count", _format_labels(self.labels, label_values), total
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name, factory):
+        # Get-or-create, so module reloads and Streamlit reruns share one metric
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(name, lambda: Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(name, lambda: Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, read):
+        gauge = self._register(name, lambda: Gauge(name, help, read))
+        gauge.read = read
+        return gauge
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PAGE_SECONDS = REGISTRY.histogram(
+    "mvt_page_render_seconds", "Script run time by page, including runs ended by st.rerun", ("page",))
+PAGE_ERRORS = REGISTRY.counter(
+    "mvt_page_errors_total", "Script runs that raised an exception, by page", ("page",))
+CALL_SECONDS = REGISTRY.histogram(
+    "mvt_call_seconds", "Time spent in expensive helpers", ("call",))
+PAYLOAD_BYTES = REGISTRY.histogram(
+    "mvt_payload_bytes", "Size of generated or loaded payloads", ("kind",), SIZE_BUCKETS)
+
+
+@contextmanager
+def timed(histogram, *label_values):
+    """Observe the wall time of the block, also when it exits via an exception (st.rerun)"""
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, *label_values)
+
+
+def timed_call(name):
+    """Decorator recording a function's run time in CALL_SECONDS under name"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                CALL_SECONDS.observe(time.perf_counter() - started, name)
+        return wrapper
+    return decorate
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port=METRICS_PORT, host="127.0.0.1"):
+    """Serve /metrics for a local Prometheus scraper; once per process, no-op when port is 0"""
+    global _server
+    if not port or _server is not None:
+        return _server
+    # http.server is only imported when the endpoint is enabled (cold start)
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes every few seconds would flood the Streamlit log
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
@@ -0,0 +1,238 @@
+# Maritime Color Vision Test - PDF reports
+# Copyright © Toni Mandusic 2025
+#
+# Certificate and comprehensive report generation. Imported by app.py only
+# when a candidate asks for a PDF, so fpdf stays out of the cold start.
+# Issued certificates (certificates.py) carry their signed ID and a QR
+# code, drawn as vector squares so it stays sharp when printed.
+
+import base64
+
+import qrcode
+from fpdf import FPDF
+
+import certificates
+import metrics
+
+class CertificatePDF(FPDF):
+    def header(self):
+        # Logo
+        self.image('https://i.postimg.cc/L8cW5X4H/phant-logo.png', 10, 8, 33)
+        self.set_font('Arial', 'B', 18)
+        self.cell(0, 10, 'MARITIME COLOR VISION CERTIFICATE', 0, 1, 'C')
+        self.ln(10)
+    
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+def draw_qr(pdf, text, x, y, size):
+    """QR code of text with its top left corner at (x, y), size mm wide"""
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=0)
+    qr.add_data(text)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    module = size / len(matrix)
+    pdf.set_fill_color(0, 0, 0)
+    for row, modules in enumerate(matrix):
+        # One rectangle per run of dark modules
+        column = 0
+        while column < len(modules):
+            if modules[column]:
+                start = column
+                while column < len(modules) and modules[column]:
+                    column += 1
+                pdf.rect(x + start * module, y + row * module, (column - start) * module, module, 'F')
+            else:
+                column += 1
+    pdf.set_fill_color(255, 255, 255)
+
+def certificate_verification(pdf, certificate, size=35):
+    """Signed certificate ID and its QR code, from the current position"""
+    if pdf.get_y() + size + 15 > pdf.h - pdf.b_margin:
+        pdf.add_page()
+    top = pdf.get_y()
+    draw_qr(pdf, certificates.qr_text(certificate), pdf.w - pdf.r_margin - size, top, size)
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 8, 'CERTIFICATE VERIFICATION', 0, 1, 'L')
+    pdf.set_font('Courier', 'B', 14)
+    pdf.cell(0, 10, certificates.display_id(certificate['cert_id']), 0, 1, 'L')
+    pdf.set_font('Arial', '', 9)
+    pdf.multi_cell(pdf.w - pdf.l_margin - pdf.r_margin - size - 5, 5,
+                   f"Issued {certificate['issued']}, key {certificate['key_id']}. Scan the code or enter "
+                   f"the ID on the verification page to confirm this certificate was issued with these results.")
+    pdf.set_y(max(pdf.get_y(), top + size) + 5)
+
+def generate_certificate(user_data, test_results, certificate=None):
+    pdf = CertificatePDF()
+    pdf.add_page()
+    
+    # Title
+    pdf.set_font('Arial', 'B', 24)
+    pdf.cell(0, 20, 'CERTIFICATE OF COLOR VISION ASSESSMENT', 0, 1, 'C')
+    pdf.ln(10)
+    
+    # Candidate Information
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, 'CANDIDATE INFORMATION', 0, 1, 'L')
+    pdf.set_font('Arial', '', 12)
+    
+    # FIX: Encode text to Latin-1 and replace unsupported characters
+    def safe_text(text):
+        if isinstance(text, str):
+            # Replace problematic characters
+            text = text.encode('latin-1', 'replace').decode('latin-1')
+        return str(text)
+    
+    pdf.cell(0, 8, f'Name: {safe_text(user_data["name"])}', 0, 1)
+    pdf.cell(0, 8, f'ID: {safe_text(user_data["id"])}', 0, 1)
+    pdf.cell(0, 8, f'Position: {safe_text(user_data["position"])}', 0, 1)
+    pdf.cell(0, 8, f'Date of Assessment: {safe_text(user_data["date"])}', 0, 1)
+    pdf.ln(10)
+    
+    # Test Results
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, 'TEST RESULTS SUMMARY', 0, 1, 'L')
+    
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(60, 10, 'Test', 1, 0, 'C')
+    pdf.cell(40, 10, 'Score', 1, 0, 'C')
+    pdf.cell(40, 10, 'Accuracy', 1, 0, 'C')
+    pdf.cell(50, 10, 'Status', 1, 1, 'C')
+    
+    pdf.set_font('Arial', '', 11)
+    for test in test_results:
+        pdf.cell(60, 10, safe_text(test['test']), 1, 0, 'L')
+        pdf.cell(40, 10, safe_text(test['score']), 1, 0, 'C')
+        pdf.cell(40, 10, safe_text(test['accuracy']), 1, 0, 'C')
+        status_color = (0, 128, 0) if test['status'] == 'PASS' else (255, 0, 0)
+        pdf.set_text_color(*status_color)
+        pdf.cell(50, 10, safe_text(test['status']), 1, 1, 'C')
+        pdf.set_text_color(0, 0, 0)
+    
+    pdf.ln(10)
+    
+    # Overall Assessment
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, 'OVERALL ASSESSMENT', 0, 1, 'L')
+    
+    passed_tests = sum(1 for test in test_results if test['status'] == 'PASS')
+    total_tests = len(test_results)
+    
+    if passed_tests == total_tests:
+        pdf.set_text_color(0, 128, 0)
+        pdf.set_font('Arial', 'B', 16)
+        pdf.cell(0, 12, 'OVERALL RESULT: PASS', 0, 1, 'L')
+        pdf.set_font('Arial', '', 12)
+        pdf.multi_cell(0, 8, safe_text('The candidate has demonstrated satisfactory color vision capabilities for maritime duties. Performance meets IMO standards for navigation and lookout responsibilities.'))
+    else:
+        pdf.set_text_color(255, 0, 0)
+        pdf.set_font('Arial', 'B', 16)
+        pdf.cell(0, 12, 'OVERALL RESULT: FAIL', 0, 1, 'L')
+        pdf.set_font('Arial', '', 12)
+        pdf.multi_cell(0, 8, safe_text('The candidate has not met the required standards for color vision in maritime operations. Further professional assessment is recommended.'))
+    
+    pdf.set_text_color(0, 0, 0)
+    pdf.ln(10)
+    
+    # Professional Endorsement
+    pdf.set_font('Arial', 'I', 10)
+    pdf.multi_cell(0, 8, safe_text('This certificate is issued based on computerized color vision assessment. For official medical certification, consult a qualified maritime medical examiner.'))
+    
+    if certificate is not None:
+        pdf.ln(5)
+        certificate_verification(pdf, certificate)
+    
+    # Signature area
+    pdf.ln(20)
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 10, 'Maritime Color Vision Test System', 0, 1, 'C')
+    pdf.set_font('Arial', 'I', 10)
+    pdf.cell(0, 10, 'Copyright © Toni Mandusic 2025', 0, 1, 'C')
+    
+    return pdf
+
+@metrics.timed_call("generate_comprehensive_pdf")
+def generate_comprehensive_pdf(user_data, results_data, certificate=None):
+    pdf = FPDF()
+    pdf.add_page()
+    
+    # Header
+    pdf.set_font('Arial', 'B', 24)
+    pdf.cell(0, 20, 'COMPREHENSIVE COLOR VISION ASSESSMENT', 0, 1, 'C')
+    pdf.ln(10)
+    
+    # Candidate Information
+    pdf.set_font('Arial', 'B', 16)
+    pdf.cell(0, 10, 'CANDIDATE INFORMATION', 0, 1, 'L')
+    pdf.set_font('Arial', '', 12)
+    
+    def safe_text(text):
+        if isinstance(text, str):
+            return text.encode('latin-1', 'replace').decode('latin-1')
+        return str(text)
+    
+    pdf.cell(0, 8, f'Name: {safe_text(user_data["name"])}', 0, 1)
+    pdf.cell(0, 8, f'ID: {safe_text(user_data["id"])}', 0, 1)
+    pdf.cell(0, 8, f'Position: {safe_text(user_data["position"])}', 0, 1)
+    pdf.cell(0, 8, f'Date: {safe_text(user_data["date"])}', 0, 1)
+    pdf.ln(10)
+    
+    # Test Results Summary
+    pdf.set_font('Arial', 'B', 16)
+    pdf.cell(0, 10, 'TEST RESULTS SUMMARY', 0, 1, 'L')
+    
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(80, 10, 'Test', 1, 0, 'C')
+    pdf.cell(40, 10, 'Score', 1, 0, 'C')
+    pdf.cell(40, 10, 'Accuracy', 1, 0, 'C')
+    pdf.cell(30, 10, 'Status', 1, 1, 'C')
+    
+    pdf.set_font('Arial', '', 10)
+    for test in results_data['tests_completed']:
+        pdf.cell(80, 10, safe_text(test['test']), 1, 0, 'L')
+        pdf.cell(40, 10, safe_text(test['score']), 1, 0, 'C')
+        pdf.cell(40, 10, safe_text(test['accuracy']), 1, 0, 'C')
+        status_color = (0, 128, 0) if test['status'] == 'PASS' else (255, 0, 0)
+        pdf.set_text_color(*status_color)
+        pdf.cell(30, 10, safe_text(test['status']), 1, 1, 'C')
+        pdf.set_text_color(0, 0, 0)
+    
+    pdf.ln(10)
+    
+    # Overall Assessment
+    passed_tests = sum(1 for test in results_data['tests_completed'] if test['status'] == 'PASS')
+    total_tests = len(results_data['tests_completed'])
+    
+    pdf.set_font('Arial', 'B', 16)
+    pdf.cell(0, 10, 'OVERALL ASSESSMENT', 0, 1, 'L')
+    
+    if passed_tests == total_tests:
+        pdf.set_text_color(0, 128, 0)
+        pdf.set_font('Arial', 'B', 14)
+        pdf.cell(0, 10, 'FIT FOR MARITIME DUTIES', 0, 1, 'L')
+    elif passed_tests >= total_tests * 0.7:
+        pdf.set_text_color(255, 165, 0)
+        pdf.set_font('Arial', 'B', 14)
+        pdf.cell(0, 10, 'CONDITIONALLY FIT', 0, 1, 'L')
+    else:
+        pdf.set_text_color(255, 0, 0)
+        pdf.set_font('Arial', 'B', 14)
+        pdf.cell(0, 10, 'FURTHER ASSESSMENT REQUIRED', 0, 1, 'L')
+    
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font('Arial', 'I', 10)
+    pdf.multi_cell(0, 8, safe_text('This comprehensive report is generated by the Maritime Color Vision Test System. For official medical certification, consult a qualified maritime medical examiner.'))
+    
+    if certificate is not None:
+        pdf.ln(5)
+        certificate_verification(pdf, certificate)
+    
+    return pdf
+
+def create_download_link(pdf_output, filename):
+    """Generate a download link for PDF"""
+    b64 = base64.b64encode(pdf_output).decode()
+    href = f'<a href="data:application/octet-stream;base64,{b64}" download="{filename}">Download Certificate</a>'
+    return href
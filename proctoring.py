@@ -0,0 +1,236 @@
+# Maritime Color Vision Test - Response timing anomaly detection
+# Copyright © Toni Mandusic 2025
+#
+# Remote candidates can look answers up or get help; the only trace is in
+# how they answer. Every answer event (Ishihara plates, lantern responses,
+# radar items) and every return to the test tab is fed to a streaming
+# detector that keeps a fixed handful of numbers per session: an EWMA of
+# answer latency and its variance, counts of very fast answers, long pauses,
+# changed answers, tab switches and answers given right after a tab switch.
+# No event history is kept, so memory is constant per session and bounded
+# overall by MAX_TRACKED; sessions idle for IDLE_SECONDS are dropped.
+#
+# A session is flagged the moment one of the rules below trips, and the
+# proctor view (app.py, ?view=proctor) lists flagged sessions live.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+MAX_TRACKED = int(os.environ.get("MVT_PROCTOR_MAX_SESSIONS", 10000))
+IDLE_SECONDS = float(os.environ.get("MVT_PROCTOR_IDLE", 2 * 3600))
+
+EWMA_ALPHA = 0.3
+MIN_ANSWERS = 5  # before latency rules apply
+
+# Flag rules
+FAST_SECONDS = 1.0  # EWMA latency below this: answers known in advance or scripted
+PAUSE_SECONDS = 20.0  # a pause is at least this long and 3 sd above the session's norm
+PAUSE_Z = 3.0
+MAX_PAUSES = 3
+MAX_CHANGES = 6
+MAX_TAB_SWITCHES = 3
+AFTER_SWITCH_SECONDS = 5.0  # an answer this soon after coming back to the tab
+MAX_ANSWERS_AFTER_SWITCH = 2
+
+FAST = 'fast_answers'
+PAUSES = 'long_pauses'
+CHANGES = 'answer_changes'
+TAB_SWITCHES = 'tab_switches'
+ANSWERS_AFTER_SWITCH = 'answers_after_tab_switch'
+
+FLAGS = metrics.REGISTRY.counter(
+    "mvt_proctor_flags_total", "Sessions flagged by the timing detector, by rule", ("rule",))
+EVENTS = metrics.REGISTRY.counter(
+    "mvt_proctor_events_total", "Events consumed by the timing detector", ("kind",))
+
+
+class SessionTiming:
+    """Running statistics of one session; a fixed set of numbers whatever the test length"""
+    __slots__ = ('label', 'started_at', 'last_seen', 'item_shown_at', 'answered', 'answers',
+                 'mean_latency', 'latency_var', 'fast', 'pauses', 'changes',
+                 'tab_switches', 'switch_seen', 'returned_at', 'answers_after_switch',
+                 'flags', 'flagged_at')
+
+    def __init__(self, now):
+        self.label = ""
+        self.started_at = now
+        self.last_seen = now
+        self.item_shown_at = now
+        self.answered = {}  # test -> bitmask of answered items
+        self.answers = 0
+        self.mean_latency = 0.0
+        self.latency_var = 0.0
+        self.fast = 0
+        self.pauses = 0
+        self.changes = 0
+        self.tab_switches = 0
+        self.switch_seen = 0  # last cumulative count reported by the browser
+        self.returned_at = None
+        self.answers_after_switch = 0
+        self.flags = ()
+        self.flagged_at = None
+
+    def _latency(self, latency):
+        if self.answers >= MIN_ANSWERS:
+            sd = self.latency_var ** 0.5
+            if latency >= PAUSE_SECONDS and latency > self.mean_latency + PAUSE_Z * sd:
+                self.pauses += 1
+        if latency < FAST_SECONDS:
+            self.fast += 1
+        self.answers += 1
+        if self.answers == 1:
+            self.mean_latency = latency
+            return
+        # Exponentially weighted mean and variance (West's incremental form)
+        delta = latency - self.mean_latency
+        self.mean_latency += EWMA_ALPHA * delta
+        self.latency_var = (1 - EWMA_ALPHA) * (self.latency_var + EWMA_ALPHA * delta * delta)
+
+    def rules(self):
+        """Rules this session currently trips"""
+        tripped = []
+        if self.answers >= MIN_ANSWERS and self.mean_latency < FAST_SECONDS:
+            tripped.append(FAST)
+        if self.pauses >= MAX_PAUSES:
+            tripped.append(PAUSES)
+        if self.changes >= MAX_CHANGES:
+            tripped.append(CHANGES)
+        if self.tab_switches >= MAX_TAB_SWITCHES:
+            tripped.append(TAB_SWITCHES)
+        if self.answers_after_switch >= MAX_ANSWERS_AFTER_SWITCH:
+            tripped.append(ANSWERS_AFTER_SWITCH)
+        return tuple(tripped)
+
+    def row(self):
+        return {
+            'label': self.label,
+            'started_at': self.started_at,
+            'last_seen': self.last_seen,
+            'answers': self.answers,
+            'mean_latency': self.mean_latency,
+            'latency_sd': self.latency_var ** 0.5,
+            'fast': self.fast,
+            'pauses': self.pauses,
+            'changes': self.changes,
+            'tab_switches': self.tab_switches,
+            'answers_after_switch': self.answers_after_switch,
+            'flags': self.flags,
+            'flagged_at': self.flagged_at,
+        }
+
+
+class TimingDetector:
+    """Streaming per-session timing statistics, shared by all sessions of the process"""
+
+    def __init__(self, max_tracked=MAX_TRACKED, idle_seconds=IDLE_SECONDS):
+        self.max_tracked = max_tracked
+        self.idle_seconds = idle_seconds
+        self.flagged_total = 0
+        self._sessions = OrderedDict()  # session uid -> SessionTiming, least recently seen first
+        self._lock = threading.Lock()
+
+    def _session(self, session_uid, now):
+        # Caller holds the lock
+        session = self._sessions.get(session_uid)
+        if session is None:
+            session = self._sessions[session_uid] = SessionTiming(now)
+            self._expire(now)
+        else:
+            self._sessions.move_to_end(session_uid)
+        session.last_seen = now
+        return session
+
+    def _expire(self, now):
+        deadline = now - self.idle_seconds
+        while self._sessions:
+            session_uid, session = next(iter(self._sessions.items()))
+            if session.last_seen >= deadline and len(self._sessions) <= self.max_tracked:
+                break
+            del self._sessions[session_uid]
+
+    def _check(self, session, now):
+        tripped = session.rules()
+        new = [rule for rule in tripped if rule not in session.flags]
+        if new:
+            if not session.flags:
+                session.flagged_at = now
+                self.flagged_total += 1
+            session.flags = tripped
+            for rule in new:
+                FLAGS.inc(rule)
+
+    def identify(self, session_uid, label, now=None):
+        """Name shown for the session in the proctor view"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._session(session_uid, now).label = label
+
+    def item_shown(self, session_uid, now=None):
+        """A new item appeared (test start, navigation, new scene); latency counts from here"""
+        now = time.time() if now is None else now
+        EVENTS.inc('item')
+        with self._lock:
+            self._session(session_uid, now).item_shown_at = now
+
+    def answer(self, session_uid, test, item, now=None):
+        """An answer to item (an index within test); a repeat answer counts as a change"""
+        now = time.time() if now is None else now
+        EVENTS.inc('answer')
+        with self._lock:
+            session = self._session(session_uid, now)
+            answered = session.answered.get(test, 0)
+            if answered >> item & 1:
+                session.changes += 1
+            else:
+                session.answered[test] = answered | 1 << item
+                session._latency(now - session.item_shown_at)
+                if session.returned_at is not None and now - session.returned_at <= AFTER_SWITCH_SECONDS:
+                    session.answers_after_switch += 1
+            # Items that advance by themselves (radar pairs) start timing here
+            session.item_shown_at = now
+            self._check(session, now)
+
+    def tab_switches(self, session_uid, count, now=None):
+        """Cumulative count of times the candidate left the tab, as reported by the browser"""
+        now = time.time() if now is None else now
+        with self._lock:
+            session = self._session(session_uid, now)
+            if count <= session.switch_seen:
+                return
+            EVENTS.inc('tab_switch', amount=count - session.switch_seen)
+            session.tab_switches += count - session.switch_seen
+            session.switch_seen = count
+            session.returned_at = now
+            self._check(session, now)
+
+    def sessions(self, flagged_only=False):
+        """{session uid: stats dict}, most recently seen first"""
+        with self._lock:
+            return {session_uid: session.row() for session_uid, session in reversed(self._sessions.items())
+                    if session.flags or not flagged_only}
+
+    def tracked_count(self):
+        return len(self._sessions)
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector():
+    """Process-wide timing detector shared by every Streamlit session"""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                detector = TimingDetector()
+                metrics.REGISTRY.gauge("mvt_proctor_sessions_tracked", "Sessions with timing statistics in memory",
+                                       detector.tracked_count)
+                metrics.REGISTRY.gauge("mvt_proctor_sessions_flagged", "Sessions flagged since start",
+                                       lambda: detector.flagged_total)
+                _detector = detector
+    return _detector
@@ -0,0 +1,128 @@
+# Maritime Color Vision Test - Candidate progress bus
+# Copyright © Toni Mandusic 2025
+#
+# In-process publish / subscribe for live candidate progress. A session
+# publishes its status (page, plate, lantern pair, ECDIS group, radar
+# subtest) at the end of a script run, and only when it changed. Every
+# subscriber - a proctor page - has its own pending table keyed by session,
+# so a candidate that moves three plates between two proctor refreshes
+# costs one entry, and a refresh only touches the sessions that changed.
+# The bus retains each session's latest status so a new subscriber starts
+# from a full snapshot, the way a retained MQTT topic does.
+#
+# Sessions that publish nothing for IDLE_SECONDS are dropped, and
+# subscribers are told; subscribers that stop polling are dropped too.
+
+import os
+import threading
+import time
+
+import metrics
+
+IDLE_SECONDS = float(os.environ.get("MVT_PROGRESS_IDLE", 3600))
+SUBSCRIBER_IDLE_SECONDS = 300
+
+PUBLISHED = metrics.REGISTRY.counter(
+    "mvt_progress_published_total", "Progress updates published by candidate sessions")
+
+
+class Subscription:
+    """One subscriber's pending updates: {session uid: status, or None once removed}"""
+
+    def __init__(self, bus, snapshot, now):
+        self._bus = bus
+        self.pending = snapshot
+        self.last_poll = now
+        self.closed = False
+
+    def poll(self, now=None):
+        """Updates since the previous poll (the full snapshot on the first one)"""
+        return self._bus._drain(self, time.time() if now is None else now)
+
+    def close(self):
+        self._bus._unsubscribe(self)
+
+
+class ProgressBus:
+    def __init__(self, idle_seconds=IDLE_SECONDS, subscriber_idle_seconds=SUBSCRIBER_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self.subscriber_idle_seconds = subscriber_idle_seconds
+        self._latest = {}  # session uid -> status dict
+        self._subscriptions = []
+        self._lock = threading.Lock()
+
+    def publish(self, session_uid, status, now=None):
+        """Retain a session's new status and queue it for every subscriber"""
+        now = time.time() if now is None else now
+        status = dict(status, updated_at=now)
+        PUBLISHED.inc()
+        with self._lock:
+            self._latest[session_uid] = status
+            for subscription in self._subscriptions:
+                subscription.pending[session_uid] = status
+
+    def remove(self, session_uid):
+        with self._lock:
+            if self._latest.pop(session_uid, None) is not None:
+                for subscription in self._subscriptions:
+                    subscription.pending[session_uid] = None
+
+    def subscribe(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            subscription = Subscription(self, dict(self._latest), now)
+            self._subscriptions.append(subscription)
+            return subscription
+
+    def _drain(self, subscription, now):
+        with self._lock:
+            self._expire(now)
+            updates = subscription.pending
+            subscription.pending = {}
+            subscription.last_poll = now
+            return updates
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+            subscription.closed = True
+
+    def _expire(self, now):
+        # Runs on subscribe / poll, i.e. every few seconds per proctor page,
+        # not on the candidates' publish path
+        deadline = now - self.idle_seconds
+        for session_uid in [uid for uid, status in self._latest.items() if status['updated_at'] < deadline]:
+            del self._latest[session_uid]
+            for subscription in self._subscriptions:
+                subscription.pending[session_uid] = None
+        subscriber_deadline = now - self.subscriber_idle_seconds
+        for subscription in [s for s in self._subscriptions if s.last_poll < subscriber_deadline]:
+            self._subscriptions.remove(subscription)
+            subscription.closed = True
+
+    def session_count(self):
+        return len(self._latest)
+
+    def subscriber_count(self):
+        return len(self._subscriptions)
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    """Process-wide progress bus shared by every Streamlit session"""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                bus = ProgressBus()
+                metrics.REGISTRY.gauge("mvt_progress_sessions", "Candidate sessions with live progress",
+                                       bus.session_count)
+                metrics.REGISTRY.gauge("mvt_progress_subscribers", "Proctor pages subscribed to progress",
+                                       bus.subscriber_count)
+                _bus = bus
+    return _bus
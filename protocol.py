@@ -0,0 +1,506 @@
+# Maritime Color Vision Test - Test protocol data
+# Copyright © Toni Mandusic 2025
+#
+# Answer keys, stimulus colors and pass rules. The constants below are the
+# built-in protocol, which the offline tools (analytics, codecs, IRT, the
+# observer simulation) read directly. The app runs whatever protocol file
+# is active (PROTOCOL_PATH, else the built-in one): a JSON definition with a
+# version name that is validated and compiled once into a Protocol object
+# holding ready lookup tables. Every worker re-checks the file's mtime and
+# swaps in a new version atomically; each test state keeps a reference to
+# the Protocol it was started with, so sessions in progress finish on their
+# version. Versions that have been active are archived under PROTOCOL_DIR
+# so a session restored from a checkpoint, on any worker, gets its own.
+#
+# Usage: python protocol.py export FILE     (the built-in protocol as a file to edit)
+#        python protocol.py publish FILE    (validate, archive and activate)
+#        python protocol.py show [FILE]     (summary of the active or given protocol)
+
+import argparse
+import json
+import os
+import re
+import threading
+
+import metrics
+
+PROTOCOL_PATH = os.environ.get("MVT_PROTOCOL", os.path.join("data", "protocol.json"))
+PROTOCOL_DIR = os.environ.get("MVT_PROTOCOL_DIR", os.path.join("data", "protocols"))
+FORMAT = 1
+BUILTIN_VERSION = "builtin"
+
+# Test data - CORRECTED Ishihara interpretations according to PDF
+# Using all plates EXCEPT: 3, 18, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38
+ISHIHARA_DATA = {
+    # Plate 1: Everyone sees 12
+    1: {"normal": "12", "deutan": "12", "protan": "12"},
+    
+    # Plate 2: Normal vs Red-green deficiency
+    2: {"normal": "8", "deutan": "3", "protan": "3"},
+    
+    # Plate 4-9: Normal vs Red-green deficiency
+    4: {"normal": "29", "deutan": "70", "protan": "70"},
+    5: {"normal": "57", "deutan": "35", "protan": "35"},
+    6: {"normal": "5", "deutan": "2", "protan": "2"},
+    7: {"normal": "3", "deutan": "5", "protan": "5"},
+    8: {"normal": "15", "deutan": "17", "protan": "17"},
+    9: {"normal": "74", "deutan": "21", "protan": "21"},
+    
+    # Plates 10-17: Normal sees number, colorblind sees nothing/wrong
+    10: {"normal": "2", "deutan": "", "protan": ""},
+    11: {"normal": "6", "deutan": "", "protan": ""},
+    12: {"normal": "97", "deutan": "", "protan": ""},
+    13: {"normal": "45", "deutan": "", "protan": ""},
+    14: {"normal": "5", "deutan": "", "protan": ""},
+    15: {"normal": "7", "deutan": "", "protan": ""},
+    16: {"normal": "16", "deutan": "", "protan": ""},
+    17: {"normal": "73", "deutan": "", "protan": ""},
+    
+    # Plates 19-21: Normal sees nothing, colorblind sees number
+    19: {"normal": "", "deutan": "2", "protan": "2"},
+    20: {"normal": "", "deutan": "45", "protan": "45"},
+    21: {"normal": "", "deutan": "73", "protan": "73"},
+    
+    # Plates 22-25: Different numbers for different types
+    22: {"normal": "26", "deutan": "2", "protan": "6"},
+    23: {"normal": "42", "deutan": "4", "protan": "2"},
+    24: {"normal": "35", "deutan": "3", "protan": "5"},
+    25: {"normal": "96", "deutan": "9", "protan": "6"}
+}
+
+# List of plates we're actually using (all except excluded ones)
+USED_PLATES = [1, 2, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 19, 20, 21, 22, 23, 24, 25]
+TOTAL_PLATES = len(USED_PLATES)
+
+LANTERN_COLORS = {
+    'red': {'name': 'Red', 'hex': '#FF0000'},
+    'green': {'name': 'Green', 'hex': '#00FF00'}, 
+    'yellow': {'name': 'Yellow', 'hex': '#FFD200'},
+    'white': {'name': 'White', 'hex': '#FFFFFF'}
+}
+
+LANTERN_SEQUENCES = [
+    ('red', 'green'), ('red', 'white'), ('green', 'white'),
+    ('yellow', 'yellow'), ('red', 'red'), ('green', 'green'),
+    ('white', 'white'), ('red', 'yellow'), ('green', 'yellow')
+]
+
+ECDIS_FM_COLORS = [
+    # Sea blues
+    ['#AEE9FF', '#9BDDF5', '#88D1EB', '#75C5E1', '#62B9D7', '#4FADCD', '#3CA1C3', '#2995B9'],
+    # Land browns
+    ['#E5D8A6', '#D4C895', '#C3B884', '#B2A873', '#A19862', '#908851', '#7F7840', '#6E682F'],
+    # Depth blues
+    ['#0076BF', '#006BAC', '#005F99', '#005386', '#004773', '#003B60', '#002F4D', '#00233A'],
+    # Navigation yellows
+    ['#FFAA00', '#E69900', '#CC8800', '#B37700', '#996600', '#805500', '#664400', '#4D3300'],
+    # Navigation greens
+    ['#44FF44', '#3CE03C', '#33C633', '#2AAD2A', '#229322', '#197A19', '#106110', '#084808'],
+    # Olive greens (new)
+    ['#808000', '#767A00', '#6D7400', '#636E00', '#596800', '#4F6200', '#455C00', '#3B5600'],
+    # Dark purples (new)
+    ['#4B0082', '#45007A', '#3F0072', '#39006A', '#330062', '#2D005A', '#270052', '#21004A']
+]
+
+ECDIS_GROUP_NAMES = ["Sea Blues", "Land Browns", "Depth Blues", "Navigation Yellows",
+                     "Navigation Greens", "Olive Greens", "Dark Purples"]
+
+# RADAR COLOR TEST DATA - DODANO
+RADAR_COLORS = {
+    'critical_pairs': [
+        ['#80FF80', '#80FF80'],  # identične
+        ['#FF8080', '#FF6060'],  # vrlo slične crvene
+        ['#80FF80', '#60FF60'],  # vrlo slične zelene  
+        ['#FFD200', '#FFB000'],  # slične žute
+        ['#FF8080', '#80FF80'],  # različite (crvena vs zelena)
+        ['#FFD200', '#80FF80'],  # različite (žuta vs zelena)
+    ],
+    'intensity_scale': [
+        '#004400', '#006600', '#008800', '#00AA00', '#00CC00', '#00EE00', '#80FF80', '#FFFFFF'
+    ],
+    'contrast_targets': [
+        {'bg': '#000818', 'target': '#80FF80', 'visible': True},    # ZELENI na tamnoplavoj - VIDLJIV
+        {'bg': '#000818', 'target': '#404040', 'visible': False},   # TAMNOSIVI na tamnoplavoj - NEVIDLJIV
+        {'bg': '#1A3D7C', 'target': '#80FF80', 'visible': True},    # ZELENI na svijetloplavoj - VIDLJIV  
+        {'bg': '#1A3D7C', 'target': '#606060', 'visible': False},   # SIVI na svijetloplavoj - NEVIDLJIV
+    ]
+}
+
+# Pass rules and timing
+ISHIHARA_PASS_ACCURACY = 80  # percent of plates answered like normal vision
+LANTERN_MAX_ERRORS = 1  # pairs with at least one misnamed light
+LANTERN_PAIR_SECONDS = 10
+ECDIS_PASS_ACCURACY = 80  # percent of colors in their place
+RADAR_PASS_ACCURACY = 80  # percent of radar points
+
+RELOADS = metrics.REGISTRY.counter(
+    "mvt_protocol_reloads_total", "Protocol file loads after an mtime change, by result", ("result",))
+
+_HEX = re.compile(r"#[0-9A-Fa-f]{6}")
+_VERSION = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{0,63}")
+
+
+class ProtocolError(ValueError):
+    """Protocol definition that can't be used"""
+
+
+def lightness(hex_color):
+    """CIE L* (D65) of an sRGB hex color"""
+    y = 0.0
+    for weight, offset in ((0.2126, 1), (0.7152, 3), (0.0722, 5)):
+        c = int(hex_color[offset:offset + 2], 16) / 255
+        y += weight * (c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4)
+    return 116 * y ** (1 / 3) - 16 if y > 216 / 24389 else y * 24389 / 27
+
+
+def _check(condition, message):
+    if not condition:
+        raise ProtocolError(message)
+
+
+def _colors(colors, what):
+    _check(isinstance(colors, list) and 0 < len(colors) <= 255, f"{what}: expected a list of 1-255 colors")
+    for color in colors:
+        _check(isinstance(color, str) and _HEX.fullmatch(color), f"{what}: {color!r} is not a #RRGGBB color")
+    return tuple(colors)
+
+
+class Protocol:
+    """One compiled protocol version; never modified once built"""
+    __slots__ = ('version', 'ishihara_data', 'used_plates', 'total_plates', 'plate_index', 'normal_answers',
+                 'ishihara_pass_accuracy', 'lantern_colors', 'lantern_palette', 'palette_index',
+                 'lantern_sequences', 'lantern_pair_seconds', 'lantern_max_errors',
+                 'ecdis_fm_colors', 'ecdis_group_names', 'ecdis_lightness', 'ecdis_pass_accuracy',
+                 'radar_colors', 'radar_same_pairs', 'radar_visible', 'radar_max_score', 'radar_pass_accuracy')
+
+    def __init__(self, definition):
+        """Validate a definition (the JSON layout of export) and build the lookup tables"""
+        try:
+            self._compile(definition)
+        except (KeyError, TypeError, ValueError, AttributeError) as exc:
+            if isinstance(exc, ProtocolError):
+                raise
+            raise ProtocolError(f"malformed protocol definition: {exc!r}") from None
+
+    def _compile(self, d):
+        _check(d.get("format") == FORMAT, f"unsupported protocol format {d.get('format')!r}")
+        _check(isinstance(d["version"], str) and _VERSION.fullmatch(d["version"]),
+               f"version must be a short name of letters, digits, '.', '_' or '-': {d['version']!r}")
+        self.version = d["version"]
+
+        ishihara = d["ishihara"]
+        self.ishihara_data = {}
+        for plate, key in ishihara["plates"].items():
+            _check(all(isinstance(key[kind], str) for kind in ("normal", "deutan", "protan")),
+                   f"plate {plate}: normal, deutan and protan readings must be strings")
+            self.ishihara_data[int(plate)] = {kind: key[kind].strip() for kind in ("normal", "deutan", "protan")}
+        self.used_plates = tuple(int(plate) for plate in ishihara["used_plates"])
+        _check(self.used_plates, "ishihara: no plates used")
+        _check(len(set(self.used_plates)) == len(self.used_plates), "ishihara: a plate is used twice")
+        missing = [plate for plate in self.used_plates if plate not in self.ishihara_data]
+        _check(not missing, f"ishihara: no answer key for plate(s) {missing}")
+        self.total_plates = len(self.used_plates)
+        self.plate_index = {plate: i for i, plate in enumerate(self.used_plates)}
+        self.normal_answers = tuple(self.ishihara_data[plate]["normal"] for plate in self.used_plates)
+        self.ishihara_pass_accuracy = float(ishihara["pass_accuracy"])
+        _check(0 <= self.ishihara_pass_accuracy <= 100, "ishihara: pass_accuracy must be a percentage")
+
+        lantern = d["lantern"]
+        self.lantern_colors = {}
+        for key, color in lantern["colors"].items():
+            # Answers are given by name and stored by key
+            _check(color["name"].lower() == key, f"lantern color {key!r}: name must be the key capitalized")
+            _check(_HEX.fullmatch(color["hex"]), f"lantern color {key!r}: {color['hex']!r} is not a #RRGGBB color")
+            self.lantern_colors[key] = {'name': color["name"], 'hex': color["hex"]}
+        _check(0 < len(self.lantern_colors) <= 127, "lantern: expected 1-127 colors")
+        self.lantern_palette = tuple(self.lantern_colors)
+        self.palette_index = {key: i for i, key in enumerate(self.lantern_palette)}
+        self.lantern_sequences = tuple(tuple(pair) for pair in lantern["sequences"])
+        _check(0 < len(self.lantern_sequences) <= 255, "lantern: expected 1-255 light pairs")
+        for pair in self.lantern_sequences:
+            _check(len(pair) == 2 and all(color in self.palette_index for color in pair),
+                   f"lantern: pair {list(pair)} must be two of {list(self.lantern_palette)}")
+        self.lantern_pair_seconds = float(lantern["pair_seconds"])
+        _check(self.lantern_pair_seconds > 0, "lantern: pair_seconds must be positive")
+        self.lantern_max_errors = int(lantern["max_errors"])
+        _check(self.lantern_max_errors >= 0, "lantern: max_errors can't be negative")
+
+        groups = d["ecdis"]["groups"]
+        # Added after format 1 was first published, hence the defaults
+        self.ecdis_pass_accuracy = float(d["ecdis"].get("pass_accuracy", ECDIS_PASS_ACCURACY))
+        self.radar_pass_accuracy = float(d["radar"].get("pass_accuracy", RADAR_PASS_ACCURACY))
+        _check(0 <= self.ecdis_pass_accuracy <= 100 and 0 <= self.radar_pass_accuracy <= 100,
+               "ecdis / radar: pass_accuracy must be a percentage")
+        _check(isinstance(groups, list) and 0 < len(groups) <= 255, "ecdis: expected 1-255 groups")
+        self.ecdis_group_names = tuple(str(group["name"]) for group in groups)
+        self.ecdis_fm_colors = tuple(_colors(group["colors"], f"ecdis {group['name']}") for group in groups)
+        self.ecdis_lightness = tuple(tuple(lightness(color) for color in colors) for colors in self.ecdis_fm_colors)
+        for name, values in zip(self.ecdis_group_names, self.ecdis_lightness):
+            # A group's listed order is its answer: lightest to darkest
+            _check(all(a >= b for a, b in zip(values, values[1:])), f"ecdis {name}: colors must go lightest to darkest")
+
+        radar = d["radar"]
+        pairs = tuple(tuple(_colors(list(pair), "radar pair")) for pair in radar["critical_pairs"])
+        _check(all(len(pair) == 2 for pair in pairs), "radar: critical pairs must have two colors")
+        scale = _colors(radar["intensity_scale"], "radar intensity scale")
+        scale_lightness = [lightness(color) for color in scale]
+        _check(all(a <= b for a, b in zip(scale_lightness, scale_lightness[1:])),
+               "radar: intensity scale must go weakest to strongest")
+        contrasts = tuple({'bg': _colors([target["bg"]], "radar contrast")[0],
+                           'target': _colors([target["target"]], "radar contrast")[0],
+                           'visible': bool(target["visible"])} for target in radar["contrast_targets"])
+        self.radar_colors = {'critical_pairs': pairs, 'intensity_scale': scale, 'contrast_targets': contrasts}
+        self.radar_same_pairs = tuple(color1 == color2 for color1, color2 in pairs)
+        self.radar_visible = tuple(target['visible'] for target in contrasts)
+        # Pairs, ordering positions, contrast targets, and 5 for the night count
+        self.radar_max_score = len(pairs) + len(scale) + len(contrasts) + 5
+
+    def definition(self):
+        """The plain JSON-friendly definition this protocol was compiled from"""
+        return {
+            'format': FORMAT,
+            'version': self.version,
+            'ishihara': {
+                'plates': {str(plate): dict(key) for plate, key in sorted(self.ishihara_data.items())},
+                'used_plates': list(self.used_plates),
+                'pass_accuracy': self.ishihara_pass_accuracy,
+            },
+            'lantern': {
+                'colors': {key: dict(color) for key, color in self.lantern_colors.items()},
+                'sequences': [list(pair) for pair in self.lantern_sequences],
+                'pair_seconds': self.lantern_pair_seconds,
+                'max_errors': self.lantern_max_errors,
+            },
+            'ecdis': {
+                'groups': [{'name': name, 'colors': list(colors)}
+                           for name, colors in zip(self.ecdis_group_names, self.ecdis_fm_colors)],
+                'pass_accuracy': self.ecdis_pass_accuracy,
+            },
+            'radar': {
+                'critical_pairs': [list(pair) for pair in self.radar_colors['critical_pairs']],
+                'intensity_scale': list(self.radar_colors['intensity_scale']),
+                'contrast_targets': [dict(target) for target in self.radar_colors['contrast_targets']],
+                'pass_accuracy': self.radar_pass_accuracy,
+            },
+        }
+
+    def ishihara_passed(self, accuracy):
+        return accuracy >= self.ishihara_pass_accuracy
+
+    def lantern_passed(self, errors):
+        return errors <= self.lantern_max_errors
+
+    def ecdis_passed(self, accuracy):
+        return accuracy >= self.ecdis_pass_accuracy
+
+    def radar_passed(self, accuracy):
+        return accuracy >= self.radar_pass_accuracy
+
+    def __repr__(self):
+        return f"<Protocol {self.version}>"
+
+
+def builtin_definition():
+    return {
+        'format': FORMAT,
+        'version': BUILTIN_VERSION,
+        'ishihara': {
+            'plates': {str(plate): key for plate, key in ISHIHARA_DATA.items()},
+            'used_plates': USED_PLATES,
+            'pass_accuracy': ISHIHARA_PASS_ACCURACY,
+        },
+        'lantern': {
+            'colors': LANTERN_COLORS,
+            'sequences': [list(pair) for pair in LANTERN_SEQUENCES],
+            'pair_seconds': LANTERN_PAIR_SECONDS,
+            'max_errors': LANTERN_MAX_ERRORS,
+        },
+        'ecdis': {
+            'groups': [{'name': name, 'colors': colors} for name, colors in zip(ECDIS_GROUP_NAMES, ECDIS_FM_COLORS)],
+            'pass_accuracy': ECDIS_PASS_ACCURACY,
+        },
+        'radar': dict(RADAR_COLORS, pass_accuracy=RADAR_PASS_ACCURACY),
+    }
+
+
+BUILTIN = Protocol(builtin_definition())
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        try:
+            definition = json.load(f)
+        except ValueError as exc:
+            raise ProtocolError(f"{path}: {exc}") from None
+    return Protocol(definition)
+
+
+def archive_path(version, directory=None):
+    return os.path.join(directory or PROTOCOL_DIR, f"{version}.json")
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def archive(protocol, directory=None):
+    """Keep a version's definition under PROTOCOL_DIR; a version name can't be reused for other content"""
+    path = archive_path(protocol.version, directory)
+    if os.path.exists(path):
+        if load(path).definition() != protocol.definition():
+            raise ProtocolError(f"version {protocol.version} is already archived with different content; "
+                                f"give the new protocol its own version name")
+        return path
+    _write_json(path, protocol.definition())
+    return path
+
+
+def publish(protocol, path=None, directory=None):
+    """Archive a compiled protocol and make it the active one (atomic rename)"""
+    _check(protocol.version != BUILTIN_VERSION, f"{BUILTIN_VERSION!r} is reserved for the built-in protocol")
+    archive(protocol, directory)
+    _write_json(path or PROTOCOL_PATH, protocol.definition())
+
+
+class ProtocolRegistry:
+    """The active protocol, reloaded when its file changes, and every version pinned by a session"""
+
+    def __init__(self, path=PROTOCOL_PATH, directory=PROTOCOL_DIR):
+        self.path = path
+        self.directory = directory
+        self._stamp = None  # (mtime_ns, size) of the loaded active file; None = built-in
+        self._active = BUILTIN
+        self._versions = {BUILTIN_VERSION: BUILTIN}
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The active protocol; one stat() per call, a reload only when the file changed"""
+        try:
+            st = os.stat(self.path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    self._reload(stamp)
+        return self._active
+
+    def _reload(self, stamp):
+        # Caller holds the lock. A broken file keeps the previous protocol
+        # active; the stamp is remembered so it isn't re-parsed every call
+        self._stamp = stamp
+        if stamp is None:
+            self._active = BUILTIN
+            return
+        try:
+            protocol = load(self.path)
+            known = self._versions.get(protocol.version)
+            if known is not None and known.definition() != protocol.definition():
+                raise ProtocolError(f"{self.path}: version {protocol.version} changed content")
+            archive(protocol, self.directory)
+            protocol = self._versions.setdefault(protocol.version, protocol)
+        except (OSError, ProtocolError):
+            RELOADS.inc('error')
+            return
+        RELOADS.inc('ok')
+        self._active = protocol
+
+    def get(self, version):
+        """A pinned version, from memory or the archive; KeyError if it was never archived"""
+        protocol = self._versions.get(version)
+        if protocol is not None:
+            return protocol
+        with self._lock:
+            if version not in self._versions:
+                if not _VERSION.fullmatch(version):
+                    raise KeyError(version)
+                try:
+                    protocol = load(archive_path(version, self.directory))
+                except FileNotFoundError:
+                    raise KeyError(version) from None
+                _check(protocol.version == version, f"archived protocol {version} names itself {protocol.version}")
+                self._versions[version] = protocol
+            return self._versions[version]
+
+    def version_count(self):
+        return len(self._versions)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Process-wide protocol registry shared by every Streamlit session"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = ProtocolRegistry()
+                metrics.REGISTRY.gauge("mvt_protocol_versions", "Protocol versions held in memory",
+                                       registry.version_count)
+                _registry = registry
+    return _registry
+
+
+def current():
+    return get_registry().current()
+
+
+def get_version(version):
+    return get_registry().get(version)
+
+
+def recorded(answers):
+    """The protocol a stored result was given on (its answers' pinned version)
+
+    Results from before versioned protocols carry none: they used the
+    built-in one. KeyError if the version was never archived here.
+    """
+    return get_version(answers.get('protocol', BUILTIN_VERSION))
+
+
+def summary(protocol):
+    return (f"Protocol {protocol.version}: {protocol.total_plates} Ishihara plates "
+            f"(pass >= {protocol.ishihara_pass_accuracy:g}%), {len(protocol.lantern_sequences)} lantern pairs "
+            f"({protocol.lantern_pair_seconds:g}s, pass <= {protocol.lantern_max_errors} error(s)), "
+            f"{len(protocol.ecdis_fm_colors)} ECDIS groups, {protocol.radar_max_score} radar points")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, publish or inspect test protocol files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write the built-in protocol as a file to edit")
+    export.add_argument("file")
+    export.add_argument("--version", default=None, help="version name for the exported copy")
+    publish_command = commands.add_parser("publish", help="validate, archive and activate a protocol file")
+    publish_command.add_argument("file")
+    show = commands.add_parser("show", help="summarize the active or a given protocol")
+    show.add_argument("file", nargs="?")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            definition = BUILTIN.definition()
+            if args.version:
+                definition['version'] = args.version
+            _write_json(args.file, definition)
+            print(f"Wrote protocol {definition['version']} to {args.file}")
+        elif args.command == "publish":
+            protocol = load(args.file)
+            publish(protocol)
+            print(f"{summary(protocol)}\nActive as {PROTOCOL_PATH}, archived in {archive_path(protocol.version)}")
+        else:
+            print(summary(load(args.file) if args.file else current()))
+    except (OSError, ProtocolError) as exc:
+        parser.exit(1, f"{exc}\n")
+
+
+if __name__ == "__main__":
+    main()
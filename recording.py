@@ -0,0 +1,134 @@
+# Maritime Color Vision Test - Session recording
+# Copyright © Toni Mandusic 2025
+#
+# Every session's inputs are appended to a small JSON-lines file so it can
+# be replayed later (benchmarks/replay.py): the seed and protocol version
+# each test was started with, every engine event with its arguments (answers, ECDIS moves, shuffle
+# and scene seeds), each script run with the page it rendered and how long
+# it took, and the scores stored with the results. Engine transitions are
+# deterministic, so these few lines reproduce the whole session.
+#
+# Lines are [kind, seconds since the header, *args]; a header object
+# starts the file and is repeated when a session continues in a new
+# process (restore after restart). Lines are buffered during a run and
+# appended once at its end, next to the checkpoint write.
+#
+# Recordings hold candidates' answers, so recording is off unless
+# MVT_RECORD=1, and recordings not written to for MVT_RECORDINGS_DAYS
+# (default 30) are deleted; the app prunes at most once an hour.
+
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RECORDINGS_DIR = os.environ.get("MVT_RECORDINGS_DIR", os.path.join("data", "recordings"))
+ENABLED = os.environ.get("MVT_RECORD", "0") == "1"
+RETENTION = float(os.environ.get("MVT_RECORDINGS_DAYS", 30)) * 86400
+PRUNE_INTERVAL = 3600
+FORMAT = 1
+
+START = 'start'    # test, seed, protocol version (absent: built-in)
+EVENT = 'event'    # test, event name, *event args
+RUN = 'run'        # page, seconds
+RESULT = 'result'  # test, score, status
+
+
+def recording_path(session_uid, directory=None):
+    if not re.fullmatch(r"[0-9a-f]{8,64}", session_uid):
+        raise ValueError(f"not a session uid: {session_uid!r}")
+    return os.path.join(directory or RECORDINGS_DIR, f"{session_uid}.jsonl")
+
+
+class SessionRecorder:
+    """Buffers one session's recording lines between flushes"""
+    __slots__ = ('path', 'started_at', 'pending')
+
+    def __init__(self, session_uid, now=None, **header):
+        self.path = recording_path(session_uid)
+        self.started_at = time.time() if now is None else now
+        self.pending = [dict(header, format=FORMAT, session=session_uid, started_at=self.started_at)]
+
+    def _add(self, kind, now, *args):
+        self.pending.append([kind, round(now - self.started_at, 3), *args])
+
+    def start(self, test, seed, now, protocol_version):
+        self._add(START, now, test, seed, protocol_version)
+
+    def event(self, test, event, now):
+        self._add(EVENT, now, test, *event)
+
+    def run(self, page, seconds, now):
+        self._add(RUN, now, page, round(seconds, 5))
+
+    def result(self, test, score, status, now):
+        self._add(RESULT, now, test, score, status)
+
+    def flush(self):
+        if not self.pending:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        body = "".join(json.dumps(line, separators=(",", ":")) + "\n" for line in self.pending)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(body)
+        self.pending.clear()
+
+
+def prune(directory=None, retention=RETENTION, now=None):
+    """Delete recordings last written more than retention seconds ago; returns how many"""
+    cutoff = (time.time() if now is None else now) - retention
+    removed = 0
+    for path in glob.glob(os.path.join(directory or RECORDINGS_DIR, "*.jsonl")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass  # pruned by another process
+    return removed
+
+
+_next_prune = 0.0
+_prune_lock = threading.Lock()
+
+
+def prune_due(now=None):
+    """prune() if PRUNE_INTERVAL has passed since this process last did"""
+    global _next_prune
+    now = time.time() if now is None else now
+    with _prune_lock:
+        if now < _next_prune:
+            return 0
+        _next_prune = now + PRUNE_INTERVAL
+    try:
+        return prune(now=now)
+    except OSError:
+        logger.exception("Pruning old recordings failed")
+        return 0
+
+
+def load(path):
+    """(headers, entries) of a recording; entries are [kind, absolute time, *args]"""
+    headers = []
+    entries = []
+    started_at = 0.0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line
+            if isinstance(record, dict):
+                if record.get("format") != FORMAT:
+                    raise ValueError(f"{path}: unsupported recording format {record.get('format')!r}")
+                headers.append(record)
+                started_at = record["started_at"]
+            else:
+                kind, offset, *args = record
+                entries.append([kind, started_at + offset, *args])
+    return headers, entries
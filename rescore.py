@@ -0,0 +1,283 @@
+# Maritime Color Vision Test - Bulk re-scoring
+# Copyright © Toni Mandusic 2025
+#
+# Re-scores every stored result against a protocol version (protocol.py):
+# after an answer key is corrected or a pass threshold changes, historical
+# results computed with the old rules are otherwise silently wrong. Stored
+# results are read in id-ordered chunks and scored on a process pool, with
+# only a few chunks in flight, so memory is bounded by the chunk size
+# however large the database is. New scores are written to the
+# result_versions table next to the original rows (which are never
+# touched), one row per result and protocol version.
+#
+# Scoring works from the stored answers. Radar answers are stored as
+# right / wrong per item, so they are decoded with the protocol the result
+# was recorded under (its 'protocol' field, else the built-in one). A
+# result is skipped, with the reason counted, when the new protocol asks
+# about something the candidate never saw (a plate added to the test, an
+# ECDIS color or radar item that wasn't shown).
+#
+# The report lists every result whose score or status changed; the summary
+# counts status transitions per test.
+#
+# Usage: python rescore.py [--db PATH] [--protocol FILE] [--report changes.csv]
+#                          [--workers N] [--chunk-size N] [--dry-run]
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import protocol
+from results_store import DB_PATH, ResultsStore, UPSERT_RESULT_VERSION, connect, format_timestamp
+
+CHUNK_SIZE = 5000
+
+REPORT_COLUMNS = ("result_id", "completed_at", "candidate_id", "candidate_name", "position", "test",
+                  "old_score", "new_score", "old_status", "new_status")
+
+# Skip reasons
+NOT_SHOWN = 'items_not_shown'
+UNKNOWN_PROTOCOL = 'unknown_protocol'
+UNKNOWN_TEST = 'unknown_test'
+MALFORMED = 'malformed_answers'
+
+
+class NotRescorable(Exception):
+    """The stored answers can't be scored under the new protocol; args[0] is the reason"""
+
+
+def _result(score, max_score, passed):
+    accuracy = score / max_score * 100 if max_score else 0.0
+    return score, max_score, accuracy, 'PASS' if passed(accuracy) else 'FAIL'
+
+
+def _ishihara(answers, target, recorded):
+    shown = set(recorded.used_plates)
+    if any(plate not in shown for plate in target.used_plates):
+        raise NotRescorable(NOT_SHOWN)
+    stored = answers.get('answers', {})
+    score = sum(1 for plate, normal in zip(target.used_plates, target.normal_answers)
+                if (stored.get(str(plate), stored.get(plate)) or "").strip() == normal)
+    return _result(score, target.total_plates, target.ishihara_passed)
+
+
+def _lantern(answers, target, recorded):
+    # Answers are stored with the lights shown, so only the rule can change
+    total = len(answers.get('sequence') or recorded.lantern_sequences)
+    correct = sum(1 for answer in answers.get('answers', {}).values()
+                  if answer['light1'] == answer['correct1'] and answer['light2'] == answer['correct2'])
+    score, max_score, accuracy, _ = _result(correct, total, lambda accuracy: True)
+    return score, max_score, accuracy, 'PASS' if target.lantern_passed(total - correct) else 'FAIL'
+
+
+def _placed(order, expected):
+    return sum(1 for placed, color in zip(order, expected) if placed == color)
+
+
+def _reorder(order, stored_score, recorded, target):
+    """Score of an ordering task under the target order
+
+    Orders are only scored when the candidate moves on (or checks), so the
+    stored score is kept where it doesn't match the stored order under the
+    recorded key: the order was never scored, or was changed afterwards.
+    """
+    if sorted(order) != sorted(target):
+        raise NotRescorable(NOT_SHOWN)
+    if list(recorded) == list(target) or _placed(order, recorded) != stored_score:
+        return stored_score
+    return _placed(order, target)
+
+
+def _ecdis(answers, target, recorded):
+    orders = answers.get('orders', [])
+    stored = answers.get('group_scores', [0] * len(orders))
+    if not len(orders) == len(target.ecdis_fm_colors) == len(recorded.ecdis_fm_colors):
+        raise NotRescorable(NOT_SHOWN)
+    groups = zip(orders, stored, recorded.ecdis_fm_colors, target.ecdis_fm_colors)
+    score = sum(_reorder(order, stored_score, recorded_colors, colors)
+                for order, stored_score, recorded_colors, colors in groups)
+    return _result(score, sum(len(colors) for colors in target.ecdis_fm_colors), target.ecdis_passed)
+
+
+def _rekey(correct, recorded_key, target_key):
+    """Right / wrong answers to yes / no items, re-marked against a new key"""
+    # The answer given was the recorded key where it was right, its opposite where wrong
+    return [(right == key) == new for right, key, new in zip(correct, recorded_key, target_key)]
+
+
+def _radar(answers, target, recorded):
+    scores = list(answers.get('subtest_scores', [0, 0, 0, 0]))
+    pairs = target.radar_colors['critical_pairs']
+    if pairs != recorded.radar_colors['critical_pairs']:
+        if len(pairs) != len(recorded.radar_same_pairs):
+            raise NotRescorable(NOT_SHOWN)
+        marked = _rekey(answers.get('pair_answers', []), recorded.radar_same_pairs, target.radar_same_pairs)
+        scores[0] = sum(marked) if len(marked) == len(pairs) else 0
+    scores[1] = _reorder(answers.get('intensity_order', []), scores[1],
+                         recorded.radar_colors['intensity_scale'], target.radar_colors['intensity_scale'])
+    contrasts = target.radar_colors['contrast_targets']
+    if contrasts != recorded.radar_colors['contrast_targets']:
+        if [(t['bg'], t['target']) for t in contrasts] != [
+                (t['bg'], t['target']) for t in recorded.radar_colors['contrast_targets']]:
+            raise NotRescorable(NOT_SHOWN)
+        marked = _rekey(answers.get('contrast_answers', []), recorded.radar_visible, target.radar_visible)
+        scores[2] = sum(marked) if len(marked) == len(contrasts) else 0
+    return _result(sum(scores), target.radar_max_score, target.radar_passed)
+
+
+SCORERS = {
+    'ishihara': _ishihara,
+    'lantern': _lantern,
+    'ecdis': _ecdis,
+    'radar': _radar,
+}
+
+
+def rescore(test, answers, target, recorded=protocol.BUILTIN):
+    """(score, max_score, accuracy, status) of stored answers under the target protocol"""
+    scorer = SCORERS.get(test)
+    if scorer is None:
+        raise NotRescorable(UNKNOWN_TEST)
+    try:
+        return scorer(answers, target, recorded)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise NotRescorable(MALFORMED) from None
+
+
+_target = None
+
+
+def _init_worker(definition):
+    global _target
+    _target = protocol.Protocol(definition)
+
+
+def rescore_chunk(rows, rescored_at):
+    """(result_versions rows, changed report rows, {test: rescored}, {(test, reason): skipped}) for raw rows"""
+    versions = []
+    changes = []
+    rescored = Counter()
+    skipped = Counter()
+    for row in rows:
+        try:
+            answers = json.loads(row['answers'])
+            try:
+                recorded = protocol.recorded(answers)
+            except KeyError:
+                raise NotRescorable(UNKNOWN_PROTOCOL) from None
+            score, max_score, accuracy, status = rescore(row['test'], answers, _target, recorded)
+        except NotRescorable as exc:
+            skipped[(row['test'], exc.args[0])] += 1
+            continue
+        except (ValueError, AttributeError):
+            skipped[(row['test'], MALFORMED)] += 1
+            continue
+        rescored[row['test']] += 1
+        versions.append((row['id'], _target.version, score, max_score, accuracy, status, rescored_at))
+        if score != row['score'] or status != row['status']:
+            changes.append((row['id'], row['completed_at'], row['candidate_id'], row['candidate_name'],
+                            row['position'], row['test'], row['score'], score, row['status'], status))
+    return versions, changes, rescored, skipped
+
+
+def _merge(summary, chunk_result, conn, report):
+    versions, changes, rescored, skipped = chunk_result
+    if conn is not None:
+        with conn:
+            conn.executemany(UPSERT_RESULT_VERSION, versions)
+    summary['rescored'].update(rescored)
+    summary['skipped'].update(skipped)
+    for change in changes:
+        test, old_status, new_status = change[5], change[8], change[9]
+        summary['changed'][test] += 1
+        if old_status != new_status:
+            summary['transitions'][(test, old_status, new_status)] += 1
+    if report is not None:
+        report.writerows(changes)
+
+
+def run(store, target, workers=None, chunk_size=CHUNK_SIZE, report=None, write=True):
+    """Re-score every stored result; returns a summary of Counters
+
+    report, if given, is a csv.writer that gets one row per changed result.
+    write=False only reports, without storing the new versions.
+    """
+    rescored_at = format_timestamp(time.time())
+    summary = {'rescored': Counter(), 'changed': Counter(), 'transitions': Counter(), 'skipped': Counter()}
+    workers = workers or os.cpu_count() or 1
+    conn = connect(store.path) if write else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(target.definition(),)) as pool:
+            pending = []
+            for chunk in store.iter_results(chunk_size=chunk_size, decode=False):
+                pending.append(pool.submit(rescore_chunk, chunk, rescored_at))
+                # Two chunks per worker in flight keep the pool busy without
+                # reading the whole table ahead; results merge in id order
+                if len(pending) >= 2 * workers:
+                    _merge(summary, pending.pop(0).result(), conn, report)
+            for future in pending:
+                _merge(summary, future.result(), conn, report)
+    finally:
+        if conn is not None:
+            conn.close()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored results against a protocol version")
+    parser.add_argument("--db", default=DB_PATH, help="results database (default: %(default)s)")
+    parser.add_argument("--protocol", help="protocol file to score with (default: the active protocol)")
+    parser.add_argument("--report", help="write changed results to this CSV file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="report changes without storing new versions")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"no results database at {args.db}")
+    try:
+        target = protocol.load(args.protocol) if args.protocol else protocol.current()
+        if not args.dry_run and target.version != protocol.BUILTIN_VERSION:
+            # Stored versions must stay resolvable, like pinned sessions
+            protocol.archive(target)
+    except (OSError, protocol.ProtocolError) as exc:
+        parser.exit(1, f"{exc}\n")
+    store = ResultsStore(args.db)
+
+    started = time.perf_counter()
+    report_file = open(args.report, "w", newline="", encoding="utf-8") if args.report else None
+    try:
+        report = None
+        if report_file is not None:
+            report = csv.writer(report_file)
+            report.writerow(REPORT_COLUMNS)
+        summary = run(store, target, args.workers, args.chunk_size, report, write=not args.dry_run)
+    except sqlite3.Error as exc:
+        parser.exit(1, f"{args.db}: {exc}\n")
+    finally:
+        if report_file is not None:
+            report_file.close()
+        store.close()
+    elapsed = time.perf_counter() - started
+
+    total = sum(summary['rescored'].values())
+    print(f"Re-scored {total} result(s) with protocol {target.version} in {elapsed:.1f}s"
+          + (" (dry run, nothing stored)" if args.dry_run else ""))
+    for test in sorted(set(summary['rescored']) | {test for test, _ in summary['skipped']}):
+        print(f"  {test:<10} {summary['rescored'][test]:>9} re-scored {summary['changed'][test]:>8} changed")
+    for (test, before, after), count in sorted(summary['transitions'].items()):
+        print(f"  {test:<10} {before} -> {after}: {count}")
+    for (test, reason), count in sorted(summary['skipped'].items()):
+        print(f"  {test:<10} skipped {count} ({reason.replace('_', ' ')})")
+    if args.report:
+        print(f"Changed results written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
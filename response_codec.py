@@ -0,0 +1,463 @@
+# Maritime Color Vision Test - Compact response codec
+# Copyright © Toni Mandusic 2025
+#
+# Bit-packed encodings of each test's responses for archive-scale analytics.
+# A Codec belongs to one protocol version: answers are coded against that
+# version's answer key, lantern palette, ECDIS trays and radar items, so
+# results are packed per version (pack_results, export_parquet.py --packed)
+# and get_codec(version) reads them back. Encoders take a sequence of
+# per-session answer dicts (the shape stored in the results store, see
+# persist_test_result() in app.py) and return one NumPy record per session;
+# past the single pass that reads the dicts, coding, bit packing, decoding
+# and scoring are array operations over all sessions at once.
+#
+#   Ishihara  4-bit answer code per plate, two plates per byte   (built-in: 12 bytes)
+#   Lantern   color codes of the shown and named lights, packed
+#             to as few bits as the palette needs, + answered bits  (built-in: 12 bytes)
+#   ECDIS     permutation rank per tray + 4-bit tray scores       (built-in: 18 bytes)
+#   Radar     answer bits, counts and subtest scores              (built-in:  6 bytes)
+
+import os
+import threading
+from math import factorial
+
+import numpy as np
+
+import protocol
+
+# Exported parts: <out>/packed/test=<test>/protocol=<version>/part-<first id>-<last id>.npz
+PACKED_DIR = "packed"
+
+# ---- Bit packing ------------------------------------------------------
+
+
+def pack_nibbles(codes):
+    """Pack (n, k) values < 16 into (n, ceil(k / 2)) bytes"""
+    if codes.shape[1] % 2:
+        codes = np.pad(codes, ((0, 0), (0, 1)))
+    return ((codes[:, 0::2] << 4) | codes[:, 1::2]).astype(np.uint8)
+
+
+def unpack_nibbles(packed, k):
+    codes = np.empty((packed.shape[0], packed.shape[1] * 2), dtype=np.uint8)
+    codes[:, 0::2] = packed >> 4
+    codes[:, 1::2] = packed & 0x0F
+    return codes[:, :k]
+
+
+def pack_codes(codes, bits):
+    """Pack (n, k) values < 2**bits into (n, ceil(k * bits / 8)) bytes, most significant bit first"""
+    shifts = np.arange(bits - 1, -1, -1, dtype=np.uint8)
+    planes = (codes.astype(np.uint8)[:, :, None] >> shifts) & 1
+    return np.packbits(planes.reshape(codes.shape[0], -1), axis=1)
+
+
+def unpack_codes(packed, k, bits):
+    planes = np.unpackbits(packed, axis=1, count=k * bits).reshape(packed.shape[0], k, bits)
+    return (planes << np.arange(bits - 1, -1, -1, dtype=np.uint8)).sum(axis=2, dtype=np.uint8)
+
+
+def _bit_fields(widths):
+    """{name: (offset, width)} laid out back to back, and the unsigned dtype that holds them"""
+    fields, offset = {}, 0
+    for name, width in widths.items():
+        fields[name] = (offset, width)
+        offset += width
+    if offset > 64:
+        raise ValueError(f"{offset} bits of radar responses don't fit in a 64-bit record")
+    return fields, np.dtype("<u4" if offset <= 32 else "<u8")
+
+
+# ---- Permutations (ECDIS trays, radar intensity order) ----------------
+
+
+def permutation_rank(perms):
+    """Lehmer rank of permutations along the last axis (vectorized)"""
+    k = perms.shape[-1]
+    weights = np.array([factorial(k - 1 - i) for i in range(k)], dtype=np.int64)
+    later_smaller = (perms[..., None, :] < perms[..., :, None]) & np.triu(np.ones((k, k), dtype=bool), 1)
+    return (later_smaller.sum(axis=-1) * weights).sum(axis=-1)
+
+
+def permutation_unrank(ranks, k):
+    """Inverse of permutation_rank: ranks of any shape -> ranks.shape + (k,)"""
+    ranks = np.asarray(ranks, dtype=np.int64)
+    perms = np.empty(ranks.shape + (k,), dtype=np.int8)
+    available = np.ones(ranks.shape + (k,), dtype=bool)
+    for i in range(k):
+        digit = (ranks // factorial(k - 1 - i)) % (k - i)
+        # Position of the digit-th still-available element
+        nth = np.cumsum(available, axis=-1) - 1
+        choice = np.argmax(available & (nth == digit[..., None]), axis=-1)
+        perms[..., i] = choice
+        np.put_along_axis(available, choice[..., None], False, axis=-1)
+    return perms
+
+
+_fixed_points = {}
+
+
+def fixed_point_table(k):
+    """Correct-position count for every rank of a k-permutation (k=8: 40320 bytes)"""
+    if k not in _fixed_points:
+        perms = permutation_unrank(np.arange(factorial(k)), k)
+        _fixed_points[k] = (perms == np.arange(k)).sum(axis=1).astype(np.uint8)
+    return _fixed_points[k]
+
+
+def rank_dtype(k):
+    """Smallest unsigned dtype holding every rank of a k-permutation plus the no-order marker"""
+    for dtype in ("<u2", "<u4", "<u8"):
+        if factorial(k) < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    raise ValueError(f"can't rank orders of {k} colors")
+
+
+def rank_orders(orders, reference, no_order):
+    """Ranks of color orders (one per session) against the reference order they permute; no_order where absent"""
+    index = {color: i for i, color in enumerate(reference)}
+    ranks = np.full(len(orders), no_order, dtype=np.uint64)
+    rows = [row for row, order in enumerate(orders) if order and len(order) == len(reference)]
+    if rows:
+        perms = np.array([[index[color] for color in orders[row]] for row in rows], dtype=np.int8)
+        ranks[rows] = permutation_rank(perms)
+    return ranks
+
+
+# ---- Codec ------------------------------------------------------------
+
+# Answers are coded against the answer key, so a wrong number that no
+# observer type would read decodes as OTHER rather than the literal digits
+PLATE_MISSING, PLATE_BLANK, PLATE_NORMAL, PLATE_DEUTAN, PLATE_PROTAN, PLATE_OTHER = range(6)
+
+RADAR_SUBTESTS = ("pairs_score", "intensity_score", "contrast_score", "night_score")
+# Most targets the night subtest scores
+RADAR_NIGHT_MAX = 5
+
+TESTS = ("ishihara", "lantern", "ecdis", "radar")
+
+
+class Codec:
+    """Encoders, decoders and scorers of the responses given on one protocol version"""
+
+    def __init__(self, rules):
+        self.version = rules.version
+
+        self.plates = rules.used_plates
+        self.plate_keys = tuple(str(plate) for plate in self.plates)
+        keys = [rules.ishihara_data[plate] for plate in self.plates]
+        self._readings = {kind: np.array([key[kind] for key in keys], dtype=str)
+                          for kind in ("normal", "deutan", "protan")}
+        # Plates where the correct response is "nothing"
+        self._blank_key = self._readings["normal"] == ""
+        # Answer text per (plate, code); None for MISSING
+        self._plate_text = np.array([[None, "", key["normal"], key["deutan"], key["protan"], "?"] for key in keys],
+                                    dtype=object)
+
+        self.palette = rules.lantern_palette
+        self.palette_index = rules.palette_index
+        self.lantern_pairs = len(rules.lantern_sequences)
+        self.color_bits = max(1, (len(self.palette) - 1).bit_length())
+        self.lantern_dtype = np.dtype([
+            ("shown", "u1", (-(-2 * self.lantern_pairs * self.color_bits // 8),)),
+            ("answers", "u1", (-(-2 * self.lantern_pairs * self.color_bits // 8),)),
+            ("answered", "u1", (-(-self.lantern_pairs // 8),)),
+        ])
+
+        self.trays = rules.ecdis_fm_colors
+        sizes = [len(tray) for tray in self.trays]
+        self.ecdis_ranks = rank_dtype(max(sizes))
+        self.ecdis_no_order = np.iinfo(self.ecdis_ranks).max
+        # Tray scores are correct positions: nibbles while no tray has 16 colors
+        self.ecdis_nibbles = max(sizes) < 16
+        self.ecdis_dtype = np.dtype([
+            ("ranks", self.ecdis_ranks, (len(self.trays),)),
+            ("scores", "u1", ((len(self.trays) + 1) // 2 if self.ecdis_nibbles else len(self.trays),)),
+        ])
+
+        self.scale = rules.radar_colors['intensity_scale']
+        self.radar_pairs = len(rules.radar_colors['critical_pairs'])
+        self.radar_contrasts = len(rules.radar_colors['contrast_targets'])
+        self.radar_fields, bits = _bit_fields({
+            "pair_bits": self.radar_pairs,
+            "pair_count": self.radar_pairs.bit_length(),
+            "contrast_bits": self.radar_contrasts,
+            "contrast_count": self.radar_contrasts.bit_length(),
+            "pairs_score": self.radar_pairs.bit_length(),
+            "intensity_score": len(self.scale).bit_length(),
+            "contrast_score": self.radar_contrasts.bit_length(),
+            "night_score": RADAR_NIGHT_MAX.bit_length(),
+        })
+        self.radar_ranks = rank_dtype(len(self.scale))
+        self.radar_no_order = np.iinfo(self.radar_ranks).max
+        self.radar_dtype = np.dtype([("bits", bits), ("intensity_rank", self.radar_ranks)])
+
+    # ---- Ishihara
+
+    def ishihara_codes(self, sessions):
+        """Unpacked (n, plates) uint8 codes from {'answers': {plate: str}} sessions (int or str keys)"""
+        given = np.zeros((len(sessions), len(self.plates)), dtype=bool)
+        text = []
+        for row, session in enumerate(sessions):
+            answers = session.get("answers", {})
+            found = [answers.get(key, answers.get(plate)) for plate, key in zip(self.plates, self.plate_keys)]
+            given[row] = [answer is not None for answer in found]
+            text.append([(answer or "").strip() for answer in found])
+        text = np.array(text, dtype=str).reshape(given.shape)
+        return np.select(
+            [~given, text == "", text == self._readings["normal"], text == self._readings["deutan"],
+             text == self._readings["protan"]],
+            [PLATE_MISSING, PLATE_BLANK, PLATE_NORMAL, PLATE_DEUTAN, PLATE_PROTAN], PLATE_OTHER).astype(np.uint8)
+
+    def encode_ishihara(self, sessions):
+        return pack_nibbles(self.ishihara_codes(sessions))
+
+    def decode_ishihara(self, packed):
+        """Decode to {'answers': {plate: str}} sessions; OTHER decodes as '?'"""
+        codes = unpack_nibbles(packed, len(self.plates))
+        text = self._plate_text[np.arange(len(self.plates)), codes]
+        return [{'answers': {key: answer for key, answer, code in zip(self.plate_keys, answers, row)
+                             if code != PLATE_MISSING}}
+                for answers, row in zip(text, codes)]
+
+    def ishihara_correct(self, packed):
+        """(n, plates) bool mask of correct plates, same rule as engine's Ishihara score"""
+        codes = unpack_nibbles(packed, len(self.plates))
+        # A missing answer counts as blank, which is correct on blank-key plates
+        blank = (codes == PLATE_BLANK) | (codes == PLATE_MISSING)
+        return np.where(self._blank_key, blank, codes == PLATE_NORMAL)
+
+    def score_ishihara(self, packed):
+        return self.ishihara_correct(packed).sum(axis=1)
+
+    # ---- Lantern
+
+    def encode_lantern(self, sessions):
+        """Encode {'sequence': [(c1, c2), ...], 'answers': {pair: {'light1', 'light2'}}} sessions"""
+        n, pairs, index = len(sessions), self.lantern_pairs, self.palette_index
+        shown = np.zeros((n, 2 * pairs), dtype=np.uint8)
+        answers = np.zeros((n, 2 * pairs), dtype=np.uint8)
+        answered = np.zeros((n, pairs), dtype=bool)
+        for row, session in enumerate(sessions):
+            sequence = [index[color] for pair in session.get("sequence", [])[:pairs] for color in pair]
+            shown[row, :len(sequence)] = sequence
+            for pair, answer in session.get("answers", {}).items():
+                pair = int(pair)
+                if answer and pair < pairs:
+                    answers[row, 2 * pair:2 * pair + 2] = index[answer["light1"]], index[answer["light2"]]
+                    answered[row, pair] = True
+        records = np.empty(n, dtype=self.lantern_dtype)
+        records["shown"] = pack_codes(shown, self.color_bits)
+        records["answers"] = pack_codes(answers, self.color_bits)
+        records["answered"] = np.packbits(answered, axis=1)
+        return records
+
+    def lantern_codes(self, records):
+        """Unpack to (shown, answers, answered): (n, pairs, 2) palette indices and (n, pairs) bool"""
+        n, pairs = len(records), self.lantern_pairs
+        shown = unpack_codes(records["shown"], 2 * pairs, self.color_bits).reshape(n, pairs, 2)
+        answers = unpack_codes(records["answers"], 2 * pairs, self.color_bits).reshape(n, pairs, 2)
+        answered = np.unpackbits(records["answered"], axis=1, count=pairs).astype(bool)
+        return shown, answers, answered
+
+    def decode_lantern(self, records):
+        shown, answers, answered = self.lantern_codes(records)
+        palette = np.array(self.palette, dtype=object)
+        shown, answers = palette[shown], palette[answers]
+        sessions = []
+        for row in range(len(records)):
+            sequence = shown[row].tolist()
+            sessions.append({'sequence': sequence, 'answers': {
+                str(pair): {'light1': answers[row, pair, 0], 'light2': answers[row, pair, 1],
+                            'correct1': sequence[pair][0], 'correct2': sequence[pair][1]}
+                for pair in np.flatnonzero(answered[row]).tolist()}})
+        return sessions
+
+    def lantern_correct(self, records):
+        """(n, pairs) bool mask of pairs answered with both lights correct"""
+        shown, answers, answered = self.lantern_codes(records)
+        return answered & (shown == answers).all(axis=2)
+
+    def score_lantern(self, records):
+        return self.lantern_correct(records).sum(axis=1)
+
+    # ---- ECDIS
+
+    def encode_ecdis(self, sessions):
+        """Encode {'orders': [[hex, ...] per tray], 'group_scores': [...]} sessions"""
+        trays = len(self.trays)
+        records = np.zeros(len(sessions), dtype=self.ecdis_dtype)
+        orders = [session.get("orders", []) for session in sessions]
+        for tray, reference in enumerate(self.trays):
+            records["ranks"][:, tray] = rank_orders([order[tray] if tray < len(order) else None for order in orders],
+                                                    reference, self.ecdis_no_order)
+        scores = np.zeros((len(sessions), trays), dtype=np.uint8)
+        for row, session in enumerate(sessions):
+            group_scores = session.get("group_scores", [])[:trays]
+            scores[row, :len(group_scores)] = group_scores
+        records["scores"] = pack_nibbles(scores) if self.ecdis_nibbles else scores
+        return records
+
+    def ecdis_group_scores(self, records):
+        """(n, trays) recorded tray scores"""
+        scores = records["scores"]
+        return unpack_nibbles(scores, len(self.trays)) if self.ecdis_nibbles else scores
+
+    def ecdis_order_scores(self, records):
+        """(n, trays) correct positions recomputed from the stored orders"""
+        ranks = records["ranks"]
+        scores = np.zeros(ranks.shape, dtype=np.uint8)
+        for tray, reference in enumerate(self.trays):
+            table = fixed_point_table(len(reference))
+            column = ranks[:, tray]
+            given = column != self.ecdis_no_order
+            scores[given, tray] = table[column[given].astype(np.int64)]
+        return scores
+
+    def decode_ecdis(self, records):
+        ranks = records["ranks"]
+        given = ranks != self.ecdis_no_order
+        orders = []
+        for tray, reference in enumerate(self.trays):
+            perms = permutation_unrank(np.where(given[:, tray], ranks[:, tray], 0), len(reference))
+            orders.append(np.array(reference, dtype=object)[perms])
+        group_scores = self.ecdis_group_scores(records)
+        return [{'orders': [orders[tray][row].tolist() for tray in range(len(self.trays)) if given[row, tray]],
+                 'group_scores': group_scores[row].tolist()}
+                for row in range(len(records))]
+
+    def score_ecdis(self, records):
+        return self.ecdis_group_scores(records).sum(axis=1)
+
+    # ---- Radar
+
+    def encode_radar(self, sessions):
+        """Encode {'subtest_scores', 'pair_answers', 'contrast_answers', 'intensity_order'} sessions"""
+        n = len(sessions)
+        pair_answers = np.zeros((n, self.radar_pairs), dtype=np.uint64)
+        contrast_answers = np.zeros((n, self.radar_contrasts), dtype=np.uint64)
+        values = {name: np.zeros(n, dtype=np.uint64) for name in self.radar_fields}
+        for row, session in enumerate(sessions):
+            pairs = session.get("pair_answers", [])[:self.radar_pairs]
+            contrasts = session.get("contrast_answers", [])[:self.radar_contrasts]
+            pair_answers[row, :len(pairs)] = pairs
+            contrast_answers[row, :len(contrasts)] = contrasts
+            values["pair_count"][row] = len(pairs)
+            values["contrast_count"][row] = len(contrasts)
+            for name, score in zip(RADAR_SUBTESTS, session.get("subtest_scores", [])):
+                values[name][row] = score
+        values["pair_bits"] = (pair_answers << np.arange(self.radar_pairs, dtype=np.uint64)).sum(
+            axis=1, dtype=np.uint64)
+        values["contrast_bits"] = (contrast_answers << np.arange(self.radar_contrasts, dtype=np.uint64)).sum(
+            axis=1, dtype=np.uint64)
+        bits = np.zeros(n, dtype=np.uint64)
+        for name, (offset, width) in self.radar_fields.items():
+            bits |= (values[name] & np.uint64((1 << width) - 1)) << np.uint64(offset)
+        records = np.empty(n, dtype=self.radar_dtype)
+        records["bits"] = bits
+        records["intensity_rank"] = rank_orders([session.get("intensity_order") for session in sessions],
+                                                self.scale, self.radar_no_order)
+        return records
+
+    def radar_field(self, records, name):
+        offset, width = self.radar_fields[name]
+        return (records["bits"].astype(np.uint64) >> np.uint64(offset)) & np.uint64((1 << width) - 1)
+
+    def radar_subtest_scores(self, records):
+        """(n, 4) recorded subtest scores in radar_scores order"""
+        return np.stack([self.radar_field(records, name) for name in RADAR_SUBTESTS], axis=1)
+
+    def decode_radar(self, records):
+        ranks = records["intensity_rank"]
+        given = ranks != self.radar_no_order
+        orders = np.array(self.scale, dtype=object)[permutation_unrank(np.where(given, ranks, 0), len(self.scale))]
+        fields = {name: self.radar_field(records, name).tolist() for name in self.radar_fields}
+        subtests = self.radar_subtest_scores(records).tolist()
+        return [{
+            'subtest_scores': subtests[row],
+            'pair_answers': [bool(fields["pair_bits"][row] >> i & 1) for i in range(fields["pair_count"][row])],
+            'contrast_answers': [bool(fields["contrast_bits"][row] >> i & 1)
+                                 for i in range(fields["contrast_count"][row])],
+            'intensity_order': orders[row].tolist() if given[row] else [],
+        } for row in range(len(records))]
+
+    def score_radar(self, records):
+        return self.radar_subtest_scores(records).sum(axis=1)
+
+    # ---- By test name
+
+    def encode(self, test, sessions):
+        return getattr(self, f"encode_{test}")(sessions)
+
+    def decode(self, test, packed):
+        return getattr(self, f"decode_{test}")(packed)
+
+    def score(self, test, packed):
+        return getattr(self, f"score_{test}")(packed)
+
+
+_codecs = {}
+_codecs_lock = threading.Lock()
+
+
+def get_codec(version=protocol.BUILTIN_VERSION):
+    """The codec of an archived protocol version, built once per process; KeyError if never archived"""
+    codec = _codecs.get(version)
+    if codec is None:
+        with _codecs_lock:
+            codec = _codecs.get(version)
+            if codec is None:
+                codec = _codecs[version] = Codec(protocol.get_version(version))
+    return codec
+
+
+def pack_results(store, test, chunk_size=50000):
+    """{protocol version: (result ids, packed responses)} for every stored result of one test type
+
+    Results on a version not archived here can't be coded and are left out.
+    """
+    ids, parts = {}, {}
+    for chunk in store.iter_results(chunk_size=chunk_size):
+        by_version = {}
+        for row in chunk:
+            if row["test"] == test:
+                by_version.setdefault(row["answers"].get('protocol', protocol.BUILTIN_VERSION), []).append(row)
+        for version, rows in by_version.items():
+            try:
+                codec = get_codec(version)
+            except KeyError:
+                continue
+            ids.setdefault(version, []).append(np.array([row["id"] for row in rows], dtype=np.int64))
+            parts.setdefault(version, []).append(codec.encode(test, [row["answers"] for row in rows]))
+    return {version: (np.concatenate(ids[version]), np.concatenate(parts[version])) for version in parts}
+
+
+def save_part(out_dir, test, version, ids, packed):
+    """Write one exported part; the file name carries the id range, so a re-run overwrites it"""
+    directory = os.path.join(out_dir, PACKED_DIR, f"test={test}", f"protocol={version}")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"part-{ids[0]:012d}-{ids[-1]:012d}.npz")
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, ids=ids, responses=packed)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def load_packed(out_dir, test):
+    """{protocol version: (result ids, packed responses)} from the parts exported for one test type"""
+    root = os.path.join(out_dir, PACKED_DIR, f"test={test}")
+    loaded = {}
+    if not os.path.isdir(root):
+        return loaded
+    for name in sorted(os.listdir(root)):
+        if not name.startswith("protocol="):
+            continue
+        ids, parts = [], []
+        for part in sorted(os.listdir(os.path.join(root, name))):
+            if part.endswith(".npz"):
+                with np.load(os.path.join(root, name, part)) as data:
+                    ids.append(data["ids"])
+                    parts.append(data["responses"])
+        if parts:
+            loaded[name[len("protocol="):]] = (np.concatenate(ids), np.concatenate(parts))
+    return loaded
@@ -0,0 +1,439 @@
+# Maritime Color Vision Test - Persistent results store
+# Copyright © Toni Mandusic 2025
+#
+# Completed test results are written to a local SQLite database in WAL mode.
+# Streamlit reruns only put records on a queue; a single background writer
+# thread drains it and commits in batches, so the render path never waits
+# on disk I/O or on another session's write lock.
+
+import atexit
+import csv
+import io
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import analytics
+import roster
+
+DB_PATH = os.environ.get("MVT_RESULTS_DB", os.path.join("data", "results.db"))
+
+# Writer batching: commit when this many records are queued or when the
+# oldest queued record has waited this long (seconds)
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 0.25
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    candidate_id TEXT NOT NULL,
+    candidate_name TEXT NOT NULL,
+    position TEXT NOT NULL,
+    test TEXT NOT NULL,
+    score REAL NOT NULL,
+    max_score REAL NOT NULL,
+    accuracy REAL NOT NULL,
+    status TEXT NOT NULL,
+    answers TEXT NOT NULL,
+    started_at TEXT,
+    completed_at TEXT NOT NULL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS idx_results_candidate ON results (candidate_id, completed_at DESC);
+CREATE INDEX IF NOT EXISTS idx_results_completed ON results (completed_at);
+CREATE INDEX IF NOT EXISTS idx_results_status ON results (status, completed_at);
+CREATE INDEX IF NOT EXISTS idx_results_name ON results (candidate_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_results_position ON results (position, completed_at);
+CREATE INDEX IF NOT EXISTS idx_results_accuracy ON results (accuracy);
+CREATE TABLE IF NOT EXISTS result_versions (
+    result_id INTEGER NOT NULL REFERENCES results (id),
+    protocol TEXT NOT NULL,
+    score REAL NOT NULL,
+    max_score REAL NOT NULL,
+    accuracy REAL NOT NULL,
+    status TEXT NOT NULL,
+    rescored_at TEXT NOT NULL,
+    PRIMARY KEY (result_id, protocol)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS certificates (
+    cert_id TEXT PRIMARY KEY,
+    key_id TEXT NOT NULL,
+    candidate_id TEXT NOT NULL,
+    candidate_name TEXT NOT NULL,
+    position TEXT NOT NULL,
+    issued TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    results TEXT NOT NULL,
+    issued_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+COLUMNS = (
+    "session_id", "candidate_id", "candidate_name", "position", "test",
+    "score", "max_score", "accuracy", "status", "answers",
+    "started_at", "completed_at", "duration",
+)
+
+# History browser: sortable columns (all indexed, id breaks ties) and the
+# columns sent to the page; answers stay in the database
+HISTORY_SORTS = {
+    'completed_at': 'completed_at',
+    'name': 'candidate_name COLLATE NOCASE',
+    'accuracy': 'accuracy',
+}
+HISTORY_COLUMNS = (
+    "id", "completed_at", "candidate_name", "candidate_id", "position",
+    "test", "score", "max_score", "accuracy", "status", "duration",
+)
+HISTORY_PAGE_SIZE = 50
+EXPORT_CHUNK_SIZE = 5000
+
+# Re-scored results (rescore.py) live next to the originals, one row per
+# result and protocol version; a re-run for the same version replaces it
+RESULT_VERSION_COLUMNS = ("result_id", "protocol", "score", "max_score", "accuracy", "status", "rescored_at")
+UPSERT_RESULT_VERSION = (f"INSERT OR REPLACE INTO result_versions ({', '.join(RESULT_VERSION_COLUMNS)}) "
+                         f"VALUES ({', '.join('?' * len(RESULT_VERSION_COLUMNS))})")
+
+# Certificate register (certificates.py): one row per issued certificate,
+# clustered on its ID so each verification is a single primary key seek
+CERTIFICATE_COLUMNS = ("cert_id", "key_id", "candidate_id", "candidate_name", "position", "issued",
+                       "digest", "session_id", "results", "issued_at")
+CERTIFICATE_LOOKUP_CHUNK = 500
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+def format_timestamp(ts):
+    """Format an epoch timestamp the way it is stored (sortable local ISO time)"""
+    if ts is None:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(ts))
+
+
+def connect(path):
+    """Open a connection configured for concurrent WAL access"""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+class ResultsStore:
+    """SQLite results store with a batched background writer"""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with connect(path) as conn:
+            conn.executescript(SCHEMA)
+            conn.executescript(analytics.SCHEMA)
+            conn.executescript(roster.SCHEMA)
+        conn.close()
+
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._writer = threading.Thread(target=self._write_loop, name="results-writer", daemon=True)
+        self._writer.start()
+
+    # ---- writes -------------------------------------------------------
+
+    def submit(self, record):
+        """Queue one completed test result; returns immediately"""
+        self._queue.put(_row(record))
+
+    def submit_many(self, records):
+        """Queue results that must be stored together; they commit in the same transaction"""
+        self._queue.put([_row(record) for record in records])
+
+    def flush(self):
+        """Block until every queued record has been committed"""
+        self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+
+    def _write_loop(self):
+        conn = connect(self.path)
+        insert = f"INSERT INTO results ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        running = True
+        while running:
+            item = self._queue.get()
+            batch = []
+            taken = 1
+            if item is _STOP:
+                running = False
+            else:
+                # A group (submit_many) is never split across batches
+                if isinstance(item, list):
+                    batch.extend(item)
+                else:
+                    batch.append(item)
+                deadline = time.monotonic() + FLUSH_INTERVAL
+                while len(batch) < BATCH_SIZE:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    taken += 1
+                    if item is _STOP:
+                        running = False
+                        break
+                    if isinstance(item, list):
+                        batch.extend(item)
+                    else:
+                        batch.append(item)
+            if batch:
+                # Cohort aggregates commit together with the results they
+                # count. A bad record is left out of the analytics on its own
+                # (see analytics.accumulate); it never costs a result
+                try:
+                    stats = analytics.upsert_rows([dict(zip(COLUMNS, row)) for row in batch])
+                except Exception:
+                    logger.exception("Failed to aggregate %d result(s) for analytics", len(batch))
+                    stats = []
+                try:
+                    with conn:
+                        conn.executemany(insert, batch)
+                        conn.executemany(analytics.UPSERT, stats)
+                except sqlite3.Error:
+                    logger.exception("Failed to write %d result(s) to %s", len(batch), self.path)
+            for _ in range(taken):
+                self._queue.task_done()
+        conn.close()
+
+    # ---- reads --------------------------------------------------------
+
+    def _reader(self):
+        # sqlite3 connections are per-thread; Streamlit runs each session's
+        # script on its own thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def latest_result(self, candidate_id, test=None):
+        """Most recent stored result for a candidate (optionally for one test)"""
+        sql = "SELECT * FROM results WHERE candidate_id = ?"
+        params = [candidate_id]
+        if test is not None:
+            sql += " AND test = ?"
+            params.append(test)
+        sql += " ORDER BY completed_at DESC, id DESC LIMIT 1"
+        row = self._reader().execute(sql, params).fetchone()
+        return decode_row(row) if row else None
+
+    def results_for_candidate(self, candidate_id, limit=50):
+        rows = self._reader().execute(
+            "SELECT * FROM results WHERE candidate_id = ? ORDER BY completed_at DESC, id DESC LIMIT ?",
+            (candidate_id, limit),
+        ).fetchall()
+        return [decode_row(row) for row in rows]
+
+    def cohort_summary(self, metrics, **filters):
+        """Merged cohort aggregates, see analytics.summary"""
+        return analytics.summary(self._reader(), metrics, **filters)
+
+    def cohorts(self):
+        return analytics.cohorts(self._reader())
+
+    def history(self, filters, sort='completed_at', descending=True, after=None, limit=HISTORY_PAGE_SIZE):
+        """One page of results matching filters; returns (rows, cursor of the next page or None)
+
+        Keyset pagination: after is the cursor returned with the previous
+        page, so every page is an index seek however deep it is.
+        """
+        expression = HISTORY_SORTS[sort]
+        clauses, params = history_filter(filters)
+        order = "DESC" if descending else "ASC"
+        if after is not None:
+            clauses.append(f"({expression}, id) {'<' if descending else '>'} (?, ?)")
+            params.extend(after)
+        sql = f"SELECT {', '.join(HISTORY_COLUMNS)}, {expression.split()[0]} AS sort_key FROM results"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {expression} {order}, id {order} LIMIT ?"
+        rows = self._reader().execute(sql, params + [limit + 1]).fetchall()
+        cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            cursor = (rows[-1]["sort_key"], rows[-1]["id"])
+        return [{column: row[column] for column in HISTORY_COLUMNS} for row in rows], cursor
+
+    def export_csv(self, filters, out, chunk_size=EXPORT_CHUNK_SIZE):
+        """Write every result matching filters to out (a binary file) as CSV, chunk by chunk"""
+        clauses, params = history_filter(filters)
+        clauses.append("id > ?")
+        sql = (f"SELECT {', '.join(HISTORY_COLUMNS)} FROM results WHERE {' AND '.join(clauses)} "
+               f"ORDER BY id LIMIT ?")
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(HISTORY_COLUMNS)
+        conn = connect(self.path)
+        try:
+            after_id = 0
+            total = 0
+            while True:
+                rows = conn.execute(sql, params + [after_id, chunk_size]).fetchall()
+                if not rows:
+                    break
+                after_id = rows[-1]["id"]
+                total += len(rows)
+                writer.writerows(tuple(row) for row in rows)
+                out.write(buffer.getvalue().encode("utf-8"))
+                buffer.seek(0)
+                buffer.truncate()
+            out.write(buffer.getvalue().encode("utf-8"))
+            return total
+        finally:
+            conn.close()
+
+    def result_versions(self, result_id):
+        """Re-scored versions of one result, oldest first"""
+        rows = self._reader().execute(
+            "SELECT * FROM result_versions WHERE result_id = ? ORDER BY rescored_at", (result_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def add_certificate(self, record):
+        """Register an issued certificate; written at once, since its PDF goes out right after
+
+        Issuing the same certificate again (same ID) keeps the first entry.
+        """
+        row = dict(record, results=json.dumps(record["results"], separators=(",", ":"), ensure_ascii=False))
+        row.setdefault("issued_at", format_timestamp(time.time()))
+        conn = self._reader()
+        with conn:
+            conn.execute(f"INSERT OR IGNORE INTO certificates ({', '.join(CERTIFICATE_COLUMNS)}) "
+                         f"VALUES ({', '.join('?' * len(CERTIFICATE_COLUMNS))})",
+                         tuple(row[column] for column in CERTIFICATE_COLUMNS))
+
+    def certificates(self, cert_ids):
+        """{cert_id: record} for the registered ones among cert_ids, in a few batched lookups"""
+        cert_ids = list(cert_ids)
+        found = {}
+        conn = self._reader()
+        for start in range(0, len(cert_ids), CERTIFICATE_LOOKUP_CHUNK):
+            chunk = cert_ids[start:start + CERTIFICATE_LOOKUP_CHUNK]
+            rows = conn.execute(f"SELECT * FROM certificates WHERE cert_id IN ({', '.join('?' * len(chunk))})",
+                                chunk).fetchall()
+            for row in rows:
+                record = dict(row)
+                record["results"] = json.loads(record["results"])
+                found[record["cert_id"]] = record
+        return found
+
+    def import_roster(self, file, filename, name=None):
+        """Import a crew roster upload (binary file); returns roster.import_roster's report"""
+        conn = connect(self.path)
+        try:
+            return roster.import_roster(conn, roster.read_rows(file, filename), name or filename)
+        finally:
+            conn.close()
+
+    def search_roster(self, text, limit=roster.SEARCH_LIMIT):
+        return roster.search(self._reader(), text, limit)
+
+    def roster_size(self):
+        return roster.size(self._reader())
+
+    def has_roster(self):
+        return roster.has_entries(self._reader())
+
+    def iter_results(self, after_id=0, chunk_size=10000, decode=True):
+        """Yield stored results with id > after_id in id order, one chunk (list) at a time
+
+        decode=False leaves answers as the stored JSON text, for callers
+        that hand the rows to other processes.
+        """
+        # Keyset pagination on the primary key keeps each query cheap and
+        # memory bounded by chunk_size regardless of table size
+        conn = connect(self.path)
+        try:
+            while True:
+                rows = conn.execute(
+                    "SELECT * FROM results WHERE id > ? ORDER BY id LIMIT ?",
+                    (after_id, chunk_size),
+                ).fetchall()
+                if not rows:
+                    return
+                after_id = rows[-1]["id"]
+                yield [decode_row(row) if decode else dict(row) for row in rows]
+        finally:
+            conn.close()
+
+
+def _row(record):
+    """Results table row for a submitted record"""
+    row = dict(record)
+    if not isinstance(row.get("answers"), str):
+        row["answers"] = json.dumps(row.get("answers", {}), separators=(",", ":"), default=str)
+    row.setdefault("started_at", None)
+    row.setdefault("duration", None)
+    row.setdefault("completed_at", format_timestamp(time.time()))
+    return tuple(row[column] for column in COLUMNS)
+
+
+def history_filter(filters):
+    """WHERE clauses and parameters for history filters
+
+    Keys: name (case-insensitive prefix), candidate_id, position, test,
+    status, date_from / date_to ("YYYY-MM-DD", inclusive). Empty values
+    are ignored.
+    """
+    clauses = []
+    params = []
+    name = (filters.get('name') or "").strip()
+    if name:
+        # Prefix LIKE on a NOCASE index is an index range scan
+        escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("candidate_name LIKE ? ESCAPE '\\'")
+        params.append(escaped + "%")
+    for column in ('candidate_id', 'position', 'test', 'status'):
+        value = filters.get(column)
+        if value:
+            clauses.append(f"{column} = ?")
+            params.append(value.strip())
+    if filters.get('date_from'):
+        clauses.append("completed_at >= ?")
+        params.append(str(filters['date_from']))
+    if filters.get('date_to'):
+        # Stored timestamps are "YYYY-MM-DDTHH:MM:SS"; "~" sorts after them
+        clauses.append("completed_at <= ?")
+        params.append(f"{filters['date_to']}~")
+    return clauses, params
+
+
+def decode_row(row):
+    """Convert a results row to a dict with answers parsed back from JSON"""
+    record = dict(row)
+    record["answers"] = json.loads(record["answers"])
+    return record
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(path=DB_PATH):
+    """Process-wide store shared by every Streamlit session"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ResultsStore(path)
+                atexit.register(_store.close)
+    return _store
@@ -0,0 +1,326 @@
+# Maritime Color Vision Test - Crew roster
+# Copyright © Toni Mandusic 2025
+#
+# Examiners upload a crew roster (CSV, or XLSX with openpyxl installed) and
+# candidates pick their own entry with a typeahead search instead of typing
+# name, ID and position. Rosters are read row by row and written in chunks
+# inside one transaction, so memory holds one chunk (and the IDs seen so
+# far) however large the fleet, and a file that breaks halfway leaves the
+# previous roster as it was. Rows are validated as they stream: name and ID are required, an ID
+# seen earlier in the file is a duplicate (the first row wins), and free
+# text positions (ranks like "2nd Officer" or "AB") are mapped to the
+# position options of the personal information form.
+#
+# Entries live in the roster table of the results database, with every
+# word of the name and the ID in roster_terms, so the typeahead is a prefix
+# range scan on that index whichever word the candidate starts typing.
+#
+# The typeahead is on the candidates' public home page, so it doesn't hand
+# out the roster: it searches from MIN_SEARCH_CHARS characters on, shows IDs
+# masked (mask_id), and an entry is only used once the candidate has typed
+# its full ID (same_id).
+#
+# Usage: python roster.py import FILE [--name NAME] [--db PATH]
+#        python roster.py search TEXT [--db PATH]
+
+import argparse
+import csv
+import functools
+import io
+import re
+import time
+import unicodedata
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS roster (
+    candidate_id TEXT PRIMARY KEY,
+    candidate_name TEXT NOT NULL,
+    position TEXT NOT NULL,
+    roster TEXT NOT NULL,
+    imported_at TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS roster_terms (
+    term TEXT NOT NULL,
+    candidate_id TEXT NOT NULL,
+    PRIMARY KEY (term, candidate_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_roster_terms_candidate ON roster_terms (candidate_id);
+"""
+
+# Options of the position selectbox
+POSITIONS = ("Deck Officer", "Engine Officer", "Lookout", "Pilot", "Other")
+
+# Roster wording -> position; matched on whole words, first hit wins
+POSITION_WORDS = (
+    ("Pilot", ("pilot",)),
+    ("Engine Officer", ("engineer", "engine", "eto", "electro", "motorman", "oiler", "wiper", "fitter")),
+    ("Deck Officer", ("officer", "master", "captain", "mate", "oow", "cadet", "navigator", "deck")),
+    ("Lookout", ("lookout", "ab", "able", "os", "ordinary", "seaman", "bosun", "boatswain", "rating",
+                 "watchkeeper", "quartermaster")),
+)
+
+COLUMN_ALIASES = {
+    'candidate_name': ("name", "full name", "candidate name", "crew name", "seafarer"),
+    'candidate_id': ("id", "candidate id", "id number", "crew id", "seafarer id", "passport",
+                     "passport number", "discharge book", "employee id"),
+    'position': ("position", "rank", "role", "function", "capacity"),
+}
+
+CHUNK_SIZE = 1000
+SEARCH_LIMIT = 10
+MIN_SEARCH_CHARS = 3
+MAX_REPORTED_ERRORS = 50
+
+_WORD = re.compile(r"\w+")
+
+
+class RosterError(ValueError):
+    pass
+
+
+# Letters NFKD doesn't split into a base letter and an accent
+_LETTERS = str.maketrans({"đ": "d", "ð": "d", "ø": "o", "ł": "l", "æ": "ae", "œ": "oe", "þ": "th", "ı": "i"})
+
+
+def _fold(text):
+    """Lower case without accents, for matching"""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text.casefold().translate(_LETTERS))
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def terms(candidate_name, candidate_id):
+    """Search terms of an entry: every word of the name, and the whole ID"""
+    return set(_WORD.findall(_fold(candidate_name))) | {_fold(candidate_id)}
+
+
+@functools.lru_cache(maxsize=1024)
+def map_position(text):
+    """Position option for free text from a roster; (position, recognized)"""
+    # Cached: a roster repeats a handful of ranks thousands of times
+    folded = _fold(text.strip())
+    for position in POSITIONS:
+        if folded == position.lower():
+            return position, True
+    words = set(_WORD.findall(folded))
+    for position, keywords in POSITION_WORDS:
+        if words.intersection(keywords):
+            return position, True
+    return "Other", False
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # spreadsheet numbers as IDs
+    return " ".join(str(value).split())
+
+
+def read_rows(file, filename):
+    """Yield the rows of an uploaded roster (binary file) as lists of strings"""
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        try:
+            import openpyxl
+        except ImportError:
+            raise RosterError("XLSX rosters need openpyxl (pip install openpyxl); upload a CSV instead") from None
+        try:
+            workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        except Exception as exc:
+            raise RosterError(f"{filename}: not a readable workbook ({exc})") from None
+        try:
+            for row in workbook.active.iter_rows(values_only=True):
+                yield [_cell(value) for value in row]
+        finally:
+            workbook.close()
+        return
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        sample = text.read(8192)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        # Only the sample is read ahead; the rest streams from the file
+        for row in csv.reader(_chain(sample, text), dialect):
+            yield [_cell(value) for value in row]
+    finally:
+        text.detach()
+
+
+def _chain(sample, text):
+    lines = sample.splitlines(keepends=True)
+    if lines and not lines[-1].endswith(("\n", "\r")):
+        lines[-1] += text.readline()
+    yield from lines
+    yield from text
+
+
+def _columns(header):
+    names = [_fold(name).replace("_", " ").strip() for name in header]
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for index, name in enumerate(names):
+            if name in aliases:
+                columns[field] = index
+                break
+    missing = [field for field in ('candidate_name', 'candidate_id') if field not in columns]
+    if missing:
+        raise RosterError(f"roster needs {' and '.join(COLUMN_ALIASES[f][0] for f in missing)} column(s); "
+                          f"found {', '.join(header) or 'no header'}")
+    return columns
+
+
+def validate(rows):
+    """Yield (line, (candidate_id, candidate_name, position), problem or None) for roster rows
+
+    The first non-empty row is the header. A problem is an error (the row
+    is skipped) unless it starts with 'position', which only means the
+    position was mapped to Other.
+    """
+    columns = None
+    seen = set()
+    for line, row in enumerate(rows, 1):
+        if not any(row):
+            continue
+        if columns is None:
+            columns = _columns(row)
+            continue
+        candidate_id, candidate_name, given_position = (
+            row[columns[field]] if columns.get(field, len(row)) < len(row) else ""
+            for field in ('candidate_id', 'candidate_name', 'position'))
+        if not candidate_name or not candidate_id:
+            yield line, None, "missing name or ID"
+            continue
+        if candidate_id in seen:
+            yield line, None, f"duplicate ID {candidate_id}"
+            continue
+        seen.add(candidate_id)
+        position, matched = map_position(given_position)
+        problem = None if matched or not given_position else f"position {given_position!r} mapped to Other"
+        yield line, (candidate_id, candidate_name, position), problem
+    if columns is None:
+        raise RosterError("the roster is empty")
+
+
+def import_roster(conn, rows, name, chunk_size=CHUNK_SIZE, now=None):
+    """Validate and store roster rows in one transaction; returns a report dict
+
+    Entries already on file (same ID) are replaced by the new roster's.
+    """
+    imported_at = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now))
+    report = {'imported': 0, 'skipped': 0, 'positions_mapped': 0, 'problems': []}
+    chunk = []
+
+    def write():
+        ids = [(entry[0],) for entry in chunk]
+        conn.executemany("DELETE FROM roster_terms WHERE candidate_id = ?", ids)
+        conn.executemany(
+            "INSERT OR REPLACE INTO roster (candidate_id, candidate_name, position, roster, imported_at) "
+            "VALUES (?, ?, ?, ?, ?)", [entry + (name, imported_at) for entry in chunk])
+        conn.executemany("INSERT OR IGNORE INTO roster_terms (term, candidate_id) VALUES (?, ?)",
+                         [(term, entry[0]) for entry in chunk for term in terms(entry[1], entry[0])])
+        report['imported'] += len(chunk)
+        chunk.clear()
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for line, entry, problem in validate(rows):
+            if problem is not None:
+                if entry is None:
+                    report['skipped'] += 1
+                else:
+                    report['positions_mapped'] += 1
+                if len(report['problems']) < MAX_REPORTED_ERRORS:
+                    report['problems'].append((line, problem))
+            if entry is not None:
+                chunk.append(entry)
+                if len(chunk) >= chunk_size:
+                    write()
+        if chunk:
+            write()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return report
+
+
+def search(conn, text, limit=SEARCH_LIMIT):
+    """Roster entries with a name word or ID starting with each word of text
+
+    Nothing until the longest word has MIN_SEARCH_CHARS characters.
+    """
+    words = sorted(set(_WORD.findall(_fold(text))), key=len, reverse=True)
+    if not words or len(words[0]) < MIN_SEARCH_CHARS:
+        return []
+    # The longest word drives the index range scan; the others filter
+    sql = ("SELECT * FROM roster r WHERE candidate_id IN "
+           "(SELECT candidate_id FROM roster_terms WHERE term >= ? AND term < ?)")
+    params = [words[0], words[0] + "\U0010ffff"]
+    for word in words[1:]:
+        sql += (" AND EXISTS (SELECT 1 FROM roster_terms t WHERE t.candidate_id = r.candidate_id "
+                "AND t.term >= ? AND t.term < ?)")
+        params.extend((word, word + "\U0010ffff"))
+    sql += " ORDER BY candidate_name COLLATE NOCASE LIMIT ?"
+    return [dict(row) for row in conn.execute(sql, params + [limit]).fetchall()]
+
+
+def mask_id(candidate_id):
+    """An ID as the typeahead shows it: only the last 3 characters of IDs longer than 4"""
+    if len(candidate_id) <= 4:
+        return "•" * len(candidate_id)
+    return "•" * (len(candidate_id) - 3) + candidate_id[-3:]
+
+
+def same_id(candidate_id, typed):
+    """True if typed is the entry's ID, ignoring case, accents and spacing"""
+    return "".join(_fold(typed).split()) == "".join(_fold(candidate_id).split())
+
+
+def size(conn):
+    return conn.execute("SELECT count(*) FROM roster").fetchone()[0]
+
+
+def has_entries(conn):
+    return conn.execute("SELECT EXISTS (SELECT 1 FROM roster)").fetchone()[0] == 1
+
+
+def main():
+    from results_store import DB_PATH, ResultsStore, connect
+
+    parser = argparse.ArgumentParser(description="Import a crew roster or search it")
+    parser.add_argument("--db", default=DB_PATH, help="results database (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="import a roster CSV / XLSX")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--name", help="roster name (default: the file name)")
+    search_parser = commands.add_parser("search", help="typeahead search, as candidates see it")
+    search_parser.add_argument("text")
+    args = parser.parse_args()
+
+    ResultsStore(args.db).close()  # creates the tables
+    conn = connect(args.db)
+    try:
+        if args.command == "search":
+            for entry in search(conn, args.text):
+                print(f"{entry['candidate_id']:<16} {entry['candidate_name']:<32} {entry['position']}")
+            return
+        started = time.perf_counter()
+        try:
+            with open(args.file, "rb") as f:
+                report = import_roster(conn, read_rows(f, args.file), args.name or args.file)
+        except (OSError, RosterError) as exc:
+            parser.exit(1, f"{args.file}: {exc}\n")
+        print(f"Imported {report['imported']} candidate(s) in {time.perf_counter() - started:.1f}s, "
+              f"skipped {report['skipped']}, {report['positions_mapped']} position(s) mapped to Other; "
+              f"{size(conn)} on the roster")
+        for line, problem in report['problems']:
+            print(f"  line {line}: {problem}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
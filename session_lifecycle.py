@@ -0,0 +1,162 @@
+# Maritime Color Vision Test - Session lifecycle and idle eviction
+# Copyright © Toni Mandusic 2025
+#
+# Candidates often close the tab mid-test, and their test state would stay
+# in server memory until Streamlit drops the session. Every script run
+# registers its session here with a last-activity time. A background
+# sweeper walks sessions from least to most recently active and, for those
+# idle longer than IDLE_TIMEOUT (or beyond MAX_RESIDENT resident sessions),
+# writes the test state to the candidate's checkpoint and removes it from
+# the session. The session keeps only a small EVICTED marker; its next run
+# reloads the state from the checkpoint before any page renders.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import checkpoint
+import metrics
+
+IDLE_TIMEOUT = float(os.environ.get("MVT_SESSION_IDLE_TIMEOUT", 15 * 60))
+MAX_RESIDENT = int(os.environ.get("MVT_MAX_RESIDENT_SESSIONS", 0))  # 0 = no cap
+SWEEP_INTERVAL = float(os.environ.get("MVT_SESSION_SWEEP_INTERVAL", 30))
+
+EVICTED = 'evicted_test_state'
+
+# Keys that are rebuilt from the checkpoint on restore
+EVICTABLE_KEYS = tuple(checkpoint.STATE_CLASSES) + ('checkpoint_snapshot',)
+
+
+def evict_test_state(state):
+    """Checkpoint a session's test state and drop it from memory"""
+    if not any(test in state for test in checkpoint.STATE_CLASSES):
+        return False
+    candidate_id = state['user_id'].strip() if 'user_id' in state else ''
+    if not candidate_id:
+        return False
+    try:
+        checkpoint.save(candidate_id, None, checkpoint.snapshot(state))
+    except checkpoint.CheckpointTaken:
+        # Not this session's log to replace: keep the state in memory
+        return False
+    for key in EVICTABLE_KEYS:
+        if key in state:
+            del state[key]
+    state[EVICTED] = True
+    return True
+
+
+def restore_test_state(state):
+    """Reload evicted test state from the checkpoint; returns True if restored"""
+    if EVICTED not in state:
+        return False
+    del state[EVICTED]
+    flat = checkpoint.load(state['user_id'].strip()) if 'user_id' in state else None
+    # Only this session's own checkpoint: the log may since have been
+    # started over for the same ID
+    if not flat or flat.get('session_uid') != (state['session_uid'] if 'session_uid' in state else None):
+        return False
+    for key, value in checkpoint.restore(flat).items():
+        state[key] = value
+    # Next save rewrites the log from the restored state
+    state['checkpoint_snapshot'] = None
+    return True
+
+
+class _Session:
+    __slots__ = ('state', 'last_active', 'running')
+
+    def __init__(self, state):
+        self.state = state
+        self.last_active = time.time()
+        self.running = False
+
+
+class SessionLifecycle:
+    """Tracks session activity and evicts idle sessions in LRU order"""
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, max_resident=MAX_RESIDENT,
+                 sweep_interval=SWEEP_INTERVAL, evict=evict_test_state):
+        self.idle_timeout = idle_timeout
+        self.max_resident = max_resident
+        self.evicted_total = 0
+        self._evict = evict
+        self._sessions = OrderedDict()  # session uid -> _Session, least recently active first
+        self._lock = threading.Lock()
+        if sweep_interval:
+            self._sweeper = threading.Thread(target=self._sweep_loop, args=(sweep_interval,),
+                                             name="session-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def begin(self, session_uid, state):
+        """Mark a session as running; blocks while it is being evicted"""
+        with self._lock:
+            session = self._sessions.get(session_uid)
+            if session is None:
+                session = self._sessions[session_uid] = _Session(state)
+            session.state = state
+            session.running = True
+            session.last_active = time.time()
+            self._sessions.move_to_end(session_uid)
+
+    def end(self, session_uid):
+        with self._lock:
+            session = self._sessions.get(session_uid)
+            if session is not None:
+                session.running = False
+                session.last_active = time.time()
+
+    def resident_count(self):
+        return len(self._sessions)
+
+    def running_count(self):
+        with self._lock:
+            return sum(1 for session in self._sessions.values() if session.running)
+
+    def sweep(self, now=None):
+        """Evict idle sessions; returns the number of sessions evicted"""
+        now = time.time() if now is None else now
+        evicted = 0
+        # Eviction runs under the lock so a session can't start a run while
+        # its state is half removed; each eviction is one small file write
+        with self._lock:
+            over_cap = len(self._sessions) - self.max_resident if self.max_resident else 0
+            for session_uid, session in list(self._sessions.items()):
+                idle = now - session.last_active
+                if idle < self.idle_timeout and over_cap <= 0:
+                    break  # LRU order: everything after this is more recent
+                if session.running:
+                    continue
+                del self._sessions[session_uid]
+                over_cap -= 1
+                if self._evict(session.state):
+                    evicted += 1
+            self.evicted_total += evicted
+        return evicted
+
+    def _sweep_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            self.sweep()
+
+
+_lifecycle = None
+_lifecycle_lock = threading.Lock()
+
+
+def get_lifecycle():
+    """Process-wide lifecycle manager shared by every Streamlit session"""
+    global _lifecycle
+    if _lifecycle is None:
+        with _lifecycle_lock:
+            if _lifecycle is None:
+                lifecycle = SessionLifecycle()
+                metrics.REGISTRY.gauge("mvt_sessions_resident", "Sessions holding test state in memory",
+                                       lifecycle.resident_count)
+                metrics.REGISTRY.gauge("mvt_sessions_running", "Sessions currently executing a script run",
+                                       lifecycle.running_count)
+                metrics.REGISTRY.gauge("mvt_sessions_evicted", "Sessions evicted to disk since start",
+                                       lambda: lifecycle.evicted_total)
+                _lifecycle = lifecycle
+    return _lifecycle
@@ -0,0 +1,257 @@
+# Maritime Color Vision Test - Simulated observers
+# Copyright © Toni Mandusic 2025
+#
+# Monte Carlo check of how a protocol variant separates normal from
+# deficient color vision, before anyone edits the plates, the lantern
+# sequences or the pass rules. Virtual candidates of a given deficiency type
+# (normal, protan, deutan), severity (0 = normal-like, 1 = dichromat) and
+# lapse rate (chance of a careless wrong answer on any item) answer every
+# Ishihara plate and lantern light:
+#
+#   Ishihara: a deficient observer reads the plate like the protocol's
+#     protan / deutan key with probability = severity, else like normal
+#   Lantern: each light is misnamed with probability severity * the type's
+#     confusion rate for that color (LANTERN_CONFUSIONS)
+#
+# Responses are drawn as NumPy batches and every variant is scored on the
+# same observers, so differences between variants are not sampling noise.
+# Shards run on a process pool; the report gives pass rates per population
+# and the battery's sensitivity, specificity and false-pass rate.
+#
+# Observers answer the active protocol (protocol.py), or with --protocol a
+# definition file not yet published, so a draft is checked against its own
+# answer key and sequences.
+#
+# Usage: python simulate_observers.py [--observers N] [--workers N] [--variant NAME ...]
+#                                     [--lapse P] [--seed N] [--verify N] [--protocol FILE] [--json]
+
+import argparse
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import engine
+import irt
+import protocol
+
+SHARD_SIZE = 200000
+
+Population = namedtuple('Population', ['kind', 'severity', 'lapse'])
+Variant = namedtuple('Variant', ['plates', 'sequences', 'ishihara_pass_accuracy', 'lantern_max_errors'])
+
+DEFAULT_LAPSE = 0.02
+
+# Severity ranges (uniform) per simulated population
+POPULATIONS = {
+    'normal': Population('normal', (0.0, 0.0), DEFAULT_LAPSE),
+    'protan-mild': Population('protan', (0.2, 0.5), DEFAULT_LAPSE),
+    'protan-severe': Population('protan', (0.6, 1.0), DEFAULT_LAPSE),
+    'deutan-mild': Population('deutan', (0.2, 0.5), DEFAULT_LAPSE),
+    'deutan-severe': Population('deutan', (0.6, 1.0), DEFAULT_LAPSE),
+}
+
+# Chance that a dichromat names a lantern color as something else; the
+# model scales these by severity
+LANTERN_CONFUSIONS = {
+    'normal': {},
+    'protan': {'red': 0.6, 'green': 0.4, 'yellow': 0.35, 'white': 0.1},
+    'deutan': {'red': 0.45, 'green': 0.6, 'yellow': 0.3, 'white': 0.2},
+}
+
+# Pass rules (Ishihara accuracy %, lantern errors) of the variants beside
+# the protocol's own ('current')
+VARIANT_RULES = {
+    'strict': (90, 0),
+    'lenient': (70, 2),
+}
+
+
+def variants(rules):
+    """{name: Variant} of a protocol: its own pass rules, then VARIANT_RULES, on all its plates and pairs"""
+    current = Variant(rules.used_plates, tuple(range(len(rules.lantern_sequences))),
+                      rules.ishihara_pass_accuracy, rules.lantern_max_errors)
+    found = {'current': current}
+    for name, (accuracy, errors) in VARIANT_RULES.items():
+        found[name] = current._replace(ishihara_pass_accuracy=accuracy, lantern_max_errors=errors)
+    return found
+
+
+def calibrated_variant(params, current):
+    """The current rules without the plates IRT calibration marks as uninformative, or None"""
+    dropped = {int(item.split(":")[1]) for item in irt.uninformative_items(params, 'ishihara')}
+    if not dropped.intersection(current.plates):
+        return None
+    return current._replace(plates=tuple(plate for plate in current.plates if plate not in dropped))
+
+
+def _deficient_reading(kind, rules):
+    """Per used plate: 1 where the type's reading differs from the normal one"""
+    if kind == 'normal':
+        return np.zeros(rules.total_plates)
+    return np.array([rules.ishihara_data[plate][kind] != rules.ishihara_data[plate]["normal"]
+                     for plate in rules.used_plates], dtype=np.float64)
+
+
+def _lantern_miss(kind, rules):
+    """(pairs, 2) chance of misnaming each light for a dichromat of this type"""
+    confusions = LANTERN_CONFUSIONS[kind]
+    return np.array([[confusions.get(color, 0.0) for color in pair] for pair in rules.lantern_sequences])
+
+
+def draw(population, count, rng, rules):
+    """(plates correct, lantern pairs correct) bool arrays for count observers"""
+    low, high = population.severity
+    severity = rng.uniform(low, high, (count, 1))
+    keep = 1.0 - population.lapse
+    plate_p = keep * (1.0 - severity * _deficient_reading(population.kind, rules))
+    plates = rng.random((count, rules.total_plates)) < plate_p
+    light_p = keep * (1.0 - severity[:, :, None] * _lantern_miss(population.kind, rules))
+    pairs = (rng.random((count, len(rules.lantern_sequences), 2)) < light_p).all(axis=2)
+    return plates, pairs
+
+
+def score(variant, plates, pairs, rules):
+    """(ishihara passed, lantern passed) per observer under a variant's rules"""
+    columns = [rules.plate_index[plate] for plate in variant.plates]
+    accuracy = plates[:, columns].sum(axis=1) * 100.0 / len(columns)
+    errors = len(variant.sequences) - pairs[:, list(variant.sequences)].sum(axis=1)
+    return accuracy >= variant.ishihara_pass_accuracy, errors <= variant.lantern_max_errors
+
+
+def simulate_shard(population, variants, count, seed, rules):
+    """{variant: [observers, ishihara passes, lantern passes, battery passes]} for one shard"""
+    rng = np.random.default_rng(seed)
+    plates, pairs = draw(population, count, rng, rules)
+    counts = {}
+    for name, variant in variants.items():
+        ishihara, lantern = score(variant, plates, pairs, rules)
+        counts[name] = [count, int(ishihara.sum()), int(lantern.sum()), int((ishihara & lantern).sum())]
+    return counts
+
+
+def verify(population, count, seed, rules):
+    """Score simulated Ishihara answers through engine.py and compare with the batch scoring"""
+    rng = np.random.default_rng(seed)
+    plates, _ = draw(population, count, rng, rules)
+    current = variants(rules)['current']
+    batch_pass, _ = score(current, plates, np.ones((count, len(rules.lantern_sequences)), dtype=bool), rules)
+    for observer in range(count):
+        events = []
+        for column, plate in enumerate(rules.used_plates):
+            key = rules.ishihara_data[plate]
+            deficient = key.get(population.kind, key["normal"])
+            # A wrong answer is the type's reading where it differs, else a lapse
+            answer = key["normal"] if plates[observer, column] else (
+                deficient if deficient != key["normal"] else "?")
+            events += [(0.0, (engine.ANSWER, answer)), (0.0, (engine.NEXT,))]
+        state = engine.run('ishihara', engine.start('ishihara', protocol=rules), events + [(0.0, (engine.FINISH,))])
+        accuracy = state.score * 100 / rules.total_plates
+        if engine.ishihara_passed(accuracy, rules) != bool(batch_pass[observer]):
+            raise AssertionError(f"{population.kind} observer {observer}: engine and batch scoring disagree")
+
+
+def run(populations, variants, observers, rules, workers=None, seed=0, shard_size=SHARD_SIZE):
+    """{population: {variant: [observers, ishihara, lantern, battery passes]}}"""
+    seeds = np.random.SeedSequence(seed)
+    jobs = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name, population in populations.items():
+            shards = [min(shard_size, observers - start) for start in range(0, observers, shard_size)]
+            for count, shard_seed in zip(shards, seeds.spawn(len(shards))):
+                jobs.append((name, pool.submit(simulate_shard, population, variants, count, shard_seed, rules)))
+        totals = {name: {variant: [0, 0, 0, 0] for variant in variants} for name in populations}
+        for name, future in jobs:
+            for variant, counts in future.result().items():
+                totals[name][variant] = [a + b for a, b in zip(totals[name][variant], counts)]
+    return totals
+
+
+def summarize(totals, populations, variants):
+    """Per variant: battery sensitivity, specificity and false-pass rate"""
+    summary = {}
+    for variant in variants:
+        normal = [0, 0]
+        deficient = [0, 0]
+        for name, by_variant in totals.items():
+            observers, _, _, passed = by_variant[variant]
+            bucket = normal if populations[name].kind == 'normal' else deficient
+            bucket[0] += observers
+            bucket[1] += passed
+        summary[variant] = {
+            'specificity': normal[1] / normal[0] if normal[0] else None,
+            'sensitivity': 1 - deficient[1] / deficient[0] if deficient[0] else None,
+            'false_pass_rate': deficient[1] / deficient[0] if deficient[0] else None,
+        }
+    return summary
+
+
+def _rate(value):
+    return "     -" if value is None else f"{value * 100:6.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate observers through protocol variants")
+    parser.add_argument("--observers", type=int, default=1000000, help="observers per population (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--variant", action="append", choices=['current'] + sorted(VARIANT_RULES) + ['calibrated'],
+                        help="protocol variant(s) to score (default: all)")
+    parser.add_argument("--lapse", type=float, default=DEFAULT_LAPSE, help="lapse rate (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", type=int, default=0, metavar="N",
+                        help="first score N observers per population through engine.py and compare")
+    parser.add_argument("--protocol", metavar="FILE", help="protocol definition to simulate (default: the active one)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    try:
+        rules = protocol.load(args.protocol) if args.protocol else protocol.current()
+    except (OSError, protocol.ProtocolError) as exc:
+        parser.error(str(exc))
+    scored = variants(rules)
+    calibrated = calibrated_variant(irt.get_params(), scored['current'])
+    if calibrated is not None:
+        scored['calibrated'] = calibrated
+    if args.variant:
+        missing = [name for name in args.variant if name not in scored]
+        if missing:
+            parser.error(f"no such variant here: {', '.join(missing)} (calibrated needs an IRT parameter file)")
+        scored = {name: scored[name] for name in args.variant}
+    populations = {name: population._replace(lapse=args.lapse) for name, population in POPULATIONS.items()}
+
+    if args.verify:
+        for index, population in enumerate(populations.values()):
+            verify(population, args.verify, args.seed + index, rules)
+
+    started = time.perf_counter()
+    totals = run(populations, scored, args.observers, rules, args.workers, args.seed)
+    elapsed = time.perf_counter() - started
+    summary = summarize(totals, populations, scored)
+
+    if args.json:
+        print(json.dumps({'protocol': rules.version, 'observers': args.observers, 'lapse': args.lapse,
+                          'seconds': elapsed,
+                          'variants': {name: variant._asdict() for name, variant in scored.items()},
+                          'pass_counts': totals, 'summary': summary}, indent=2))
+        return
+
+    print(f"Protocol {rules.version}: {args.observers} observers x {len(populations)} populations in {elapsed:.1f}s "
+          f"on {args.workers or os.cpu_count()} worker(s), lapse rate {args.lapse}")
+    for name, variant in scored.items():
+        print(f"\nVariant {name}: {len(variant.plates)} plates, pass >= {variant.ishihara_pass_accuracy}%; "
+              f"{len(variant.sequences)} lantern pairs, pass <= {variant.lantern_max_errors} error(s)")
+        print(f"  {'population':<16} {'ishihara':>9} {'lantern':>9} {'battery':>9}   (% passing)")
+        for population, by_variant in totals.items():
+            observers, ishihara, lantern, battery = by_variant[name]
+            print(f"  {population:<16} {_rate(ishihara / observers):>9} {_rate(lantern / observers):>9} "
+                  f"{_rate(battery / observers):>9}")
+        rates = summary[name]
+        print(f"  sensitivity {_rate(rates['sensitivity'])}%   specificity {_rate(rates['specificity'])}%   "
+              f"false-pass {_rate(rates['false_pass_rate'])}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# Maritime Color Vision Test - Per-test session state
+# Copyright © Toni Mandusic 2025
+#
+# One compact object per test per session, kept in st.session_state under
+# the test's key ('ishihara', 'lantern', 'ecdis', 'radar'). Colors are held
+# as small integer indices into the palettes in protocol.py and converted
+# back to names / hex strings only when rendering or storing results.
+# Palettes and answer keys come from the state's own compiled Protocol
+# (protocol.py), fixed when the test starts; checkpoints store its version.
+#
+# Randomized setup takes an optional rng (anything with sample / shuffle /
+# randint, normally the random module) so runs can be reproduced from a seed.
+# Restoring from a checkpoint (from_dict) doesn't run __init__, so it draws
+# nothing from the rng and doesn't look up the active protocol.
+
+import random
+import time
+from array import array
+
+from protocol import BUILTIN_VERSION, Protocol, current, get_version
+
+NO_SELECTION = -1
+UNANSWERED = -1
+
+
+def _dump(value):
+    if isinstance(value, Protocol):
+        return value.version
+    if isinstance(value, array):
+        return value.tolist()
+    if isinstance(value, list):
+        return [_dump(item) for item in value]
+    return value
+
+
+class SlotState:
+    """Plain-data conversion shared by the per-test state classes"""
+    __slots__ = ()
+    # Slots held as arrays, and as lists of arrays: {slot: typecode}
+    _ARRAYS = {}
+    _ARRAY_LISTS = {}
+
+    def to_dict(self):
+        return {name: _dump(getattr(self, name)) for name in self.__slots__}
+
+    def copy(self):
+        """Independent copy without re-running __init__ (no rng draws)"""
+        state = self.__class__.__new__(self.__class__)
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, array):
+                value = value[:]
+            elif isinstance(value, list):
+                value = [item[:] if isinstance(item, array) else item for item in value]
+            setattr(state, name, value)
+        return state
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild from to_dict() output; a state saved before protocol pinning gets the built-in one"""
+        state = cls.__new__(cls)
+        for name in cls.__slots__:
+            if name == 'protocol':
+                value = get_version(data.get(name) or BUILTIN_VERSION)
+            elif name in cls._ARRAYS:
+                value = array(cls._ARRAYS[name], data[name])
+            elif name in cls._ARRAY_LISTS:
+                value = [array(cls._ARRAY_LISTS[name], item) for item in data[name]]
+            else:
+                value = data[name]
+            setattr(state, name, value)
+        return state
+
+
+class IshiharaState(SlotState):
+    __slots__ = ('protocol', 'current_plate', 'answers', 'score', 'finished')
+
+    def __init__(self, protocol=None):
+        self.protocol = protocol or current()
+        self.current_plate = 0
+        self.answers = [None] * self.protocol.total_plates  # None = plate not visited yet
+        self.score = 0
+        self.finished = False
+
+    def answer(self, plate):
+        return self.answers[self.protocol.plate_index[plate]] or ""
+
+    def set_answer(self, plate, value):
+        self.answers[self.protocol.plate_index[plate]] = value
+
+    def has_answers(self):
+        return any(answer is not None for answer in self.answers)
+
+    def answers_by_plate(self):
+        """Visited plates as {plate_number: answer}"""
+        return {plate: answer for plate, answer in zip(self.protocol.used_plates, self.answers) if answer is not None}
+
+
+class LanternState(SlotState):
+    __slots__ = ('protocol', 'current_pair', 'sequence', 'answers', 'pair_start_time')
+    _ARRAYS = {'sequence': 'B', 'answers': 'b'}
+
+    def __init__(self, rng=random, protocol=None):
+        self.protocol = protocol or current()
+        pairs = len(self.protocol.lantern_sequences)
+        self.current_pair = 0
+        self.sequence = array('B', rng.sample(range(pairs), pairs))  # order of lantern_sequences
+        self.answers = array('b', [UNANSWERED]) * (2 * pairs)  # two palette indices per pair
+        self.pair_start_time = time.time()
+
+    def pair_colors(self, pair):
+        return self.protocol.lantern_sequences[self.sequence[pair]]
+
+    def set_answer(self, pair, color1, color2):
+        self.answers[2 * pair] = self.protocol.palette_index[color1]
+        self.answers[2 * pair + 1] = self.protocol.palette_index[color2]
+
+    def answer(self, pair):
+        if self.answers[2 * pair] == UNANSWERED:
+            return None
+        palette = self.protocol.lantern_palette
+        return palette[self.answers[2 * pair]], palette[self.answers[2 * pair + 1]]
+
+    def answered_pairs(self):
+        return [pair for pair in range(len(self.sequence)) if self.answers[2 * pair] != UNANSWERED]
+
+    def sequence_colors(self):
+        return [self.pair_colors(pair) for pair in range(len(self.sequence))]
+
+    def answers_by_pair(self):
+        """Answered pairs in the stored-results layout"""
+        records = {}
+        for pair in self.answered_pairs():
+            light1, light2 = self.answer(pair)
+            correct1, correct2 = self.pair_colors(pair)
+            records[pair] = {'light1': light1, 'light2': light2, 'correct1': correct1, 'correct2': correct2}
+        return records
+
+
+class EcdisState(SlotState):
+    __slots__ = ('protocol', 'current_group', 'orders', 'scores', 'selected', 'finished')
+    _ARRAYS = {'scores': 'B'}
+    _ARRAY_LISTS = {'orders': 'B'}
+
+    def __init__(self, rng=random, protocol=None):
+        self.protocol = protocol or current()
+        self.current_group = 0
+        self.scores = array('B', [0]) * len(self.protocol.ecdis_fm_colors)
+        self.orders = []  # per group: indices into ecdis_fm_colors[group]
+        for group in self.protocol.ecdis_fm_colors:
+            order = list(range(len(group)))
+            rng.shuffle(order)
+            self.orders.append(array('B', order))
+        self.selected = NO_SELECTION
+        self.finished = False
+
+    def colors(self, group):
+        colors = self.protocol.ecdis_fm_colors[group]
+        return [colors[i] for i in self.orders[group]]
+
+    def shuffle(self, group, rng=random):
+        order = list(self.orders[group])
+        rng.shuffle(order)
+        self.orders[group] = array('B', order)
+
+    def move(self, group, color, target_position):
+        order = self.orders[group]
+        order.remove(color)
+        order.insert(target_position, color)
+
+    def score_group(self, group):
+        """Count colors in their correct position"""
+        self.scores[group] = sum(1 for position, color in enumerate(self.orders[group]) if position == color)
+
+    def hex_orders(self):
+        return [self.colors(group) for group in range(len(self.orders))]
+
+
+class RadarState(SlotState):
+    __slots__ = ('protocol', 'current_test', 'scores', 'start_time',
+                 'pair_index', 'pair_answers',
+                 'order', 'selected',
+                 'contrast_index', 'contrast_answers',
+                 'night_targets', 'night_positions', 'night_start', 'finished')
+    _ARRAYS = {'scores': 'B', 'pair_answers': 'B', 'order': 'B', 'contrast_answers': 'B', 'night_positions': 'H'}
+
+    def __init__(self, rng=random, protocol=None):
+        self.protocol = protocol or current()
+        self.current_test = 0
+        self.scores = array('B', [0, 0, 0, 0])  # 4 podtesta
+        self.start_time = time.time()
+        self.pair_index = 0
+        self.pair_answers = array('B')
+        order = list(range(len(self.protocol.radar_colors['intensity_scale'])))
+        rng.shuffle(order)
+        self.order = array('B', order)  # indices into intensity_scale
+        self.selected = NO_SELECTION
+        self.contrast_index = 0
+        self.contrast_answers = array('B')
+        self.night_targets = 0  # 0 = no scene generated yet
+        self.night_positions = array('H')  # x, y pairs
+        self.night_start = 0.0
+        self.finished = False
+
+    def order_colors(self):
+        scale = self.protocol.radar_colors['intensity_scale']
+        return [scale[i] for i in self.order]
+
+    def move(self, color, target_position):
+        self.order.remove(color)
+        self.order.insert(target_position, color)
+
+    def new_night_scene(self, rng=random):
+        self.night_targets = rng.randint(1, 5)
+        self.night_start = time.time()
+        positions = []
+        for _ in range(self.night_targets):
+            positions += [rng.randint(50, 350), rng.randint(50, 250)]
+        self.night_positions = array('H', positions)
+
+    def clear_night_scene(self):
+        self.night_targets = 0
+        self.night_positions = array('H')
+
+    def night_target_positions(self):
+        return list(zip(self.night_positions[0::2], self.night_positions[1::2]))
+
+
+STATE_CLASSES = {
+    'ishihara': IshiharaState,
+    'lantern': LanternState,
+    'ecdis': EcdisState,
+    'radar': RadarState,
+}
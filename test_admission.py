@@ -0,0 +1,55 @@
+# Maritime Color Vision Test - Admission control tests
+# Copyright © Toni Mandusic 2025
+
+import admission
+from admission import AdmissionController, NORMAL, TIMED
+
+
+def test_sessions_over_the_cap_wait_in_order():
+    controller = AdmissionController(max_active=2, lease_seconds=60)
+    assert controller.admit("a", now=0.0).admitted
+    assert controller.admit("b", now=1.0).admitted
+    assert controller.admit("c", now=2.0) == admission.Ticket(False, 1, admission.DEFAULT_SESSION_SECONDS / 2)
+    assert controller.admit("d", now=3.0).position == 2
+    # A timed section that lost its slot goes ahead of everyone
+    assert controller.admit("e", TIMED, now=4.0).position == 1
+    assert controller.admit("c", NORMAL, now=5.0).position == 2
+
+    controller.release("a", now=10.0)
+    assert controller.admit("c", now=11.0).position == 1
+    assert controller.admit("e", now=12.0).admitted
+    assert controller.active_count() == 2
+    assert controller.waiting_count() == 2
+
+
+def test_leases_expire_without_renewal():
+    controller = AdmissionController(max_active=1, lease_seconds=60)
+    assert controller.admit("a", now=0.0).admitted
+    assert not controller.admit("b", now=1.0).admitted
+    controller.touch("a", now=50.0)
+    assert not controller.admit("b", now=100.0).admitted
+    # a's lease lapses 60 s after its last renewal and b takes the slot
+    assert controller.admit("b", now=111.0).admitted
+    assert not controller.admit("a", now=112.0).admitted
+    # A waiting session that stops polling leaves the queue
+    controller.touch("b", now=150.0)
+    assert controller.admit("c", now=160.0).position == 2
+    controller.touch("b", now=200.0)
+    assert controller.admit("c", now=215.0).position == 1
+    assert controller.waiting_count() == 1
+
+
+def test_hold_times_update_the_wait_estimate():
+    controller = AdmissionController(max_active=1, lease_seconds=600)
+    controller.admit("a", now=0.0)
+    controller.release("a", now=100.0)
+    expected = admission.DEFAULT_SESSION_SECONDS + admission.EWMA_ALPHA * (100.0 - admission.DEFAULT_SESSION_SECONDS)
+    assert controller.session_seconds == expected
+    controller.admit("b", now=101.0)
+    assert controller.admit("c", now=102.0).estimated_wait == expected
+
+
+def test_no_cap_admits_everyone():
+    controller = AdmissionController(max_active=0)
+    assert all(controller.admit(str(i), now=0.0).admitted for i in range(100))
+    assert controller.waiting_count() == 0
@@ -0,0 +1,63 @@
+# Maritime Color Vision Test - Cohort analytics tests
+# Copyright © Toni Mandusic 2025
+
+import os
+
+import pytest
+
+import analytics
+import protocol
+from results_store import ResultsStore, connect
+
+
+@pytest.fixture
+def batch(result):
+    good = result("good", {'answers': {'1': "12"}})
+    bad = result("bad", {'answers': {'999': "5"}})  # no such plate
+    failed = result("failed", {'answers': {'1': "7"}}, status='FAIL', accuracy=0.0)
+    return good, bad, failed
+
+
+def test_bad_record_is_left_out_alone(batch):
+    stats = analytics.accumulate(batch)
+    cohort = ("default", "2025-06", "Deck Officer")
+    assert stats[cohort + (analytics.PASS, 'ishihara')][:2] == [2, 0.5]
+    assert stats[cohort + (analytics.PLATE_ERROR, '1')][:2] == [2, 0.5]
+    assert cohort + (analytics.PLATE_ERROR, '999') not in stats
+
+
+def test_results_are_scored_on_their_recorded_protocol(batch, result, corrected_protocol):
+    recorded = result("recorded", {'answers': {'1': "7"}, 'protocol': corrected_protocol.version})
+    stats = analytics.accumulate([batch[2], recorded])
+    cohort = ("default", "2025-06", "Deck Officer")
+    # "7" is wrong on the built-in key (FAILED has no version) and right on the corrected one
+    assert stats[cohort + (analytics.PLATE_ERROR, '1')][:2] == [2, 0.5]
+
+
+def test_writer_keeps_the_batch_analytics_around_a_bad_record(tmp_path, batch):
+    path = os.path.join(tmp_path, "results.db")
+    store = ResultsStore(path)
+    store.submit_many(list(batch))
+    store.flush()
+    store.close()
+
+    conn = connect(path)
+    try:
+        assert conn.execute("SELECT count(*) FROM results").fetchone()[0] == 3
+        summary = analytics.summary(conn, [analytics.PASS])
+    finally:
+        conn.close()
+    assert summary[analytics.PASS]['ishihara'].n == 2
+    assert summary[analytics.PASS]['ishihara'].mean == 0.5
+
+
+def test_dashboard_labels_come_from_the_protocol():
+    rules = protocol.BUILTIN
+    extra = len(rules.ecdis_group_names)
+    assert analytics.group_name("0", rules) == rules.ecdis_group_names[0]
+    assert analytics.group_name(str(extra), rules) == f"Group {extra + 1}"
+    first, second = rules.lantern_palette[:2]
+    answers = {f"{second}>{first}": None, f"blue>{first}": None}
+    assert analytics.lantern_codes(answers, rules) == [first, second, "blue"]
+    assert analytics.color_name(first, rules) == rules.lantern_colors[first]['name']
+    assert analytics.color_name("blue", rules) == "blue"
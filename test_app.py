@@ -0,0 +1,132 @@
+# Maritime Color Vision Test - App flow tests
+# Copyright © Toni Mandusic 2025
+
+import importlib.util
+import io
+import os
+
+import checkpoint
+import engine
+from results_store import ResultsStore
+
+
+def test_results_page_stores_only_finished_tests(candidate_app, click):
+    at = candidate_app("RESULTS-TEST-1")
+    at.button(key="ecdis_home").click().run()
+    click(at, "Next Group →")
+
+    # Halfway through ECDIS: shown, but not stored
+    at.session_state.current_page = "results"
+    at.run()
+    assert not at.exception
+    assert at.session_state.persisted_results == {}
+
+    at.session_state.current_page = "ecdiscfm"
+    at.run()
+    groups = len(at.session_state.ecdis.protocol.ecdis_fm_colors)
+    while not engine.at_end('ecdis', at.session_state.ecdis):
+        click(at, "Next Group →")
+    click(at, "See Results")
+    assert not at.exception
+    assert at.session_state.current_page == "results"
+    assert list(at.session_state.persisted_results) == ['ecdis']
+    assert at.session_state.ecdis.current_group == groups - 1
+
+
+def test_resume_needs_the_name_and_resume_code(candidate_app, click):
+    first = candidate_app("RESUME-TEST-1")
+    first.button(key="ecdis_home").click().run()
+    click(first, "Next Group →")
+    code = first.session_state.resume_code
+    assert any(checkpoint.display_code(code) in caption.value for caption in first.caption)
+
+    for name, typed in (("Test Candidate", ""), ("Test Candidate", "AAAA-AAAA"), ("Someone Else", code)):
+        at = candidate_app("RESUME-TEST-1", name)
+        at.text_input(key="resume_code_input").input(typed).run()
+        click(at, "Resume Assessment")
+        assert not at.exception
+        assert 'ecdis' not in at.session_state
+        assert at.error
+
+    at = candidate_app("RESUME-TEST-1", " test  candidate ")
+    at.text_input(key="resume_code_input").input(checkpoint.display_code(code).lower()).run()
+    click(at, "Resume Assessment")
+    assert not at.exception
+    assert at.session_state.ecdis.current_group == 1
+    assert at.session_state.session_uid == first.session_state.session_uid
+    # The code stays the same for the rest of the assessment
+    assert at.session_state.resume_code == code
+
+
+def test_another_session_cant_discard_or_replace_a_checkpoint(candidate_app, click):
+    first = candidate_app("RESUME-TEST-2")
+    first.button(key="ecdis_home").click().run()
+    click(first, "Next Group →")
+    code = first.session_state.resume_code
+    saved = checkpoint.load("RESUME-TEST-2")
+
+    at = candidate_app("RESUME-TEST-2")
+    click(at, "Start Fresh")
+    assert at.error
+    at.text_input(key="resume_code_input").input("AAAA-AAAA").run()
+    click(at, "Start Fresh")
+    assert at.error
+    at.button(key="ecdis_home").click().run()
+    assert not at.exception
+    assert 'ecdis' not in at.session_state
+    assert checkpoint.load("RESUME-TEST-2") == saved
+
+    # With the code, the candidate can start over
+    at.text_input(key="resume_code_input").input(code).run()
+    click(at, "Start Fresh")
+    assert not checkpoint.exists("RESUME-TEST-2")
+    at.button(key="ecdis_home").click().run()
+    assert 'ecdis' in at.session_state
+    assert checkpoint.exists("RESUME-TEST-2")
+
+
+def test_roster_lookup_masks_ids_and_needs_the_full_id(candidate_app, click):
+    store = ResultsStore(os.environ["MVT_RESULTS_DB"])
+    store.import_roster(io.BytesIO("Name,ID,Rank\nAna Kovačić,P100200,Chief Officer\n".encode("utf-8")),
+                        "crew.csv")
+    store.close()
+    at = candidate_app()
+    at.text_input[0].input("kov").run()
+    picker = at.radio[0]
+    assert picker.options == ["Ana Kovačić — ID ••••200 (Deck Officer)"]
+    picker.set_value(0).run()
+
+    at.text_input(key="roster_confirm_id").input("P100300").run()
+    click(at, "Use This Entry")
+    assert at.error
+    assert not at.session_state.user_id
+
+    at.text_input(key="roster_confirm_id").input("p100200").run()
+    click(at, "Use This Entry")
+    assert not at.exception
+    assert at.session_state.user_id == "P100200"
+    assert at.session_state.user_name == "Ana Kovačić"
+
+
+def test_seeded_sessions_set_up_tests_the_same_way(candidate_app):
+    def setup(candidate_id, seed):
+        at = candidate_app(candidate_id)
+        at.session_state.random_seed = seed
+        at.button(key="lantern_home").click().run()
+        at.session_state.current_page = "home"
+        at.run()
+        at.button(key="ecdis_home").click().run()
+        assert not at.exception
+        return at.session_state.lantern.sequence.tolist(), at.session_state.ecdis.hex_orders()
+
+    assert setup("SEED-TEST-1", "load-7") == setup("SEED-TEST-2", "load-7")
+    assert setup("SEED-TEST-3", "load-7") != setup("SEED-TEST-4", "load-8")
+
+
+def test_home_page_renders_without_heavy_imports(tmp_path):
+    # A fresh process, as in benchmarks/cold_start.py
+    spec = importlib.util.spec_from_file_location(
+        "cold_start", os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "cold_start.py"))
+    cold_start = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(cold_start)
+    assert cold_start.sample(str(tmp_path))['loaded'] == []
@@ -0,0 +1,37 @@
+# Maritime Color Vision Test - Full battery tests
+# Copyright © Toni Mandusic 2025
+
+import random
+
+import pytest
+
+import assets
+import battery
+import engine
+import protocol
+
+
+def test_parse_order():
+    assert battery.parse_order(" ecdis, lantern ,radar") == ('ecdis', 'lantern', 'radar')
+    for text in ("", " , ", "lantern,lantern", "lantern,hearing"):
+        with pytest.raises(ValueError):
+            battery.parse_order(text)
+
+
+def test_next_test():
+    order = ('lantern', 'ishihara', 'ecdis')
+    assert [battery.next_test(order, index) for index in range(3)] == ['ishihara', 'ecdis', None]
+
+
+@pytest.mark.parametrize("test", list(engine.STATE_CLASSES))
+def test_prepared_test_is_the_one_start_would_give(test):
+    prepared = battery.get_prefetcher().submit(battery.prepare, test, 1234, protocol.BUILTIN).result()
+    started = engine.start(test, random.Random(1234), 50.0, protocol.BUILTIN)
+    assert engine.begin(test, prepared, 50.0).to_dict() == started.to_dict()
+
+
+def test_preparing_the_lantern_renders_its_lights():
+    battery.prepare('lantern', 1, protocol.BUILTIN)
+    before = assets.light_sprite.cache_info()
+    assets.prefetch_lights([color['hex'] for color in protocol.BUILTIN.lantern_colors.values()])
+    assert assets.light_sprite.cache_info().misses == before.misses
@@ -0,0 +1,62 @@
+# Maritime Color Vision Test - Display calibration tests
+# Copyright © Toni Mandusic 2025
+
+import os
+
+import numpy as np
+
+import calibration
+import protocol
+from calibration import Profile
+
+
+def reference(profile, level, channel):
+    """One corrected level, computed directly from the model"""
+    value = level / 255
+    linear = value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+    return round(255 * (linear * profile[1 + channel]) ** (1 / profile.gamma))
+
+
+def test_apply_matches_the_model_and_keeps_alpha():
+    profile = Profile(2.4, 1.0, 0.9, 0.8)
+    rng = np.random.default_rng(0)
+    rgba = rng.integers(0, 256, (16, 16, 4), dtype=np.uint8)
+    original = rgba.copy()
+    out = calibration.apply(profile, rgba)
+    assert (rgba == original).all()
+    assert (out[..., 3] == rgba[..., 3]).all()
+    for y, x in ((0, 0), (3, 7), (15, 15)):
+        assert [int(v) for v in out[y, x, :3]] == [reference(profile, int(rgba[y, x, c]), c) for c in range(3)]
+    assert calibration.apply(profile, np.zeros((1, 3), dtype=np.uint8)).tolist() == [[0, 0, 0]]
+
+
+def test_measurements_make_a_profile():
+    # An ideal display matches the half-tone at the reference level and leaves it unchanged
+    neutral = calibration.make_profile(calibration.REFERENCE_MATCH)
+    assert neutral[1:] == (1.0, 1.0, 1.0)
+    assert calibration.lookup_table(neutral)[:, calibration.REFERENCE_MATCH].tolist() == [calibration.REFERENCE_MATCH] * 3
+    assert calibration.gamma_from_match(0) == calibration.MIN_GAMMA
+    assert calibration.gamma_from_match(255) == calibration.MAX_GAMMA
+    red, green, blue = calibration.white_gains(20, 0)
+    assert red == 1.0 and blue < green < 1.0
+    assert max(calibration.white_gains(-30, 10)) == 1.0
+
+
+def test_palettes():
+    assert calibration.palette(None, protocol.BUILTIN)["#123456"] == "#123456"
+    profile = Profile(2.0, 1.0, 1.0, 0.5)
+    palette = calibration.palette(profile, protocol.BUILTIN)
+    assert calibration.palette(profile, protocol.BUILTIN) is palette
+    colors = calibration.stimulus_colors(protocol.BUILTIN)
+    assert set(colors) <= set(palette)
+    assert palette["#FFFFFF"] == "#FFFFB4"
+    assert palette["#000001"] == calibration.correct_colors(profile, ["#000001"])[0]
+
+
+def test_profiles_are_saved_by_name(tmp_path):
+    path = os.path.join(tmp_path, "profiles.json")
+    assert calibration.saved_profile("bridge", path) is None
+    calibration.save_profile("bridge", calibration.make_profile(200, warmth=10), path)
+    calibration.save_profile("laptop", Profile(2.2, 1.0, 1.0, 1.0), path)
+    assert calibration.saved_profile("bridge", path) == calibration.make_profile(200, warmth=10)
+    assert sorted(calibration.load_profiles(path)) == ["bridge", "laptop"]
@@ -0,0 +1,97 @@
+# Maritime Color Vision Test - Certificate signing tests
+# Copyright © Toni Mandusic 2025
+
+import os
+
+import certificates
+
+KEYRING = certificates.Keyring({'k1': b"\x01" * 32, 'k2': b"\x02" * 32}, 'k2')
+RESULTS = [['ishihara', 23, 100.0, 'PASS'], ['lantern', 9, 100.0, 'PASS']]
+
+
+def issued(candidate_id="C-1"):
+    return certificates.issue(candidate_id, "Test Candidate", "Deck Officer", "session-1", RESULTS,
+                              issued="2025-06-01", keyring=KEYRING)
+
+
+def verify(claim, register=None, keyring=KEYRING):
+    lookup = None
+    if register is not None:
+        def lookup(cert_ids):
+            return {record['cert_id']: record for record in register if record['cert_id'] in cert_ids}
+    return certificates.verify_many([claim], lookup, keyring)[0]
+
+
+def tampered(cert_id):
+    """The ID with its first character changed"""
+    return ("B" if cert_id[0] == "A" else "A") + cert_id[1:]
+
+
+def test_issued_certificate_verifies():
+    record = issued()
+    assert record['key_id'] == 'k2'
+    assert verify(record['cert_id'], [record])['status'] == certificates.VALID
+    assert verify(certificates.display_id(record['cert_id']).lower(), [record])['status'] == certificates.VALID
+    assert verify(certificates.qr_payload(record))['status'] == certificates.SIGNATURE_VALID
+
+
+def test_signature_covers_every_signed_field():
+    record = issued()
+    base = (KEYRING.keys['k2'], 'k2', record['candidate_id'], record['issued'], record['digest'])
+    for index in range(1, len(base)):
+        changed = list(base)
+        changed[index] += "x"
+        assert certificates.sign(*changed) != record['cert_id']
+
+
+def test_tampered_id_is_forged():
+    record = issued()
+    forged = tampered(record['cert_id'])
+    assert verify(certificates.qr_payload(dict(record, cert_id=forged)))['status'] == certificates.FORGED
+    # Not in the register at all
+    assert verify(forged, [record])['status'] == certificates.NOT_ISSUED
+
+
+def test_qr_for_another_candidate_is_forged():
+    record = issued()
+    payload = certificates.qr_payload(dict(record, candidate_id="C-2"))
+    assert verify(payload)['status'] == certificates.FORGED
+
+
+def test_unknown_key():
+    record = issued()
+    assert verify(certificates.qr_payload(record), keyring=certificates.Keyring({'k1': b"\x01" * 32}, 'k1'))[
+        'status'] == certificates.UNKNOWN_KEY
+    assert verify(certificates.qr_payload(dict(record, key_id='k9')))['status'] == certificates.UNKNOWN_KEY
+
+
+def test_mismatches():
+    record = issued()
+    assert verify((record['cert_id'], "C-2"), [record])['status'] == certificates.MISMATCH
+    assert verify((record['cert_id'], "C-1"), [record])['status'] == certificates.VALID
+    other = issued("C-2")
+    # A QR code whose signed fields belong to another issued certificate
+    payload = certificates.qr_payload(dict(other, cert_id=record['cert_id']))
+    assert verify(payload, [record, other])['status'] == certificates.MISMATCH
+
+
+def test_altered_register_entry_is_forged():
+    record = issued()
+    altered = dict(record, results=[['ishihara', 23, 100.0, 'PASS'], ['lantern', 9, 100.0, 'FAIL']])
+    assert verify(record['cert_id'], [altered])['status'] == certificates.FORGED
+
+
+def test_bare_id_and_malformed_claims():
+    record = issued()
+    assert verify(record['cert_id'])['status'] == certificates.NOT_ISSUED
+    assert verify("not a certificate")['status'] == certificates.MALFORMED
+    assert verify(certificates.PREFIX + ":" + record['cert_id'])['status'] == certificates.MALFORMED
+
+
+def test_new_key_rotates_and_keeps_the_old_ones(tmp_path):
+    path = os.path.join(tmp_path, "keys.json")
+    first = certificates.load_keyring(path, create=True)
+    second = certificates.new_key(path)
+    assert second.active != first.active
+    assert second.keys[first.active] == first.keys[first.active]
+    assert certificates.load_keyring(path).active == second.active
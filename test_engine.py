@@ -0,0 +1,84 @@
+# Maritime Color Vision Test - Test engine tests
+# Copyright © Toni Mandusic 2025
+
+import random
+
+import pytest
+
+import checkpoint
+import engine
+import protocol
+import state as state_module
+
+
+def run(test, events, seed=1):
+    state = engine.start(test, random.Random(seed), 0.0, protocol.BUILTIN)
+    return engine.run(test, state, [(float(i), event) for i, event in enumerate(events, 1)])
+
+
+def test_ecdis_is_finished_only_by_finish():
+    groups = len(protocol.BUILTIN.ecdis_fm_colors)
+    state = run('ecdis', [(engine.NEXT,)] * groups)
+    assert engine.at_end('ecdis', state)
+    assert not engine.finished('ecdis', state)
+    assert engine.finished('ecdis', engine.apply('ecdis', state, (engine.FINISH,), 99.0))
+
+
+def test_radar_is_finished_only_by_finish():
+    state = run('radar', [(engine.NEXT,)] * engine.RADAR_SUBTESTS)
+    assert not engine.finished('radar', state)
+    assert engine.finished('radar', engine.apply('radar', state, (engine.FINISH,), 99.0))
+
+
+def test_lantern_is_finished_past_the_last_pair():
+    state = run('lantern', [])
+    assert not engine.finished('lantern', state)
+    state = run('lantern', [(engine.NEXT,)] * len(state.sequence))
+    assert engine.finished('lantern', state)
+
+
+def test_finished_survives_a_checkpoint():
+    session = {'ishihara': run('ishihara', [(engine.ANSWER, "12"), (engine.FINISH,)])}
+    restored = checkpoint.restore(checkpoint.snapshot(session))
+    assert restored['ishihara'].finished
+    assert restored['ishihara'].answers == session['ishihara'].answers
+
+
+def test_restoring_state_draws_nothing_and_keeps_its_protocol(monkeypatch):
+    states = {test: run(test, [(engine.NEXT,)]) for test in engine.STATE_CLASSES}
+    rng_state = random.getstate()
+    monkeypatch.setattr(state_module, "current", lambda: pytest.fail("restore looked up the active protocol"))
+    for test, state in states.items():
+        restored = type(state).from_dict(state.to_dict())
+        assert restored.to_dict() == state.to_dict()
+        assert restored.protocol is protocol.BUILTIN
+    assert random.getstate() == rng_state
+
+
+def test_apply_leaves_the_input_state_alone():
+    state = engine.start('ishihara', random.Random(1), 0.0, protocol.BUILTIN)
+    before = state.to_dict()
+    after = engine.apply('ishihara', state, (engine.ANSWER, " 12 "), 1.0)
+    assert state.to_dict() == before
+    assert after.answers[0] == "12"
+    with pytest.raises(engine.TransitionError):
+        engine.apply('ishihara', state, (engine.SHUFFLE, 1), 1.0)
+
+
+def test_lantern_timeout_advances_only_an_expired_pair():
+    state = engine.start('lantern', random.Random(1), 100.0, protocol.BUILTIN)
+    seconds = protocol.BUILTIN.lantern_pair_seconds
+    assert engine.apply('lantern', state, (engine.TIMEOUT,), 100.0 + seconds - 0.5).current_pair == 0
+    state = engine.apply('lantern', state, (engine.TIMEOUT,), 100.0 + seconds)
+    assert state.current_pair == 1
+    assert engine.lantern_time_remaining(state, 100.0 + seconds) == seconds
+
+
+def test_ecdis_moves_and_shuffles_are_reproducible():
+    events = [(engine.SHUFFLE, 42), (engine.ANSWER, 0), (engine.ANSWER, 3), (engine.NEXT,)]
+    first, second = run('ecdis', events, seed=5), run('ecdis', events, seed=5)
+    assert first.to_dict() == second.to_dict()
+    shuffled = run('ecdis', events[:1], seed=5).orders[0]
+    assert first.orders[0][3] == shuffled[0]
+    assert first.selected == engine.NO_SELECTION
+    assert first.scores[0] == sum(1 for position, color in enumerate(first.orders[0]) if position == color)
@@ -0,0 +1,70 @@
+# Maritime Color Vision Test - Parquet export tests
+# Copyright © Toni Mandusic 2025
+
+import json
+import os
+
+import pyarrow.parquet as pq
+
+import export_parquet
+from protocol import USED_PLATES, LANTERN_SEQUENCES
+from results_store import ResultsStore
+
+
+def row(test, answers, row_id=1):
+    return {
+        'id': row_id, 'session_id': f"s{row_id}", 'candidate_id': f"c{row_id}", 'candidate_name': "Test Candidate",
+        'position': "Deck Officer", 'test': test, 'score': 1, 'max_score': 1, 'accuracy': 100.0,
+        'status': 'PASS', 'started_at': "2025-06-01T09:55:00", 'completed_at': "2025-06-01T10:00:00",
+        'duration': 300.0, 'answers': answers,
+    }
+
+
+def test_ishihara_columns_follow_the_builtin_plates():
+    plate = USED_PLATES[0]
+    table = export_parquet.rows_to_table('ishihara', [row('ishihara', {'answers': {str(plate): " 12"}})])
+    assert table.schema == export_parquet.SCHEMAS['ishihara']
+    record = table.to_pylist()[0]
+    assert record[f"plate_{plate}"] == " 12"
+    assert record[f"plate_{plate}_correct"] is True
+    assert record[f"plate_{USED_PLATES[1]}"] is None
+    assert record['answers'] is None
+
+
+def test_items_without_a_column_are_kept_as_json():
+    extra = len(LANTERN_SEQUENCES)
+    answers = {
+        'sequence': [["red", "green"]] * (extra + 1),
+        'answers': {str(extra): {'light1': "red", 'light2': "white"}},
+    }
+    ishihara = {'answers': {'99': "5"}}
+    lantern = export_parquet.rows_to_table('lantern', [row('lantern', answers)]).to_pylist()[0]
+    assert json.loads(lantern['answers']) == {
+        f"pair_{extra + 1}_shown1": "red", f"pair_{extra + 1}_shown2": "green",
+        f"pair_{extra + 1}_light1": "red", f"pair_{extra + 1}_light2": "white",
+    }
+    plates = export_parquet.rows_to_table('ishihara', [row('ishihara', ishihara)]).to_pylist()[0]
+    assert json.loads(plates['answers']) == {'plate_99': "5", 'plate_99_correct': None}
+
+
+def test_unknown_test_type_keeps_all_answers():
+    table = export_parquet.rows_to_table('custom', [row('custom', {'value': 3})])
+    assert table.column_names[-1] == 'answers'
+    assert json.loads(table.to_pylist()[0]['answers']) == {'value': 3}
+
+
+def test_export_resumes_from_the_watermark(tmp_path):
+    store = ResultsStore(os.path.join(tmp_path, "results.db"))
+    store.submit_many([row('radar', {'subtest_scores': [1, 2, 3, 4]}, i) for i in (1, 2)])
+    store.flush()
+    out_dir = os.path.join(tmp_path, "export")
+    assert export_parquet.export(out_dir, store) == 2
+    assert export_parquet.export(out_dir, store) == 0
+    store.submit_many([row('radar', {'subtest_scores': [1, 2, 3, 4, 5]}, 3)])
+    store.flush()
+    assert export_parquet.export(out_dir, store) == 1
+    store.close()
+
+    table = pq.read_table(os.path.join(out_dir, "test=radar"))
+    assert table.num_rows == 3
+    assert [json.loads(extra) for extra in table.column('answers').to_pylist() if extra] == [{'subtest_5_score': 5}]
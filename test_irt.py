@@ -0,0 +1,72 @@
+# Maritime Color Vision Test - IRT scoring tests
+# Copyright © Toni Mandusic 2025
+
+import os
+
+import numpy as np
+
+import irt
+import irt_calibrate
+from results_store import ResultsStore
+
+
+def test_plates_are_scored_on_the_recorded_answer_key(corrected_protocol):
+    rules = corrected_protocol
+    assert irt.responses('ishihara', {'answers': {'1': "12"}}) == {"plate:1": 1}
+    assert irt.responses('ishihara', {'answers': {'1': "12"}, 'protocol': rules.version}) == {"plate:1": 0}
+    assert irt.responses('ishihara', {'answers': {'1': " 7"}, 'protocol': rules.version}) == {"plate:1": 1}
+
+
+def test_unreadable_parameter_file_turns_irt_off_once(tmp_path, monkeypatch, caplog):
+    path = tmp_path / "irt_params.json"
+    path.write_text('{"format": 99}')
+    reads = []
+
+    def load_params():
+        reads.append(path)
+        return original(str(path))
+
+    original = irt.load_params
+    monkeypatch.setattr(irt, "load_params", load_params)
+    monkeypatch.setattr(irt, "_params", None)
+    monkeypatch.setattr(irt, "_params_loaded", False)
+    assert irt.ability('ishihara', {'answers': {'1': "12"}}) is None
+    assert irt.ability('ishihara', {'answers': {'1': "12"}}) is None
+    assert len(reads) == 1
+    assert "IRT parameters not loaded" in caplog.text
+
+    path.write_text("not json")
+    monkeypatch.setattr(irt, "_params_loaded", False)
+    assert irt.get_params() is None
+
+
+def test_calibration_recovers_item_order_in_any_chunk_size():
+    rng = np.random.default_rng(1)
+    theta = rng.standard_normal(3000)
+    difficulty = np.array([-1.5, 0.0, 1.5])
+    correct = rng.random((3000, 3)) < 1 / (1 + np.exp(-1.5 * (theta[:, None] - difficulty)))
+    responses = correct.astype(np.int8)
+    responses[::7, 2] = -1  # not shown to every session
+
+    fit = irt_calibrate.fit_2pl(responses)
+    assert list(np.argsort(fit['b'])) == [0, 1, 2]
+    assert np.allclose(fit['b'], difficulty, atol=0.3)
+    assert fit['n'].tolist() == [3000, 3000, 3000 - len(range(0, 3000, 7))]
+    chunked = irt_calibrate.fit_2pl(responses, chunk_size=128)
+    assert np.allclose(chunked['a'], fit['a']) and np.allclose(chunked['b'], fit['b'])
+
+
+def test_response_matrix_leaves_out_unknown_protocol_versions(tmp_path, result):
+    store = ResultsStore(os.path.join(tmp_path, "results.db"))
+    store.submit_many([
+        result("known", {'answers': {'1': "12", '2': "0"}}),
+        result("unknown", {'answers': {'1': "12"}, 'protocol': "never-archived"}),
+    ])
+    store.flush()
+    matrix, names = irt_calibrate.response_matrix(store, 'ishihara', chunk_size=1)
+    store.close()
+    assert matrix.dtype == np.int8
+    assert matrix.shape == (1, len(names))
+    assert matrix[0, names.index("plate:1")] == 1
+    assert matrix[0, names.index("plate:2")] == 0
+    assert (matrix >= 0).sum() == 2
@@ -0,0 +1,43 @@
+# Maritime Color Vision Test - Lantern light rendering tests
+# Copyright © Toni Mandusic 2025
+
+import math
+
+import pytest
+
+import lights
+
+
+def test_transmittance():
+    assert lights.transmittance(2.0, None) == 1.0
+    # At the meteorological visibility only the 2 % contrast threshold is left
+    assert lights.transmittance(5.0, 5.0) == pytest.approx(0.02, abs=0.001)
+    assert lights.transmittance(1.0, 4.0) == pytest.approx(math.exp(-lights.KOSCHMIEDER / 4))
+    assert lights.transmittance(1.0, 2.0) < lights.transmittance(1.0, 4.0)
+
+
+def test_light_is_a_clipped_core_with_a_halo_on_black():
+    sprite = lights.render("#FF0000", 64, lights.INTENSITIES['high'])
+    assert sprite.shape == (64, 64, 3) and sprite.dtype.name == 'uint8'
+    center = sprite[31:33, 31:33, 0]
+    assert (center == 255).all()  # the over-bright core clips
+    assert (sprite[..., 1:] == 0).all()  # no light outside the color's channels
+    assert sprite[0, 0, 0] == 0
+    assert 0 < sprite[32, 44, 0] < 255  # glare halo
+    assert (sprite == sprite[::-1, ::-1]).all()
+
+
+def test_dimmer_and_hazier_lights_are_darker():
+    clear = lights.render("#FFFFFF", 64, lights.INTENSITIES['high']).astype(int)
+    low = lights.render("#FFFFFF", 64, lights.INTENSITIES['low']).astype(int)
+    hazy = lights.render("#FFFFFF", 64, lights.INTENSITIES['high'], lights.transmittance(2.0, 3.0)).astype(int)
+    assert low.sum() < clear.sum()
+    assert hazy[32, 32].sum() < clear[32, 32].sum()
+    assert (low <= clear).all()
+
+
+def test_sprite_follows_the_settings():
+    lighting = lights.Lighting(size=48, intensity='low', distance=2.0, visibility=None, scintillation=False)
+    assert (lights.sprite_pixels("#00FF00", lighting) == lights.render("#00FF00", 48, 0.25)).all()
+    assert lights.describe(lighting) == "low intensity at 2 NM, clear air"
+    assert lights.describe(lighting._replace(visibility=3.5)) == "low intensity at 2 NM, visibility 3.5 NM"
@@ -0,0 +1,37 @@
+# Maritime Color Vision Test - Runtime metrics tests
+# Copyright © Toni Mandusic 2025
+
+import threading
+
+import metrics
+
+
+def run_threads(target, count=8):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_counter_sums_every_thread_and_keeps_finished_ones():
+    counter = metrics.Counter("test_total", "Test counter", ("kind",))
+    counter.inc("a")
+    run_threads(lambda: [counter.inc("a") for _ in range(1000)])
+    assert counter.value("a") == 8001
+    # Finished threads are folded into one shard and still counted
+    assert len(counter._shards._shards) == 1
+    run_threads(lambda: counter.inc("b", amount=2))
+    assert dict((labels, value) for _, labels, value in counter.samples()) == {
+        '{kind="a"}': 8001, '{kind="b"}': 16}
+
+
+def test_histogram_merges_buckets_across_threads():
+    histogram = metrics.Histogram("test_seconds", "Test histogram", ("page",), buckets=(1.0, 2.0))
+    histogram.observe(0.5, "home")
+    run_threads(lambda: [histogram.observe(value, "home") for value in (0.5, 1.5, 3.0)], count=4)
+    counts, total, total_sum = histogram.series()[("home",)]
+    assert counts == [5, 4, 4]
+    assert total == 13
+    assert total_sum == 0.5 + 4 * 5.0
+    assert histogram.quantile(0.5, "home") == 1.0 + (6.5 - 5) / 4
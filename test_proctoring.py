@@ -0,0 +1,97 @@
+# Maritime Color Vision Test - Timing detector tests
+# Copyright © Toni Mandusic 2025
+
+import time
+
+import proctoring
+from proctoring import TimingDetector, get_detector
+
+
+def answer_items(detector, latencies, now=1000.0, test='ishihara'):
+    for item, latency in enumerate(latencies):
+        detector.item_shown("s", now)
+        now += latency
+        detector.answer("s", test, item, now)
+    return detector.sessions()["s"]
+
+
+def test_normal_pace_is_not_flagged():
+    row = answer_items(TimingDetector(), [2.5, 3.1, 1.8, 4.0, 2.2, 2.9, 3.5, 2.0])
+    assert row['answers'] == 8
+    assert row['fast'] == 0
+    assert row['flags'] == ()
+
+
+def test_fast_answers_are_flagged():
+    row = answer_items(TimingDetector(), [0.3] * 6)
+    assert proctoring.FAST in row['flags']
+
+
+def test_repeat_answers_count_as_changes():
+    detector = TimingDetector()
+    for i in range(proctoring.MAX_CHANGES + 1):
+        detector.answer("s", 'ishihara', 0, 1000.0 + 3 * i)
+    row = detector.sessions()["s"]
+    assert row['answers'] == 1
+    assert row['changes'] == proctoring.MAX_CHANGES
+    assert proctoring.CHANGES in row['flags']
+
+
+
+def test_fast_answers_need_enough_answers_first():
+    row = answer_items(TimingDetector(), [0.3] * (proctoring.MIN_ANSWERS - 1))
+    assert row['fast'] == proctoring.MIN_ANSWERS - 1
+    assert row['flags'] == ()
+
+
+def test_long_pauses_are_flagged_against_the_sessions_own_pace():
+    steady = [3.0, 3.2, 2.8, 3.1, 2.9]
+    pause = proctoring.PAUSE_SECONDS + 5
+    row = answer_items(TimingDetector(), steady + [pause, pause] + (steady + [pause]) * 2)
+    # The second of two pauses in a row is within the session's (now wider) spread
+    assert row['pauses'] == proctoring.MAX_PAUSES
+    assert proctoring.PAUSES in row['flags']
+    # A slow but even candidate's long answers are not pauses
+    row = answer_items(TimingDetector(), [pause] * 10)
+    assert row['pauses'] == 0
+
+
+def test_tab_switches_and_answers_right_after_them():
+    detector = TimingDetector()
+    detector.item_shown("s", 1000.0)
+    detector.tab_switches("s", 1, 1010.0)
+    detector.answer("s", 'ishihara', 0, 1012.0)
+    detector.tab_switches("s", 1, 1013.0)  # the same count reported again
+    detector.tab_switches("s", 2, 1020.0)
+    detector.answer("s", 'ishihara', 1, 1020.0 + proctoring.AFTER_SWITCH_SECONDS + 1)
+    row = detector.sessions()["s"]
+    assert row['tab_switches'] == 2
+    assert row['answers_after_switch'] == 1
+    assert row['flags'] == ()
+    detector.tab_switches("s", proctoring.MAX_TAB_SWITCHES, 1040.0)
+    detector.answer("s", 'ishihara', 2, 1041.0)
+    row = detector.sessions(flagged_only=True)["s"]
+    assert row['flags'] == (proctoring.TAB_SWITCHES, proctoring.ANSWERS_AFTER_SWITCH)
+    assert row['flagged_at'] == 1040.0
+
+def test_ishihara_session_at_normal_speed_is_not_flagged(monkeypatch, candidate_app, click):
+    # The app reads the clock for every event; a candidate takes 3 s per plate
+    clock = [time.time()]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+
+    at = candidate_app("PROCTOR-TEST-1")
+    at.button(key="ishihara_home").click().run()
+    ishihara = at.session_state.ishihara
+    for index, plate in enumerate(ishihara.protocol.used_plates):
+        clock[0] += 3.0
+        at.text_input(key=f"plate_{plate}").input(ishihara.protocol.normal_answers[index] or "").run()
+        if index < ishihara.protocol.total_plates - 1:
+            click(at, "Next →")
+    assert not at.exception
+
+    row = get_detector().sessions()[at.session_state.session_uid]
+    typed = sum(1 for answer in ishihara.protocol.normal_answers if answer)
+    assert row['answers'] == typed
+    assert row['changes'] == 0
+    assert row['mean_latency'] >= 3.0
+    assert row['flags'] == ()
@@ -0,0 +1,51 @@
+# Maritime Color Vision Test - Progress bus tests
+# Copyright © Toni Mandusic 2025
+
+from progress_bus import ProgressBus
+
+
+def test_new_subscriber_starts_from_the_retained_snapshot():
+    bus = ProgressBus(idle_seconds=60, subscriber_idle_seconds=30)
+    bus.publish("a", {'page': "ishihara", 'item': 1}, now=0.0)
+    bus.publish("a", {'page': "ishihara", 'item': 2}, now=1.0)
+    subscription = bus.subscribe(now=2.0)
+    assert subscription.poll(now=2.0) == {"a": {'page': "ishihara", 'item': 2, 'updated_at': 1.0}}
+    assert subscription.poll(now=3.0) == {}
+
+
+def test_updates_between_polls_collapse_per_session():
+    bus = ProgressBus(idle_seconds=60, subscriber_idle_seconds=30)
+    subscription = bus.subscribe(now=0.0)
+    for item in range(3):
+        bus.publish("a", {'item': item}, now=1.0 + item)
+    bus.publish("b", {'item': 0}, now=2.0)
+    updates = subscription.poll(now=5.0)
+    assert sorted(updates) == ["a", "b"]
+    assert updates["a"]['item'] == 2
+
+
+def test_removed_and_idle_sessions_are_reported_once():
+    bus = ProgressBus(idle_seconds=60, subscriber_idle_seconds=300)
+    bus.publish("done", {'page': "results"}, now=0.0)
+    bus.publish("idle", {'page': "lantern"}, now=0.0)
+    subscription = bus.subscribe(now=1.0)
+    subscription.poll(now=1.0)
+    bus.remove("done")
+    bus.remove("never-published")
+    assert subscription.poll(now=2.0) == {"done": None}
+    bus.publish("active", {'page': "ecdis"}, now=50.0)
+    assert subscription.poll(now=61.0) == {"idle": None, "active": {'page': "ecdis", 'updated_at': 50.0}}
+    assert bus.session_count() == 1
+    assert subscription.poll(now=62.0) == {}
+
+
+def test_subscribers_that_stop_polling_are_dropped():
+    bus = ProgressBus(idle_seconds=600, subscriber_idle_seconds=30)
+    stale = bus.subscribe(now=0.0)
+    fresh = bus.subscribe(now=0.0)
+    fresh.poll(now=20.0)
+    fresh.poll(now=40.0)
+    assert stale.closed and not fresh.closed
+    assert bus.subscriber_count() == 1
+    fresh.close()
+    assert bus.subscriber_count() == 0
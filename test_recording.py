@@ -0,0 +1,31 @@
+# Maritime Color Vision Test - Session recording tests
+# Copyright © Toni Mandusic 2025
+
+import os
+
+import recording
+
+
+def test_old_recordings_are_pruned(tmp_path):
+    now = 1_000_000.0
+    for name, age in (("a" * 16, 0), ("b" * 16, recording.RETENTION + 60)):
+        path = recording.recording_path(name, str(tmp_path))
+        with open(path, "w") as f:
+            f.write("{}\n")
+        os.utime(path, (now - age, now - age))
+    assert recording.prune(str(tmp_path), now=now) == 1
+    assert os.listdir(tmp_path) == ["a" * 16 + ".jsonl"]
+
+
+def test_recording_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(recording, "RECORDINGS_DIR", str(tmp_path))
+    recorder = recording.SessionRecorder("c" * 16, now=100.0, protocol="v1")
+    recorder.start('ishihara', 7, 101.0, None)
+    recorder.event('ishihara', ('answer', 1, "12"), 102.5)
+    recorder.result('ishihara', 1, 'PASS', 103.0)
+    recorder.flush()
+    headers, entries = recording.load(recorder.path)
+    assert headers[0]['protocol'] == "v1"
+    assert entries == [[recording.START, 101.0, 'ishihara', 7, None],
+                       [recording.EVENT, 102.5, 'ishihara', 'answer', 1, "12"],
+                       [recording.RESULT, 103.0, 'ishihara', 1, 'PASS']]
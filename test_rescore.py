@@ -0,0 +1,75 @@
+# Maritime Color Vision Test - Re-scoring tests
+# Copyright © Toni Mandusic 2025
+
+import pytest
+
+import protocol
+import rescore
+
+# (answer marked right, recorded key, new key) -> right under the new key.
+# The answer given is the recorded key where it was right, the opposite where wrong
+REKEY = [
+    (True, True, True, True),
+    (True, True, False, False),
+    (True, False, False, True),
+    (True, False, True, False),
+    (False, True, True, False),
+    (False, True, False, True),
+    (False, False, True, True),
+    (False, False, False, False),
+]
+
+
+@pytest.mark.parametrize("right, recorded, new, expected", REKEY)
+def test_rekey(right, recorded, new, expected):
+    assert rescore._rekey([right], [recorded], [new]) == [expected]
+
+
+RECORDED = ["a", "b", "c", "d"]
+TARGET = ["b", "a", "c", "d"]
+
+# (order, stored score, target order) -> score under the target
+REORDER = [
+    # Same order in both versions: the stored score stands
+    (["a", "b", "d", "c"], 2, RECORDED, 2),
+    # Scored under the recorded order: re-marked under the new one
+    (["a", "b", "c", "d"], 4, TARGET, 2),
+    (["b", "a", "c", "d"], 2, TARGET, 4),
+    # The stored score doesn't match the stored order (never scored, or
+    # changed afterwards): kept as it was
+    (["b", "a", "c", "d"], 0, TARGET, 0),
+    (["a", "b", "c", "d"], 3, TARGET, 3),
+]
+
+
+@pytest.mark.parametrize("order, stored, target, expected", REORDER)
+def test_reorder(order, stored, target, expected):
+    assert rescore._reorder(order, stored, RECORDED, target) == expected
+
+
+@pytest.mark.parametrize("order", [["a", "b", "c"], ["a", "b", "c", "e"]])
+def test_reorder_of_other_colors_is_not_rescorable(order):
+    with pytest.raises(rescore.NotRescorable) as raised:
+        rescore._reorder(order, 0, RECORDED, TARGET)
+    assert raised.value.args[0] == rescore.NOT_SHOWN
+
+
+def test_corrected_plate_key_changes_the_score(corrected_protocol):
+    target = corrected_protocol
+    answers = {'answers': {str(plate): normal for plate, normal in
+                           zip(protocol.BUILTIN.used_plates, protocol.BUILTIN.normal_answers)}}
+    total = protocol.BUILTIN.total_plates
+    assert rescore.rescore('ishihara', answers, protocol.BUILTIN)[0] == total
+    assert rescore.rescore('ishihara', answers, target)[0] == total - 1
+
+
+def test_unscorable_answers():
+    with pytest.raises(rescore.NotRescorable) as raised:
+        rescore.rescore('ecdis', {'orders': [["#000000"]]}, protocol.BUILTIN)
+    assert raised.value.args[0] == rescore.NOT_SHOWN
+    with pytest.raises(rescore.NotRescorable) as raised:
+        rescore.rescore('lantern', {'answers': {'0': {}}}, protocol.BUILTIN)
+    assert raised.value.args[0] == rescore.MALFORMED
+    with pytest.raises(rescore.NotRescorable) as raised:
+        rescore.rescore('hearing', {}, protocol.BUILTIN)
+    assert raised.value.args[0] == rescore.UNKNOWN_TEST
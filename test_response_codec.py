@@ -0,0 +1,140 @@
+# Maritime Color Vision Test - Response codec tests
+# Copyright © Toni Mandusic 2025
+
+import json
+import os
+import random
+
+import numpy as np
+
+import engine
+import export_parquet
+import protocol
+import response_codec
+from results_store import ResultsStore
+
+
+def stored(answers):
+    """Answers as they come back from the results store (JSON keys are strings)"""
+    return json.loads(json.dumps(answers))
+
+
+def ishihara_session(rng, rules):
+    state = engine.start('ishihara', rng, 0.0, rules)
+    for plate in rules.used_plates:
+        key = rules.ishihara_data[plate]
+        answer = rng.choice([key["normal"], key["deutan"], key["protan"], "", " 99", None])
+        if answer is not None:
+            state.set_answer(plate, answer)
+    engine.apply('ishihara', state, (engine.FINISH,), 1.0)
+    return state, stored({'answers': state.answers_by_plate()})
+
+
+def lantern_session(rng, rules):
+    state = engine.start('lantern', rng, 0.0, rules)
+    events = []
+    for _ in state.sequence:
+        if rng.random() < 0.8:
+            events.append((0.0, (engine.ANSWER, rng.choice(rules.lantern_palette), rng.choice(rules.lantern_palette))))
+        events.append((0.0, (engine.NEXT,)))
+    state = engine.run('lantern', state, events)
+    return stored({'sequence': state.sequence_colors(), 'answers': state.answers_by_pair()})
+
+
+def ecdis_session(rng, rules):
+    state = engine.start('ecdis', rng, 0.0, rules)
+    events = [(0.0, (engine.NEXT,))] * (len(rules.ecdis_fm_colors) - 1) + [(0.0, (engine.FINISH,))]
+    state = engine.run('ecdis', state, events)
+    return stored({'orders': state.hex_orders(), 'group_scores': list(state.scores)})
+
+
+def radar_session(rng, rules):
+    pairs = rng.randint(0, len(rules.radar_colors['critical_pairs']))
+    contrasts = rng.randint(0, len(rules.radar_colors['contrast_targets']))
+    order = list(rules.radar_colors['intensity_scale'])
+    rng.shuffle(order)
+    return stored({
+        'subtest_scores': [rng.randint(0, pairs), rng.randint(0, len(order)), rng.randint(0, contrasts),
+                           rng.randint(0, response_codec.RADAR_NIGHT_MAX)],
+        'pair_answers': [rng.random() < 0.5 for _ in range(pairs)],
+        'intensity_order': order if rng.random() < 0.9 else [],
+        'contrast_answers': [rng.random() < 0.5 for _ in range(contrasts)],
+    })
+
+
+def five_color_protocol():
+    """An archived version with a fifth lantern color (3-bit codes) and fewer plates"""
+    definition = protocol.BUILTIN.definition()
+    definition['version'] = "five-colors"
+    definition['ishihara']['used_plates'] = definition['ishihara']['used_plates'][:15]
+    definition['lantern']['colors']['blue'] = {'name': "Blue", 'hex': "#0000FF"}
+    definition['lantern']['sequences'] += [["blue", "red"], ["white", "blue"]]
+    rules = protocol.Protocol(definition)
+    protocol.archive(rules)
+    return rules
+
+
+def test_ishihara_round_trip_and_score():
+    rng = random.Random(1)
+    codec = response_codec.get_codec()
+    states, sessions = zip(*(ishihara_session(rng, protocol.BUILTIN) for _ in range(200)))
+    packed = codec.encode('ishihara', sessions)
+    assert packed.shape == (200, 12)
+    for session, decoded in zip(sessions, codec.decode('ishihara', packed)):
+        # A reading no observer type gives decodes as '?'
+        assert decoded['answers'] == {plate: "?" if answer == " 99" else answer.strip()
+                                      for plate, answer in session['answers'].items()}
+    assert codec.score('ishihara', packed).tolist() == [engine.ishihara_score(state) for state in states]
+
+
+def test_lantern_ecdis_and_radar_round_trip():
+    rng = random.Random(2)
+    codec = response_codec.get_codec()
+    for make, test in ((lantern_session, 'lantern'), (ecdis_session, 'ecdis'), (radar_session, 'radar')):
+        sessions = [make(rng, protocol.BUILTIN) for _ in range(200)]
+        packed = codec.encode(test, sessions)
+        assert codec.decode(test, packed) == sessions
+        assert packed.dtype.itemsize == {'lantern': 12, 'ecdis': 18, 'radar': 6}[test]
+
+
+def test_scores_on_packed_arrays_match_the_stored_results():
+    rng = random.Random(3)
+    codec = response_codec.get_codec()
+    lantern = [lantern_session(rng, protocol.BUILTIN) for _ in range(100)]
+    assert codec.score('lantern', codec.encode('lantern', lantern)).tolist() == [
+        sum(1 for answer in session['answers'].values()
+            if (answer['light1'], answer['light2']) == (answer['correct1'], answer['correct2']))
+        for session in lantern]
+    ecdis = codec.encode('ecdis', [ecdis_session(rng, protocol.BUILTIN) for _ in range(100)])
+    assert (codec.ecdis_order_scores(ecdis) == codec.ecdis_group_scores(ecdis)).all()
+
+
+def test_codec_follows_the_protocol_version():
+    rules = five_color_protocol()
+    codec = response_codec.get_codec(rules.version)
+    assert codec.color_bits == 3
+    rng = random.Random(4)
+    sessions = [lantern_session(rng, rules) for _ in range(50)]
+    assert codec.decode('lantern', codec.encode('lantern', sessions)) == sessions
+    assert codec.encode('ishihara', [ishihara_session(rng, rules)[1]]).shape == (1, 8)
+
+
+def test_export_writes_packed_parts_per_protocol_version(tmp_path, result):
+    rules = five_color_protocol()
+    rng = random.Random(5)
+    sessions = {protocol.BUILTIN_VERSION: [lantern_session(rng, protocol.BUILTIN) for _ in range(3)],
+                rules.version: [lantern_session(rng, rules) for _ in range(2)]}
+    store = ResultsStore(os.path.join(tmp_path, "results.db"))
+    for version, answers in sessions.items():
+        store.submit_many([result(f"{version}-{i}", dict(session, protocol=version), test='lantern')
+                           for i, session in enumerate(answers)])
+    store.flush()
+
+    out_dir = os.path.join(tmp_path, "export")
+    assert export_parquet.export(out_dir, store, packed=True) == 5
+    store.close()
+    loaded = response_codec.load_packed(out_dir, 'lantern')
+    assert sorted(loaded) == sorted(sessions)
+    for version, (ids, packed) in loaded.items():
+        assert np.all(np.diff(ids) > 0)
+        assert response_codec.get_codec(version).decode('lantern', packed) == sessions[version]
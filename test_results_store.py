@@ -0,0 +1,68 @@
+# Maritime Color Vision Test - Results store tests
+# Copyright © Toni Mandusic 2025
+
+import csv
+import io
+import os
+
+import pytest
+
+from results_store import HISTORY_COLUMNS, ResultsStore
+
+NAMES = ["Ana", "ivan", "Marko", "Ante", "Luka"]
+
+
+@pytest.fixture
+def store(tmp_path, result):
+    store = ResultsStore(os.path.join(tmp_path, "results.db"))
+    records = []
+    for i in range(23):
+        record = result(f"s{i:02d}", {}, status='PASS' if i % 3 else 'FAIL', accuracy=float(i % 4 * 25))
+        record['candidate_name'] = NAMES[i % len(NAMES)]
+        record['completed_at'] = f"2025-06-{i % 10 + 1:02d}T10:00:00"
+        records.append(record)
+    store.submit_many(records)
+    store.flush()
+    yield store
+    store.close()
+
+
+def all_pages(store, filters, sort, descending, limit=4):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = store.history(filters, sort, descending, after=cursor, limit=limit)
+        rows += page
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+@pytest.mark.parametrize("sort", ['completed_at', 'name', 'accuracy'])
+@pytest.mark.parametrize("descending", [True, False])
+def test_history_pages_cover_every_row_once_in_order(store, sort, descending):
+    rows, pages = all_pages(store, {}, sort, descending)
+    assert pages == 6
+    column = {'name': 'candidate_name'}.get(sort, sort)
+    key = lambda row: (row[column].lower() if sort == 'name' else row[column], row['id'])  # noqa: E731
+    assert rows == sorted(rows, key=key, reverse=descending)
+    assert len({row['id'] for row in rows}) == 23
+    assert set(rows[0]) == set(HISTORY_COLUMNS)
+
+
+def test_history_filters(store):
+    rows, _ = all_pages(store, {'name': "an", 'status': 'FAIL', 'date_from': "2025-06-03",
+                                'date_to': "2025-06-07", 'position': ""}, 'completed_at', True)
+    assert rows
+    for row in rows:
+        assert row['candidate_name'].lower().startswith("an")
+        assert row['status'] == 'FAIL'
+        assert "2025-06-03" <= row['completed_at'][:10] <= "2025-06-07"
+
+
+def test_csv_export_writes_every_match_in_chunks(store):
+    out = io.BytesIO()
+    assert store.export_csv({'status': 'PASS'}, out, chunk_size=5) == 15
+    lines = list(csv.reader(io.StringIO(out.getvalue().decode("utf-8"))))
+    assert tuple(lines[0]) == HISTORY_COLUMNS
+    assert len(lines) == 16
+    assert [int(line[0]) for line in lines[1:]] == sorted(int(line[0]) for line in lines[1:])
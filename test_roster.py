@@ -0,0 +1,91 @@
+# Maritime Color Vision Test - Crew roster tests
+# Copyright © Toni Mandusic 2025
+
+import io
+import os
+
+import pytest
+
+import roster
+from results_store import ResultsStore, connect
+
+CSV = """Name;Passport number;Rank
+Ana Kovačić;P100200;Chief Officer
+Marko Horvat;P100300;2nd Engineer
+Ivan Marić;P100400;AB
+;P100500;Master
+Petar Babić;;Master
+Luka Perić;P100200;Cook
+Josip Novak;P100600;Cook
+"""
+
+
+@pytest.fixture
+def conn(tmp_path):
+    path = os.path.join(tmp_path, "results.db")
+    ResultsStore(path).close()
+    conn = connect(path)
+    yield conn
+    conn.close()
+
+
+def imported(conn, text=CSV):
+    return roster.import_roster(conn, roster.read_rows(io.BytesIO(text.encode("utf-8")), "crew.csv"), "crew.csv")
+
+
+def test_import_validates_rows(conn):
+    report = imported(conn)
+    assert report['imported'] == 4
+    assert report['skipped'] == 3
+    assert report['positions_mapped'] == 1
+    assert report['problems'] == [(5, "missing name or ID"), (6, "missing name or ID"),
+                                  (7, "duplicate ID P100200"), (8, "position 'Cook' mapped to Other")]
+    assert roster.size(conn) == 4
+
+
+def test_duplicate_id_keeps_the_first_row(conn):
+    imported(conn)
+    assert [entry['candidate_name'] for entry in roster.search(conn, "P100200")] == ["Ana Kovačić"]
+
+
+def test_a_broken_roster_leaves_the_previous_one(conn):
+    imported(conn)
+    with pytest.raises(roster.RosterError):
+        imported(conn, "Rank;Vessel\nMaster;Adriatic\n")
+    assert roster.size(conn) == 4
+
+
+@pytest.mark.parametrize("text, position", [
+    ("Chief Officer", "Deck Officer"),
+    ("2nd Engineer", "Engine Officer"),
+    ("ETO", "Engine Officer"),
+    ("AB", "Lookout"),
+    ("Sea Pilot", "Pilot"),
+    ("lookout", "Lookout"),
+    ("Cook", "Other"),
+])
+def test_position_mapping(text, position):
+    assert roster.map_position(text)[0] == position
+
+
+def test_search(conn):
+    imported(conn)
+    assert [entry['candidate_id'] for entry in roster.search(conn, "kova")] == ["P100200"]
+    # Accents are folded, and every word has to match
+    assert [entry['candidate_id'] for entry in roster.search(conn, "maric ivan")] == ["P100400"]
+    assert roster.search(conn, "mar horvat") == [roster.search(conn, "horvat")[0]]
+    assert len(roster.search(conn, "mar", limit=1)) == 1
+
+
+def test_search_needs_a_few_characters(conn):
+    imported(conn)
+    assert roster.search(conn, "m") == []
+    assert roster.search(conn, "ma") == []
+    assert len(roster.search(conn, "mar")) == 2
+
+
+def test_ids_are_masked_and_confirmed():
+    assert roster.mask_id("P100200") == "••••200"
+    assert roster.mask_id("1234") == "••••"
+    assert roster.same_id("P100200", " p100 200 ")
+    assert not roster.same_id("P100200", "P100300")
@@ -0,0 +1,77 @@
+# Maritime Color Vision Test - Session lifecycle tests
+# Copyright © Toni Mandusic 2025
+
+import os
+import random
+import time
+
+import pytest
+
+import checkpoint
+import engine
+import protocol
+import session_lifecycle
+
+CANDIDATE = "EVICT-TEST-1"
+
+
+def session(session_uid):
+    return {'session_uid': session_uid, 'user_id': CANDIDATE, 'user_name': "Test Candidate",
+            'resume_digest': checkpoint.resume_digest(CANDIDATE, session_uid),
+            'ecdis': engine.start('ecdis', random.Random(1), 0.0, protocol.BUILTIN)}
+
+
+def abandon(candidate_id):
+    old = time.time() - checkpoint.ABANDONED_AFTER - 60
+    os.utime(checkpoint.checkpoint_path(candidate_id), (old, old))
+
+
+def test_evicted_state_comes_back():
+    state = session("uid-1")
+    assert session_lifecycle.evict_test_state(state)
+    assert 'ecdis' not in state
+    assert session_lifecycle.restore_test_state(state)
+    assert 'ecdis' in state
+
+
+def test_another_session_cant_replace_the_log():
+    state = session("uid-1")
+    assert session_lifecycle.evict_test_state(state)
+    other = session("uid-2")
+    with pytest.raises(checkpoint.CheckpointTaken):
+        checkpoint.save(CANDIDATE, None, checkpoint.snapshot(other))
+    assert not session_lifecycle.evict_test_state(other)
+    assert 'ecdis' in other
+    assert not checkpoint.discard(CANDIDATE, other['resume_digest'])
+    assert session_lifecycle.restore_test_state(state)
+
+
+def test_evicted_state_is_not_restored_from_another_sessions_log():
+    state = session("uid-1")
+    assert session_lifecycle.evict_test_state(state)
+    # Left long enough to count as abandoned, the ID starts over in another session
+    abandon(CANDIDATE)
+    other = session("uid-2")
+    checkpoint.save(CANDIDATE, None, checkpoint.snapshot(other))
+    assert not session_lifecycle.restore_test_state(state)
+    assert 'ecdis' not in state
+    assert checkpoint.discard(CANDIDATE, other['resume_digest'])
+
+
+def test_sweep_evicts_idle_and_least_recent_sessions_but_not_running_ones():
+    evicted = []
+    lifecycle = session_lifecycle.SessionLifecycle(idle_timeout=60, max_resident=2, sweep_interval=0,
+                                                   evict=lambda state: evicted.append(state['name']) or True)
+    for name in ("a", "b", "c", "d"):
+        lifecycle.begin(name, {'name': name})
+        lifecycle.end(name)
+    lifecycle.begin("a", {'name': "a"})  # running again, most recent
+    now = time.time()
+    # Over the cap of two: the least recent idle ones go first
+    assert lifecycle.sweep(now) == 2
+    assert evicted == ["b", "c"]
+    # Past the idle timeout everything goes, except a session mid-run
+    assert lifecycle.sweep(now + 120) == 1
+    assert evicted == ["b", "c", "d"]
+    assert lifecycle.resident_count() == lifecycle.running_count() == 1
+    assert lifecycle.evicted_total == 3
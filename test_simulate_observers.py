@@ -0,0 +1,39 @@
+# Maritime Color Vision Test - Simulated observer tests
+# Copyright © Toni Mandusic 2025
+
+import numpy as np
+
+import protocol
+import simulate_observers as sim
+
+
+def test_batch_scoring_matches_the_engine():
+    for name in ('normal', 'protan-mild', 'deutan-severe'):
+        sim.verify(sim.POPULATIONS[name], 200, 1, protocol.BUILTIN)
+
+
+def test_shards_are_reproducible_and_separate_the_populations():
+    rules = protocol.BUILTIN
+    variants = sim.variants(rules)
+    normal = sim.simulate_shard(sim.POPULATIONS['normal'], variants, 2000, 1, rules)
+    assert sim.simulate_shard(sim.POPULATIONS['normal'], variants, 2000, 1, rules) == normal
+    severe = sim.simulate_shard(sim.POPULATIONS['protan-severe'], variants, 2000, 1, rules)
+    observers, _, _, passed = normal['current']
+    assert passed / observers > 0.5
+    assert severe['current'][3] / observers < 0.05
+    # Stricter rules never pass more observers than lenient ones
+    for counts in (normal, severe):
+        assert counts['strict'][3] <= counts['current'][3] <= counts['lenient'][3]
+
+
+def test_summary_rates():
+    populations = {'normal': sim.POPULATIONS['normal'], 'protan-mild': sim.POPULATIONS['protan-mild']}
+    totals = {'normal': {'current': [100, 0, 0, 95]}, 'protan-mild': {'current': [200, 0, 0, 20]}}
+    summary = sim.summarize(totals, populations, ['current'])['current']
+    assert summary == {'specificity': 0.95, 'sensitivity': 0.9, 'false_pass_rate': 0.1}
+
+
+def test_a_lapse_free_normal_observer_reads_every_plate():
+    population = sim.Population('normal', (0.0, 0.0), 0.0)
+    plates, pairs = sim.draw(population, 50, np.random.default_rng(0), protocol.BUILTIN)
+    assert plates.all() and pairs.all()